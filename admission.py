@@ -0,0 +1,226 @@
+"""
+Controle de admissão nas filas RQ (todos os pontos de enfileiramento).
+
+Antes de enfileirar, cada job passa por admit/admit_many (um script Lua, atômico):
+  - deduplicação por conta: um job de scraping da mesma conta ainda na fila
+    (queued/scheduled/deferred) faz o novo ser rejeitado (motivo "duplicado")
+  - profundidade máxima da fila (fila base + subfilas por conta do FairWorker):
+    acima de max_depth o job é adiado (motivo "fila_cheia", com retry_after)
+  - jobs de scraping expiram na fila após ttl segundos (ttl do RQ): durante uma
+    queda do fornecedor a fila não acumula crawls que já estariam desatualizados
+
+Política por fila em QUEUE_ADMISSION (JSON, mesmo formato de JOB_BUDGET_DEFAULTS:
+chave "*" para todas, subfilas usam a fila base) sobre POLICY_DEFAULTS, ex.:
+    {"scraping": {"max_depth": 5000, "ttl": 1800}, "pedido": {"max_depth": 20000}}
+Sem política, a fila não tem limite nem ttl: limites e expiração valem só para as
+filas configuradas em QUEUE_ADMISSION.
+
+Resultado estruturado (dict), por job:
+    {"resultado": "admitido", "job_id": ...}
+    {"resultado": "rejeitado", "motivo": "duplicado", "job_id": <job existente>}
+    {"resultado": "adiado", "motivo": "fila_cheia", "profundidade": n, "retry_after": s}
+"""
+import hashlib
+import json
+import os
+import uuid
+
+import tracing
+from pedido_ledger import JOB_KEY_PREFIX
+from queue_utils import enqueue_bulk as enqueue_pipeline
+from scheduling import SUBQUEUES_KEY
+
+ADMITIDO = "admitido"
+REJEITADO = "rejeitado"
+ADIADO = "adiado"
+
+DEDUP_KEY = "admission:conta:{base}:{conta}"
+QUEUE_KEY_PREFIX = "rq:queue:"
+
+# Nenhuma fila tem limite ou ttl sem QUEUE_ADMISSION (opt-in)
+POLICY_DEFAULTS: dict[str, dict] = {}
+CAMPOS = ("max_depth", "ttl", "retry_after")
+
+# KEYS[1] = conjunto de subfilas da fila base; KEYS[2..] = chaves de dedup (uma por job).
+# ARGV[1..5] = prefixo dos jobs, prefixo das filas, fila base, max_depth (0 = sem
+# limite), ttl da chave de dedup; ARGV[6..] = pares (job_id, usa_dedup "1"/"0").
+# Retorna, por job: {'ok', ''}, {'duplicado', job_id existente} ou {'cheia', profundidade}.
+ADMIT_LUA = """
+local max = tonumber(ARGV[4])
+local depth = 0
+if max > 0 then
+  depth = redis.call('LLEN', ARGV[2] .. ARGV[3])
+  for _, nome in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    depth = depth + redis.call('LLEN', ARGV[2] .. nome)
+  end
+end
+local out = {}
+local admitidos = {}
+for i = 2, #KEYS do
+  local job_id = ARGV[6 + (i - 2) * 2]
+  local dedup = ARGV[7 + (i - 2) * 2] == '1'
+  local resultado = nil
+  if dedup and admitidos[KEYS[i]] then
+    resultado = {'duplicado', admitidos[KEYS[i]]}
+  elseif dedup then
+    local anterior = redis.call('GET', KEYS[i])
+    if anterior then
+      local st = redis.call('HGET', ARGV[1] .. anterior, 'status')
+      if st == 'queued' or st == 'scheduled' or st == 'deferred' then
+        resultado = {'duplicado', anterior}
+      end
+    end
+  end
+  if resultado == nil and max > 0 and depth >= max then
+    resultado = {'cheia', tostring(depth)}
+  end
+  if resultado == nil then
+    if dedup then
+      redis.call('SET', KEYS[i], job_id, 'EX', ARGV[5])
+      admitidos[KEYS[i]] = job_id
+    end
+    depth = depth + 1
+    resultado = {'ok', ''}
+  end
+  out[#out + 1] = resultado
+end
+return out
+"""
+
+
+def base_name(queue_name: str) -> str:
+    """Fila base (subfilas por conta são <base>.<hash>)."""
+    return queue_name.split(".")[0]
+
+
+def policy(queue_name: str) -> dict:
+    """Política de admissão da fila: POLICY_DEFAULTS + QUEUE_ADMISSION."""
+    base = base_name(queue_name)
+    raw = os.environ.get("QUEUE_ADMISSION", "").strip()
+    config = json.loads(raw) if raw else {}
+    resultado = {"max_depth": 0, "ttl": None, "retry_after": 60}
+    resultado.update(POLICY_DEFAULTS.get(base) or {})
+    resultado.update(config.get("*") or {})
+    resultado.update(config.get(base) or {})
+    desconhecidos = set(resultado) - set(CAMPOS)
+    if desconhecidos:
+        raise ValueError(f"QUEUE_ADMISSION: campos desconhecidos {sorted(desconhecidos)} (use {', '.join(CAMPOS)})")
+    return resultado
+
+
+def dedup_key(queue_name: str, conta: str) -> str:
+    digest = hashlib.sha1(conta.encode("utf-8")).hexdigest()[:12]
+    return DEDUP_KEY.format(base=base_name(queue_name), conta=digest)
+
+
+def conta_do_payload(payload: dict) -> str | None:
+    """Conta usada na deduplicação de jobs de scraping (None: sem deduplicação)."""
+    return payload.get("usuario") or payload.get("user") or None
+
+
+class QueueAdmission:
+    """Admissão de jobs em uma fila base (e suas subfilas por conta)."""
+
+    def __init__(self, queue, politica: dict | None = None):
+        self.queue = queue
+        self.conn = queue.connection
+        self.base = base_name(queue.name)
+        self.politica = politica if politica is not None else policy(queue.name)
+        self._admit = self.conn.register_script(ADMIT_LUA)
+
+    @property
+    def ttl(self) -> int | None:
+        return self.politica.get("ttl")
+
+    def depth(self) -> int:
+        nomes = [self.base] + [m.decode() for m in self.conn.smembers(SUBQUEUES_KEY.format(base=self.base))]
+        pipe = self.conn.pipeline(transaction=False)
+        for nome in nomes:
+            pipe.llen(QUEUE_KEY_PREFIX + nome)
+        return sum(pipe.execute())
+
+    def capacity(self) -> int | None:
+        """Vagas na fila até max_depth (None = sem limite)."""
+        maximo = int(self.politica.get("max_depth") or 0)
+        return max(0, maximo - self.depth()) if maximo > 0 else None
+
+    def admit_many(self, itens) -> list[dict]:
+        """
+        Admite, em ordem, jobs (conta ou None, job_id ou None); job_id ausente é gerado.
+        Retorna um resultado por job; os admitidos devem ser enfileirados com o job_id retornado.
+        """
+        itens = [(conta, job_id or uuid.uuid4().hex) for conta, job_id in itens]
+        if not itens:
+            return []
+        keys = [SUBQUEUES_KEY.format(base=self.base)]
+        args = [
+            JOB_KEY_PREFIX, QUEUE_KEY_PREFIX, self.base,
+            int(self.politica.get("max_depth") or 0),
+            int(self.ttl or 86400),
+        ]
+        for conta, job_id in itens:
+            keys.append(dedup_key(self.base, conta) if conta else dedup_key(self.base, "-"))
+            args.extend([job_id, "1" if conta else "0"])
+        resultados = []
+        for (conta, job_id), (codigo, valor) in zip(itens, self._admit(keys=keys, args=args)):
+            codigo = codigo.decode() if isinstance(codigo, bytes) else codigo
+            valor = valor.decode() if isinstance(valor, bytes) else valor
+            if codigo == "ok":
+                resultados.append({"resultado": ADMITIDO, "job_id": job_id})
+            elif codigo == "duplicado":
+                resultados.append({"resultado": REJEITADO, "motivo": "duplicado", "job_id": valor})
+            else:
+                resultados.append({
+                    "resultado": ADIADO,
+                    "motivo": "fila_cheia",
+                    "profundidade": int(valor),
+                    "retry_after": self.politica.get("retry_after", 60),
+                })
+        return resultados
+
+    def admit(self, conta: str | None = None, job_id: str | None = None) -> dict:
+        return self.admit_many([(conta, job_id)])[0]
+
+
+def enqueue(queue, func: str, payload: dict, dedup: bool = False, fila=None, **kwargs) -> dict:
+    """
+    Admite e enfileira um job (Queue.enqueue com o ttl da política).
+    dedup: deduplica pela conta do payload (jobs de scraping). fila: Queue de destino (ex.: subfila
+    da conta); a admissão usa a fila base `queue`. Retorna o resultado da admissão.
+    """
+    admission = QueueAdmission(queue)
+    resultado = admission.admit(conta_do_payload(payload) if dedup else None, kwargs.pop("job_id", None))
+    if resultado["resultado"] != ADMITIDO:
+        return resultado
+    span = tracing.inject(payload, f"enqueue {func}")
+    job = (fila or queue).enqueue(func, payload, job_id=resultado["job_id"], ttl=admission.ttl, **kwargs)
+    span.finish()
+    return {**resultado, "fila": job.origin}
+
+
+def enqueue_bulk(queue, func: str, payloads, dedup: bool = False, job_id_for=None, **kwargs) -> dict:
+    """
+    queue_utils.enqueue_bulk só com os payloads admitidos (dedup como em enqueue).
+    Retorna {"jobs", "segundos", "recusados": [(payload, resultado), ...]}.
+    """
+    payloads = list(payloads)
+    admission = QueueAdmission(queue)
+    resultados = admission.admit_many([
+        (conta_do_payload(p) if dedup else None, job_id_for(p) if job_id_for else None)
+        for p in payloads
+    ])
+    admitidos = {id(p): r["job_id"] for p, r in zip(payloads, resultados) if r["resultado"] == ADMITIDO}
+    jobs, segundos = enqueue_pipeline(
+        queue, func, [p for p in payloads if id(p) in admitidos],
+        job_id_for=lambda p: admitidos[id(p)], ttl=admission.ttl, **kwargs,
+    )
+    recusados = [(p, r) for p, r in zip(payloads, resultados) if r["resultado"] != ADMITIDO]
+    return {"jobs": jobs, "segundos": segundos, "recusados": recusados}
+
+
+def summarize(recusados) -> str:
+    """Resumo legível dos jobs não admitidos."""
+    motivos: dict[str, int] = {}
+    for _, r in recusados:
+        motivos[r["motivo"]] = motivos.get(r["motivo"], 0) + 1
+    return ", ".join(f"{n} {motivo}" for motivo, n in sorted(motivos.items()))
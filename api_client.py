@@ -2,13 +2,64 @@
 Cliente da API do desafio Cotefácil (Nível 2 e 3).
 Autenticação OAuth, envio de produtos (/produto) e pedidos (/pedido).
 """
+import json
 import logging
 import os
+import time
+import zlib
+from typing import Iterable, Iterator
+from urllib.parse import urlsplit
+
 import requests
 
+try:
+    import orjson  # opcional (pip install .[fast-json]): serialização mais rápida no upload em stream
+except ImportError:
+    orjson = None
+
+import tracing
+from circuit_breaker import api_upstream, breaker_for
+
 logger = logging.getLogger(__name__)
 
 
+def _request(http, method: str, url: str, **kwargs) -> requests.Response:
+    """
+    Chamada HTTP com span de tracing (kind CLIENT), circuit breaker do host
+    (CIRCUIT_BREAKER=1; falha na hora com CircuitOpenError se aberto) e raise_for_status.
+    Erros de rede, 5xx e 429 contam como falha do upstream; demais 4xx não.
+    """
+    breaker = breaker_for(api_upstream(url))
+    if breaker is not None:
+        breaker.before_call()
+    with tracing.span(
+        f"{method} {urlsplit(url).path}",
+        kind="CLIENT",
+        **{"http.method": method, "http.url": url},
+    ) as s:
+        inicio = time.monotonic()
+        try:
+            r = getattr(http, method.lower())(url, **kwargs)
+        except requests.RequestException:
+            if breaker is not None:
+                breaker.record(False, time.monotonic() - inicio)
+            raise
+        if breaker is not None:
+            breaker.record(r.status_code < 500 and r.status_code != 429, time.monotonic() - inicio)
+        s.set_tag("http.status_code", r.status_code)
+        r.raise_for_status()
+        return r
+
+
+def make_session(pool_size: int = 10) -> requests.Session:
+    """Session com pool de conexões dimensionado para chamadas concorrentes."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
 def get_base_url():
     """URL base da API (variável de ambiente DESAFIO_API_URL)."""
     url = os.environ.get(
@@ -27,24 +78,32 @@ def signup(email: str, password: str, base_url: str | None = None) -> dict:
     base_url = base_url or get_base_url()
     # OpenAPI: CreateUser requer username (3-50 chars) e password (8-64 chars)
     payload = {"username": email, "password": password}
-    r = requests.post(
+    r = _request(
+        requests, "POST",
         f"{base_url}/oauth/signup",
         json=payload,
         headers={"Content-Type": "application/json"},
         timeout=30,
     )
-    r.raise_for_status()
     return r.json()
 
 
-def get_token(username: str, password: str, base_url: str | None = None) -> str:
+def get_token(
+    username: str,
+    password: str,
+    base_url: str | None = None,
+    session: requests.Session | None = None,
+) -> str:
     """
     Obtém token de acesso (POST /oauth/token).
     Retorna o access_token para usar em Authorization: Bearer <token>.
+    session: requests.Session opcional para reutilizar conexões (pool).
     """
     base_url = base_url or get_base_url()
+    http = session or requests
     # Formato comum OAuth2 password grant
-    r = requests.post(
+    r = _request(
+        http, "POST",
         f"{base_url}/oauth/token",
         data={
             "grant_type": "password",
@@ -54,7 +113,6 @@ def get_token(username: str, password: str, base_url: str | None = None) -> str:
         headers={"Content-Type": "application/x-www-form-urlencoded"},
         timeout=30,
     )
-    r.raise_for_status()
     data = r.json()
     token = data.get("access_token") or data.get("token")
     if not token:
@@ -70,7 +128,8 @@ def post_produtos(produtos: list[dict], token: str, base_url: str | None = None)
     """
     base_url = base_url or get_base_url()
     payload = _normalize_produtos(produtos)
-    r = requests.post(
+    r = _request(
+        requests, "POST",
         f"{base_url}/produto",
         json=payload,
         headers={
@@ -79,22 +138,84 @@ def post_produtos(produtos: list[dict], token: str, base_url: str | None = None)
         },
         timeout=60,
     )
-    r.raise_for_status()
     return r.json()
 
 
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def post_produtos_stream(
+    produtos: Iterable[dict],
+    token: str,
+    base_url: str | None = None,
+    gzip: bool = False,
+    session: requests.Session | None = None,
+) -> dict:
+    """
+    Como post_produtos, mas o corpo é um array JSON gerado sob demanda e enviado com
+    Transfer-Encoding: chunked (opcionalmente com Content-Encoding: gzip): cada
+    produto é normalizado e serializado só quando o socket pede o próximo bloco.
+    A memória fica constante com qualquer tamanho de catálogo (produtos pode ser
+    um gerador). Usa orjson se instalado.
+    """
+    base_url = base_url or get_base_url()
+    http = session or requests
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {token}",
+    }
+    corpo = iter_json_array(_normalize_produto(p) for p in produtos)
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+        corpo = _gzip_stream(corpo)
+    r = _request(http, "POST", f"{base_url}/produto", data=corpo, headers=headers, timeout=60)
+    return r.json()
+
+
+def _dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def iter_json_array(itens: Iterable, chunk_bytes: int = STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+    """Array JSON dos itens em blocos de ~chunk_bytes (poucas escritas no socket)."""
+    buffer = bytearray(b"[")
+    primeiro = True
+    for item in itens:
+        if not primeiro:
+            buffer += b","
+        primeiro = False
+        buffer += _dumps(item)
+        if len(buffer) >= chunk_bytes:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += b"]"
+    yield bytes(buffer)
+
+
+def _gzip_stream(blocos: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: formato gzip
+    for bloco in blocos:
+        comprimido = compressor.compress(bloco)
+        if comprimido:
+            yield comprimido
+    yield compressor.flush()
+
+
 def _normalize_produtos(produtos: list[dict]) -> list[dict]:
     """Garante gtin/codigo/descricao como string e preco_fabrica/estoque como número."""
-    out = []
-    for p in produtos:
-        out.append({
-            "gtin": str(p.get("gtin", "")),
-            "codigo": str(p.get("codigo", "")),
-            "descricao": str(p.get("descricao", "")),
-            "preco_fabrica": _to_number(p.get("preco_fabrica"), 0.0),
-            "estoque": _to_number(p.get("estoque"), 0),
-        })
-    return out
+    return [_normalize_produto(p) for p in produtos]
+
+
+def _normalize_produto(p: dict) -> dict:
+    return {
+        "gtin": str(p.get("gtin", "")),
+        "codigo": str(p.get("codigo", "")),
+        "descricao": str(p.get("descricao", "")),
+        "preco_fabrica": _to_number(p.get("preco_fabrica"), 0.0),
+        "estoque": _to_number(p.get("estoque"), 0),
+    }
 
 
 def _to_number(val, default):
@@ -114,14 +235,21 @@ def _to_number(val, default):
 # ---------- Nível 3: Pedidos ----------
 
 
-def post_pedido(token: str, base_url: str | None = None) -> dict:
+def post_pedido(
+    token: str,
+    base_url: str | None = None,
+    session: requests.Session | None = None,
+) -> dict:
     """
     Cria um pedido aleatório na API (POST /pedido).
     Requer autenticação (Bearer token).
     Retorna o Pedido criado (id, codigo_fornecedor, status, itens).
+    session: requests.Session opcional para reutilizar conexões (pool).
     """
     base_url = base_url or get_base_url()
-    r = requests.post(
+    http = session or requests
+    r = _request(
+        http, "POST",
         f"{base_url}/pedido",
         headers={
             "Content-Type": "application/json",
@@ -129,7 +257,37 @@ def post_pedido(token: str, base_url: str | None = None) -> dict:
         },
         timeout=30,
     )
-    r.raise_for_status()
+    return r.json()
+
+
+def list_pedidos(
+    token: str,
+    base_url: str | None = None,
+    after_id: int | None = None,
+    pendente: bool | None = None,
+    limit: int | None = None,
+) -> list[dict]:
+    """
+    Lista pedidos (GET /pedido).
+    Filtros opcionais (query string): after_id (apenas id > after_id, ordenado por id),
+    pendente (sem status/codigo_fornecedor) e limit (tamanho da página).
+    APIs que ignorem os filtros retornam a lista completa; filtre também no cliente.
+    """
+    base_url = base_url or get_base_url()
+    params = {}
+    if after_id is not None:
+        params["after_id"] = after_id
+    if pendente is not None:
+        params["pendente"] = "true" if pendente else "false"
+    if limit is not None:
+        params["limit"] = limit
+    r = _request(
+        requests, "GET",
+        f"{base_url}/pedido",
+        params=params,
+        headers={"Authorization": f"Bearer {token}"},
+        timeout=30,
+    )
     return r.json()
 
 
@@ -139,14 +297,18 @@ def patch_pedido(
     status: str,
     token: str,
     base_url: str | None = None,
+    session: requests.Session | None = None,
 ) -> dict | None:
     """
     Atualiza o pedido com código de confirmação e status (PATCH /pedido/:id).
     Payload: {"codigo_confirmacao": "...", "status": "..."}.
     Retorna o JSON da resposta (Pedido ou null).
+    session: requests.Session opcional para reutilizar conexões (pool).
     """
     base_url = base_url or get_base_url()
-    r = requests.patch(
+    http = session or requests
+    r = _request(
+        http, "PATCH",
         f"{base_url}/pedido/{id_pedido}",
         json={
             "codigo_confirmacao": codigo_confirmacao,
@@ -158,5 +320,4 @@ def patch_pedido(
         },
         timeout=30,
     )
-    r.raise_for_status()
     return r.json()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark do índice do catálogo (catalog_index.py) com um catálogo sintético.
+
+Gera N produtos no formato do spider (descrições com princípio ativo, dosagem,
+forma e apresentação, com acentos), constrói o índice e mede a latência de
+consultas no próprio processo (sem HTTP): gtin, codigo e busca por descrição
+com 1 a 3 palavras (a última como prefixo).
+
+Uso (na raiz do projeto):
+    python benchmarks/catalog_index.py
+    python benchmarks/catalog_index.py --skus 500000 --queries 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from catalog_index import CatalogIndex, tokens  # noqa: E402
+
+ATIVOS = [
+    "DIPIRONA", "PARACETAMOL", "IBUPROFENO", "AMOXICILINA", "LOSARTANA", "OMEPRAZOL",
+    "SINVASTATINA", "METFORMINA", "CLONAZEPAM", "AZITROMICINA", "CEFALEXINA", "NIMESULIDA",
+    "DICLOFENACO", "PREDNISOLONA", "LORATADINA", "FLUOXETINA", "SERTRALINA", "ATENOLOL",
+    "HIDROCLOROTIAZIDA", "ÁCIDO ACETILSALICÍLICO", "VITAMINA C", "SOLUÇÃO FISIOLÓGICA",
+    "CLORIDRATO DE AMBROXOL", "BROMIDRATO DE FENOTEROL", "DEXAMETASONA", "CETOCONAZOL",
+]
+FORMAS = ["COMPRIMIDOS", "CÁPSULAS", "GOTAS", "XAROPE", "POMADA", "CREME", "SOLUÇÃO ORAL", "INJETÁVEL"]
+LABS = ["EMS", "MEDLEY", "EUROFARMA", "NEO QUÍMICA", "GERMED", "PRATI", "CIMED", "TEUTO", "ACHÉ", "SANOFI"]
+
+
+def catalogo(n: int, seed: int = 42) -> list[dict]:
+    rnd = random.Random(seed)
+    produtos = []
+    for i in range(n):
+        descricao = (
+            f"{rnd.choice(ATIVOS)} {rnd.choice([25, 50, 100, 200, 250, 500, 750, 1000])}MG "
+            f"{rnd.choice(FORMAS)} CX {rnd.choice([10, 20, 30, 60])} {rnd.choice(LABS)} L{i % 5000:04d}"
+        )
+        produtos.append({
+            "gtin": f"789{i:010d}",
+            "codigo": str(100000 + i),
+            "descricao": descricao,
+            "preco_fabrica": f"{rnd.uniform(2, 300):.2f}".replace(".", ","),
+            "estoque": str(rnd.randint(0, 500)),
+        })
+    return produtos
+
+
+def consultas(produtos: list[dict], n: int, seed: int = 7) -> list[tuple[str, str]]:
+    """(tipo, consulta): 20% gtin, 10% codigo, 70% busca com 1-3 palavras (a última truncada)."""
+    rnd = random.Random(seed)
+    lista = []
+    for _ in range(n):
+        p = rnd.choice(produtos)
+        r = rnd.random()
+        if r < 0.2:
+            lista.append(("gtin", p["gtin"]))
+        elif r < 0.3:
+            lista.append(("codigo", p["codigo"]))
+        else:
+            palavras = p["descricao"].lower().split()
+            k = rnd.randint(1, 3)
+            escolhidas = palavras[:k]
+            ultima = escolhidas[-1]
+            escolhidas[-1] = ultima[:rnd.randint(min(2, len(ultima)), len(ultima))]
+            lista.append(("busca", " ".join(escolhidas)))
+    return lista
+
+
+def _rss_mb() -> float:
+    from servimed_scraper.extensions import _rss_mb as rss
+
+    return rss() or 0.0
+
+
+def percentil(valores: list[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência do índice do catálogo")
+    parser.add_argument("--skus", type=int, default=500_000, help="Produtos sintéticos (padrão: 500000)")
+    parser.add_argument("--queries", type=int, default=20_000, help="Consultas medidas (padrão: 20000)")
+    parser.add_argument("--limit", type=int, default=20, help="Resultados por busca (padrão: 20)")
+    args = parser.parse_args()
+
+    produtos = catalogo(args.skus)
+    antes = _rss_mb()
+    index = CatalogIndex(produtos)
+    print(f"{len(index):,} produtos, {len(index.vocabulario):,} termos; "
+          f"construção {index.segundos_construcao:.2f}s, RSS +{_rss_mb() - antes:.0f} MB")
+
+    medidas: dict[str, list[float]] = {"gtin": [], "codigo": [], "busca": []}
+    vazios = 0
+    for tipo, q in consultas(produtos, args.queries):
+        inicio = time.perf_counter()
+        if tipo == "gtin":
+            r = index.get_gtin(q)
+        elif tipo == "codigo":
+            r = index.get_codigo(q)
+        else:
+            r = index.search(q, limit=args.limit)
+        medidas[tipo].append((time.perf_counter() - inicio) * 1000)
+        if not r:
+            vazios += 1
+    assert index.search("acido acetil")[0]["descricao"].startswith("ÁCIDO")
+    assert tokens("Solução") == ["solucao"]
+
+    print(f"{'consulta':<10}{'n':>8}{'p50 ms':>10}{'p99 ms':>10}{'máx ms':>10}")
+    for tipo, valores in medidas.items():
+        if valores:
+            print(f"{tipo:<10}{len(valores):>8}{percentil(valores, 0.5):>10.4f}"
+                  f"{percentil(valores, 0.99):>10.4f}{max(valores):>10.4f}")
+    todas = [v for valores in medidas.values() for v in valores]
+    print(f"{'todas':<10}{len(todas):>8}{percentil(todas, 0.5):>10.4f}{percentil(todas, 0.99):>10.4f}"
+          f"{max(todas):>10.4f}   sem resultado: {vazios}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark do histórico do catálogo (catalog_store.py) com crawls sintéticos.
+
+Grava S snapshots de um catálogo de N produtos em que, a cada crawl, uma fração
+dos preços/estoques muda e alguns produtos entram e saem, e compara:
+
+  disco      store (colunas por bloco deduplicadas, zlib) x cópias JSON completas
+  diff       merge em stream do store x carregar os dois JSON inteiros em dicts
+
+Uso (na raiz do projeto):
+    python benchmarks/catalog_store.py
+    python benchmarks/catalog_store.py --produtos 200000 --snapshots 30 --mudancas 0.01
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from catalog_store import CatalogStore  # noqa: E402
+
+
+def crawls(n: int, snapshots: int, mudancas: float, seed: int = 42):
+    rnd = random.Random(seed)
+    catalogo = {
+        f"{i:07d}": {
+            "gtin": f"789{i:010d}",
+            "codigo": f"{i:07d}",
+            "descricao": f"DIPIRONA SÓDICA {i % 1000} MG COMPRIMIDOS CX {i % 50}",
+            "preco_fabrica": f"{rnd.randint(100, 99999) / 100:.2f}".replace(".", ","),
+            "estoque": str(rnd.randint(0, 500)),
+        }
+        for i in range(n)
+    }
+    proximo = n
+    for _ in range(snapshots):
+        yield list(catalogo.values())
+        for codigo in rnd.sample(sorted(catalogo), int(n * mudancas)):
+            catalogo[codigo] = {**catalogo[codigo], "estoque": str(rnd.randint(0, 500))}
+        for codigo in rnd.sample(sorted(catalogo), max(1, int(n * mudancas / 10))):
+            del catalogo[codigo]
+        for _ in range(max(1, int(n * mudancas / 10))):
+            codigo = f"{proximo:07d}"
+            catalogo[codigo] = {"codigo": codigo, "descricao": "NOVO", "preco_fabrica": "1,00", "estoque": "1"}
+            proximo += 1
+
+
+def naive_diff(a: str, b: str) -> int:
+    with open(a, encoding="utf-8") as f:
+        antes = {p["codigo"]: p for p in json.load(f)}
+    with open(b, encoding="utf-8") as f:
+        depois = {p["codigo"]: p for p in json.load(f)}
+    return sum(1 for k in antes.keys() | depois.keys() if antes.get(k) != depois.get(k))
+
+
+def medir(nome: str, fn):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    mudancas = fn()
+    segundos = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{nome:<24} {mudancas:7d} mudanças  {segundos:6.2f}s  pico {pico / 2**20:7.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Disco e diff do histórico do catálogo")
+    parser.add_argument("--produtos", type=int, default=100000)
+    parser.add_argument("--snapshots", type=int, default=20)
+    parser.add_argument("--mudancas", type=float, default=0.01, help="Fração de produtos alterados por crawl")
+    parser.add_argument("--chunk", type=int, default=256, help="Produtos por bloco (média)")
+    args = parser.parse_args()
+
+    raiz = tempfile.mkdtemp(prefix="catalog_store_")
+    try:
+        store = CatalogStore(os.path.join(raiz, "store"), chunk_records=args.chunk)
+        copias = os.path.join(raiz, "json")
+        os.makedirs(copias)
+        inicio = time.perf_counter()
+        for i, produtos in enumerate(crawls(args.produtos, args.snapshots, args.mudancas)):
+            with open(os.path.join(copias, f"{i:04d}.json"), "w", encoding="utf-8") as f:
+                json.dump(produtos, f, ensure_ascii=False)
+            store.put("conta", produtos, agora=1e9 + i * 3600)
+        print(f"{args.produtos} produtos, {args.snapshots} snapshots, {args.mudancas:.1%} alterados por crawl "
+              f"({time.perf_counter() - inicio:.1f}s para gerar e gravar)")
+
+        uso = store.usage()
+        json_total = sum(os.path.getsize(os.path.join(copias, n)) for n in os.listdir(copias))
+        print(f"cópias JSON completas    {json_total / 2**20:8.1f} MB")
+        print(f"store sem deduplicação   {uso['bytes_sem_dedup'] / 2**20:8.1f} MB (zlib)")
+        print(f"store em disco           {uso['bytes_em_disco'] / 2**20:8.1f} MB ({uso['blobs']} blobs)")
+
+        arquivos = sorted(os.listdir(copias))
+        medir("diff JSON (dicts)", lambda: naive_diff(os.path.join(copias, arquivos[-2]), os.path.join(copias, arquivos[-1])))
+        medir("diff store (stream)", lambda: sum(1 for _ in store.diff("conta", "-2", "-1")))
+        medir("diff store 1o x último", lambda: sum(1 for _ in store.diff("conta", store.snapshot_ids("conta")[0], "-1")))
+    finally:
+        shutil.rmtree(raiz)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos perfis de conexão (servimed_scraper.profiles): default x fast.
+
+Sobe um servidor local TLS (HTTP/2 e HTTP/1.1 por ALPN, certificado autoassinado)
+com páginas de catálogo no formato da listagem do fornecedor, comprimidas com br
+ou gzip conforme o Accept-Encoding e com latência artificial por resposta. Cada
+perfil roda em um processo próprio (o reactor do Scrapy não reinicia) e baixa
+todas as páginas com o parser do ProductsSpider.
+
+Uso (na raiz do projeto; HTTP/2 exige h2 e priority: pip install h2 priority):
+    python benchmarks/http_profile.py
+    python benchmarks/http_profile.py --pages 400 --rows 200 --latency 0.05
+    python benchmarks/http_profile.py --http1-only    # servidor sem h2 (fallback)
+
+Saída: páginas/s, bytes na conexão (corpo + cabeçalhos, lado do servidor, antes
+do TLS), bytes após descompressão e protocolo negociado, por perfil.
+"""
+import argparse
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _catalog_html(page: int, rows: int) -> bytes:
+    linhas = "".join(
+        f"<tr><td>789{page:05d}{i:05d}</td><td>{page * 100000 + i}</td>"
+        f"<td>MEDICAMENTO {page}-{i} 500MG CX 20 COMPRIMIDOS</td>"
+        f"<td>R$ {10 + i % 90},{i % 100:02d}</td><td>{i % 37}</td></tr>"
+        for i in range(rows)
+    )
+    return (
+        "<html><head><title>Produtos</title></head><body>"
+        f"<table class='table'><thead><tr><th>GTIN</th><th>Código</th><th>Descrição</th>"
+        f"<th>Preço</th><th>Estoque</th></tr></thead><tbody>{linhas}</tbody></table>"
+        "</body></html>"
+    ).encode()
+
+
+def _self_signed_cert(directory: str) -> tuple[str, str]:
+    import ipaddress
+    from datetime import datetime, timedelta, timezone
+
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    nome = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    agora = datetime.now(timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(nome)
+        .issuer_name(nome)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(agora - timedelta(minutes=5))
+        .not_valid_after(agora + timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path, key_path = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption(),
+        ))
+    return cert_path, key_path
+
+
+def serve(args):
+    """Servidor de catálogo (processo filho): imprime a porta e atende até ser encerrado."""
+    from twisted.internet import reactor, ssl
+    from twisted.protocols.policies import ProtocolWrapper, WrappingFactory
+    from twisted.web import resource, server
+
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    stats = {"bytes": 0, "requests": 0, "protocols": {}}
+
+    class Counting(ProtocolWrapper):
+        def write(self, data):
+            stats["bytes"] += len(data)
+            super().write(data)
+
+        def writeSequence(self, data):
+            stats["bytes"] += sum(len(d) for d in data)
+            super().writeSequence(data)
+
+    class Catalog(resource.Resource):
+        isLeaf = True
+
+        def render_GET(self, request):
+            if request.path == b"/_stats":
+                body = json.dumps(stats).encode()
+                stats.update(bytes=0, requests=0, protocols={})
+                return body
+            stats["requests"] += 1
+            proto = "h2" if request.clientproto == b"HTTP/2" else "http/1.1"
+            stats["protocols"][proto] = stats["protocols"].get(proto, 0) + 1
+            page = int(request.args.get(b"page", [b"1"])[0])
+            body = _catalog_html(page, args.rows)
+            aceitas = (request.getHeader("accept-encoding") or "").lower()
+            if brotli is not None and "br" in aceitas:
+                body = brotli.compress(body)
+                request.setHeader("content-encoding", "br")
+            elif "gzip" in aceitas:
+                body = gzip.compress(body)
+                request.setHeader("content-encoding", "gzip")
+            request.setHeader("content-type", "text/html; charset=utf-8")
+
+            def responder():
+                request.write(body)
+                request.finish()
+
+            reactor.callLater(args.latency, responder)
+            return server.NOT_DONE_YET
+
+    cert_path, key_path = _self_signed_cert(tempfile.mkdtemp())
+    with open(cert_path) as c, open(key_path) as k:
+        cert = ssl.PrivateCertificate.loadPEM(c.read() + k.read())
+    protocolos = [b"http/1.1"] if args.http1_only else [b"h2", b"http/1.1"]
+    options = cert.options()
+    options._acceptableProtocols = protocolos
+    site = server.Site(Catalog())
+    site.log = lambda request: None
+    wrapping = WrappingFactory(site)
+    wrapping.protocol = Counting
+    port = reactor.listenSSL(0, wrapping, options, interface="127.0.0.1")
+    print(port.getHost().port, flush=True)
+    reactor.run()
+
+
+def crawl(args):
+    """Crawl com um perfil (processo filho): imprime o resultado em JSON."""
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+
+    from servimed_scraper.spiders.products_spider import ProductsSpider
+
+    base, pages = args.base, args.pages
+
+    class BenchSpider(ProductsSpider):
+        name = "bench_products"
+        allowed_domains = ["127.0.0.1"]
+
+        async def start(self, *a, **kw):
+            for n in range(1, pages + 1):
+                yield self._listing_request(f"{base}/catalog?page={n}")
+
+    settings = get_project_settings()
+    settings.set("HTTP_PROFILE", args.crawl, "cmdline")
+    settings.set("LOG_LEVEL", "WARNING")
+    settings.set("PAGE_CACHE_ENABLED", False)
+    settings.set("ITEM_PIPELINES", {})
+    os.environ.pop("SERVIMED_HTTP_PROFILE", None)
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler(BenchSpider)
+    process.crawl(crawler)
+    inicio = time.monotonic()
+    process.start()
+    stats = crawler.stats.get_stats()
+    print(json.dumps({
+        "segundos": time.monotonic() - inicio,
+        "paginas": stats.get("response_received_count", 0),
+        "itens": stats.get("item_scraped_count", 0),
+        "bytes_descomprimidos": stats.get("httpcompression/response_bytes", 0),
+        "erros": stats.get("downloader/exception_count", 0),
+        "http2": stats.get("http2/requests", 0),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos perfis HTTP (default x fast)")
+    parser.add_argument("--pages", type=int, default=200, help="Páginas de catálogo (padrão: 200)")
+    parser.add_argument("--rows", type=int, default=100, help="Produtos por página (padrão: 100)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latência por resposta em s (padrão: 0.05)")
+    parser.add_argument("--profiles", default="default,fast", help="Perfis separados por vírgula")
+    parser.add_argument("--http1-only", action="store_true", help="Servidor sem HTTP/2 no ALPN")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--crawl", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--base", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+    if args.crawl:
+        crawl(args)
+        return
+
+    cmd = [sys.executable, os.path.abspath(__file__), "--serve", "--rows", str(args.rows),
+           "--latency", str(args.latency)]
+    if args.http1_only:
+        cmd.append("--http1-only")
+    servidor = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True, cwd=ROOT)
+    try:
+        base = f"https://127.0.0.1:{servidor.stdout.readline().strip()}"
+        import ssl
+
+        contexto = ssl._create_unverified_context()
+        print(f"{args.pages} páginas x {args.rows} produtos, latência {args.latency}s, servidor {base}")
+        print(f"{'perfil':<10}{'pág/s':>10}{'segundos':>10}{'bytes conexão':>16}{'descomprimido':>16}  protocolos")
+        for perfil in args.profiles.split(","):
+            urllib.request.urlopen(f"{base}/_stats", context=contexto).read()  # zera contadores
+            saida = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--crawl", perfil, "--base", base,
+                 "--pages", str(args.pages)],
+                capture_output=True, text=True, cwd=ROOT, check=True,
+            )
+            r = json.loads(saida.stdout.strip().splitlines()[-1])
+            srv = json.loads(urllib.request.urlopen(f"{base}/_stats", context=contexto).read())
+            print(
+                f"{perfil:<10}{r['paginas'] / r['segundos']:>10.1f}{r['segundos']:>10.2f}"
+                f"{srv['bytes']:>16,}{r['bytes_descomprimidos']:>16,}  {srv['protocols']}"
+            )
+    finally:
+        servidor.terminate()
+
+
+if __name__ == "__main__":
+    main()
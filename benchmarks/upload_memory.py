@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memória do upload de produtos: post_produtos x post_produtos_stream.
+
+Sobe um servidor HTTP local que lê o corpo (Content-Length ou chunked, com ou sem
+gzip) e o descarta, e mede com tracemalloc o pico de memória alocada durante o
+envio de N produtos sintéticos:
+
+  lista + post_produtos           lista de produtos, lista normalizada e JSON inteiro
+  lista + post_produtos_stream    lista de produtos (caso do worker); corpo em stream
+  gerador + post_produtos_stream  nada materializado (memória constante)
+
+Uso (na raiz do projeto):
+    python benchmarks/upload_memory.py
+    python benchmarks/upload_memory.py --produtos 500000 --gzip
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import api_client  # noqa: E402
+from api_client import post_produtos, post_produtos_stream  # noqa: E402
+
+
+class DiscardHandler(BaseHTTPRequestHandler):
+    def _blocos(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                tamanho = int(self.rfile.readline().split(b";")[0], 16)
+                if tamanho == 0:
+                    self.rfile.readline()
+                    return
+                yield self.rfile.read(tamanho)
+                self.rfile.readline()
+        restante = int(self.headers.get("Content-Length") or 0)
+        while restante:
+            bloco = self.rfile.read(min(restante, 65536))
+            restante -= len(bloco)
+            yield bloco
+
+    def do_POST(self):
+        descompressor = zlib.decompressobj(31) if self.headers.get("Content-Encoding") == "gzip" else None
+        recebidos = 0
+        for bloco in self._blocos():
+            recebidos += len(descompressor.decompress(bloco) if descompressor else bloco)
+        corpo = b'{"bytes": %d}' % recebidos
+        self.send_response(201)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def produtos(n: int):
+    for i in range(n):
+        yield {
+            "gtin": f"789{i:010d}",
+            "codigo": f"A{i}",
+            "descricao": f"DIPIRONA SÓDICA {i % 1000} MG COMPRIMIDOS CX {i % 50}",
+            "preco_fabrica": f"{i % 997},{i % 100:02d}",
+            "estoque": str(i % 500),
+        }
+
+
+def medir(nome: str, enviar) -> None:
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    resposta = enviar()
+    segundos = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{nome:<34} pico {pico / 2**20:8.1f} MB  {segundos:6.2f}s  corpo {resposta['bytes'] / 2**20:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pico de memória do upload de produtos")
+    parser.add_argument("--produtos", type=int, default=200000)
+    parser.add_argument("--gzip", action="store_true", help="Upload em stream com gzip")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DiscardHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    n = args.produtos
+    print(f"{n} produtos, orjson={'sim' if api_client.orjson is not None else 'não'}, gzip={args.gzip}")
+
+    medir("lista + post_produtos", lambda: post_produtos(list(produtos(n)), token="t", base_url=base))
+    medir("lista + post_produtos_stream",
+          lambda: post_produtos_stream(list(produtos(n)), token="t", base_url=base, gzip=args.gzip))
+    medir("gerador + post_produtos_stream",
+          lambda: post_produtos_stream(produtos(n), token="t", base_url=base, gzip=args.gzip))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Despacho dos callbacks de pedido (PATCH /pedido/:id) fora dos jobs de pedido.
+
+Com CALLBACK_DISPATCHER=1, process_pedido_task e process_pedido_batch_task não
+fazem o PATCH: gravam (id_pedido, codigo_confirmacao, status) no Redis e o worker
+segue para o próximo pedido. O daemon run_callback_dispatcher.py envia os PATCH.
+
+Estruturas:
+  callbacks:pendentes  hash id_pedido -> JSON {codigo_confirmacao, status, tentativas}
+                       (um novo callback do mesmo pedido substitui o anterior)
+  callbacks:fila       zset id_pedido -> horário em que pode ser enviado
+  callbacks:falhas     hash id_pedido -> JSON do callback + erro (tentativas esgotadas,
+                       erro 4xx ou id_pedido não numérico, que não se resolvem com
+                       retentativa)
+
+O dispatcher retira lotes vencidos (claim: o horário passa para agora + lease, de
+modo que um dispatcher que morra não perde callbacks), envia com concorrência
+limitada sobre uma Session com pool e um único token, e confirma cada um (ack) só
+se o callback não foi substituído durante o envio. Falhas são reagendadas por
+pedido, com backoff exponencial, sem afetar os demais do lote.
+"""
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+PENDING_KEY = "callbacks:pendentes"
+QUEUE_KEY = "callbacks:fila"
+DEAD_KEY = "callbacks:falhas"
+
+# KEYS = fila, pendentes; ARGV = agora, lease (s), tamanho do lote.
+# Retorna [id, json, id, json, ...] dos callbacks vencidos, marcados como em envio.
+CLAIM_LUA = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[3]))
+local out = {}
+for _, id in ipairs(ids) do
+  local dados = redis.call('HGET', KEYS[2], id)
+  if dados then
+    redis.call('ZADD', KEYS[1], tonumber(ARGV[1]) + tonumber(ARGV[2]), id)
+    out[#out + 1] = id
+    out[#out + 1] = dados
+  else
+    redis.call('ZREM', KEYS[1], id)
+  end
+end
+return out
+"""
+
+# KEYS = fila, pendentes; ARGV = id, json enviado. Remove só se não foi substituído.
+ACK_LUA = """
+if redis.call('HGET', KEYS[2], ARGV[1]) == ARGV[2] then
+  redis.call('HDEL', KEYS[2], ARGV[1])
+  redis.call('ZREM', KEYS[1], ARGV[1])
+  return 1
+end
+return 0
+"""
+
+# KEYS = fila, pendentes; ARGV = id, json enviado, json com tentativas, próximo horário.
+# Reagenda só se o callback não foi substituído (um novo é enviado na hora).
+RETRY_LUA = """
+if redis.call('HGET', KEYS[2], ARGV[1]) == ARGV[2] then
+  redis.call('HSET', KEYS[2], ARGV[1], ARGV[3])
+  redis.call('ZADD', KEYS[1], tonumber(ARGV[4]), ARGV[1])
+  return 1
+end
+return 0
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class CallbackInvalido(ValueError):
+    """Callback que nenhuma retentativa consegue enviar (ex.: id_pedido não numérico)."""
+
+
+def enabled() -> bool:
+    return os.environ.get("CALLBACK_DISPATCHER", "0") == "1"
+
+
+def push_callback(conn, id_pedido, codigo_confirmacao: str, status: str):
+    """Registra o callback do pedido para o dispatcher (substitui um anterior pendente)."""
+    dados = json.dumps({"codigo_confirmacao": codigo_confirmacao, "status": status, "tentativas": 0})
+    pipe = conn.pipeline(transaction=True)
+    pipe.hset(PENDING_KEY, str(id_pedido), dados)
+    pipe.zadd(QUEUE_KEY, {str(id_pedido): time.time()})
+    pipe.execute()
+
+
+def pending(conn) -> int:
+    return conn.hlen(PENDING_KEY)
+
+
+def _retryable(exc) -> bool:
+    """Erros de rede, 5xx, 429 e 401 (token expirado) são retentados; demais 4xx e callbacks inválidos não."""
+    if isinstance(exc, CallbackInvalido):
+        return False
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        codigo = exc.response.status_code
+        return codigo >= 500 or codigo in (401, 408, 429)
+    return True
+
+
+class CallbackDispatcher:
+    """
+    Envia os callbacks pendentes em lotes.
+
+    conn: conexão Redis. api_user/api_password: credenciais da API do desafio.
+    """
+
+    def __init__(
+        self,
+        conn,
+        api_user: str,
+        api_password: str,
+        base_url: str | None = None,
+        batch_size: int = 100,
+        concurrency: int = 8,
+        lease: float = 120.0,
+        max_attempts: int = 8,
+        backoff_base: float = 5.0,
+        backoff_max: float = 600.0,
+    ):
+        from api_client import make_session
+
+        self.conn = conn
+        self.api_user = api_user
+        self.api_password = api_password
+        self.base_url = base_url
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = make_session(pool_size=concurrency)
+        self._claim = conn.register_script(CLAIM_LUA)
+        self._ack = conn.register_script(ACK_LUA)
+        self._retry = conn.register_script(RETRY_LUA)
+        self._token = None
+
+    def _token_atual(self, renovar: bool = False) -> str:
+        from api_client import get_token
+
+        if self._token is None or renovar:
+            self._token = get_token(self.api_user, self.api_password, base_url=self.base_url, session=self.session)
+        return self._token
+
+    def claim(self) -> list[tuple[str, str]]:
+        """Callbacks vencidos (id_pedido, json), marcados como em envio por `lease` segundos."""
+        raw = self._claim(keys=[QUEUE_KEY, PENDING_KEY], args=[time.time(), self.lease, self.batch_size])
+        raw = [r.decode() if isinstance(r, bytes) else r for r in raw]
+        return list(zip(raw[::2], raw[1::2]))
+
+    def _send(self, id_pedido: str, dados: dict, token: str):
+        from api_client import patch_pedido
+
+        try:
+            id_pedido_int = int(id_pedido)
+        except (TypeError, ValueError):
+            raise CallbackInvalido(f"id_pedido não numérico: {id_pedido!r}")
+        return patch_pedido(
+            id_pedido=id_pedido_int,
+            codigo_confirmacao=dados["codigo_confirmacao"],
+            status=dados["status"],
+            token=token,
+            base_url=self.base_url,
+            session=self.session,
+        )
+
+    def _settle(self, id_pedido: str, enviado: str, erro) -> str:
+        """Ack, reagendamento ou falha definitiva de um callback. Retorna o desfecho."""
+        from pedido_ledger import PedidoLedger
+
+        if erro is None:
+            if self._ack(keys=[QUEUE_KEY, PENDING_KEY], args=[id_pedido, enviado]):
+                PedidoLedger(self.conn).record_patched(id_pedido)
+            return "enviado"
+        dados = json.loads(enviado)
+        dados["tentativas"] = int(dados.get("tentativas", 0)) + 1
+        if not _retryable(erro) or dados["tentativas"] >= self.max_attempts:
+            if self._ack(keys=[QUEUE_KEY, PENDING_KEY], args=[id_pedido, enviado]):
+                self.conn.hset(DEAD_KEY, id_pedido, json.dumps({**dados, "erro": str(erro)}))
+                logger.error("Callback do pedido %s descartado após %d tentativas: %s",
+                             id_pedido, dados["tentativas"], erro)
+            return "falha"
+        atraso = min(self.backoff_max, self.backoff_base * 2 ** (dados["tentativas"] - 1))
+        self._retry(keys=[QUEUE_KEY, PENDING_KEY], args=[id_pedido, enviado, json.dumps(dados), time.time() + atraso])
+        logger.warning("Callback do pedido %s falhou (tentativa %d), nova tentativa em %.0fs: %s",
+                       id_pedido, dados["tentativas"], atraso, erro)
+        return "reagendado"
+
+    def dispatch_once(self) -> dict:
+        """Um lote: envia os callbacks vencidos. Retorna a contagem por desfecho."""
+        lote = self.claim()
+        contagem = {"enviado": 0, "reagendado": 0, "falha": 0}
+        if not lote:
+            return contagem
+        try:
+            token = self._token_atual()
+        except Exception as e:
+            # Sem token nenhum envio é possível: reagenda o lote inteiro
+            for id_pedido, enviado in lote:
+                contagem[self._settle(id_pedido, enviado, e)] += 1
+            return contagem
+
+        def enviar(item):
+            id_pedido, enviado = item
+            try:
+                self._send(id_pedido, json.loads(enviado), token)
+                return None
+            except requests.HTTPError as e:
+                if e.response is not None and e.response.status_code == 401:
+                    self._token = None  # renovado no próximo lote
+                return e
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            erros = list(pool.map(enviar, lote))
+        for (id_pedido, enviado), erro in zip(lote, erros):
+            contagem[self._settle(id_pedido, enviado, erro)] += 1
+        logger.info("Callbacks: %s", contagem)
+        return contagem
+
+    def run(self, idle_interval: float = 0.5, max_cycles: int | None = None):
+        """Laço do daemon: lotes seguidos enquanto houver trabalho; max_cycles limita (testes)."""
+        ciclos = 0
+        while max_cycles is None or ciclos < max_cycles:
+            ciclos += 1
+            try:
+                contagem = self.dispatch_once()
+            except Exception:
+                logger.exception("Falha no despacho de callbacks")
+                contagem = {}
+            if not any(contagem.values()):
+                time.sleep(idle_interval)
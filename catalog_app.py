@@ -0,0 +1,69 @@
+"""
+Serviço de consulta ao catálogo extraído (índice em memória, ver catalog_index.py).
+
+Rotas (APIRouter, pode ser incluído em outro app com app.include_router(router)):
+  GET  /catalogo/busca?q=dipirona 500&limit=20   palavras da descrição (última como prefixo), gtin ou codigo
+  GET  /catalogo/gtin/{gtin}
+  GET  /catalogo/codigo/{codigo}
+  GET  /catalogo/status                          tamanho e origem do índice atual
+  POST /catalogo/reload                          recarrega o snapshot agora
+
+Snapshot em CATALOG_PATH (JSON de run_scraper.py ou diretório CATALOG_SNAPSHOT_DIR
+do worker), verificado a cada CATALOG_WATCH_INTERVAL segundos; o índice novo
+substitui o anterior de forma atômica quando termina de carregar.
+
+Uso:
+  pip install fastapi uvicorn
+  CATALOG_PATH=produtos.json uvicorn catalog_app:app --port 8800
+"""
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import APIRouter, FastAPI, HTTPException, Query
+
+from catalog_index import CatalogStore
+
+store = CatalogStore(os.environ.get("CATALOG_PATH", "produtos.json"))
+router = APIRouter(prefix="/catalogo", tags=["catalogo"])
+
+
+@router.get("/busca")
+def buscar(q: str = Query(..., min_length=1), limit: int = Query(20, ge=1, le=200)):
+    return {"produtos": store.index.search(q, limit=limit)}
+
+
+@router.get("/gtin/{gtin}")
+def por_gtin(gtin: str):
+    produto = store.index.get_gtin(gtin)
+    if produto is None:
+        raise HTTPException(404, "Produto não encontrado")
+    return produto
+
+
+@router.get("/codigo/{codigo}")
+def por_codigo(codigo: str):
+    produto = store.index.get_codigo(codigo)
+    if produto is None:
+        raise HTTPException(404, "Produto não encontrado")
+    return produto
+
+
+@router.get("/status")
+def status():
+    return store.index.stats()
+
+
+@router.post("/reload")
+def reload():
+    return {"recarregado": store.refresh(force=True), **store.index.stats()}
+
+
+@asynccontextmanager
+async def _lifespan(_app):
+    store.refresh()
+    store.watch(float(os.environ.get("CATALOG_WATCH_INTERVAL", "5")))
+    yield
+
+
+app = FastAPI(title="Catálogo Servimed", version="0.1.0", lifespan=_lifespan)
+app.include_router(router)
@@ -0,0 +1,258 @@
+"""
+Índice em memória do catálogo extraído (consulta de baixa latência).
+
+CatalogIndex é imutável depois de construído:
+  - mapas exatos gtin -> produto e codigo -> produto
+  - índice invertido de palavras da descricao (sem acentos, minúsculas):
+    bitmaps (int) para termos frequentes, posições ordenadas (array) para os
+    raros, e vocabulário ordenado para prefixo
+
+Busca: todas as palavras da consulta precisam estar na descrição; a última é
+tratada como prefixo ("dipi" encontra "DIPIRONA") e expandida para todos os termos
+do vocabulário com esse prefixo. Termos frequentes ("cx", "comprimidos") são
+combinados por AND de bitmaps, assim como prefixos com mais de PREFIX_MAX_TERMS
+termos (OR dos termos em um bitmap); com termos raros, a interseção percorre a
+lista mais curta. Em ambos os casos para ao atingir o limite.
+
+CatalogStore guarda o índice atual e o troca atomicamente (uma atribuição de
+referência) quando um snapshot novo termina de carregar; consultas em andamento
+seguem no índice antigo. Snapshots: JSON (lista de produtos, formato de
+run_scraper.py) ou diretório com vários JSON (um por conta, ver
+CATALOG_SNAPSHOT_DIR em worker.py). Benchmark: benchmarks/catalog_index.py.
+"""
+import glob
+import heapq
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from itertools import chain
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+NONZERO_RE = re.compile(rb"[^\x00]")
+PREFIX_MAX_TERMS = 64  # acima disso, os termos raros do prefixo são unidos em um bitmap
+PREFIX_MIN_LEN = 2
+BITMAP_DENSITY = 64  # termo em mais de 1/64 dos produtos é guardado como bitmap
+
+
+def fold(texto: str) -> str:
+    """Minúsculas sem acentos ("Solução" -> "solucao")."""
+    decomposto = unicodedata.normalize("NFKD", texto or "")
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def tokens(texto: str) -> list[str]:
+    return TOKEN_RE.findall(fold(texto))
+
+
+def _contains(posicoes: array, pos: int) -> bool:
+    i = bisect_left(posicoes, pos)
+    return i < len(posicoes) and posicoes[i] == pos
+
+
+class CatalogIndex:
+    """Índice imutável de uma lista de produtos."""
+
+    def __init__(self, produtos: list[dict], origem: str = ""):
+        inicio = time.perf_counter()
+        self.produtos = produtos
+        self.origem = origem
+        self.por_gtin: dict[str, int] = {}
+        self.por_codigo: dict[str, int] = {}
+        listas: dict[str, list[int]] = {}
+        for pos, p in enumerate(produtos):
+            gtin, codigo = str(p.get("gtin") or ""), str(p.get("codigo") or "")
+            if gtin:
+                self.por_gtin.setdefault(gtin, pos)
+            if codigo:
+                self.por_codigo.setdefault(codigo, pos)
+            for t in set(tokens(p.get("descricao") or "")):
+                listas.setdefault(t, []).append(pos)
+        # Termos frequentes viram bitmap (int com um bit por produto: AND/OR em C);
+        # os demais, posições crescentes em array("I"). O bitmap só é usado quando
+        # custa no máximo o dobro da array (mais de 1 produto em BITMAP_DENSITY)
+        self._bytes = (len(produtos) + 7) // 8
+        minimo = max(1, len(produtos) // BITMAP_DENSITY)
+        self.postings: dict[str, array] = {}
+        self.bitmaps: dict[str, int] = {}
+        for t, ps in listas.items():
+            if len(ps) >= minimo:
+                self.bitmaps[t] = self._bitmap(ps)
+            else:
+                self.postings[t] = array("I", ps)
+        self.vocabulario = sorted(listas)
+        self.construido_em = time.time()
+        self.segundos_construcao = time.perf_counter() - inicio
+
+    def _bitmap(self, posicoes) -> int:
+        bits = bytearray(self._bytes)
+        for pos in posicoes:
+            bits[pos >> 3] |= 1 << (pos & 7)
+        return int.from_bytes(bits, "little")
+
+    def __len__(self) -> int:
+        return len(self.produtos)
+
+    def get_gtin(self, gtin: str) -> dict | None:
+        pos = self.por_gtin.get(gtin)
+        return None if pos is None else self.produtos[pos]
+
+    def get_codigo(self, codigo: str) -> dict | None:
+        pos = self.por_codigo.get(codigo)
+        return None if pos is None else self.produtos[pos]
+
+    def _termos(self, palavra: str, prefixo: bool) -> list[str]:
+        if not prefixo:
+            return [palavra] if palavra in self.postings or palavra in self.bitmaps else []
+        i = bisect_left(self.vocabulario, palavra)
+        termos = []
+        while i < len(self.vocabulario):
+            termo = self.vocabulario[i]
+            if not termo.startswith(palavra):
+                break
+            termos.append(termo)
+            i += 1
+        return termos
+
+    def search(self, consulta: str, limit: int = 20) -> list[dict]:
+        """
+        Produtos cuja descrição contém todas as palavras da consulta (a última como
+        prefixo). Consulta só com dígitos também casa gtin/codigo exatos, que vêm primeiro.
+        """
+        consulta = (consulta or "").strip()
+        if not consulta or limit <= 0:
+            return []
+        resultado, vistos = [], set()
+        for pos in (self.por_gtin.get(consulta), self.por_codigo.get(consulta)):
+            if pos is not None and pos not in vistos:
+                vistos.add(pos)
+                resultado.append(self.produtos[pos])
+
+        palavras = tokens(consulta)
+        # Cada palavra vira um bitmap (termos frequentes) ou um grupo de arrays
+        # (termos raros, OR entre os termos do prefixo); palavras combinam com AND
+        bitmap, grupos = -1, []
+        for i, palavra in enumerate(palavras):
+            ultima = i == len(palavras) - 1
+            termos = self._termos(palavra, ultima and len(palavra) >= PREFIX_MIN_LEN)
+            if not termos:
+                return resultado[:limit]
+            raros = [self.postings[t] for t in termos if t in self.postings]
+            if len(raros) == len(termos) and len(raros) <= PREFIX_MAX_TERMS:
+                grupos.append(raros)
+                continue
+            bits = self._bitmap(chain.from_iterable(raros)) if raros else 0
+            for t in termos:
+                if t in self.bitmaps:
+                    bits |= self.bitmaps[t]
+            bitmap &= bits
+        if not palavras:
+            return resultado[:limit]
+
+        for pos in self._candidatos(bitmap, grupos):
+            if pos not in vistos:
+                resultado.append(self.produtos[pos])
+                if len(resultado) >= limit:
+                    break
+        return resultado
+
+    def _candidatos(self, bitmap: int, grupos: list[list[array]]):
+        """Posições (crescentes) no AND do bitmap com todos os grupos de arrays."""
+        bits = bitmap.to_bytes(self._bytes, "little") if bitmap != -1 else None
+        if not grupos:
+            # Varre só os bytes não nulos (busca em C); posições em ordem crescente
+            for m in NONZERO_RE.finditer(bits):
+                byte, base = m.group()[0], m.start() << 3
+                for bit in range(8):
+                    if byte >> bit & 1:
+                        yield base + bit
+            return
+        grupos = sorted(grupos, key=lambda g: sum(len(a) for a in g))
+        menor, demais = grupos[0], grupos[1:]
+        anterior = None
+        for pos in menor[0] if len(menor) == 1 else heapq.merge(*menor):
+            if pos == anterior:
+                continue
+            anterior = pos
+            if bits is not None and not bits[pos >> 3] >> (pos & 7) & 1:
+                continue
+            if all(any(_contains(a, pos) for a in g) for g in demais):
+                yield pos
+
+    def stats(self) -> dict:
+        return {
+            "produtos": len(self.produtos),
+            "termos": len(self.vocabulario),
+            "origem": self.origem,
+            "construido_em": self.construido_em,
+            "segundos_construcao": round(self.segundos_construcao, 3),
+        }
+
+
+def load_snapshot(path: str) -> list[dict]:
+    """Produtos de um JSON (lista) ou de todos os *.json de um diretório (ordem por nome)."""
+    arquivos = sorted(glob.glob(os.path.join(path, "*.json"))) if os.path.isdir(path) else [path]
+    produtos = []
+    for arquivo in arquivos:
+        with open(arquivo, encoding="utf-8") as f:
+            produtos.extend(json.load(f))
+    return produtos
+
+
+def _assinatura(path: str):
+    """mtime/tamanho do snapshot (de cada arquivo, no diretório) para detectar mudança."""
+    arquivos = sorted(glob.glob(os.path.join(path, "*.json"))) if os.path.isdir(path) else [path]
+    assinatura = []
+    for arquivo in arquivos:
+        try:
+            st = os.stat(arquivo)
+        except FileNotFoundError:
+            continue
+        assinatura.append((arquivo, st.st_mtime_ns, st.st_size))
+    return tuple(assinatura)
+
+
+class CatalogStore:
+    """
+    Índice atual de um snapshot com troca atômica. refresh() recarrega se o
+    snapshot mudou; watch() faz isso periodicamente em uma thread. Um snapshot
+    inválido (ex.: JSON ainda sendo escrito) mantém o índice anterior.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index = CatalogIndex([], origem=path)
+        self._assinatura = None
+        self._lock = threading.Lock()  # uma recarga por vez; leituras não travam
+
+    def refresh(self, force: bool = False) -> bool:
+        with self._lock:
+            assinatura = _assinatura(self.path)
+            if not assinatura or (assinatura == self._assinatura and not force):
+                return False
+            try:
+                novo = CatalogIndex(load_snapshot(self.path), origem=self.path)
+            except (OSError, ValueError) as e:
+                logger.warning("Snapshot do catálogo inválido (%s): %s; mantendo o índice atual", self.path, e)
+                return False
+            self.index = novo
+            self._assinatura = assinatura
+            logger.info("Catálogo recarregado: %d produtos em %.2fs", len(novo), novo.segundos_construcao)
+            return True
+
+    def watch(self, interval: float = 5.0) -> threading.Thread:
+        def loop():
+            while True:
+                self.refresh()
+                time.sleep(interval)
+
+        thread = threading.Thread(target=loop, name="catalog-watch", daemon=True)
+        thread.start()
+        return thread
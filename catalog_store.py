@@ -0,0 +1,401 @@
+"""
+Histórico do catálogo por conta: snapshots colunares, comprimidos e endereçados por conteúdo.
+
+Cada crawl vira um snapshot: os produtos ordenados por SKU (change_events.sku) e
+divididos em blocos; cada bloco é gravado por coluna (lista JSON com o valor do
+campo em cada produto do bloco, mais a coluna de SKUs), comprimida com zlib e
+gravada uma única vez em blobs/<sha256[:2]>/<sha256> (hash do conteúdo
+descomprimido). O manifesto do snapshot (snapshots/<conta>/<id>.json) lista os
+blocos com o primeiro e o último SKU e o hash de cada coluna.
+
+O fim de um bloco é decidido pelo SKU do último produto (hash do SKU múltiplo de
+chunk_records: em média chunk_records produtos por bloco, no máximo 4x), de modo
+que um produto novo ou removido só muda o bloco onde cai. Como as colunas são
+deduplicadas separadamente, uma mudança de estoque grava de novo só a coluna
+estoque do bloco; descrição, gtin etc. continuam os mesmos blobs.
+
+diff(conta, de, para) é um merge dos dois snapshots em ordem de SKU com um bloco
+por vez de cada lado: blocos idênticos são pulados sem ler nada; blocos com os
+mesmos SKUs são comparados só pelas colunas cujo hash mudou. Retenção (retain:
+últimos N e o último de cada dia nos últimos D dias) remove manifestos;
+compact() apaga os blobs que nenhum manifesto referencia. Campos com valor None
+não são guardados.
+
+Uso:
+    python catalog_store.py list <conta>
+    python catalog_store.py diff <conta> <de> <para>     # ids ou -1 (último), -2, ...
+    python catalog_store.py export <conta> <id>
+    python catalog_store.py retain --keep-last 30 --keep-daily 90
+    python catalog_store.py compact
+    python catalog_store.py usage                        # bytes em disco x sem deduplicação
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from change_events import ALTERADO, NOVO, REMOVIDO, sku
+
+CHUNK_RECORDS = 256
+COMPRESS_LEVEL = 6
+COMPACT_GRACE = 3600  # blobs mais novos que isso não são apagados (snapshot sendo gravado)
+SKU_COLUMN = "_sku"
+
+
+def _conta_dir(conta: str) -> str:
+    return re.sub(r"[^\w.@-]", "_", conta)
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _is_boundary(s: str, chunk_records: int) -> bool:
+    return int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big") % chunk_records == 0
+
+
+class CatalogStore:
+    """Snapshots do catálogo em um diretório (local ou volume compartilhado entre workers)."""
+
+    def __init__(self, root: str, chunk_records: int = CHUNK_RECORDS, level: int = COMPRESS_LEVEL):
+        self.root = root
+        self.chunk_records = max(1, chunk_records)
+        self.level = level
+
+    # --- blobs ---
+
+    def _blob_path(self, h: str) -> str:
+        return os.path.join(self.root, "blobs", h[:2], h)
+
+    def _put_blob(self, valores: list) -> tuple[str, int, bool]:
+        """Grava a coluna se ainda não existe. Retorna (hash, bytes comprimidos, novo)."""
+        conteudo = json.dumps(valores, ensure_ascii=False, separators=(",", ":")).encode()
+        h = hashlib.sha256(conteudo).hexdigest()
+        path = self._blob_path(h)
+        if os.path.exists(path):
+            os.utime(path)  # reaproveitado: protege do compact() até o manifesto existir
+            return h, os.path.getsize(path), False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        comprimido = zlib.compress(conteudo, self.level)
+        _write_atomic(path, comprimido)
+        return h, len(comprimido), True
+
+    def read_column(self, h: str) -> list:
+        with open(self._blob_path(h), "rb") as f:
+            return json.loads(zlib.decompress(f.read()))
+
+    def read_chunk(self, chunk: dict) -> list[dict]:
+        """Produtos de um bloco do manifesto (todas as colunas)."""
+        colunas = {nome: self.read_column(h) for nome, h in chunk["colunas"].items() if nome != SKU_COLUMN}
+        return [
+            {nome: valores[i] for nome, valores in colunas.items() if valores[i] is not None}
+            for i in range(chunk["produtos"])
+        ]
+
+    # --- snapshots ---
+
+    def _manifest_dir(self, conta: str) -> str:
+        return os.path.join(self.root, "snapshots", _conta_dir(conta))
+
+    def _put_chunk(self, skus: list[str], produtos: list[dict]) -> tuple[dict, int, int]:
+        campos = sorted({k for p in produtos for k, v in p.items() if v is not None})
+        colunas = {SKU_COLUMN: skus, **{campo: [p.get(campo) for p in produtos] for campo in campos}}
+        chunk = {"primeiro": skus[0], "ultimo": skus[-1], "produtos": len(skus), "colunas": {}, "bytes": 0}
+        novos = gravados = 0
+        for nome, valores in colunas.items():
+            h, tamanho, novo = self._put_blob(valores)
+            chunk["colunas"][nome] = h
+            chunk["bytes"] += tamanho
+            novos += novo
+            gravados += tamanho if novo else 0
+        return chunk, novos, gravados
+
+    def put(self, conta: str, produtos, crawl: str = "", agora: float | None = None) -> dict:
+        """Grava um snapshot da conta. Retorna o manifesto (com blobs novos e bytes gravados)."""
+        agora = time.time() if agora is None else agora
+        por_sku = {}
+        for produto in produtos:  # SKU repetido fica com o último
+            por_sku[sku(produto)] = produto
+        chunks, novos, gravados = [], 0, 0
+        skus = []
+        for s in sorted(por_sku):
+            skus.append(s)
+            if _is_boundary(s, self.chunk_records) or len(skus) >= 4 * self.chunk_records:
+                chunk, n, b = self._put_chunk(skus, [por_sku[k] for k in skus])
+                chunks.append(chunk)
+                novos, gravados, skus = novos + n, gravados + b, []
+        if skus:
+            chunk, n, b = self._put_chunk(skus, [por_sku[k] for k in skus])
+            chunks.append(chunk)
+            novos, gravados = novos + n, gravados + b
+
+        directory = self._manifest_dir(conta)
+        criado = datetime.fromtimestamp(agora, timezone.utc)
+        while os.path.exists(os.path.join(directory, criado.strftime("%Y%m%dT%H%M%S%fZ") + ".json")):
+            criado += timedelta(microseconds=1)
+        manifesto = {
+            "id": criado.strftime("%Y%m%dT%H%M%S%fZ"),
+            "conta": conta,
+            "criado_em": criado.isoformat(),
+            "crawl": crawl,
+            "produtos": len(por_sku),
+            "bytes": sum(c["bytes"] for c in chunks),
+            "chunks": chunks,
+        }
+        os.makedirs(directory, exist_ok=True)
+        _write_atomic(os.path.join(directory, manifesto["id"] + ".json"), json.dumps(manifesto).encode())
+        return {**manifesto, "blobs_novos": novos, "bytes_gravados": gravados}
+
+    def contas(self) -> list[str]:
+        contas = []
+        for directory in sorted(glob.glob(os.path.join(self.root, "snapshots", "*"))):
+            ids = self.snapshot_ids(directory=directory)
+            if ids:
+                contas.append(self._read_manifest(os.path.join(directory, ids[-1] + ".json"))["conta"])
+        return contas
+
+    def snapshot_ids(self, conta: str | None = None, directory: str | None = None) -> list[str]:
+        """Ids dos snapshots da conta, mais antigos primeiro."""
+        directory = directory or self._manifest_dir(conta)
+        return sorted(os.path.basename(p)[:-5] for p in glob.glob(os.path.join(directory, "*.json")))
+
+    def _read_manifest(self, path: str) -> dict:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def manifest(self, conta: str, snapshot_id: str) -> dict:
+        """Manifesto pelo id ou por índice relativo ("-1" = último, "-2" = penúltimo)."""
+        if re.fullmatch(r"-[1-9]\d*", snapshot_id):
+            ids = self.snapshot_ids(conta)
+            indice = int(snapshot_id)
+            if not ids or -indice > len(ids):
+                raise KeyError(f"Snapshot {snapshot_id} inexistente para {conta}")
+            snapshot_id = ids[indice]
+        path = os.path.join(self._manifest_dir(conta), snapshot_id + ".json")
+        if not os.path.exists(path):
+            raise KeyError(f"Snapshot {snapshot_id} inexistente para {conta}")
+        return self._read_manifest(path)
+
+    def records(self, conta: str, snapshot_id: str):
+        """Produtos do snapshot em ordem de SKU (um bloco na memória por vez)."""
+        for chunk in self.manifest(conta, snapshot_id)["chunks"]:
+            yield from self.read_chunk(chunk)
+
+    def diff(self, conta: str, de: str, para: str):
+        """
+        Mudanças de `de` para `para` em ordem de SKU: {"tipo", "sku", "anterior", "atual"}
+        (tipo "novo", "removido" ou "alterado", como em change_events).
+        """
+        a = _Cursor(self, self.manifest(conta, de)["chunks"])
+        b = _Cursor(self, self.manifest(conta, para)["chunks"])
+        while True:
+            if a.at_chunk_start() and b.at_chunk_start():
+                ca, cb = a.chunk(), b.chunk()
+                if ca["colunas"] == cb["colunas"]:
+                    a.skip_chunk()
+                    b.skip_chunk()
+                    continue
+                if ca["colunas"][SKU_COLUMN] == cb["colunas"][SKU_COLUMN]:
+                    yield from self._diff_same_skus(ca, cb)
+                    a.skip_chunk()
+                    b.skip_chunk()
+                    continue
+            ra, rb = a.peek(), b.peek()
+            if ra is None and rb is None:
+                return
+            ka = sku(ra) if ra is not None else None
+            kb = sku(rb) if rb is not None else None
+            if rb is None or (ra is not None and ka < kb):
+                yield {"tipo": REMOVIDO, "sku": ka, "anterior": ra, "atual": None}
+                a.advance()
+            elif ra is None or kb < ka:
+                yield {"tipo": NOVO, "sku": kb, "anterior": None, "atual": rb}
+                b.advance()
+            else:
+                if ra != rb:
+                    yield {"tipo": ALTERADO, "sku": ka, "anterior": ra, "atual": rb}
+                a.advance()
+                b.advance()
+
+    def _diff_same_skus(self, ca: dict, cb: dict):
+        """Blocos com os mesmos SKUs: lê só as colunas que mudaram para achar os produtos alterados."""
+        n = ca["produtos"]
+        antes, depois, alterados = {}, {}, set()
+        for nome in (ca["colunas"].keys() | cb["colunas"].keys()) - {SKU_COLUMN}:
+            ha, hb = ca["colunas"].get(nome), cb["colunas"].get(nome)
+            if ha == hb:
+                continue
+            antes[nome] = self.read_column(ha) if ha else [None] * n
+            depois[nome] = self.read_column(hb) if hb else [None] * n
+            alterados.update(i for i in range(n) if antes[nome][i] != depois[nome][i])
+        if not alterados:
+            return
+        for nome, h in ca["colunas"].items():
+            if nome not in antes and cb["colunas"].get(nome) == h:
+                antes[nome] = depois[nome] = self.read_column(h)  # coluna igual nos dois lados: lida uma vez
+        skus = antes.pop(SKU_COLUMN)
+        depois.pop(SKU_COLUMN)
+        for i in sorted(alterados):
+            yield {
+                "tipo": ALTERADO,
+                "sku": skus[i],
+                "anterior": {k: v[i] for k, v in antes.items() if v[i] is not None},
+                "atual": {k: v[i] for k, v in depois.items() if v[i] is not None},
+            }
+
+    # --- retenção e compactação ---
+
+    def retain(self, conta: str, keep_last: int = 30, keep_daily: int = 0, agora: float | None = None) -> list[str]:
+        """
+        Mantém os keep_last snapshots mais recentes e o último de cada dia dos
+        últimos keep_daily dias (UTC); apaga os demais manifestos. Retorna os ids apagados.
+        """
+        agora = time.time() if agora is None else agora
+        ids = self.snapshot_ids(conta)
+        manter = set(ids[-keep_last:]) if keep_last > 0 else set()
+        if keep_daily > 0:
+            limite = datetime.fromtimestamp(agora - keep_daily * 86400, timezone.utc).strftime("%Y%m%d")
+            por_dia = {}
+            for snapshot_id in ids:  # ordem crescente: fica o último do dia
+                if snapshot_id[:8] >= limite:
+                    por_dia[snapshot_id[:8]] = snapshot_id
+            manter.update(por_dia.values())
+        apagados = [i for i in ids if i not in manter]
+        for snapshot_id in apagados:
+            os.remove(os.path.join(self._manifest_dir(conta), snapshot_id + ".json"))
+        return apagados
+
+    def compact(self, grace: float = COMPACT_GRACE, agora: float | None = None) -> dict:
+        """Apaga blobs sem manifesto (e temporários abandonados) mais velhos que grace segundos."""
+        agora = time.time() if agora is None else agora
+        referenciados = set()
+        for path in glob.glob(os.path.join(self.root, "snapshots", "*", "*.json")):
+            try:
+                for chunk in self._read_manifest(path)["chunks"]:
+                    referenciados.update(chunk["colunas"].values())
+            except FileNotFoundError:  # removido por retain() em paralelo
+                continue
+        removidos, liberados, mantidos = 0, 0, 0
+        for path in glob.glob(os.path.join(self.root, "blobs", "*", "*")):
+            nome = os.path.basename(path)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if nome in referenciados:
+                mantidos += 1
+            elif agora - st.st_mtime >= grace:
+                os.remove(path)
+                removidos += 1
+                liberados += st.st_size
+        return {"blobs_mantidos": mantidos, "blobs_removidos": removidos, "bytes_liberados": liberados}
+
+    def usage(self) -> dict:
+        """Blobs e bytes em disco x bytes que os snapshots ocupariam sem deduplicação."""
+        em_disco, blobs = 0, 0
+        for path in glob.glob(os.path.join(self.root, "blobs", "*", "*")):
+            em_disco += os.path.getsize(path)
+            blobs += 1
+        logicos, snapshots = 0, 0
+        for path in glob.glob(os.path.join(self.root, "snapshots", "*", "*.json")):
+            logicos += self._read_manifest(path)["bytes"]
+            snapshots += 1
+        return {"snapshots": snapshots, "blobs": blobs, "bytes_em_disco": em_disco, "bytes_sem_dedup": logicos}
+
+
+class _Cursor:
+    """Posição em um snapshot para o merge do diff: bloco atual lido sob demanda."""
+
+    def __init__(self, store: CatalogStore, chunks: list[dict]):
+        self.store = store
+        self.chunks = chunks
+        self.i = 0
+        self.registros = None
+        self.pos = 0
+
+    def at_chunk_start(self) -> bool:
+        return self.registros is None and self.i < len(self.chunks)
+
+    def chunk(self) -> dict:
+        return self.chunks[self.i]
+
+    def skip_chunk(self):
+        self.i += 1
+
+    def peek(self) -> dict | None:
+        if self.registros is None:
+            if self.i >= len(self.chunks):
+                return None
+            self.registros = self.store.read_chunk(self.chunk())
+            self.pos = 0
+        return self.registros[self.pos]
+
+    def advance(self):
+        self.pos += 1
+        if self.pos >= len(self.registros):
+            self.registros = None
+            self.i += 1
+
+
+def from_env() -> CatalogStore | None:
+    """Store em CATALOG_STORE_DIR (None se não configurado)."""
+    root = os.environ.get("CATALOG_STORE_DIR", "")
+    if not root:
+        return None
+    return CatalogStore(root, chunk_records=int(os.environ.get("CATALOG_STORE_CHUNK", str(CHUNK_RECORDS))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshots do catálogo por conta (histórico, diff, retenção)")
+    parser.add_argument("--dir", default=os.environ.get("CATALOG_STORE_DIR", ".scrapy/catalog_store"))
+    sub = parser.add_subparsers(dest="acao", required=True)
+    sub.add_parser("list").add_argument("conta")
+    p = sub.add_parser("diff")
+    p.add_argument("conta")
+    p.add_argument("de")
+    p.add_argument("para")
+    p = sub.add_parser("export")
+    p.add_argument("conta")
+    p.add_argument("snapshot_id")
+    p = sub.add_parser("retain")
+    p.add_argument("--conta", help="Padrão: todas")
+    p.add_argument("--keep-last", type=int, default=int(os.environ.get("CATALOG_STORE_KEEP_LAST", "30")))
+    p.add_argument("--keep-daily", type=int, default=int(os.environ.get("CATALOG_STORE_KEEP_DAILY", "0")))
+    p = sub.add_parser("compact")
+    p.add_argument("--grace", type=float, default=COMPACT_GRACE)
+    sub.add_parser("usage")
+    args = parser.parse_args()
+
+    store = CatalogStore(args.dir)
+    try:
+        if args.acao == "list":
+            for snapshot_id in store.snapshot_ids(args.conta):
+                m = store.manifest(args.conta, snapshot_id)
+                print(json.dumps({k: m[k] for k in ("id", "criado_em", "crawl", "produtos", "bytes")}))
+        elif args.acao == "diff":
+            for mudanca in store.diff(args.conta, args.de, args.para):
+                print(json.dumps(mudanca, ensure_ascii=False))
+        elif args.acao == "export":
+            print(json.dumps(list(store.records(args.conta, args.snapshot_id)), ensure_ascii=False))
+        elif args.acao == "retain":
+            for conta in [args.conta] if args.conta else store.contas():
+                apagados = store.retain(conta, args.keep_last, args.keep_daily)
+                print(json.dumps({"conta": conta, "apagados": len(apagados)}))
+        elif args.acao == "compact":
+            print(json.dumps(store.compact(args.grace)))
+        else:
+            print(json.dumps(store.usage()))
+    except KeyError as e:
+        parser.error(e.args[0])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Eventos de mudança de preço e estoque (Redis Stream) para consumidores downstream.
+
+Ao fim de cada crawl, o catálogo extraído da conta é comparado com o do crawl
+anterior (hash produtos:estado:<conta>, SKU -> [preco_fabrica, estoque]) e cada
+SKU que mudou gera um evento compacto no stream produtos:mudancas:
+
+  conta, sku, gtin, codigo, tipo ("alterado", "novo" ou "removido"),
+  preco_fabrica_anterior, preco_fabrica, estoque_anterior, estoque, crawl
+
+O SKU é o codigo (ou o gtin, sem código). O primeiro crawl de uma conta só grava
+a base, sem eventos; "removido" só é emitido por crawls completos (um crawl
+interrompido pelo orçamento do job não remove nada). Eventos e novo estado são
+gravados na mesma transação, então uma retentativa do job não repete eventos; o
+estado fica em WATCH durante o diff, e crawls concorrentes da mesma conta refazem
+o diff em vez de publicar os mesmos eventos duas vezes.
+
+O stream é limitado a CHANGE_STREAM_MAXLEN entradas (aproximado, XADD MAXLEN ~).
+Consumidores usam grupos (XREADGROUP): cada grupo recebe todos os eventos e, dentro
+do grupo, cada evento vai para um único consumidor, que confirma com ack. Eventos
+sem ack de um consumidor que morreu são reassumidos com claim_stale (XAUTOCLAIM).
+
+Uso (consumidor de exemplo, um evento JSON por linha):
+    python change_events.py --group precos --consumer c1
+"""
+import argparse
+import json
+import os
+
+from redis.exceptions import WatchError
+
+STREAM_KEY = "produtos:mudancas"
+STATE_KEY = "produtos:estado:{conta}"
+CAMPOS = ("preco_fabrica", "estoque")
+
+ALTERADO = "alterado"
+NOVO = "novo"
+REMOVIDO = "removido"
+
+_BLOCO = 1000  # comandos por pipeline ao gravar estado e eventos
+
+
+def enabled() -> bool:
+    return os.environ.get("CHANGE_EVENTS", "0") == "1"
+
+
+def sku(produto: dict) -> str:
+    return str(produto.get("codigo") or produto.get("gtin") or "")
+
+
+def _decode(valor):
+    return valor.decode() if isinstance(valor, bytes) else valor
+
+
+class ChangeFeed:
+    """Diff do catálogo por conta e publicação no stream de mudanças."""
+
+    def __init__(self, conn, stream: str = STREAM_KEY, maxlen: int | None = None):
+        self.conn = conn
+        self.stream = stream
+        self.maxlen = maxlen if maxlen is not None else int(os.environ.get("CHANGE_STREAM_MAXLEN", "100000"))
+
+    def _state(self, conta: str) -> dict:
+        estado = {}
+        for chave, valor in self.conn.hscan_iter(STATE_KEY.format(conta=conta), count=_BLOCO):
+            estado[_decode(chave)] = json.loads(valor)
+        return estado
+
+    def diff(self, conta: str, produtos: list[dict], completo: bool = True) -> tuple[list[dict], dict, list[str]]:
+        """
+        Compara produtos com o estado salvo da conta.
+        Retorna (eventos, estado novo a gravar, SKUs a remover do estado).
+        """
+        anterior = self._state(conta)
+        eventos, atual = [], {}
+        primeiro = not anterior
+        for p in produtos:
+            chave = sku(p)
+            if not chave:
+                continue
+            valores = [str(p.get(c) or "") for c in CAMPOS]
+            antigos = anterior.get(chave)
+            if antigos == valores or chave in atual:
+                atual.setdefault(chave, valores)
+                continue
+            atual[chave] = valores
+            if primeiro:
+                continue
+            eventos.append(self._evento(conta, p, NOVO if antigos is None else ALTERADO, antigos, valores))
+        removidos = []
+        if completo and not primeiro:
+            removidos = [chave for chave in anterior if chave not in atual]
+            for chave in removidos:
+                eventos.append(self._evento(conta, {"codigo": chave}, REMOVIDO, anterior[chave], None))
+        novos = {chave: v for chave, v in atual.items() if anterior.get(chave) != v}
+        return eventos, novos, removidos
+
+    @staticmethod
+    def _evento(conta, produto, tipo, antigos, valores) -> dict:
+        antigos = antigos or ["", ""]
+        valores = valores or ["", ""]
+        return {
+            "conta": conta,
+            "sku": sku(produto),
+            "gtin": str(produto.get("gtin") or ""),
+            "codigo": str(produto.get("codigo") or ""),
+            "tipo": tipo,
+            "preco_fabrica_anterior": antigos[0],
+            "preco_fabrica": valores[0],
+            "estoque_anterior": antigos[1],
+            "estoque": valores[1],
+        }
+
+    def publish(self, conta: str, produtos: list[dict], completo: bool = True, crawl: str = "") -> dict:
+        """
+        Publica um evento por SKU alterado e atualiza o estado da conta.
+        Retorna a contagem por tipo de evento.
+        """
+        chave_estado = STATE_KEY.format(conta=conta)
+        with self.conn.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    # Estado alterado por outro crawl entre o diff e o EXEC: refaz o diff
+                    pipe.watch(chave_estado)
+                    eventos, novos, removidos = self.diff(conta, produtos, completo)
+                    pipe.multi()
+                    for e in eventos:
+                        pipe.xadd(self.stream, {**e, "crawl": crawl}, maxlen=self.maxlen, approximate=True)
+                    itens = [(chave, json.dumps(v)) for chave, v in novos.items()]
+                    for i in range(0, len(itens), _BLOCO):
+                        pipe.hset(chave_estado, mapping=dict(itens[i:i + _BLOCO]))
+                    for i in range(0, len(removidos), _BLOCO):
+                        pipe.hdel(chave_estado, *removidos[i:i + _BLOCO])
+                    pipe.execute()
+                    break
+                except WatchError:
+                    continue
+        contagem = {ALTERADO: 0, NOVO: 0, REMOVIDO: 0}
+        for e in eventos:
+            contagem[e["tipo"]] += 1
+        return contagem
+
+
+def ensure_group(conn, group: str, stream: str = STREAM_KEY, start: str = "$"):
+    """Cria o grupo de consumidores (e o stream, se preciso); ignora grupo existente."""
+    from redis.exceptions import ResponseError
+
+    try:
+        conn.xgroup_create(stream, group, id=start, mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def _eventos(entradas) -> list[tuple[str, dict]]:
+    return [
+        (_decode(id_), {_decode(k): _decode(v) for k, v in campos.items()})
+        for id_, campos in entradas
+        if campos is not None
+    ]
+
+
+def read(conn, group: str, consumer: str, count: int = 100, block_ms: int | None = None,
+         stream: str = STREAM_KEY) -> list[tuple[str, dict]]:
+    """Próximos eventos não entregues ao grupo: lista de (id, evento)."""
+    resposta = conn.xreadgroup(group, consumer, {stream: ">"}, count=count, block=block_ms)
+    return _eventos(resposta[0][1]) if resposta else []
+
+
+def ack(conn, group: str, ids, stream: str = STREAM_KEY) -> int:
+    return conn.xack(stream, group, *ids) if ids else 0
+
+
+def claim_stale(conn, group: str, consumer: str, min_idle_ms: int = 60000, count: int = 100,
+                stream: str = STREAM_KEY) -> list[tuple[str, dict]]:
+    """Reassume eventos entregues há mais de min_idle_ms sem ack (consumidor morto)."""
+    resposta = conn.xautoclaim(stream, group, consumer, min_idle_ms, start_id="0-0", count=count)
+    return _eventos(resposta[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consome eventos de mudança de preço/estoque")
+    parser.add_argument("--redis-url", default=os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+    parser.add_argument("--group", required=True, help="Grupo de consumidores")
+    parser.add_argument("--consumer", required=True, help="Nome deste consumidor no grupo")
+    parser.add_argument("--from-start", action="store_true", help="Grupo novo lê o stream desde o início")
+    parser.add_argument("--count", type=int, default=100, help="Eventos por leitura")
+    args = parser.parse_args()
+
+    from redis import Redis
+
+    conn = Redis.from_url(args.redis_url)
+    ensure_group(conn, args.group, start="0" if args.from_start else "$")
+    try:
+        while True:
+            eventos = claim_stale(conn, args.group, args.consumer, count=args.count)
+            eventos += read(conn, args.group, args.consumer, count=args.count, block_ms=5000)
+            for id_, evento in eventos:
+                print(json.dumps({"id": id_, **evento}, ensure_ascii=False), flush=True)
+            ack(conn, args.group, [id_ for id_, _ in eventos])
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
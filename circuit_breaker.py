@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Circuit breaker por upstream (API do desafio, domínio do fornecedor) e orçamento
+global de retentativas, compartilhados por todos os workers via Redis.
+
+Estados do breaker (hash breaker:<upstream>:estado):
+  fechado      chamadas liberadas; resultados contados em janela deslizante
+  aberto       taxa de erro ou de chamadas lentas acima do limite; chamadas
+               falham na hora (CircuitOpenError) até aberto_ate
+  meio_aberto  fim do cooldown: uma única chamada de sonda; sucesso fecha,
+               falha reabre
+
+Configuração por env: CIRCUIT_BREAKER=1 ativa; CB_ERROR_RATE, CB_SLOW_SECONDS,
+CB_SLOW_RATE, CB_MIN_CALLS, CB_WINDOW, CB_COOLDOWN; RETRY_BUDGET_RATIO e
+RETRY_BUDGET_MIN (retentativas por janela de RETRY_BUDGET_WINDOW segundos).
+
+Estado atual (métrica): python circuit_breaker.py  (ou run_worker.py --metrics)
+"""
+import argparse
+import os
+import time
+from urllib.parse import urlsplit
+
+FECHADO = "fechado"
+ABERTO = "aberto"
+MEIO_ABERTO = "meio_aberto"
+# Valor numérico do estado (gauge): 0 fechado, 1 meio aberto, 2 aberto
+ESTADO_GAUGE = {FECHADO: 0, MEIO_ABERTO: 1, ABERTO: 2}
+
+STATE_KEY = "breaker:{name}:estado"
+WINDOW_KEY = "breaker:{name}:janela"
+PROBE_KEY = "breaker:{name}:sonda"
+
+# KEYS: estado, sonda; ARGV: agora, cooldown. Retorna {liberado, espera}.
+ALLOW_LUA = """
+local estado = redis.call('HGET', KEYS[1], 'estado') or 'fechado'
+if estado == 'fechado' then
+  return {1, '0'}
+end
+local agora = tonumber(ARGV[1])
+local ate = tonumber(redis.call('HGET', KEYS[1], 'aberto_ate') or '0')
+if estado == 'aberto' and agora < ate then
+  redis.call('HINCRBY', KEYS[1], 'rejeitadas', 1)
+  return {0, tostring(ate - agora)}
+end
+if redis.call('SET', KEYS[2], '1', 'NX', 'EX', ARGV[2]) then
+  redis.call('HSET', KEYS[1], 'estado', 'meio_aberto')
+  return {1, '0'}
+end
+redis.call('HINCRBY', KEYS[1], 'rejeitadas', 1)
+return {0, '1'}
+"""
+
+# KEYS: estado, janela, sonda
+# ARGV: agora, tamanho do bucket, nº de buckets, ok (1/0), lenta (1/0),
+#       mínimo de chamadas, taxa de erro, taxa de lentas, cooldown
+# Retorna o estado após o registro.
+RECORD_LUA = """
+local agora = tonumber(ARGV[1])
+local tamanho = tonumber(ARGV[2])
+local n = tonumber(ARGV[3])
+local falhou = ARGV[4] == '0'
+local lenta = ARGV[5] == '1'
+local b = math.floor(agora / tamanho)
+
+local function abrir()
+  redis.call('HSET', KEYS[1], 'estado', 'aberto', 'aberto_ate', tostring(agora + tonumber(ARGV[9])))
+  redis.call('HINCRBY', KEYS[1], 'aberturas', 1)
+  redis.call('DEL', KEYS[2])
+  return 'aberto'
+end
+
+local estado = redis.call('HGET', KEYS[1], 'estado') or 'fechado'
+if estado == 'meio_aberto' then
+  redis.call('DEL', KEYS[3])
+  if falhou or lenta then
+    return abrir()
+  end
+  redis.call('HSET', KEYS[1], 'estado', 'fechado')
+  redis.call('DEL', KEYS[2])
+  return 'fechado'
+end
+if estado == 'aberto' then
+  return 'aberto'
+end
+
+redis.call('HINCRBY', KEYS[2], b .. ':total', 1)
+if falhou then redis.call('HINCRBY', KEYS[2], b .. ':erros', 1) end
+if lenta then redis.call('HINCRBY', KEYS[2], b .. ':lentas', 1) end
+local velho = b - n
+redis.call('HDEL', KEYS[2], velho .. ':total', velho .. ':erros', velho .. ':lentas')
+redis.call('EXPIRE', KEYS[2], tamanho * n * 2)
+
+local total, erros, lentas = 0, 0, 0
+for i = 0, n - 1 do
+  local k = b - i
+  total = total + tonumber(redis.call('HGET', KEYS[2], k .. ':total') or '0')
+  erros = erros + tonumber(redis.call('HGET', KEYS[2], k .. ':erros') or '0')
+  lentas = lentas + tonumber(redis.call('HGET', KEYS[2], k .. ':lentas') or '0')
+end
+if total >= tonumber(ARGV[6]) and
+   (erros / total >= tonumber(ARGV[7]) or lentas / total >= tonumber(ARGV[8])) then
+  return abrir()
+end
+return 'fechado'
+"""
+
+# KEYS[1] = contadores da janela; ARGV: razão, mínimo, ttl. Retorna 1 se liberada.
+RETRY_BUDGET_LUA = """
+local tentativas = tonumber(redis.call('HGET', KEYS[1], 'tentativas') or '0')
+local retentativas = tonumber(redis.call('HGET', KEYS[1], 'retentativas') or '0')
+local limite = math.max(tonumber(ARGV[2]), tentativas * tonumber(ARGV[1]))
+if retentativas >= limite then
+  redis.call('HINCRBY', KEYS[1], 'negadas', 1)
+  redis.call('EXPIRE', KEYS[1], ARGV[3])
+  return 0
+end
+redis.call('HINCRBY', KEYS[1], 'retentativas', 1)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+class CircuitOpenError(Exception):
+    """Upstream com breaker aberto: a chamada nem foi feita."""
+
+    def __init__(self, upstream: str, retry_after: float):
+        self.upstream = upstream
+        self.retry_after = retry_after
+        super().__init__(f"Circuit breaker aberto para {upstream} (nova tentativa em {retry_after:.0f}s)")
+
+
+def api_upstream(base_url: str) -> str:
+    return f"api:{urlsplit(base_url).hostname}"
+
+
+def supplier_upstream(host: str) -> str:
+    return f"fornecedor:{host}"
+
+
+class CircuitBreaker:
+    """Breaker de um upstream; estado e janela de resultados no Redis."""
+
+    def __init__(
+        self,
+        conn,
+        name: str,
+        error_rate: float = 0.5,
+        slow_seconds: float = 10.0,
+        slow_rate: float = 0.5,
+        min_calls: int = 10,
+        window: int = 60,
+        buckets: int = 6,
+        cooldown: int = 30,
+    ):
+        self.conn = conn
+        self.name = name
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.slow_rate = slow_rate
+        self.min_calls = min_calls
+        self.bucket_size = max(1, window // buckets)
+        self.buckets = buckets
+        self.cooldown = cooldown
+        self._keys = [STATE_KEY.format(name=name), WINDOW_KEY.format(name=name), PROBE_KEY.format(name=name)]
+        self._allow = conn.register_script(ALLOW_LUA)
+        self._record = conn.register_script(RECORD_LUA)
+
+    def before_call(self):
+        """Libera a chamada ou levanta CircuitOpenError (no meio aberto, só a sonda passa)."""
+        liberado, espera = self._allow(
+            keys=[self._keys[0], self._keys[2]], args=[time.time(), self.cooldown],
+        )
+        if not int(liberado):
+            raise CircuitOpenError(self.name, float(espera))
+
+    def ensure_closed(self):
+        """Verificação sem efeito colateral (não consome a sonda): falha se aberto."""
+        estado = self.state()
+        if estado["estado"] == ABERTO and estado["retry_after"] > 0:
+            raise CircuitOpenError(self.name, estado["retry_after"])
+
+    def record(self, ok: bool, elapsed: float | None = None) -> str:
+        """Registra o resultado de uma chamada; retorna o estado resultante."""
+        lenta = elapsed is not None and elapsed >= self.slow_seconds
+        estado = self._record(
+            keys=self._keys,
+            args=[
+                time.time(), self.bucket_size, self.buckets, int(ok), int(lenta),
+                self.min_calls, self.error_rate, self.slow_rate, self.cooldown,
+            ],
+        )
+        return estado.decode() if isinstance(estado, bytes) else estado
+
+    def state(self) -> dict:
+        raw = {k.decode(): v.decode() for k, v in self.conn.hgetall(self._keys[0]).items()}
+        estado = raw.get("estado", FECHADO)
+        aberto_ate = float(raw.get("aberto_ate", 0))
+        return {
+            "upstream": self.name,
+            "estado": estado,
+            "gauge": ESTADO_GAUGE[estado],
+            "retry_after": max(aberto_ate - time.time(), 0.0) if estado == ABERTO else 0.0,
+            "aberturas": int(raw.get("aberturas", 0)),
+            "rejeitadas": int(raw.get("rejeitadas", 0)),
+        }
+
+
+class RetryBudget:
+    """
+    Orçamento global de retentativas: por janela, no máximo
+    max(min_retries, ratio * tentativas) retentativas em todos os workers.
+    """
+    key_prefix = "retry_budget"
+
+    def __init__(self, conn, ratio: float = 0.2, min_retries: int = 10, window: int = 60):
+        self.conn = conn
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._acquire = conn.register_script(RETRY_BUDGET_LUA)
+
+    def _key(self) -> str:
+        return f"{self.key_prefix}:{int(time.time() // self.window)}"
+
+    def record_attempt(self):
+        key = self._key()
+        pipe = self.conn.pipeline()
+        pipe.hincrby(key, "tentativas", 1)
+        pipe.expire(key, self.window * 2)
+        pipe.execute()
+
+    def try_acquire(self) -> bool:
+        return bool(self._acquire(keys=[self._key()], args=[self.ratio, self.min_retries, self.window * 2]))
+
+    def usage(self) -> dict:
+        raw = {k.decode(): int(v) for k, v in self.conn.hgetall(self._key()).items()}
+        return {c: raw.get(c, 0) for c in ("tentativas", "retentativas", "negadas")}
+
+
+# ---------- Configuração por env (um breaker por upstream, por processo) ----------
+
+_breakers: dict[str, CircuitBreaker] = {}
+_conn = None
+
+
+def enabled() -> bool:
+    return os.environ.get("CIRCUIT_BREAKER", "0") == "1"
+
+
+def _redis():
+    global _conn
+    if _conn is None:
+        from redis import Redis
+
+        _conn = Redis.from_url(os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+    return _conn
+
+
+def breaker_for(upstream: str, conn=None) -> CircuitBreaker | None:
+    """Breaker configurado por env para o upstream; None com CIRCUIT_BREAKER desligado."""
+    if not enabled():
+        return None
+    if upstream not in _breakers:
+        env = os.environ.get
+        _breakers[upstream] = CircuitBreaker(
+            conn or _redis(),
+            upstream,
+            error_rate=float(env("CB_ERROR_RATE", "0.5")),
+            slow_seconds=float(env("CB_SLOW_SECONDS", "10")),
+            slow_rate=float(env("CB_SLOW_RATE", "0.5")),
+            min_calls=int(env("CB_MIN_CALLS", "10")),
+            window=int(env("CB_WINDOW", "60")),
+            cooldown=int(env("CB_COOLDOWN", "30")),
+        )
+    return _breakers[upstream]
+
+
+def retry_budget(conn) -> RetryBudget:
+    env = os.environ.get
+    return RetryBudget(
+        conn,
+        ratio=float(env("RETRY_BUDGET_RATIO", "0.2")),
+        min_retries=int(env("RETRY_BUDGET_MIN", "10")),
+        window=int(env("RETRY_BUDGET_WINDOW", "60")),
+    )
+
+
+def breaker_states(conn) -> list[dict]:
+    """Estado de todos os breakers conhecidos no Redis."""
+    nomes = sorted(
+        k.decode()[len("breaker:"):-len(":estado")]
+        for k in conn.scan_iter(match="breaker:*:estado")
+    )
+    return [CircuitBreaker(conn, nome).state() for nome in nomes]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estado dos circuit breakers e do orçamento de retentativas")
+    parser.add_argument("--redis-url", default=os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+    args = parser.parse_args()
+
+    from redis import Redis
+
+    conn = Redis.from_url(args.redis_url)
+    estados = breaker_states(conn)
+    if not estados:
+        print("Nenhum circuit breaker registrado.")
+    for e in estados:
+        print(
+            f"{e['upstream']}: {e['estado']} (gauge={e['gauge']}, retry_after={e['retry_after']:.0f}s, "
+            f"aberturas={e['aberturas']}, rejeitadas={e['rejeitadas']})"
+        )
+    uso = retry_budget(conn).usage()
+    print(f"Orçamento de retentativas (janela atual): {uso}")
+
+
+if __name__ == "__main__":
+    main()
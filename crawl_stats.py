@@ -0,0 +1,149 @@
+"""
+Estatísticas dos crawls no resultado dos jobs e série temporal por fornecedor.
+
+Os runners (scraper_runner, order_runner) chamam record_crawl(crawler) ao fim de
+cada crawl: com uma coleta ativa (collect, aberta pelo worker em volta do job) o
+resumo das stats do Scrapy entra na coleta. O resumo traz requisições, respostas,
+bytes, histograma de status, retentativas, erros, tempo, itens extraídos e
+descartados e os percentis de latência de LatencyStatsMiddleware.
+
+O worker devolve os resumos no resultado do job ("crawl_stats") e os acrescenta
+ao stream crawl_stats:<host do fornecedor> (XADD com MAXLEN aproximado, uma
+entrada compacta por crawl; o id do stream é o horário). Lentidão gradual do site
+do fornecedor aparece na latência e no tempo; regressão no parsing, em itens por
+página e itens descartados. Leitura: series() ou python crawl_stats.py <host>.
+"""
+import argparse
+import contextvars
+import json
+import os
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+SERIES_KEY = "crawl_stats:{fornecedor}"
+SERIES_MAXLEN = int(os.environ.get("CRAWL_STATS_MAXLEN", "10000"))
+
+# Campos numéricos da série (resumo -> campo do stream)
+CAMPOS_SERIE = (
+    "segundos", "requisicoes", "respostas", "bytes_recebidos", "retentativas",
+    "erros", "itens", "itens_descartados",
+)
+
+_current = contextvars.ContextVar("crawl_stats", default=None)
+
+
+def summarize(stats: dict) -> dict:
+    """Resumo compacto das stats de um crawl (dict de crawler.stats.get_stats())."""
+    prefixo_status = "downloader/response_status_count/"
+    latencia = {
+        nome: stats[f"latency/{nome}"]
+        for nome in ("p50", "p90", "p99", "max", "count")
+        if f"latency/{nome}" in stats
+    }
+    resumo = {
+        "finish_reason": stats.get("finish_reason"),
+        "segundos": round(float(stats.get("elapsed_time_seconds") or 0), 3),
+        "requisicoes": stats.get("downloader/request_count", 0),
+        "respostas": stats.get("downloader/response_count", 0),
+        "bytes_enviados": stats.get("downloader/request_bytes", 0),
+        "bytes_recebidos": stats.get("downloader/response_bytes", 0),
+        "status": {k[len(prefixo_status):]: v for k, v in sorted(stats.items()) if k.startswith(prefixo_status)},
+        "retentativas": stats.get("retry/count", 0),
+        "retentativas_esgotadas": stats.get("retry/max_reached", 0),
+        "erros": stats.get("downloader/exception_count", 0),
+        "itens": stats.get("item_scraped_count", 0),
+        "itens_descartados": stats.get("item_dropped_count", 0),
+    }
+    if latencia:
+        resumo["latencia_ms"] = latencia
+    return resumo
+
+
+@contextmanager
+def collect():
+    """Coleta os resumos dos crawls executados no bloco (lista retornada pelo with)."""
+    resumos: list[dict] = []
+    token = _current.set(resumos)
+    try:
+        yield resumos
+    finally:
+        _current.reset(token)
+
+
+def record_crawl(crawler, conta: str | None = None):
+    """Acrescenta o resumo do crawl à coleta ativa (sem coleta, não faz nada)."""
+    resumos = _current.get()
+    if resumos is None or crawler.stats is None:
+        return
+    spider = crawler.spider
+    base_url = getattr(spider, "base_url", "") or ""
+    resumos.append({
+        "spider": getattr(spider, "name", None),
+        "fornecedor": urlsplit(base_url).hostname or "",
+        "conta": conta if conta is not None else getattr(spider, "user", None),
+        **summarize(crawler.stats.get_stats()),
+    })
+
+
+def append(conn, resumo: dict, job_id: str = "", maxlen: int = SERIES_MAXLEN) -> str | None:
+    """Acrescenta o resumo à série do fornecedor. Retorna o id da entrada."""
+    if maxlen <= 0:
+        return None
+    campos = {campo: resumo.get(campo) or 0 for campo in CAMPOS_SERIE}
+    campos.update({f"latencia_{k}": v for k, v in (resumo.get("latencia_ms") or {}).items() if k != "count"})
+    campos.update({
+        "spider": resumo.get("spider") or "",
+        "conta": resumo.get("conta") or "",
+        "job": job_id or "",
+        "motivo": resumo.get("finish_reason") or "",
+        "status": json.dumps(resumo.get("status") or {}, separators=(",", ":")),
+    })
+    chave = SERIES_KEY.format(fornecedor=resumo.get("fornecedor") or "-")
+    id_ = conn.xadd(chave, campos, maxlen=maxlen, approximate=True)
+    return id_.decode() if isinstance(id_, bytes) else id_
+
+
+def _numero(valor: str):
+    try:
+        return int(valor)
+    except ValueError:
+        return float(valor)
+
+
+def series(conn, fornecedor: str, inicio: str = "-", fim: str = "+", count: int | None = None) -> list[dict]:
+    """Entradas da série do fornecedor (inicio/fim: ids do stream ou ms epoch), mais antigas primeiro."""
+    entradas = []
+    for id_, campos in conn.xrange(SERIES_KEY.format(fornecedor=fornecedor), inicio, fim, count=count):
+        id_ = id_.decode() if isinstance(id_, bytes) else id_
+        dados = {k.decode(): v.decode() for k, v in campos.items()}
+        entrada = {"id": id_, "ts": int(id_.split("-")[0]) / 1000}
+        for k, v in dados.items():
+            if k == "status":
+                entrada[k] = json.loads(v)
+            elif k in CAMPOS_SERIE or k.startswith("latencia_"):
+                entrada[k] = _numero(v)
+            else:
+                entrada[k] = v
+        entradas.append(entrada)
+    return entradas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Série temporal das stats de crawl de um fornecedor")
+    parser.add_argument("fornecedor", help="Host do fornecedor (ex.: pedidoeletronico.servimed.com.br)")
+    parser.add_argument("--redis-url", default=os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+    parser.add_argument("--count", type=int, default=None, help="Máximo de entradas (mais recentes)")
+    args = parser.parse_args()
+
+    from redis import Redis
+
+    conn = Redis.from_url(args.redis_url)
+    entradas = series(conn, args.fornecedor)
+    if args.count:
+        entradas = entradas[-args.count:]
+    for entrada in entradas:
+        print(json.dumps(entrada, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
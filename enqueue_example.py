@@ -8,6 +8,12 @@ Requer Redis em execução e o worker rodando (rq worker).
 Uso:
   python enqueue_example.py
   python enqueue_example.py --usuario "email@exemplo.com" --senha "minhasenha"
+  python enqueue_example.py --bulk-file contas.jsonl   # um payload {"usuario", "senha"} por linha
+  cat contas.jsonl | python enqueue_example.py --bulk-file -
+  python enqueue_example.py --bulk-file contas.jsonl --single-job   # todas as contas em um job (um reactor)
+  python enqueue_example.py --fair   # subfila por conta (escalonamento justo; requer run_worker.py)
+  python enqueue_example.py --distributed 4   # crawl dividido entre 4 workers (fronteira no Redis)
+  python enqueue_example.py --max-pages 500 --max-seconds 300   # orçamento do job (job_budget.py)
 """
 import argparse
 import os
@@ -36,30 +42,127 @@ def main():
         default=os.environ.get("RQ_QUEUE_NAME", "scraping"),
         help="Nome da fila RQ",
     )
+    parser.add_argument(
+        "--bulk-file",
+        default="",
+        help="Arquivo JSONL com um payload por linha ('-' = stdin); enfileira em um único pipeline",
+    )
+    parser.add_argument(
+        "--single-job",
+        action="store_true",
+        help="Com --bulk-file: um único job com todas as contas (payload['contas'], um crawler por conta)",
+    )
+    parser.add_argument(
+        "--fair",
+        action="store_true",
+        default=os.environ.get("RQ_FAIR_SCRAPING", "0") == "1",
+        help="Enfileira na subfila da conta (round-robin entre contas no FairWorker)",
+    )
+    parser.add_argument(
+        "--distributed",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Crawl distribuído entre N workers (coordenador + N-1 workers na mesma fila)",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=int(os.environ.get("RQ_SCRAPING_RETRIES", "0")),
+        help="Retentativas automáticas do job (retomam do checkpoint do crawl)",
+    )
+    for limite, ajuda in (
+        ("max_pages", "Máximo de páginas baixadas"),
+        ("max_items", "Máximo de produtos extraídos"),
+        ("max_rss_mb", "Máximo de memória residente do worker (MB)"),
+        ("max_seconds", "Tempo máximo do job (s)"),
+        ("max_bytes", "Máximo de bytes baixados"),
+    ):
+        parser.add_argument(
+            "--" + limite.replace("_", "-"),
+            dest=limite,
+            type=float,
+            default=None,
+            help=f"{ajuda}; ao atingir, o crawl termina com resultado parcial",
+        )
     args = parser.parse_args()
+    from job_budget import LIMITES
+
+    budget = {k: getattr(args, k) for k in LIMITES if getattr(args, k) is not None}
 
     try:
         from redis import Redis
-        from rq import Queue
+        from rq import Queue, Retry
     except ImportError:
         print("Instale as dependências: pip install redis rq", file=sys.stderr)
         sys.exit(1)
 
+    from scheduling import fair_queue
+
+    queue = Queue(args.queue, connection=Redis.from_url(args.redis_url))
+
+    def queue_for(payload):
+        conta = payload.get("usuario") or payload.get("user") or ""
+        return fair_queue(queue.connection, args.queue, conta) if args.fair and conta else queue
+
+    if args.bulk_file:
+        import admission
+        from queue_utils import format_rate, read_jsonl
+
+        try:
+            if args.bulk_file == "-":
+                payloads = list(read_jsonl(sys.stdin))
+            else:
+                with open(args.bulk_file, encoding="utf-8") as f:
+                    payloads = list(read_jsonl(f))
+            if args.single_job:
+                payloads = [{"contas": payloads, **({"budget": budget} if budget else {})}]
+            res = admission.enqueue_bulk(
+                queue, "worker.process_scraping_task", payloads, dedup=True, queue_for=queue_for,
+            )
+        except Exception as e:
+            print(f"Erro ao enfileirar: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(format_rate(len(res["jobs"]), res["segundos"]))
+        if res["recusados"]:
+            print(f"  Não enfileirados: {admission.summarize(res['recusados'])}")
+        print(f"  Fila: {args.queue}")
+        return
+
     payload = {
         "usuario": args.usuario,
         "senha": args.senha,
     }
+    if budget:
+        payload["budget"] = budget
+    func = "worker.process_scraping_task"
+    if args.distributed > 0:
+        payload["workers"] = args.distributed
+        func = "worker.process_distributed_scraping_task"
 
     try:
-        redis_conn = Redis.from_url(args.redis_url)
-        queue = Queue(args.queue, connection=redis_conn)
-        job = queue.enqueue(
-            "worker.process_scraping_task",
+        import admission
+
+        res = admission.enqueue(
+            queue,
+            func,
             payload,
+            dedup=True,
+            fila=queue_for(payload),
             job_timeout="600",
+            retry=Retry(max=args.retries, interval=30) if args.retries > 0 else None,
         )
-        print(f"Tarefa enfileirada. Job ID: {job.id}")
-        print(f"  Fila: {args.queue}")
+        if res["resultado"] == admission.REJEITADO:
+            print(f"Conta {args.usuario!r} já tem job na fila ({res['job_id']}); nada enfileirado.")
+            return
+        if res["resultado"] == admission.ADIADO:
+            print(
+                f"Fila cheia ({res['profundidade']} jobs); tente de novo em {res['retry_after']}s.",
+                file=sys.stderr,
+            )
+            sys.exit(2)
+        print(f"Tarefa enfileirada. Job ID: {res['job_id']}")
+        print(f"  Fila: {res['fila']}")
         print(f"  Payload: usuario={args.usuario!r}")
         print("Aguarde o worker processar. Verifique com: rq info ou no log do worker.")
     except Exception as e:
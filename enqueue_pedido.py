@@ -10,10 +10,72 @@ Uso:
   python enqueue_pedido.py
   python enqueue_pedido.py --usuario "email@fornecedor.com" --senha "senha"
   python enqueue_pedido.py --api-user meu_user --api-password minha_senha
+  python enqueue_pedido.py --coalesce-window 5   # agrupa pedidos da mesma conta em lote
+
+Modo em massa (um processo, uma conexão Redis, um pipeline):
+  python enqueue_pedido.py --count 1000 --concurrency 16   # cria N pedidos na API
+  python enqueue_pedido.py --bulk-file pedidos.jsonl         # payloads JSONL prontos
+  cat pedidos.jsonl | python enqueue_pedido.py --bulk-file -
 """
 import argparse
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _create_pedidos(args, count: int) -> list[dict]:
+    """Cria `count` pedidos na API com POST /pedido concorrentes (um token, sessão com pool)."""
+    from api_client import get_token, make_session, post_pedido
+
+    session = make_session(pool_size=args.concurrency)
+    token = get_token(username=args.api_user, password=args.api_password, session=session)
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        return list(pool.map(lambda _: post_pedido(token=token, session=session), range(count)))
+
+
+def _enqueue_bulk(args, queue):
+    """Modo em massa: payloads de --bulk-file ou --count pedidos novos, em um único pipeline."""
+    import admission
+    from pedido_ledger import PedidoLedger, job_id_for
+    from queue_utils import format_rate, pedido_payload, read_jsonl
+
+    if args.bulk_file:
+        if args.bulk_file == "-":
+            payloads = list(read_jsonl(sys.stdin))
+        else:
+            with open(args.bulk_file, encoding="utf-8") as f:
+                payloads = list(read_jsonl(f))
+    else:
+        pedidos = _create_pedidos(args, args.count)
+        payloads = [pedido_payload(p, usuario=args.usuario, senha=args.senha) for p in pedidos]
+        print(f"{len(pedidos)} pedidos criados na API")
+
+    for payload in payloads:
+        payload.setdefault("usuario", args.usuario)
+        payload.setdefault("senha", args.senha)
+        if payload.get("id_pedido") in (None, "", "None"):
+            raise ValueError(f"Payload sem id_pedido: {payload!r}")
+
+    # Um job por id_pedido (último payload vence); pedidos concluídos ou com job
+    # ativo no ledger não são enfileirados de novo
+    payloads = list({str(p["id_pedido"]): p for p in payloads}.values())
+    ledger = PedidoLedger(queue.connection)
+    claims = ledger.claim_enqueue_many(
+        [(p["id_pedido"], job_id_for(p["id_pedido"])) for p in payloads]
+    )
+    ignorados = sum(1 for c in claims if c != "ok")
+    payloads = [p for p, c in zip(payloads, claims) if c == "ok"]
+
+    res = admission.enqueue_bulk(
+        queue, "worker.process_pedido_task", payloads,
+        job_id_for=lambda p: job_id_for(p["id_pedido"]),
+    )
+    print(format_rate(len(res["jobs"]), res["segundos"]))
+    if ignorados:
+        print(f"  {ignorados} pedidos ignorados (já concluídos ou com job ativo)")
+    if res["recusados"]:
+        print(f"  Não enfileirados: {admission.summarize(res['recusados'])}")
+    print(f"  Fila: {args.queue}")
 
 
 def main():
@@ -50,9 +112,37 @@ def main():
         default=os.environ.get("RQ_QUEUE_PEDIDO_NAME", "pedido"),
         help="Nome da fila de pedidos",
     )
+    parser.add_argument(
+        "--coalesce-window",
+        type=float,
+        default=float(os.environ.get("PEDIDO_COALESCE_WINDOW", "0")),
+        help="Janela (s) para agrupar pedidos da mesma conta em um lote (0 = desativado)",
+    )
+    parser.add_argument(
+        "--bulk-file",
+        default="",
+        help="Arquivo JSONL com um payload de pedido por linha ('-' = stdin)",
+    )
+    parser.add_argument(
+        "--count", "-n",
+        type=int,
+        default=1,
+        help="Quantidade de pedidos a criar na API e enfileirar (modo em massa se > 1)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="POST /pedido simultâneos no modo em massa",
+    )
     args = parser.parse_args()
 
-    if not args.api_user or not args.api_password:
+    bulk = bool(args.bulk_file) or args.count > 1
+    if bulk and args.coalesce_window > 0:
+        print("Erro: --coalesce-window não se combina com o modo em massa.", file=sys.stderr)
+        sys.exit(1)
+
+    if not args.bulk_file and (not args.api_user or not args.api_password):
         print(
             "Erro: configure DESAFIO_API_USER e DESAFIO_API_PASSWORD "
             "(ou --api-user e --api-password).",
@@ -62,12 +152,21 @@ def main():
 
     try:
         from api_client import get_token, post_pedido
+        from queue_utils import pedido_payload
         from redis import Redis
         from rq import Queue
     except ImportError as e:
         print(f"Erro de dependência: {e}", file=sys.stderr)
         sys.exit(1)
 
+    if bulk:
+        try:
+            _enqueue_bulk(args, Queue(args.queue, connection=Redis.from_url(args.redis_url)))
+        except Exception as e:
+            print(f"Erro no enfileiramento em massa: {e}", file=sys.stderr)
+            sys.exit(1)
+        return
+
     # 1. Obter token e criar pedido aleatório na API
     try:
         token = get_token(username=args.api_user, password=args.api_password)
@@ -77,34 +176,41 @@ def main():
         sys.exit(1)
 
     id_pedido = pedido.get("id")
-    itens = pedido.get("itens") or []
     if id_pedido is None:
         print("Erro: API não retornou id do pedido.", file=sys.stderr)
         sys.exit(1)
 
     # 2. Montar payload para a fila (formato do desafio)
-    produtos = [
-        {"gtin": str(i.get("gtin", "")), "codigo": str(i.get("codigo", "")), "quantidade": i.get("quantidade", 1)}
-        for i in itens
-    ]
-    payload = {
-        "usuario": args.usuario,
-        "senha": args.senha,
-        "id_pedido": str(id_pedido),
-        "produtos": produtos,
-    }
+    payload = pedido_payload(pedido, usuario=args.usuario, senha=args.senha)
+    produtos = payload["produtos"]
 
     # 3. Enfileirar
     try:
         redis_conn = Redis.from_url(args.redis_url)
         queue = Queue(args.queue, connection=redis_conn)
-        job = queue.enqueue(
-            "worker.process_pedido_task",
-            payload,
-            job_timeout="600",
-        )
         print(f"Pedido criado na API: id={id_pedido}, itens={len(produtos)}")
-        print(f"Tarefa enfileirada. Job ID: {job.id}")
+        if args.coalesce_window > 0:
+            from pedido_batch import enqueue_pedido_coalescido
+
+            lote = enqueue_pedido_coalescido(queue, payload, janela=args.coalesce_window)
+            if lote.get("resultado") == "adiado":
+                print(f"Fila cheia ({lote['profundidade']} jobs); tente de novo em {lote['retry_after']}s.")
+            elif lote["agendado"]:
+                print(f"Novo lote agendado em {args.coalesce_window}s. Job ID: {lote['job_id']}")
+            else:
+                print("Pedido adicionado ao lote já agendado da conta.")
+        else:
+            from pedido_ledger import enqueue_pedido_idempotente
+
+            res = enqueue_pedido_idempotente(queue, payload)
+            if res["resultado"] == "ok":
+                print(f"Tarefa enfileirada. Job ID: {res['job_id']}")
+            elif res["resultado"] == "adiado":
+                print(f"Fila cheia ({res['profundidade']} jobs); tente de novo em {res['retry_after']}s.")
+            elif res["resultado"] == "duplicado":
+                print(f"Pedido {id_pedido} já tem job ativo ({res['job_id']}); nada enfileirado.")
+            else:
+                print(f"Pedido {id_pedido} já concluído (ledger); nada enfileirado.")
         print(f"  Fila: {args.queue}")
         print("Aguarde o worker processar (pedido no site + PATCH /pedido/:id).")
     except Exception as e:
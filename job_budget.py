@@ -0,0 +1,112 @@
+"""
+Orçamento de recursos por job (limites brandos com encerramento antecipado do crawl).
+
+Limites (todos opcionais):
+  max_pages    respostas baixadas
+  max_items    itens extraídos
+  max_rss_mb   memória residente do processo (MB)
+  max_seconds  tempo do job desde o início da execução (a espera em fila não conta)
+  max_bytes    bytes baixados (downloader/response_bytes)
+
+Origem: padrões por fila em JOB_BUDGET_DEFAULTS (JSON, ex.:
+'{"scraping": {"max_pages": 2000, "max_seconds": 540}}'; subfilas por conta usam
+a fila base) sobrescritos por payload["budget"].
+
+O worker ativa o orçamento do job (activate); os runners repassam os limites ao
+crawler (setting JOB_BUDGET, aplicado por JobBudgetExtension) com o tempo que
+resta do job. Ao estourar um limite o crawl é encerrado (finish_reason
+"budget_exceeded"), os itens já extraídos são mantidos e o limite atingido fica
+em JobBudget.exceeded.
+"""
+import contextvars
+import json
+import math
+import os
+import time
+from contextlib import contextmanager
+
+LIMITES = ("max_pages", "max_items", "max_rss_mb", "max_seconds", "max_bytes")
+CLOSE_REASON = "budget_exceeded"
+
+_current = contextvars.ContextVar("job_budget", default=None)
+
+
+def _validate(limites: dict, origem: str) -> dict:
+    desconhecidos = set(limites) - set(LIMITES)
+    if desconhecidos:
+        raise ValueError(f"{origem}: limites desconhecidos {sorted(desconhecidos)} (use {', '.join(LIMITES)})")
+    validos = {}
+    for nome, valor in limites.items():
+        if valor is None:
+            continue
+        valor = float(valor)
+        if valor <= 0:
+            raise ValueError(f"{origem}: {nome} deve ser > 0")
+        validos[nome] = valor
+    return validos
+
+
+def queue_defaults(queue_name: str | None) -> dict:
+    """Limites padrão da fila (JOB_BUDGET_DEFAULTS); a chave "*" vale para todas."""
+    raw = os.environ.get("JOB_BUDGET_DEFAULTS", "").strip()
+    if not raw:
+        return {}
+    defaults = json.loads(raw)
+    base = (queue_name or "").split(".")[0]
+    limites = dict(defaults.get("*") or {})
+    limites.update(defaults.get(base) or {})
+    return _validate(limites, "JOB_BUDGET_DEFAULTS")
+
+
+def resolve(payload: dict, queue_name: str | None = None) -> dict:
+    """Limites do job: padrões da fila + payload["budget"]."""
+    limites = queue_defaults(queue_name)
+    limites.update(_validate(payload.get("budget") or {}, "payload['budget']"))
+    return limites
+
+
+class JobBudget:
+    """Orçamento do job em execução e o primeiro limite atingido."""
+
+    def __init__(self, limites: dict, inicio: float | None = None):
+        self.limites = dict(limites)
+        self.inicio = time.time() if inicio is None else inicio
+        self.exceeded = None
+
+    def crawl_settings(self, crawlers: int = 1) -> dict:
+        """
+        Valor de JOB_BUDGET para um crawl: max_seconds vira prazo absoluto (deadline).
+        Com vários crawlers no job (um por conta), páginas, itens e bytes são divididos
+        igualmente; memória e prazo valem para o processo todo.
+        """
+        limites = {}
+        for nome, valor in self.limites.items():
+            if nome in ("max_pages", "max_items", "max_bytes"):
+                limites[nome] = math.ceil(valor / max(1, crawlers))
+            elif nome != "max_seconds":
+                limites[nome] = valor
+        if "max_seconds" in self.limites:
+            limites["deadline"] = self.inicio + self.limites["max_seconds"]
+        return limites
+
+    def record_crawl(self, crawler):
+        """Registra o limite atingido pelo crawl (stats de JobBudgetExtension)."""
+        stats = crawler.stats
+        limite = stats.get_value("job_budget/limit") if stats is not None else None
+        if limite and self.exceeded is None:
+            self.exceeded = limite
+
+
+@contextmanager
+def activate(limites: dict):
+    """Torna o orçamento o atual (lido pelos runners) durante o bloco."""
+    budget = JobBudget(limites)
+    token = _current.set(budget)
+    try:
+        yield budget
+    finally:
+        _current.reset(token)
+
+
+def current() -> JobBudget | None:
+    return _current.get()
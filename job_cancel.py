@@ -0,0 +1,164 @@
+"""
+Cancelamento cooperativo de jobs de scraping e desligamento gracioso do worker.
+
+Um job em execução é interrompido por uma flag no Redis (job:cancelar:<job_id>,
+valor = motivo), lida a cada JOB_CANCEL_CHECK_INTERVAL segundos pelo
+JobCancelExtension do crawl, que encerra o spider com close_spider (finish_reason
+"cancelled" ou "shutdown"). Os itens das páginas já processadas ficam no
+checkpoint do job (servimed_scraper.checkpoint) e o runner levanta JobInterrupted.
+
+Motivos:
+  shutdown   o worker recebeu SIGTERM (deploy, scale down): GracefulShutdownMixin
+             marca o job atual; o job é reenfileirado na frente da fila com o
+             mesmo checkpoint e continua de onde parou em outro worker.
+             SIGTERM entregue direto ao processo do job também encerra o crawl
+             (handler do Scrapy, finish_reason "shutdown").
+  cancelado  pedido do operador (python job_cancel.py cancel <job_id>): o job
+             termina sem enviar nada e fica retomável (resume <job_id>) enquanto
+             o checkpoint existir.
+"""
+import argparse
+import contextvars
+import os
+import signal
+from contextlib import contextmanager
+
+CANCEL_KEY = "job:cancelar:{job_id}"
+CANCEL_TTL = 86400
+DRAIN_SIGNAL = signal.SIGUSR1
+
+SHUTDOWN = "shutdown"
+CANCELADO = "cancelado"
+# finish_reason do Scrapy -> motivo
+CLOSE_REASONS = {"shutdown": SHUTDOWN, "cancelled": CANCELADO}
+
+_current = contextvars.ContextVar("job_cancel", default=None)
+
+
+class JobInterrupted(Exception):
+    """Crawl encerrado por cancelamento ou desligamento do worker."""
+
+    def __init__(self, motivo: str):
+        self.motivo = motivo
+        super().__init__(f"Crawl interrompido: {motivo}")
+
+
+def cancel_key(job_id: str) -> str:
+    return CANCEL_KEY.format(job_id=job_id)
+
+
+def request_cancel(conn, job_id: str, motivo: str = CANCELADO):
+    """Pede a interrupção do job (lida pelo crawl em até JOB_CANCEL_CHECK_INTERVAL s)."""
+    conn.set(cancel_key(job_id), motivo, ex=CANCEL_TTL)
+
+
+def requested(conn, job_id: str) -> str | None:
+    motivo = conn.get(cancel_key(job_id))
+    return motivo.decode() if isinstance(motivo, bytes) else motivo
+
+
+def clear(conn, job_id: str):
+    conn.delete(cancel_key(job_id))
+
+
+@contextmanager
+def activate(job_id: str):
+    """Torna a flag do job a atual (lida pelos runners) durante o bloco."""
+    token = _current.set(cancel_key(job_id))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def current() -> str | None:
+    """Chave da flag de cancelamento do job atual (None fora de um job)."""
+    return _current.get()
+
+
+def raise_if_interrupted(crawler):
+    """Crawl encerrado por cancelamento/SIGTERM: propaga como JobInterrupted."""
+    stats = crawler.stats
+    motivo = CLOSE_REASONS.get(stats.get_value("finish_reason")) if stats is not None else None
+    if motivo is not None:
+        raise JobInterrupted(motivo)
+
+
+class GracefulShutdownMixin:
+    """
+    Worker RQ: no SIGTERM (warm shutdown) marca o job em execução com o motivo
+    "shutdown"; o crawl fecha o spider, o job é reenfileirado e o worker sai sem
+    esperar o crawl inteiro. Um segundo SIGTERM continua sendo o cold shutdown do RQ.
+
+    DRAIN_SIGNAL (SIGUSR1) é a saída por dreno (redução do pool pelo supervisor,
+    worker_supervisor.py): o worker termina o job atual sem interrompê-lo e sai.
+    Um SIGTERM durante o dreno interrompe o job como no warm shutdown.
+    """
+    _drenando = False
+
+    def _install_signal_handlers(self):
+        super()._install_signal_handlers()
+        signal.signal(DRAIN_SIGNAL, self.request_drain)
+
+    def setup_work_horse_signals(self):
+        super().setup_work_horse_signals()
+        signal.signal(DRAIN_SIGNAL, signal.SIG_IGN)
+
+    def request_drain(self, signum, frame):
+        self.log.info("Worker %s: dreno pedido, saindo ao fim do job atual", self.name)
+        self._drenando = True
+        self.request_stop(signum, frame)
+        signal.signal(signal.SIGTERM, self.interrupt_drain)
+
+    def interrupt_drain(self, signum, frame):
+        signal.signal(signal.SIGTERM, self.request_force_stop)
+        self._interrupt_current_job()
+
+    def handle_warm_shutdown_request(self):
+        super().handle_warm_shutdown_request()
+        if not self._drenando:
+            self._interrupt_current_job()
+
+    def _interrupt_current_job(self):
+        job_id = self.get_current_job_id()
+        if job_id:
+            self.log.info("Worker %s: interrompendo o job %s para desligar", self.name, job_id)
+            request_cancel(self.connection, job_id, SHUTDOWN)
+
+
+def resume(conn, job_id: str):
+    """Reenfileira um job cancelado com o mesmo checkpoint. Retorna o job novo."""
+    from rq import Queue
+    from rq.job import Job
+
+    job = Job.fetch(job_id, connection=conn)
+    novo = Queue(job.origin, connection=conn).enqueue(
+        job.func_name,
+        *job.args,
+        job_timeout=job.timeout,
+        meta={"checkpoint_key": job.meta.get("checkpoint_key", job.id)},
+        **job.kwargs,
+    )
+    clear(conn, job_id)
+    return novo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cancela ou retoma jobs de scraping")
+    parser.add_argument("acao", choices=["cancel", "resume"])
+    parser.add_argument("job_id")
+    parser.add_argument("--redis-url", default=os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+    args = parser.parse_args()
+
+    from redis import Redis
+
+    conn = Redis.from_url(args.redis_url)
+    if args.acao == "cancel":
+        request_cancel(conn, args.job_id)
+        print(f"Cancelamento pedido para o job {args.job_id}")
+    else:
+        print(f"Job {args.job_id} retomado como {resume(conn, args.job_id).id}")
+
+
+if __name__ == "__main__":
+    main()
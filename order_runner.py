@@ -1,10 +1,18 @@
 """
 Executa o spider de pedido e retorna o resultado (codigo_confirmacao, status).
 Usado pelo worker Nível 3 para simular envio do pedido no site e obter código Servimed.
+run_orders executa um lote de pedidos da mesma conta com um único login.
 """
 from scrapy.crawler import CrawlerProcess
 from scrapy.utils.project import get_project_settings
 
+import crawl_stats
+import tracing
+from servimed_scraper.pipelines import SharedList
+
+# Pedido do lote sem confirmação do spider (ex.: login falhou): não foi feito no site
+NAO_CONFIRMADO = "nao_confirmado"
+
 
 def run_order(
     usuario: str,
@@ -26,30 +34,85 @@ def run_order(
     Returns:
         {"codigo_confirmacao": str, "status": str}, ex.: "pedido_realizado".
     """
-    result_container: list[dict] = []
+    resultado = run_orders(
+        usuario=usuario,
+        senha=senha,
+        pedidos=[{"id_pedido": id_pedido, "produtos": produtos}],
+        login_url=login_url,
+        fallback=True,
+    )[0]
+    return {
+        "codigo_confirmacao": resultado["codigo_confirmacao"],
+        "status": resultado["status"],
+    }
+
+
+def run_orders(
+    usuario: str,
+    senha: str,
+    pedidos: list[dict],
+    login_url: str | None = None,
+    concorrencia: int = 1,
+    fallback: bool = False,
+) -> list[dict]:
+    """
+    Executa vários pedidos da mesma conta com um único login no site.
+
+    Args:
+        usuario: Login no site Servimed.
+        senha: Senha no site Servimed.
+        pedidos: Lista de dicts {"id_pedido": str, "produtos": [...]}.
+        login_url: URL de login (opcional; padrão do spider).
+        concorrencia: Máximo de pedidos submetidos em paralelo na sessão.
+        fallback: Pedido sem resultado do spider recebe o código simulado
+            SERV-<id> e "pedido_realizado" (comportamento de run_order). Sem
+            fallback, recebe codigo_confirmacao None e status NAO_CONFIRMADO.
+
+    Returns:
+        Um dict por pedido, na ordem de entrada:
+        {"id_pedido": str, "codigo_confirmacao": str | None, "status": str}.
+    """
+    result_container: list[dict] = SharedList()
 
     settings = get_project_settings()
     settings.set("LOG_LEVEL", "WARNING")
     settings.set("ORDER_RESULT_CONTAINER", result_container)
+    settings.set("TRACE_PARENT", tracing.current_traceparent())
     settings.set("ITEM_PIPELINES", {
         "servimed_scraper.pipelines.CollectOrderResultPipeline": 100,
     })
 
     process = CrawlerProcess(settings)
+    crawler = process.create_crawler("order")
     process.crawl(
-        "order",
+        crawler,
         user=usuario,
         password=senha,
-        id_pedido=id_pedido,
-        produtos=produtos,
+        pedidos=pedidos,
+        concorrencia=concorrencia,
         login_url=login_url,
     )
     process.start()
+    crawl_stats.record_crawl(crawler, conta=usuario)
 
-    if result_container:
-        return result_container[0]
-    # Fallback se o spider não yieldar (ex.: erro antes da confirmação)
-    return {
-        "codigo_confirmacao": f"SERV-{id_pedido}" if id_pedido else "SERV-UNKNOWN",
-        "status": "pedido_realizado",
-    }
+    por_id = {str(r.get("id_pedido") or ""): r for r in result_container}
+    resultados = []
+    for pedido in pedidos:
+        id_pedido = str(pedido.get("id_pedido") or "")
+        r = por_id.get(id_pedido)
+        if r is None and len(pedidos) == 1 and result_container:
+            r = result_container[0]
+        if r is None and fallback:
+            # Fallback se o spider não yieldar (ex.: erro antes da confirmação)
+            r = {
+                "codigo_confirmacao": f"SERV-{id_pedido}" if id_pedido else "SERV-UNKNOWN",
+                "status": "pedido_realizado",
+            }
+        elif r is None:
+            r = {"codigo_confirmacao": None, "status": NAO_CONFIRMADO}
+        resultados.append({
+            "id_pedido": id_pedido,
+            "codigo_confirmacao": r["codigo_confirmacao"],
+            "status": r["status"],
+        })
+    return resultados
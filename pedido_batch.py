@@ -0,0 +1,108 @@
+"""
+Agrupamento (coalescência) de tarefas de pedido da mesma conta do fornecedor.
+
+Em vez de enfileirar um job por pedido, os payloads são acumulados em uma lista
+Redis por conta durante uma janela curta. O primeiro pedido da janela agenda
+(enqueue_in) o job worker.flush_pedido_batch, que retira todos os pedidos
+acumulados e os processa em lote, com um único login no site.
+
+O flush move a lista para pedido:lote:<conta>:processando:<job_id> (atômico) e
+só a apaga depois do lote processado: se o job falhar, os pedidos continuam lá e
+a retentativa do mesmo job (FLUSH_RETRY_INTERVALS) os processa de novo; o ledger evita
+refazer no site os que já foram submetidos.
+
+O agendamento usa o scheduler do RQ: o worker precisa rodar com scheduler
+(run_worker.py já inicia com with_scheduler=True).
+"""
+import json
+from datetime import timedelta
+
+BATCH_KEY = "pedido:lote:{conta}"
+SCHEDULED_KEY = "pedido:lote:{conta}:agendado"
+PROCESSING_KEY = "pedido:lote:{conta}:processando:{job_id}"
+FLUSH_RETRY_INTERVALS = [30, 120, 600]
+
+# KEYS: lote, agendado, processando. Uma retentativa do flush (processando já
+# existe) reprocessa a mesma lista e não mexe na janela atual da conta.
+TAKE_LUA = """
+if redis.call('EXISTS', KEYS[3]) == 0 then
+    if redis.call('EXISTS', KEYS[1]) == 1 then
+        redis.call('RENAME', KEYS[1], KEYS[3])
+    end
+    redis.call('DEL', KEYS[2])
+end
+return redis.call('LRANGE', KEYS[3], 0, -1)
+"""
+
+
+def batch_key(conta: str) -> str:
+    return BATCH_KEY.format(conta=conta)
+
+
+def scheduled_key(conta: str) -> str:
+    return SCHEDULED_KEY.format(conta=conta)
+
+
+def processing_key(conta: str, job_id: str) -> str:
+    return PROCESSING_KEY.format(conta=conta, job_id=job_id)
+
+
+def enqueue_pedido_coalescido(queue, payload: dict, janela: float = 5.0, job_timeout: str = "600") -> dict:
+    """
+    Acumula o payload de pedido no lote da conta e agenda o flush se necessário.
+
+    queue: rq.Queue de pedidos (a conexão Redis é a da fila).
+    payload: {"usuario", "senha", "id_pedido", "produtos"}.
+    janela: segundos entre o primeiro pedido do lote e o processamento.
+
+    Retorna {"conta": ..., "agendado": bool, "job_id": str | None}; job_id só é
+    preenchido quando este pedido abriu uma nova janela. Com a fila cheia
+    (admission.py), nada é acumulado e o resultado "adiado" da admissão é retornado.
+    """
+    from rq import Retry
+
+    from admission import QueueAdmission
+
+    conta = payload.get("usuario") or payload.get("user")
+    if not conta:
+        raise ValueError("Payload deve conter 'usuario' e 'senha'")
+
+    admission = QueueAdmission(queue)
+    if admission.capacity() == 0:
+        return admission.admit()
+
+    conn = queue.connection
+    # A marca de agendamento expira sozinha caso o flush nunca rode (worker sem scheduler)
+    ttl = max(int(janela * 10), 60)
+    pipe = conn.pipeline()
+    pipe.rpush(batch_key(conta), json.dumps(payload))
+    pipe.set(scheduled_key(conta), "1", nx=True, ex=ttl)
+    _, nova_janela = pipe.execute()
+
+    job_id = None
+    if nova_janela:
+        job = queue.enqueue_in(
+            timedelta(seconds=janela),
+            "worker.flush_pedido_batch",
+            conta,
+            job_timeout=job_timeout,
+            retry=Retry(max=len(FLUSH_RETRY_INTERVALS), interval=FLUSH_RETRY_INTERVALS),
+        )
+        job_id = job.id
+    return {"conta": conta, "agendado": bool(nova_janela), "job_id": job_id}
+
+
+def take_batch(conn, conta: str, job_id: str) -> list[dict]:
+    """
+    Move atomicamente os pedidos acumulados da conta para a lista de processamento
+    do flush job_id e libera a janela; na retentativa do mesmo job, devolve a mesma
+    lista. Pedidos que chegarem depois abrem uma nova janela (novo flush agendado).
+    """
+    keys = [batch_key(conta), scheduled_key(conta), processing_key(conta, job_id)]
+    raw = conn.eval(TAKE_LUA, len(keys), *keys)
+    return [json.loads(r) for r in raw]
+
+
+def ack_batch(conn, conta: str, job_id: str):
+    """Lote do flush job_id processado: apaga a lista de processamento."""
+    conn.delete(processing_key(conta, job_id))
@@ -0,0 +1,163 @@
+"""
+Ledger de submissão de pedidos no Redis (processamento idempotente por id_pedido).
+
+Cada pedido tem um hash pedido:ledger:<id> com a etapa concluída:
+  submetido  pedido realizado no site (codigo_confirmacao e status gravados)
+  concluido  PATCH /pedido/:id enviado à API
+
+Uma retentativa do job pula as etapas já feitas (nunca refaz o pedido no site
+depois de "submetido"). O enfileiramento consulta o ledger e não cria um segundo
+job enquanto o anterior do mesmo pedido ainda estiver na fila ou em execução.
+Durante o processamento, uma trava por pedido impede dois workers de submeterem
+o mesmo pedido ao mesmo tempo. A trava é reentrante para o mesmo dono (o id do
+job): a retentativa do job antes de a trava expirar a renova em vez de desistir.
+"""
+import time
+
+import tracing
+
+LEDGER_KEY = "pedido:ledger:{id}"
+LOCK_KEY = "pedido:ledger:{id}:trava"
+JOB_KEY_PREFIX = "rq:job:"
+
+SUBMETIDO = "submetido"
+CONCLUIDO = "concluido"
+
+# KEYS[1] = ledger; ARGV = job_id, prefixo das chaves de job RQ, ttl, agora.
+# Retorna 'ok', 'duplicado' (job anterior ativo) ou 'concluido'.
+CLAIM_ENQUEUE_LUA = """
+if redis.call('HGET', KEYS[1], 'etapa') == 'concluido' then
+  return 'concluido'
+end
+local anterior = redis.call('HGET', KEYS[1], 'job_id')
+if anterior then
+  local st = redis.call('HGET', ARGV[2] .. anterior, 'status')
+  if st == 'queued' or st == 'started' or st == 'scheduled' or st == 'deferred' then
+    return 'duplicado'
+  end
+end
+redis.call('HSET', KEYS[1], 'job_id', ARGV[1], 'enfileirado_em', ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 'ok'
+"""
+
+# KEYS[1] = trava; ARGV[1] = dono, ARGV[2] = ttl. Renova se já for do dono,
+# senão tenta criá-la. Retorna 1 se a trava é do dono.
+LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  redis.call('EXPIRE', KEYS[1], ARGV[2])
+  return 1
+end
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2]) then
+  return 1
+end
+return 0
+"""
+
+# KEYS[1] = trava; ARGV[1] = dono. Libera só se ainda for do mesmo dono.
+UNLOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class PedidoEmProcessamento(Exception):
+    """Trava do pedido com outro dono: outro job está processando o pedido."""
+
+    retry_after = 0.0
+
+    def __init__(self, id_pedido):
+        self.id_pedido = id_pedido
+        super().__init__(f"Pedido {id_pedido} em processamento por outro job")
+
+
+def job_id_for(id_pedido) -> str:
+    """Id determinístico do job de pedido (o mesmo pedido nunca tem dois jobs ativos)."""
+    return f"pedido-{id_pedido}"
+
+
+class PedidoLedger:
+    """Etapas de submissão por id_pedido, guardadas por ttl_seconds (padrão: 30 dias)."""
+
+    def __init__(self, conn, ttl_seconds: int = 30 * 86400):
+        self.conn = conn
+        self.ttl_seconds = ttl_seconds
+        self._claim = conn.register_script(CLAIM_ENQUEUE_LUA)
+        self._lock = conn.register_script(LOCK_LUA)
+        self._unlock = conn.register_script(UNLOCK_LUA)
+
+    def get(self, id_pedido) -> dict:
+        raw = self.conn.hgetall(LEDGER_KEY.format(id=id_pedido))
+        return {k.decode(): v.decode() for k, v in raw.items()}
+
+    def claim_enqueue(self, id_pedido, job_id: str) -> str:
+        """Reserva o enfileiramento do pedido: 'ok', 'duplicado' ou 'concluido'."""
+        return self.claim_enqueue_many([(id_pedido, job_id)])[0]
+
+    def claim_enqueue_many(self, pedidos) -> list[str]:
+        """claim_enqueue de vários (id_pedido, job_id) em um único pipeline."""
+        pipe = self.conn.pipeline(transaction=False)
+        agora = time.time()
+        for id_pedido, job_id in pedidos:
+            self._claim(
+                keys=[LEDGER_KEY.format(id=id_pedido)],
+                args=[job_id, JOB_KEY_PREFIX, self.ttl_seconds, agora],
+                client=pipe,
+            )
+        return [r.decode() if isinstance(r, bytes) else r for r in pipe.execute()]
+
+    def lock(self, id_pedido, owner: str, ttl_seconds: int) -> bool:
+        """Trava (ou renova, se já for de owner) o pedido; False se outro dono a tiver."""
+        return bool(self._lock(keys=[LOCK_KEY.format(id=id_pedido)], args=[owner, ttl_seconds]))
+
+    def unlock(self, id_pedido, owner: str):
+        self._unlock(keys=[LOCK_KEY.format(id=id_pedido)], args=[owner])
+
+    def record_submitted(self, id_pedido, codigo_confirmacao: str, status: str):
+        self._record(id_pedido, {
+            "etapa": SUBMETIDO,
+            "codigo_confirmacao": codigo_confirmacao,
+            "status": status,
+            "submetido_em": time.time(),
+        })
+
+    def record_patched(self, id_pedido):
+        self._record(id_pedido, {"etapa": CONCLUIDO, "concluido_em": time.time()})
+
+    def _record(self, id_pedido, campos: dict):
+        key = LEDGER_KEY.format(id=id_pedido)
+        pipe = self.conn.pipeline(transaction=True)
+        pipe.hset(key, mapping=campos)
+        pipe.expire(key, self.ttl_seconds)
+        pipe.execute()
+
+
+def enqueue_pedido_idempotente(queue, payload: dict, job_timeout: str = "600") -> dict:
+    """
+    Enfileira worker.process_pedido_task para o pedido, salvo se ele já estiver
+    concluído ou com um job ativo, ou se a fila estiver cheia (admission.py).
+    Retorna {"resultado": "ok"|"duplicado"|"concluido", "job_id": ...} ou o
+    resultado "adiado" da admissão.
+    """
+    from admission import ADMITIDO, QueueAdmission
+
+    id_pedido = str(payload["id_pedido"])
+    job_id = job_id_for(id_pedido)
+    admission = QueueAdmission(queue)
+    admitido = admission.admit(job_id=job_id)
+    if admitido["resultado"] != ADMITIDO:
+        return admitido
+    resultado = PedidoLedger(queue.connection).claim_enqueue(id_pedido, job_id)
+    if resultado == "ok":
+        span = tracing.inject(payload, "enqueue worker.process_pedido_task")
+        queue.enqueue(
+            "worker.process_pedido_task",
+            payload,
+            job_id=job_id,
+            job_timeout=job_timeout,
+            ttl=admission.ttl,
+        )
+        span.finish()
+    return {"resultado": resultado, "job_id": job_id}
@@ -0,0 +1,176 @@
+"""
+Sincronização de pedidos pendentes (GET /pedido) com a fila de pedidos.
+
+O daemon consulta a API periodicamente, considera apenas pedidos com id acima do
+cursor salvo no Redis e enfileira cada pedido pendente (sem status e sem
+codigo_fornecedor). A deduplicação é a do ledger (pedido_ledger.py): o job tem id
+pedido-<id> e não é criado de novo enquanto o anterior estiver ativo ou o pedido
+estiver concluído. Jobs e avanço do cursor são gravados em um único pipeline
+transacional (MULTI/EXEC). Se a página não couber na fila (max_depth de
+admission.py), o ciclo para sem avançar o cursor.
+
+A cada rescan_interval segundos um ciclo relê os pendentes desde o início: pedidos
+cujo job falhou ou expirou sem concluir voltam para a fila.
+
+O intervalo de consulta é adaptativo: volta ao mínimo quando há pedidos novos e
+dobra a cada ciclo vazio (ou com erro) até o máximo.
+"""
+import logging
+import time
+
+import requests
+from rq import Queue
+
+from admission import QueueAdmission
+from api_client import get_token, list_pedidos
+from pedido_ledger import PedidoLedger, job_id_for
+from queue_utils import is_pedido_pendente, pedido_payload
+
+logger = logging.getLogger(__name__)
+
+CURSOR_KEY = "pedido_sync:cursor"
+
+
+class PedidoSync:
+    """
+    Consulta GET /pedido de forma incremental e enfileira pedidos pendentes.
+
+    queue: rq.Queue de pedidos (a conexão Redis guarda cursor e ledger).
+    usuario/senha: credenciais do fornecedor usadas no payload das tarefas.
+    api_user/api_password: credenciais da API do desafio (oauth/token).
+    """
+
+    def __init__(
+        self,
+        queue: Queue,
+        usuario: str,
+        senha: str,
+        api_user: str,
+        api_password: str,
+        base_url: str | None = None,
+        page_size: int = 100,
+        min_interval: float = 2.0,
+        max_interval: float = 60.0,
+        job_timeout: int = 600,
+        rescan_interval: float = 300.0,
+    ):
+        self.queue = queue
+        self.conn = queue.connection
+        self.usuario = usuario
+        self.senha = senha
+        self.api_user = api_user
+        self.api_password = api_password
+        self.base_url = base_url
+        self.page_size = page_size
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.job_timeout = job_timeout
+        self.rescan_interval = rescan_interval
+        self.interval = min_interval
+        self.admission = QueueAdmission(queue)
+        self.ledger = PedidoLedger(self.conn)
+        self._ultimo_rescan = time.monotonic()
+        self._token = None
+
+    def get_cursor(self) -> int:
+        return int(self.conn.get(CURSOR_KEY) or 0)
+
+    def _list_page(self, after_id: int) -> list[dict]:
+        """Uma página de pedidos após o cursor; renova o token uma vez em caso de 401."""
+        for tentativa in range(2):
+            if self._token is None:
+                self._token = get_token(self.api_user, self.api_password, base_url=self.base_url)
+            try:
+                return list_pedidos(
+                    self._token,
+                    base_url=self.base_url,
+                    after_id=after_id,
+                    pendente=True,
+                    limit=self.page_size,
+                )
+            except requests.HTTPError as e:
+                if tentativa == 0 and e.response is not None and e.response.status_code == 401:
+                    self._token = None
+                    continue
+                raise
+        return []
+
+    def sync_once(self, desde: int | None = None) -> int:
+        """
+        Executa um ciclo de sincronização a partir do cursor salvo (ou de desde, no
+        rescan; o cursor salvo nunca recua). Retorna quantos pedidos foram enfileirados.
+        """
+        salvo = self.get_cursor()
+        cursor = salvo if desde is None else desde
+        total = 0
+        while True:
+            page = self._list_page(cursor)
+            # A API pode ignorar os filtros: o cursor é aplicado também no cliente
+            novos = sorted(
+                (p for p in page if p.get("id") is not None and int(p["id"]) > cursor),
+                key=lambda p: int(p["id"]),
+            )
+            if not novos:
+                break
+
+            pendentes = [p for p in novos if is_pedido_pendente(p)]
+            # Uma reserva sem job (fila cheia abaixo) aponta para um job inexistente
+            # e é liberada no próximo claim
+            claims = self.ledger.claim_enqueue_many([(p["id"], job_id_for(p["id"])) for p in pendentes])
+            a_enfileirar = [p for p, c in zip(pendentes, claims) if c == "ok"]
+            vagas = self.admission.capacity()
+            if vagas is not None and len(a_enfileirar) > vagas:
+                # Fila cheia: o cursor não avança, a página é relida no próximo ciclo
+                logger.warning("Sincronização adiada: fila cheia (%d vagas, %d pedidos)", vagas, len(a_enfileirar))
+                break
+
+            novo_cursor = int(novos[-1]["id"])
+            pipe = self.conn.pipeline(transaction=True)
+            if a_enfileirar:
+                self.queue.enqueue_many(
+                    [
+                        Queue.prepare_data(
+                            "worker.process_pedido_task",
+                            args=(pedido_payload(p, usuario=self.usuario, senha=self.senha),),
+                            timeout=self.job_timeout,
+                            ttl=self.admission.ttl,
+                            job_id=job_id_for(p["id"]),
+                        )
+                        for p in a_enfileirar
+                    ],
+                    pipeline=pipe,
+                )
+            pipe.set(CURSOR_KEY, max(novo_cursor, salvo))
+            pipe.execute()
+
+            total += len(a_enfileirar)
+            cursor = novo_cursor
+            if len(page) < self.page_size:
+                break
+
+        if total:
+            logger.info("Sincronização: %d pedidos enfileirados (cursor=%d)", total, cursor)
+        return total
+
+    def next_interval(self, enfileirados: int) -> float:
+        """Intervalo adaptativo: mínimo com atividade, dobra (até o máximo) sem atividade."""
+        if enfileirados:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+        return self.interval
+
+    def run(self, max_cycles: int | None = None):
+        """Laço do daemon; max_cycles limita os ciclos (útil em testes)."""
+        ciclos = 0
+        while max_cycles is None or ciclos < max_cycles:
+            ciclos += 1
+            desde = None
+            if self.rescan_interval and time.monotonic() - self._ultimo_rescan >= self.rescan_interval:
+                desde, self._ultimo_rescan = 0, time.monotonic()
+            try:
+                enfileirados = self.sync_once(desde)
+            except Exception:
+                logger.exception("Falha na sincronização de pedidos")
+                enfileirados = 0
+            time.sleep(self.next_interval(enfileirados))
@@ -0,0 +1,89 @@
+"""
+Utilitários compartilhados pelos pontos de enfileiramento (scripts enqueue_* e daemons).
+O controle de admissão (profundidade, deduplicação, ttl) fica em admission.py.
+"""
+import json
+import time
+
+import tracing
+
+
+def pedido_payload(pedido: dict, usuario: str, senha: str) -> dict:
+    """Monta o payload da tarefa de pedido (formato do desafio) a partir do Pedido da API."""
+    itens = pedido.get("itens") or []
+    produtos = [
+        {"gtin": str(i.get("gtin", "")), "codigo": str(i.get("codigo", "")), "quantidade": i.get("quantidade", 1)}
+        for i in itens
+    ]
+    return {
+        "usuario": usuario,
+        "senha": senha,
+        "id_pedido": str(pedido.get("id")),
+        "produtos": produtos,
+    }
+
+
+def is_pedido_pendente(pedido: dict) -> bool:
+    """Pedido ainda não realizado no fornecedor (sem status e sem codigo_fornecedor)."""
+    return not pedido.get("status") and not pedido.get("codigo_fornecedor")
+
+
+def read_jsonl(stream):
+    """Lê payloads JSONL (um objeto por linha; linhas vazias ignoradas)."""
+    for n, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Linha {n} não é JSON válido: {e}") from e
+
+
+def enqueue_bulk(
+    queue, func: str, payloads, job_timeout: int = 600, queue_for=None, job_id_for=None, ttl=None,
+) -> tuple[list, float]:
+    """
+    Enfileira todos os payloads em um único pipeline Redis (Queue.enqueue_many).
+    queue_for: callable opcional payload -> Queue (ex.: subfila por conta); padrão `queue`.
+    job_id_for: callable opcional payload -> id do job (padrão: id aleatório do RQ).
+    ttl: tempo máximo (s) do job na fila antes de ser descartado (padrão: sem limite).
+    Cada payload recebe um traceparent (tracing.inject) com o span do enfileiramento.
+    Retorna (jobs, segundos gastos no enfileiramento).
+    """
+    from rq import Queue
+
+    inicio = time.perf_counter()
+    por_fila: dict[str, tuple] = {}
+    spans = []
+    for payload in payloads:
+        spans.append(tracing.inject(payload, f"enqueue {func}"))
+        fila = queue_for(payload) if queue_for else queue
+        por_fila.setdefault(fila.name, (fila, []))[1].append(payload)
+
+    pipe = queue.connection.pipeline()
+    jobs = []
+    for fila, lote in por_fila.values():
+        jobs.extend(fila.enqueue_many(
+            [
+                Queue.prepare_data(
+                    func,
+                    args=(payload,),
+                    timeout=job_timeout,
+                    ttl=ttl,
+                    job_id=job_id_for(payload) if job_id_for else None,
+                )
+                for payload in lote
+            ],
+            pipeline=pipe,
+        ))
+    pipe.execute()
+    for s in spans:
+        s.finish()
+    return jobs, time.perf_counter() - inicio
+
+
+def format_rate(n: int, segundos: float) -> str:
+    """Resumo legível da taxa de enfileiramento."""
+    taxa = n / segundos if segundos > 0 else float("inf")
+    return f"{n} tarefas enfileiradas em {segundos:.3f}s ({taxa:.0f} jobs/s)"
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Daemon do dispatcher de callbacks de pedido (callback_dispatcher.py).
+Execute a partir da raiz do projeto. Requer Redis em execução e os workers com
+CALLBACK_DISPATCHER=1 (senão os jobs fazem o PATCH diretamente).
+
+  python run_callback_dispatcher.py
+  python run_callback_dispatcher.py --concurrency 16 --batch-size 200
+
+Credenciais da API: DESAFIO_API_USER e DESAFIO_API_PASSWORD.
+"""
+import argparse
+import logging
+import os
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Envia em lote os callbacks PATCH /pedido/:id pendentes")
+    parser.add_argument("--redis-url", default=os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+    parser.add_argument(
+        "--concurrency", type=int,
+        default=int(os.environ.get("CALLBACK_CONCURRENCY", "8")),
+        help="PATCH simultâneos (tamanho do pool de conexões)",
+    )
+    parser.add_argument(
+        "--batch-size", type=int,
+        default=int(os.environ.get("CALLBACK_BATCH_SIZE", "100")),
+        help="Callbacks retirados por lote",
+    )
+    parser.add_argument(
+        "--max-attempts", type=int,
+        default=int(os.environ.get("CALLBACK_MAX_ATTEMPTS", "8")),
+        help="Tentativas por callback antes de ir para callbacks:falhas",
+    )
+    parser.add_argument("--lease", type=float, default=120.0, help="Tempo até um callback em envio ser retomado (s)")
+    parser.add_argument("--idle", type=float, default=0.5, help="Espera sem callbacks pendentes (s)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    logging.basicConfig(level=logging.INFO)
+
+    api_user = os.environ.get("DESAFIO_API_USER")
+    api_password = os.environ.get("DESAFIO_API_PASSWORD")
+    if not api_user or not api_password:
+        parser.error("Configure DESAFIO_API_USER e DESAFIO_API_PASSWORD")
+
+    from redis import Redis
+
+    from callback_dispatcher import CallbackDispatcher
+
+    dispatcher = CallbackDispatcher(
+        Redis.from_url(args.redis_url),
+        api_user,
+        api_password,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        lease=args.lease,
+        max_attempts=args.max_attempts,
+    )
+    try:
+        dispatcher.run(idle_interval=args.idle)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
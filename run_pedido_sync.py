@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Daemon de sincronização de pedidos pendentes (GET /pedido -> fila de pedidos).
+Execute a partir da raiz do projeto. Requer Redis em execução.
+
+  python run_pedido_sync.py
+  python run_pedido_sync.py --min-interval 1 --max-interval 30 --page-size 200
+"""
+import argparse
+import logging
+import os
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Consulta pedidos pendentes na API e enfileira cada um (deduplicado pelo ledger)"
+    )
+    parser.add_argument(
+        "--usuario", "-u",
+        default=os.environ.get("SERVIMED_USER", "juliano@farmaprevonline.com.br"),
+        help="Usuário para login no site do fornecedor (Servimed)",
+    )
+    parser.add_argument(
+        "--senha", "-p",
+        default=os.environ.get("SERVIMED_PASSWORD", "a007299A"),
+        help="Senha para login no site do fornecedor",
+    )
+    parser.add_argument("--api-user", default=os.environ.get("DESAFIO_API_USER"))
+    parser.add_argument("--api-password", default=os.environ.get("DESAFIO_API_PASSWORD"))
+    parser.add_argument("--redis-url", default=os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+    parser.add_argument("--queue", default=os.environ.get("RQ_QUEUE_PEDIDO_NAME", "pedido"))
+    parser.add_argument("--page-size", type=int, default=100, help="Pedidos por página do GET /pedido")
+    parser.add_argument("--min-interval", type=float, default=2.0, help="Intervalo mínimo entre ciclos (s)")
+    parser.add_argument("--max-interval", type=float, default=60.0, help="Intervalo máximo entre ciclos (s)")
+    parser.add_argument(
+        "--rescan-interval", type=float, default=300.0,
+        help="A cada quantos segundos reler os pendentes desde o início (0 desativa)",
+    )
+    args = parser.parse_args()
+
+    if not args.api_user or not args.api_password:
+        print(
+            "Erro: configure DESAFIO_API_USER e DESAFIO_API_PASSWORD "
+            "(ou --api-user e --api-password).",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    logging.basicConfig(level=logging.INFO)
+
+    from redis import Redis
+    from rq import Queue
+
+    from pedido_sync import PedidoSync
+
+    queue = Queue(args.queue, connection=Redis.from_url(args.redis_url))
+    sync = PedidoSync(
+        queue,
+        usuario=args.usuario,
+        senha=args.senha,
+        api_user=args.api_user,
+        api_password=args.api_password,
+        page_size=args.page_size,
+        min_interval=args.min_interval,
+        max_interval=args.max_interval,
+        rescan_interval=args.rescan_interval,
+    )
+    try:
+        sync.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
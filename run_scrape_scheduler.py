@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Daemon do agendador de scraping por desatualização (scrape_scheduler.py).
+Execute a partir da raiz do projeto. Requer Redis em execução e o worker rodando.
+
+  python run_scrape_scheduler.py --accounts contas.jsonl
+  python run_scrape_scheduler.py --accounts contas.jsonl --min-interval 600 --max-interval 43200 --fair
+
+contas.jsonl: um {"usuario", "senha"} por linha, com "min_interval", "max_interval"
+(s) e "budget" opcionais por conta. O arquivo é relido quando muda.
+"""
+import argparse
+import logging
+import os
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Enfileira o scraping de cada conta conforme a frequência de mudança do catálogo"
+    )
+    parser.add_argument("--accounts", required=True, help="Arquivo JSONL com as contas do fornecedor")
+    parser.add_argument("--redis-url", default=os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+    parser.add_argument("--queue", default=os.environ.get("RQ_QUEUE_NAME", "scraping"))
+    parser.add_argument(
+        "--min-interval", type=float,
+        default=float(os.environ.get("SCRAPE_MIN_INTERVAL", "900")),
+        help="Intervalo mínimo entre crawls da mesma conta (s)",
+    )
+    parser.add_argument(
+        "--max-interval", type=float,
+        default=float(os.environ.get("SCRAPE_MAX_INTERVAL", "86400")),
+        help="Intervalo máximo entre crawls da mesma conta (s)",
+    )
+    parser.add_argument("--max-per-cycle", type=int, default=50, help="Máximo de jobs enfileirados por ciclo")
+    parser.add_argument("--cycle", type=float, default=10.0, help="Intervalo entre ciclos do agendador (s)")
+    parser.add_argument(
+        "--fair",
+        action="store_true",
+        default=os.environ.get("RQ_FAIR_SCRAPING", "0") == "1",
+        help="Enfileira na subfila da conta (round-robin entre contas no FairWorker)",
+    )
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    logging.basicConfig(level=logging.INFO)
+
+    from redis import Redis
+    from rq import Queue
+
+    from queue_utils import read_jsonl
+    from scheduling import fair_queue
+    from scrape_scheduler import ScrapeScheduler
+
+    def carregar():
+        with open(args.accounts, encoding="utf-8") as f:
+            return list(read_jsonl(f))
+
+    queue = Queue(args.queue, connection=Redis.from_url(args.redis_url))
+    scheduler = ScrapeScheduler(
+        queue,
+        carregar(),
+        min_interval=args.min_interval,
+        max_interval=args.max_interval,
+        max_per_cycle=args.max_per_cycle,
+        queue_for=(lambda p: fair_queue(queue.connection, args.queue, p["usuario"])) if args.fair else None,
+    )
+    mtime = os.stat(args.accounts).st_mtime_ns
+    try:
+        while True:
+            atual = os.stat(args.accounts).st_mtime_ns
+            if atual != mtime:
+                try:
+                    scheduler.set_contas(carregar())
+                    mtime = atual
+                except (OSError, ValueError) as e:
+                    logging.warning("Arquivo de contas inválido, mantendo as contas atuais: %s", e)
+            scheduler.run(interval=args.cycle, max_cycles=1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -5,11 +5,35 @@ Execute a partir da raiz do projeto. Requer Redis em execução.
 
   python run_worker.py
   python run_worker.py --queues scraping,pedido --redis-url redis://localhost:6379/0
+
+Faixas de prioridade (scheduling.FairWorker): a fila de pedido é sempre consultada
+antes do scraping, e o scraping é dividido por conta (round-robin entre subfilas).
+
+  python run_worker.py --lane pedido                    # worker dedicado a pedidos
+  python run_worker.py --workers 8 --reserved-pedido 2  # 8 processos, 2 só para pedidos
+  python run_worker.py --metrics                        # espera em fila, breakers e retentativas
+
+SIGTERM: o crawl em andamento é fechado e o job reenfileirado a partir do
+checkpoint (job_cancel.py); o worker sai em seguida.
 """
 import os
 import sys
 
 
+def run_worker(queue_names: list[str], redis_url: str, pedido_queue: str):
+    """Executa um FairWorker: fila de pedido como prioridade, demais divididas por conta."""
+    from redis import Redis
+
+    from scheduling import FairWorker
+
+    priority = [q for q in queue_names if q == pedido_queue]
+    fair_bases = [q for q in queue_names if q != pedido_queue]
+    redis_conn = Redis.from_url(redis_url)
+    worker = FairWorker(priority, fair_bases, connection=redis_conn)
+    # Scheduler habilitado para jobs agendados (ex.: flush de lotes de pedido)
+    worker.work(with_scheduler=True)
+
+
 def main():
     import argparse
     p = argparse.ArgumentParser()
@@ -19,22 +43,64 @@ def main():
         help="Filas separadas por vírgula (ex: scraping,pedido)",
     )
     p.add_argument("--redis-url", default=os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+    p.add_argument(
+        "--lane",
+        choices=["geral", "pedido"],
+        default=os.environ.get("RQ_LANE", "geral"),
+        help="geral: pedido (prioridade) + scraping; pedido: apenas a fila de pedidos",
+    )
+    p.add_argument("--workers", type=int, default=1, help="Quantidade de processos worker")
+    p.add_argument(
+        "--reserved-pedido",
+        type=int,
+        default=int(os.environ.get("RQ_RESERVED_PEDIDO", "0")),
+        help="Processos (de --workers) dedicados exclusivamente à fila de pedidos",
+    )
+    p.add_argument("--metrics", action="store_true", help="Mostra espera em fila por faixa, estado dos circuit breakers e orçamento de retentativas e sai")
     args = p.parse_args()
 
     # RQ worker precisa encontrar os módulos do projeto
     sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
     os.environ.setdefault("REDIS_URL", args.redis_url)
 
-    from rq import Worker
-    from redis import Redis
-
     queue_names = [q.strip() for q in args.queues.split(",") if q.strip()]
     if not queue_names:
         queue_names = ["scraping", "pedido"]
+    pedido_queue = os.environ.get("RQ_QUEUE_PEDIDO_NAME", "pedido")
+
+    if args.metrics:
+        import json
+
+        from redis import Redis
+
+        from circuit_breaker import breaker_states, retry_budget
+        from scheduling import lane_wait_metrics
+
+        conn = Redis.from_url(args.redis_url)
+        print(json.dumps({
+            "espera_em_fila": lane_wait_metrics(conn),
+            "circuit_breakers": breaker_states(conn),
+            "orcamento_retentativas": retry_budget(conn).usage(),
+        }, indent=2))
+        return
+
+    if args.workers <= 1:
+        names = [pedido_queue] if args.lane == "pedido" else queue_names
+        run_worker(names, args.redis_url, pedido_queue)
+        return
+
+    from multiprocessing import Process
 
-    redis_conn = Redis.from_url(args.redis_url)
-    worker = Worker(queue_names, connection=redis_conn)
-    worker.work()
+    reserved = min(max(args.reserved_pedido, 0), args.workers)
+    specs = [[pedido_queue]] * reserved + [queue_names] * (args.workers - reserved)
+    processes = [
+        Process(target=run_worker, args=(names, args.redis_url, pedido_queue))
+        for names in specs
+    ]
+    for proc in processes:
+        proc.start()
+    for proc in processes:
+        proc.join()
 
 
 if __name__ == "__main__":
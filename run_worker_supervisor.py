@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Supervisor de pools de workers com escala automática (worker_supervisor.py).
+Execute a partir da raiz do projeto (um por host). Requer Redis em execução.
+
+  python run_worker_supervisor.py
+  python run_worker_supervisor.py --pool pedido=pedido:1:4 --pool scraping=scraping,pedido:1:8
+  python run_worker_supervisor.py --event-log logs/pools.jsonl
+
+Pools: --pool NOME=FILAS:MIN:MAX (repetível) ou WORKER_POOLS em JSON, ex.:
+  {"scraping": {"queues": ["scraping", "pedido"], "min": 1, "max": 8, "max_wait": 300}}
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+
+DEFAULT_POOLS = '{"pedido": {"queues": ["pedido"], "min": 1, "max": 4}, "scraping": {"queues": ["scraping", "pedido"], "min": 1, "max": 8}}'
+
+
+def _pool_arg(valor: str) -> tuple[str, dict]:
+    try:
+        nome, resto = valor.split("=", 1)
+        filas, minimo, maximo = resto.rsplit(":", 2)
+        return nome, {"queues": filas, "min": int(minimo), "max": int(maximo)}
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Pool inválido {valor!r} (use NOME=FILAS:MIN:MAX)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantém pools de workers RQ dimensionados pela fila e pelo host")
+    parser.add_argument("--redis-url", default=os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+    parser.add_argument("--pool", type=_pool_arg, action="append", default=[], help="NOME=FILAS:MIN:MAX (repetível)")
+    parser.add_argument("--interval", type=float, default=float(os.environ.get("WORKER_SUPERVISOR_INTERVAL", "5")))
+    parser.add_argument(
+        "--cpu-max", type=float,
+        default=float(os.environ.get("WORKER_SUPERVISOR_CPU_MAX", "0.9")),
+        help="Carga (load average 1 min / CPUs) a partir da qual nenhum pool cresce",
+    )
+    parser.add_argument(
+        "--mem-min", type=float,
+        default=float(os.environ.get("WORKER_SUPERVISOR_MEM_MIN", "0.1")),
+        help="Fração de memória disponível abaixo da qual nenhum pool cresce",
+    )
+    parser.add_argument(
+        "--drain-timeout", type=float,
+        default=float(os.environ.get("WORKER_DRAIN_TIMEOUT", "900")),
+        help="Segundos de dreno antes de interromper o job do worker (reenfileirado)",
+    )
+    parser.add_argument("--event-log", default=os.environ.get("WORKER_SUPERVISOR_EVENT_LOG"), help="Arquivo JSONL de eventos dos pools")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.environ.setdefault("REDIS_URL", args.redis_url)
+    logging.basicConfig(level=logging.INFO)
+
+    from redis import Redis
+
+    from worker_supervisor import WorkerSupervisor, parse_pools
+
+    try:
+        config = dict(args.pool) if args.pool else json.loads(os.environ.get("WORKER_POOLS") or DEFAULT_POOLS)
+        pools = parse_pools(config)
+    except ValueError as e:
+        parser.error(str(e))
+
+    supervisor = WorkerSupervisor(
+        Redis.from_url(args.redis_url),
+        pools,
+        redis_url=args.redis_url,
+        pedido_queue=os.environ.get("RQ_QUEUE_PEDIDO_NAME", "pedido"),
+        event_log=args.event_log,
+        cpu_max=args.cpu_max,
+        mem_min=args.mem_min,
+        drain_timeout=args.drain_timeout,
+    )
+
+    def _terminate(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        supervisor.run(interval=args.interval)
+    except KeyboardInterrupt:
+        supervisor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Camada de escalonamento das filas RQ: faixas (lanes) com prioridade e divisão
+justa da fila de scraping entre contas do fornecedor.
+
+- Faixa "pedido": sempre consultada antes do scraping; workers dedicados
+  (run_worker.py --lane pedido / --reserved-pedido K) reservam capacidade.
+- Faixa "scraping": cada conta tem uma subfila própria (scraping.<hash>); o
+  FairWorker alterna entre as subfilas a cada job (round-robin), de modo que uma
+  conta com centenas de jobs não monopoliza os workers.
+- Métricas de espera em fila por faixa: hash Redis scheduling:espera:<faixa>.
+"""
+import hashlib
+import logging
+import math
+import time
+from datetime import datetime, timezone
+
+from rq import Queue, Worker
+
+from job_cancel import GracefulShutdownMixin
+
+logger = logging.getLogger(__name__)
+
+SUBQUEUES_KEY = "scheduling:subfilas:{base}"
+WAIT_METRICS_KEY = "scheduling:espera:{lane}"
+# Limites (s) dos buckets do histograma de espera em fila
+WAIT_BUCKETS = (1, 5, 30, 60, 300, 900)
+
+# KEYS[1] = hash de métricas; ARGV = espera (s), campo do bucket
+RECORD_WAIT_LUA = """
+local espera = tonumber(ARGV[1])
+redis.call('HINCRBY', KEYS[1], 'count', 1)
+redis.call('HINCRBYFLOAT', KEYS[1], 'sum', ARGV[1])
+redis.call('HINCRBY', KEYS[1], ARGV[2], 1)
+local atual = tonumber(redis.call('HGET', KEYS[1], 'max'))
+if atual == nil or atual < espera then
+  redis.call('HSET', KEYS[1], 'max', ARGV[1])
+end
+return 1
+"""
+
+
+def account_queue_name(base: str, conta: str) -> str:
+    """Nome da subfila da conta (hash para não expor o login no nome da chave)."""
+    digest = hashlib.sha1(conta.encode("utf-8")).hexdigest()[:12]
+    return f"{base}.{digest}"
+
+
+def fair_queue(conn, base: str, conta: str) -> Queue:
+    """Subfila da conta, registrada no conjunto de subfilas consultado pelo FairWorker."""
+    name = account_queue_name(base, conta)
+    conn.sadd(SUBQUEUES_KEY.format(base=base), name)
+    return Queue(name, connection=conn)
+
+
+def record_queue_wait(conn, lane: str, seconds: float):
+    """Acumula contagem, soma, máximo e histograma do tempo de espera em fila."""
+    bucket = next((f"le_{b}" for b in WAIT_BUCKETS if seconds <= b), "le_inf")
+    conn.eval(RECORD_WAIT_LUA, 1, WAIT_METRICS_KEY.format(lane=lane), repr(float(seconds)), bucket)
+
+
+def lane_wait_metrics(conn, lanes=("pedido", "scraping")) -> dict:
+    """Métricas de espera por faixa: count, avg, max e histograma."""
+    out = {}
+    for lane in lanes:
+        raw = {k.decode(): v.decode() for k, v in conn.hgetall(WAIT_METRICS_KEY.format(lane=lane)).items()}
+        count = int(raw.get("count", 0))
+        total = float(raw.get("sum", 0))
+        out[lane] = {
+            "count": count,
+            "avg": total / count if count else 0.0,
+            "max": float(raw.get("max", 0)),
+            "histograma": {k: int(v) for k, v in raw.items() if k.startswith("le_")},
+        }
+    return out
+
+
+class FairSchedulingMixin:
+    """
+    Prioridade entre faixas e round-robin entre subfilas por conta para workers RQ.
+
+    priority_queues: filas consultadas sempre primeiro (ex.: ["pedido"]).
+    fair_bases: filas base divididas por conta (ex.: ["scraping"]); a fila base
+    em si continua sendo consultada por último (jobs enfileirados sem conta).
+
+    A lista de subfilas é relida a cada job e, enquanto ocioso, a cada
+    refresh_interval segundos (contas novas entram na rotação sem reiniciar).
+    """
+    refresh_interval = 5
+
+    def __init__(self, priority_queues, fair_bases=(), *args, **kwargs):
+        self.priority_names = list(priority_queues)
+        self.fair_bases = list(fair_bases)
+        self._rr_offset = 0
+        super().__init__(self.priority_names + self.fair_bases, *args, **kwargs)
+
+    def lane_of(self, queue_name: str) -> str:
+        return "pedido" if queue_name in self.priority_names else "scraping"
+
+    def refresh_queues(self):
+        """Monta a ordem de consulta: prioridade, subfilas rotacionadas e filas base."""
+        subfilas = []
+        for base in self.fair_bases:
+            nomes = sorted(
+                n.decode() if isinstance(n, bytes) else n
+                for n in self.connection.smembers(SUBQUEUES_KEY.format(base=base))
+            )
+            subfilas.extend(nomes)
+        if subfilas:
+            pos = self._rr_offset % len(subfilas)
+            subfilas = subfilas[pos:] + subfilas[:pos]
+            self._rr_offset += 1
+        nomes = self.priority_names + subfilas + self.fair_bases
+        self.queues = [
+            Queue(n, connection=self.connection, job_class=self.job_class, serializer=self.serializer)
+            for n in nomes
+        ]
+        self._ordered_queues = self.queues
+
+    def dequeue_job_and_maintain_ttl(self, timeout, max_idle_time=None):
+        if timeout is None:
+            # Modo burst: consulta não bloqueante, uma única vez
+            self.refresh_queues()
+            return super().dequeue_job_and_maintain_ttl(timeout, max_idle_time)
+        inicio = time.monotonic()
+        while True:
+            self.refresh_queues()
+            janela = self.refresh_interval
+            if max_idle_time is not None:
+                restante = max_idle_time - (time.monotonic() - inicio)
+                if restante <= 0:
+                    return None
+                janela = min(janela, math.ceil(restante))
+            result = super().dequeue_job_and_maintain_ttl(timeout, max_idle_time=janela)
+            if result is not None:
+                return result
+
+    def execute_job(self, job, queue):
+        if job.enqueued_at is not None:
+            enqueued_at = job.enqueued_at
+            if enqueued_at.tzinfo is None:
+                enqueued_at = enqueued_at.replace(tzinfo=timezone.utc)
+            espera = max((datetime.now(timezone.utc) - enqueued_at).total_seconds(), 0.0)
+            try:
+                record_queue_wait(self.connection, self.lane_of(queue.name), espera)
+            except Exception:
+                logger.exception("Falha ao registrar espera em fila")
+        return super().execute_job(job, queue)
+
+
+class FairWorker(FairSchedulingMixin, GracefulShutdownMixin, Worker):
+    """
+    Worker RQ (com fork por job) usando FairSchedulingMixin; no SIGTERM, o crawl
+    em andamento é interrompido e reenfileirado (job_cancel.GracefulShutdownMixin).
+    """
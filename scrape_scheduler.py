@@ -0,0 +1,215 @@
+"""
+Agendador de scraping por desatualização (substitui os loops de cron com intervalo fixo).
+
+Cada conta tem uma política (intervalo mínimo e máximo entre crawls) e um estado
+no Redis (hash scrape_agenda:conta:<usuario>): intervalo atual, último crawl,
+taxa de mudança do catálogo (média móvel) e o job em andamento. O conjunto
+ordenado scrape_agenda:proximas guarda o horário do próximo crawl de cada conta.
+
+A cada ciclo:
+1. Jobs terminados das contas em andamento são lidos: a fração do catálogo que
+   mudou (resultado "mudancas" de process_scraping_task, com CHANGE_EVENTS=1)
+   ajusta o intervalo: catálogo que mudou encurta pela metade (até o mínimo),
+   catálogo estável aumenta em BACKOFF vezes (até o máximo). Sem informação de
+   mudança (job falhou, CHANGE_EVENTS=0) o intervalo fica como está.
+2. Contas vencidas (mais atrasadas primeiro, até max_per_cycle) sem job na fila
+   ou em execução recebem um job process_scraping_task (via admission.py: com a
+   fila cheia o ciclo para e as contas seguem vencidas); o próximo horário é
+   agendado com jitter (intervalo ± JITTER) para espalhar os crawls.
+
+Contas novas começam no intervalo mínimo com o primeiro crawl espalhado dentro
+dele. As credenciais ficam só na memória do daemon (arquivo de contas).
+"""
+import logging
+import random
+import time
+
+from rq import Queue
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
+
+import admission
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = "scrape_agenda:conta:{conta}"
+DUE_KEY = "scrape_agenda:proximas"
+IN_FLIGHT_KEY = "scrape_agenda:em_andamento"
+
+BACKOFF = 1.5
+JITTER = 0.1
+TAXA_ALPHA = 0.5  # peso da última observação na média móvel da taxa de mudança
+ATIVOS = ("queued", "started", "scheduled", "deferred")
+
+
+def _decode(raw: dict) -> dict:
+    return {k.decode(): v.decode() for k, v in raw.items()}
+
+
+def change_fraction(result) -> float | None:
+    """Fração do catálogo que mudou no job (None sem contagem de mudanças)."""
+    if not isinstance(result, dict) or not isinstance(result.get("mudancas"), dict):
+        return None
+    produtos = int(result.get("produtos_enviados") or 0)
+    mudancas = sum(int(v or 0) for v in result["mudancas"].values())
+    return min(1.0, mudancas / max(1, produtos))
+
+
+class ScrapeScheduler:
+    """
+    Agenda process_scraping_task por conta de acordo com a taxa de mudança.
+
+    queue: rq.Queue de scraping (a conexão Redis guarda o estado).
+    contas: lista de {"usuario", "senha"} com "min_interval"/"max_interval"
+      opcionais (s) e "budget" opcional (repassado no payload).
+    queue_for: callable opcional payload -> Queue (ex.: subfila por conta).
+    """
+
+    def __init__(
+        self,
+        queue: Queue,
+        contas: list[dict],
+        min_interval: float = 900.0,
+        max_interval: float = 86400.0,
+        max_per_cycle: int = 50,
+        job_timeout: int = 600,
+        queue_for=None,
+    ):
+        self.queue = queue
+        self.conn = queue.connection
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_per_cycle = max_per_cycle
+        self.job_timeout = job_timeout
+        self.queue_for = queue_for
+        self.contas: dict[str, dict] = {}
+        self.set_contas(contas)
+
+    def set_contas(self, contas: list[dict]):
+        """Atualiza as contas agendadas; contas novas entram na agenda, removidas saem."""
+        self.contas = {}
+        for c in contas:
+            usuario = c.get("usuario") or c.get("user")
+            senha = c.get("senha") or c.get("password")
+            if not usuario or not senha:
+                raise ValueError("Cada conta deve conter 'usuario' e 'senha'")
+            self.contas[usuario] = {**c, "usuario": usuario, "senha": senha}
+
+        agora = time.time()
+        agendadas = {m.decode() for m in self.conn.zrange(DUE_KEY, 0, -1)}
+        pipe = self.conn.pipeline()
+        for usuario in self.contas.keys() - agendadas:
+            minimo, _ = self._limites(usuario)
+            pipe.hsetnx(STATE_KEY.format(conta=usuario), "intervalo", minimo)
+            pipe.zadd(DUE_KEY, {usuario: agora + random.uniform(0, minimo)})
+        removidas = agendadas - self.contas.keys()
+        if removidas:
+            pipe.zrem(DUE_KEY, *removidas)
+            pipe.srem(IN_FLIGHT_KEY, *removidas)
+        pipe.execute()
+
+    def _limites(self, usuario: str) -> tuple[float, float]:
+        c = self.contas[usuario]
+        return float(c.get("min_interval") or self.min_interval), float(c.get("max_interval") or self.max_interval)
+
+    def state(self, usuario: str) -> dict:
+        return _decode(self.conn.hgetall(STATE_KEY.format(conta=usuario)))
+
+    def observe(self, usuario: str, fracao: float | None, agora: float | None = None) -> float:
+        """Ajusta o intervalo da conta pela fração que mudou no último crawl; retorna o intervalo."""
+        agora = time.time() if agora is None else agora
+        minimo, maximo = self._limites(usuario)
+        estado = self.state(usuario)
+        intervalo = float(estado.get("intervalo") or minimo)
+        campos = {"ultimo_crawl": agora}
+        if fracao is not None:
+            intervalo = intervalo / 2 if fracao > 0 else intervalo * BACKOFF
+            anterior = float(estado["taxa"]) if "taxa" in estado else fracao
+            campos["taxa"] = TAXA_ALPHA * fracao + (1 - TAXA_ALPHA) * anterior
+        intervalo = min(maximo, max(minimo, intervalo))
+        campos["intervalo"] = intervalo
+        self.conn.hset(STATE_KEY.format(conta=usuario), mapping=campos)
+        return intervalo
+
+    def collect(self) -> int:
+        """Lê os jobs terminados das contas em andamento. Retorna quantos terminaram."""
+        terminados = 0
+        for raw in self.conn.smembers(IN_FLIGHT_KEY):
+            usuario = raw.decode()
+            job_id = self.state(usuario).get("job_id")
+            try:
+                job = Job.fetch(job_id, connection=self.conn) if job_id else None
+            except NoSuchJobError:
+                job = None
+            status = job.get_status(refresh=False) if job is not None else None
+            if status in ATIVOS:
+                continue
+            fracao = change_fraction(job.return_value(refresh=False)) if status == "finished" else None
+            if usuario in self.contas:
+                intervalo = self.observe(usuario, fracao)
+                logger.info("Conta %s: job %s %s, mudança=%s, intervalo=%.0fs", usuario, job_id, status, fracao, intervalo)
+            self.conn.srem(IN_FLIGHT_KEY, usuario)
+            terminados += 1
+        return terminados
+
+    def _payload(self, usuario: str) -> dict:
+        c = self.contas[usuario]
+        payload = {"usuario": usuario, "senha": c["senha"]}
+        if c.get("budget"):
+            payload["budget"] = c["budget"]
+        return payload
+
+    def enqueue_due(self, agora: float | None = None) -> list[str]:
+        """Enfileira as contas vencidas sem job ativo. Retorna as contas enfileiradas."""
+        agora = time.time() if agora is None else agora
+        vencidas = [m.decode() for m in self.conn.zrangebyscore(DUE_KEY, "-inf", agora)]
+        em_andamento = {m.decode() for m in self.conn.smembers(IN_FLIGHT_KEY)}
+        enfileiradas = []
+        for usuario in vencidas:
+            if len(enfileiradas) >= self.max_per_cycle:
+                break
+            if usuario not in self.contas:
+                continue
+            intervalo = float(self.state(usuario).get("intervalo") or self._limites(usuario)[0])
+            proxima = agora + intervalo * random.uniform(1 - JITTER, 1 + JITTER)
+            if usuario in em_andamento:
+                # Crawl anterior ainda na fila ou rodando: não empilha outro
+                self.conn.zadd(DUE_KEY, {usuario: proxima})
+                continue
+            payload = self._payload(usuario)
+            fila = self.queue_for(payload) if self.queue_for else self.queue
+            res = admission.enqueue(
+                self.queue, "worker.process_scraping_task", payload,
+                dedup=True, fila=fila, job_timeout=self.job_timeout,
+            )
+            if res["resultado"] == admission.ADIADO:
+                logger.warning("Agendador: fila cheia (%d jobs), contas vencidas ficam para o próximo ciclo",
+                               res["profundidade"])
+                break
+            # Rejeitado: a conta já tem job na fila (enfileirado fora do agendador); acompanha esse job
+            pipe = self.conn.pipeline()
+            pipe.hset(STATE_KEY.format(conta=usuario), mapping={"job_id": res["job_id"], "enfileirado_em": agora})
+            pipe.sadd(IN_FLIGHT_KEY, usuario)
+            pipe.zadd(DUE_KEY, {usuario: proxima})
+            pipe.execute()
+            if res["resultado"] != admission.ADMITIDO:
+                continue
+            enfileiradas.append(usuario)
+        if enfileiradas:
+            logger.info("Agendador: %d contas enfileiradas", len(enfileiradas))
+        return enfileiradas
+
+    def run_once(self) -> list[str]:
+        self.collect()
+        return self.enqueue_due()
+
+    def run(self, interval: float = 10.0, max_cycles: int | None = None):
+        """Laço do daemon; max_cycles limita os ciclos (útil em testes)."""
+        ciclos = 0
+        while max_cycles is None or ciclos < max_cycles:
+            ciclos += 1
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Falha no ciclo do agendador de scraping")
+            time.sleep(interval)
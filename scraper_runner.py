@@ -1,29 +1,145 @@
 """
 Executa o spider de produtos e retorna a lista de produtos em memória.
 Usado pelo worker do Nível 2 para obter os dados sem escrever em disco.
+run_scrapers executa várias contas do fornecedor em paralelo no mesmo processo.
 """
 from scrapy.crawler import CrawlerProcess
 from scrapy.utils.project import get_project_settings
 
+import crawl_stats
+import job_budget
+import job_cancel
+import tracing
+from circuit_breaker import CircuitOpenError
+from servimed_scraper.pipelines import SharedDict
 
-def run_scraper(usuario: str, senha: str) -> list[dict]:
+
+def raise_if_circuit_open(crawler):
+    """Crawl encerrado pelo CircuitBreakerMiddleware: propaga como CircuitOpenError."""
+    stats = crawler.stats
+    if stats is not None and stats.get_value("finish_reason") == "circuit_open":
+        raise CircuitOpenError(
+            stats.get_value("circuit_breaker/upstream", "fornecedor"),
+            float(stats.get_value("circuit_breaker/retry_after", 0)),
+        )
+
+
+def run_scraper(usuario: str, senha: str, checkpoint=None) -> list[dict]:
     """
     Executa o spider de produtos com as credenciais do fornecedor e retorna
     uma lista de dicts, cada um com: gtin, codigo, descricao, preco_fabrica, estoque.
+
+    checkpoint: CrawlCheckpoint opcional (servimed_scraper.checkpoint). Se houver
+    progresso salvo, o crawl retoma das páginas pendentes; o retorno inclui os
+    itens das execuções anteriores.
+
+    Com um orçamento de job ativo (job_budget.activate), o crawl é encerrado no
+    primeiro limite atingido; os itens extraídos até ali são retornados e o limite
+    fica em job_budget.current().exceeded.
+    """
+    contas = [{"usuario": usuario, "senha": senha}]
+    checkpoints = {usuario: checkpoint} if checkpoint is not None else None
+    return run_scrapers(contas, checkpoints=checkpoints)[usuario]
+
+
+def run_scrapers(contas: list[dict], checkpoints: dict | None = None) -> dict[str, list[dict]]:
+    """
+    Executa um crawler "products" por conta do fornecedor, todos ao mesmo tempo no
+    mesmo processo (um reactor). Cada crawler tem seu próprio spider e
+    CookiesMiddleware, ou seja, sessão e cookies separados por conta.
+
+    contas: [{"usuario": ..., "senha": ...}, ...] (usuários distintos).
+    checkpoints: dict opcional usuario -> CrawlCheckpoint.
+
+    Retorna dict usuario -> lista de produtos da conta. Se o breaker do fornecedor
+    abrir em qualquer crawler, levanta CircuitOpenError; se o job for cancelado ou
+    o worker desligado (job_cancel.py), JobInterrupted (nos dois casos os
+    checkpoints guardam o progresso de todas as contas).
     """
-    items_list: list[dict] = []
+    checkpoints = checkpoints or {}
+    por_conta = SharedDict({c["usuario"]: [] for c in contas})
+    budget = job_budget.current()
     settings = get_project_settings()
-    settings.set("COLLECT_ITEMS_LIST", items_list)
+    settings.set("COLLECT_ITEMS_BY_ACCOUNT", por_conta)
+    settings.set("TRACE_PARENT", tracing.current_traceparent())
     settings.set("LOG_LEVEL", "WARNING")
     settings.set("ITEM_PIPELINES", {
         "servimed_scraper.pipelines.CollectItemsPipeline": 100,
     })
+    if budget is not None:
+        settings.set("JOB_BUDGET", budget.crawl_settings(crawlers=len(contas)))
+    settings.set("JOB_CANCEL_KEY", job_cancel.current() or "")
+
+    process = CrawlerProcess(settings)
+    crawlers = []
+    for conta in contas:
+        crawler = process.create_crawler("products")
+        process.crawl(
+            crawler,
+            user=conta["usuario"],
+            password=conta["senha"],
+            checkpoint=checkpoints.get(conta["usuario"]),
+        )
+        crawlers.append(crawler)
+    process.start()
+    for conta, crawler in zip(contas, crawlers):
+        crawl_stats.record_crawl(crawler, conta=conta["usuario"])
+    for crawler in crawlers:
+        raise_if_circuit_open(crawler)
+        job_cancel.raise_if_interrupted(crawler)
+        if budget is not None:
+            budget.record_crawl(crawler)
+
+    resultado = {}
+    for conta in contas:
+        checkpoint = checkpoints.get(conta["usuario"])
+        resultado[conta["usuario"]] = checkpoint.items() if checkpoint is not None else list(por_conta[conta["usuario"]])
+    return resultado
+
+
+def run_scraper_distributed(
+    crawl_id: str,
+    role: str,
+    usuario: str | None = None,
+    senha: str | None = None,
+) -> dict:
+    """
+    Executa o spider de produtos no modo distribuído (fronteira compartilhada no Redis).
+
+    role="coordinator": faz login, publica a sessão, semeia a fronteira e continua
+    processando páginas como um worker. role="worker": usa a sessão publicada e
+    processa páginas até a fronteira esvaziar. Os itens vão para o sink comum do
+    crawl (RedisFrontier.items), não para a memória do processo.
+
+    Com um orçamento de job ativo (job_budget.activate), o crawl deste processo é
+    encerrado no primeiro limite atingido (as páginas que estavam com ele voltam à
+    fronteira quando o lease expira) e o limite fica em job_budget.current().exceeded.
+
+    Retorna as estatísticas distribuídas deste processo (páginas, URLs publicadas).
+    """
+    budget = job_budget.current()
+    settings = get_project_settings()
+    settings.set("LOG_LEVEL", "WARNING")
+    settings.set("TRACE_PARENT", tracing.current_traceparent())
+    if budget is not None:
+        settings.set("JOB_BUDGET", budget.crawl_settings())
 
     process = CrawlerProcess(settings)
+    crawler = process.create_crawler("products")
     process.crawl(
-        "products",
+        crawler,
         user=usuario,
         password=senha,
+        crawl_id=crawl_id,
+        distributed_role=role,
     )
     process.start()
-    return items_list
+    crawl_stats.record_crawl(crawler, conta=usuario)
+    raise_if_circuit_open(crawler)
+    if budget is not None:
+        budget.record_crawl(crawler)
+    stats = crawler.stats.get_stats() if crawler.stats else {}
+    return {
+        "paginas": stats.get("distributed/pages", 0),
+        "urls_publicadas": stats.get("distributed/urls_published", 0),
+    }
@@ -0,0 +1,66 @@
+"""
+Checkpoint de crawl no Redis (retomada do spider de produtos após falha do job).
+
+Um checkpoint é identificado por uma chave (o id do job RQ, que se mantém nas
+retentativas) e usa as chaves:
+  checkpoint:<chave>:pending   conjunto de URLs da listagem ainda não processadas
+  checkpoint:<chave>:visited   conjunto de URLs já processadas
+  checkpoint:<chave>:items     lista de itens extraídos (JSON), na ordem das páginas
+  checkpoint:<chave>:uploaded  quantos itens já foram enviados à API
+
+Cada página é registrada de forma atômica (itens + próximas URLs + visitada): se o
+worker morrer no meio da página seguinte, a retentativa refaz só essa página.
+Fica no Redis (e não em JOBDIR local) porque a retentativa pode rodar em outro host.
+"""
+import json
+
+KEYS = ("pending", "visited", "items", "uploaded")
+
+
+class CrawlCheckpoint:
+    """Fronteira pendente, páginas visitadas, itens e progresso de upload de um crawl."""
+
+    def __init__(self, conn, key: str, ttl_seconds: int = 7 * 86400):
+        self.conn = conn
+        self.checkpoint_key = key
+        self.ttl_seconds = ttl_seconds
+
+    def key(self, nome: str) -> str:
+        return f"checkpoint:{self.checkpoint_key}:{nome}"
+
+    def record_page(self, url: str, items: list[dict], next_urls) -> list[str]:
+        """Registra a página processada; retorna as próximas URLs ainda não visitadas."""
+        novas = [u for u in dict.fromkeys(next_urls) if u and u != url and not self.is_visited(u)]
+        pipe = self.conn.pipeline(transaction=True)
+        pipe.sadd(self.key("visited"), url)
+        pipe.srem(self.key("pending"), url)
+        if novas:
+            pipe.sadd(self.key("pending"), *novas)
+        if items:
+            pipe.rpush(self.key("items"), *[json.dumps(i, ensure_ascii=False) for i in items])
+        for nome in KEYS:
+            pipe.expire(self.key(nome), self.ttl_seconds)
+        pipe.execute()
+        return novas
+
+    def pending_urls(self) -> list[str]:
+        return sorted(u.decode() if isinstance(u, bytes) else u for u in self.conn.smembers(self.key("pending")))
+
+    def is_visited(self, url: str) -> bool:
+        return bool(self.conn.sismember(self.key("visited"), url))
+
+    def has_progress(self) -> bool:
+        """Alguma página já foi registrada (há o que retomar)."""
+        return bool(self.conn.exists(self.key("visited")))
+
+    def items(self) -> list[dict]:
+        return [json.loads(r) for r in self.conn.lrange(self.key("items"), 0, -1)]
+
+    def uploaded(self) -> int:
+        return int(self.conn.get(self.key("uploaded")) or 0)
+
+    def mark_uploaded(self, n: int):
+        self.conn.set(self.key("uploaded"), n, ex=self.ttl_seconds)
+
+    def clear(self):
+        self.conn.delete(*[self.key(nome) for nome in KEYS])
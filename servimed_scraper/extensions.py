@@ -0,0 +1,226 @@
+"""
+Extensões Scrapy do projeto.
+"""
+import os
+import time
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
+
+
+class TracingExtension:
+    """
+    Spans do crawl para o tracing entre processos (tracing.py, formato Zipkin v2).
+
+    - Um span "crawl <spider>" do spider_opened ao spider_closed, filho de
+      TRACE_PARENT (traceparent do job, definido por scraper_runner/order_runner).
+    - Um span por requisição: da entrada no downloader (inclui espera de slot,
+      autothrottle e rate limit) até a resposta, com status, callback e
+      download_latency.
+
+    Ativa com TRACING_ENABLED (settings: ligado quando TRACE_FILE está definido).
+    """
+
+    def __init__(self, crawler, parent: str | None):
+        import tracing
+
+        self.tracing = tracing
+        self.crawler = crawler
+        self.parent = parent
+        self.crawl_span = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("TRACING_ENABLED"):
+            raise NotConfigured
+        ext = cls(crawler, crawler.settings.get("TRACE_PARENT"))
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(ext.request_reached_downloader, signal=signals.request_reached_downloader)
+        crawler.signals.connect(ext.response_received, signal=signals.response_received)
+        return ext
+
+    def spider_opened(self, spider):
+        self.crawl_span = self.tracing.Span(f"crawl {spider.name}", parent=self.parent)
+
+    def spider_closed(self, spider, reason):
+        stats = self.crawler.stats
+        self.crawl_span.set_tag("reason", reason)
+        self.crawl_span.set_tag("pages", stats.get_value("response_received_count", 0))
+        self.crawl_span.set_tag("items", stats.get_value("item_scraped_count", 0))
+        self.crawl_span.set_tag("errors", stats.get_value("downloader/exception_count", 0))
+        self.crawl_span.finish()
+
+    def request_reached_downloader(self, request, spider):
+        request.meta["_trace_start"] = time.time()
+
+    def response_received(self, response, request, spider):
+        start = request.meta.get("_trace_start")
+        if start is None or self.crawl_span is None:
+            return
+        callback = getattr(request.callback, "__name__", None)
+        self.tracing.record_span(
+            f"{request.method} {urlparse_cached(request).path or '/'}",
+            start,
+            time.time(),
+            parent=self.crawl_span,
+            kind="CLIENT",
+            **{
+                "http.method": request.method,
+                "http.url": request.url,
+                "http.status_code": response.status,
+                "callback": callback,
+                "download_latency": request.meta.get("download_latency"),
+            },
+        )
+
+
+def _rss_mb() -> float:
+    """Memória residente atual do processo em MB (pico, fora do Linux)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        import resource
+        import sys
+
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico / 2**20 if sys.platform == "darwin" else pico / 1024
+
+
+class JobBudgetExtension:
+    """
+    Orçamento de recursos do job (job_budget.py) aplicado ao crawl.
+
+    Setting JOB_BUDGET: {"max_pages", "max_items", "max_rss_mb", "max_bytes",
+    "deadline"} (deadline = prazo absoluto em epoch, derivado de max_seconds).
+    Páginas, itens e bytes são verificados a cada resposta/item; prazo e memória
+    também a cada JOB_BUDGET_CHECK_INTERVAL segundos. No primeiro limite atingido o
+    spider é encerrado com finish_reason "budget_exceeded" (itens já extraídos
+    seguem normalmente pelos pipelines e checkpoint) e as stats job_budget/limit e
+    job_budget/value registram qual limite foi atingido e o valor medido.
+    """
+    close_reason = "budget_exceeded"
+
+    def __init__(self, crawler, limites: dict, intervalo: float):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.limites = limites
+        self.intervalo = intervalo
+        self.task = None
+        self.exceeded = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        limites = crawler.settings.getdict("JOB_BUDGET")
+        if not limites:
+            raise NotConfigured
+        ext = cls(crawler, limites, crawler.settings.getfloat("JOB_BUDGET_CHECK_INTERVAL", 1.0))
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(ext.response_received, signal=signals.response_received)
+        crawler.signals.connect(ext.item_scraped, signal=signals.item_scraped)
+        return ext
+
+    def spider_opened(self, spider):
+        from twisted.internet import task
+
+        for nome, valor in self.limites.items():
+            self.stats.set_value(f"job_budget/{nome}", valor)
+        if "deadline" in self.limites or "max_rss_mb" in self.limites:
+            self.task = task.LoopingCall(self.check_periodic)
+            self.task.start(self.intervalo, now=True)
+
+    def spider_closed(self, spider, reason):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+
+    def response_received(self, response, request, spider):
+        self._check("max_pages", self.stats.get_value("response_received_count", 0))
+        self._check("max_bytes", self.stats.get_value("downloader/response_bytes", 0))
+
+    def item_scraped(self, item, response, spider):
+        self._check("max_items", self.stats.get_value("item_scraped_count", 0))
+
+    def check_periodic(self):
+        if "deadline" in self.limites and time.time() >= self.limites["deadline"]:
+            self._exceed("max_seconds", round(time.time() - self.limites["deadline"], 1))
+        if "max_rss_mb" in self.limites:
+            self._check("max_rss_mb", _rss_mb())
+
+    def _check(self, nome, valor):
+        limite = self.limites.get(nome)
+        if limite is not None and valor >= limite:
+            self._exceed(nome, valor)
+
+    def _exceed(self, nome, valor):
+        if self.exceeded is not None:
+            return
+        self.exceeded = nome
+        self.stats.set_value("job_budget/limit", nome)
+        self.stats.set_value("job_budget/value", valor)
+        spider = self.crawler.spider
+        spider.logger.warning("Orçamento do job atingido: %s (%s); encerrando o crawl", nome, valor)
+        self.crawler.engine.close_spider(spider, self.close_reason)
+
+
+class JobCancelExtension:
+    """
+    Cancelamento cooperativo do crawl (job_cancel.py).
+
+    A cada JOB_CANCEL_CHECK_INTERVAL segundos lê a flag JOB_CANCEL_KEY (definida
+    pelo runner dentro de um job) no Redis; com a flag, encerra o spider com
+    close_spider: finish_reason "shutdown" (SIGTERM no worker) ou "cancelled".
+    Requisições em andamento terminam e os itens já extraídos seguem pelos
+    pipelines e pelo checkpoint.
+    """
+
+    def __init__(self, crawler, conn, key: str, intervalo: float):
+        self.crawler = crawler
+        self.conn = conn
+        self.key = key
+        self.intervalo = intervalo
+        self.task = None
+        self.motivo = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        key = crawler.settings.get("JOB_CANCEL_KEY")
+        if not key:
+            raise NotConfigured
+        from redis import Redis
+
+        conn = Redis.from_url(crawler.settings.get("JOB_CANCEL_REDIS_URL"))
+        ext = cls(crawler, conn, key, crawler.settings.getfloat("JOB_CANCEL_CHECK_INTERVAL", 1.0))
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        from twisted.internet import task
+
+        self.task = task.LoopingCall(self.check)
+        self.task.start(self.intervalo, now=True)
+
+    def spider_closed(self, spider, reason):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+
+    def check(self):
+        if self.motivo is not None:
+            return
+        try:
+            valor = self.conn.get(self.key)
+        except Exception as e:
+            self.crawler.spider.logger.warning("Falha ao ler a flag de cancelamento: %s", e)
+            return
+        if valor is None:
+            return
+        from job_cancel import SHUTDOWN
+
+        self.motivo = valor.decode() if isinstance(valor, bytes) else valor
+        reason = "shutdown" if self.motivo == SHUTDOWN else "cancelled"
+        spider = self.crawler.spider
+        spider.logger.warning("Job interrompido (%s); encerrando o crawl", self.motivo)
+        self.crawler.engine.close_spider(spider, reason)
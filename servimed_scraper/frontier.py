@@ -0,0 +1,151 @@
+"""
+Fronteira de crawl compartilhada no Redis (modo distribuído do spider de produtos).
+
+Um crawl distribuído é identificado por crawl_id e usa as chaves:
+  crawl:<id>:frontier  lista de URLs pendentes
+  crawl:<id>:seen      conjunto de URLs já enfileiradas (dupefilter compartilhado)
+  crawl:<id>:inflight  zset URL -> prazo do lease (páginas em processamento)
+  crawl:<id>:items     lista de itens extraídos (JSON), sink comum dos workers
+  crawl:<id>:session   cabeçalho Cookie da sessão autenticada pelo coordenador
+  crawl:<id>:seeded    marca de fronteira semeada pelo coordenador
+  crawl:<id>:final     marca do worker que finaliza (upload) o crawl
+
+Páginas retiradas com pop() ficam em "inflight" com um lease; se o worker morrer
+antes de complete_page(), requeue_expired() devolve a URL à fronteira.
+"""
+import json
+import time
+
+# KEYS[1] = seen, KEYS[2] = frontier; ARGV = URLs. Retorna quantas eram novas.
+PUSH_LUA = """
+local novos = 0
+for i, url in ipairs(ARGV) do
+  if redis.call('SADD', KEYS[1], url) == 1 then
+    redis.call('RPUSH', KEYS[2], url)
+    novos = novos + 1
+  end
+end
+return novos
+"""
+
+# KEYS[1] = frontier, KEYS[2] = inflight; ARGV[1] = máximo, ARGV[2] = prazo do lease
+POP_LUA = """
+local out = {}
+for i = 1, tonumber(ARGV[1]) do
+  local url = redis.call('LPOP', KEYS[1])
+  if not url then break end
+  redis.call('ZADD', KEYS[2], ARGV[2], url)
+  table.insert(out, url)
+end
+return out
+"""
+
+# KEYS[1] = inflight, KEYS[2] = frontier; ARGV[1] = agora
+REQUEUE_LUA = """
+local expirados = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+for i, url in ipairs(expirados) do
+  redis.call('ZREM', KEYS[1], url)
+  redis.call('RPUSH', KEYS[2], url)
+end
+return #expirados
+"""
+
+
+class RedisFrontier:
+    """Fronteira, dupefilter, sessão e sink de itens de um crawl distribuído."""
+
+    def __init__(self, conn, crawl_id: str, lease_seconds: int = 300, ttl_seconds: int = 86400):
+        self.conn = conn
+        self.crawl_id = crawl_id
+        self.lease_seconds = lease_seconds
+        self.ttl_seconds = ttl_seconds
+        self._push = conn.register_script(PUSH_LUA)
+        self._pop = conn.register_script(POP_LUA)
+        self._requeue = conn.register_script(REQUEUE_LUA)
+
+    def key(self, nome: str) -> str:
+        return f"crawl:{self.crawl_id}:{nome}"
+
+    # ---------- Fronteira ----------
+
+    def push(self, urls) -> int:
+        """Adiciona URLs ainda não vistas. Retorna quantas foram enfileiradas."""
+        urls = list(urls)
+        if not urls:
+            return 0
+        return int(self._push(keys=[self.key("seen"), self.key("frontier")], args=urls))
+
+    def mark_seen(self, urls):
+        """Marca URLs como vistas sem enfileirá-las (ex.: página já processada localmente)."""
+        urls = list(urls)
+        if urls:
+            self.conn.sadd(self.key("seen"), *urls)
+
+    def pop(self, n: int = 1) -> list[str]:
+        """Retira até n URLs e as marca como em processamento (lease)."""
+        prazo = time.time() + self.lease_seconds
+        urls = self._pop(keys=[self.key("frontier"), self.key("inflight")], args=[n, prazo])
+        return [u.decode() if isinstance(u, bytes) else u for u in urls]
+
+    def complete_page(self, url: str | None, items: list[dict], next_urls) -> int:
+        """
+        Registra o resultado de uma página de forma atômica: itens no sink, novas URLs
+        na fronteira e fim do lease da página. Retorna quantas URLs novas entraram.
+        """
+        next_urls = list(next_urls)
+        pipe = self.conn.pipeline(transaction=True)
+        if next_urls:
+            self._push(keys=[self.key("seen"), self.key("frontier")], args=next_urls, client=pipe)
+        if items:
+            pipe.rpush(self.key("items"), *[json.dumps(i, ensure_ascii=False) for i in items])
+        if url is not None:
+            pipe.zrem(self.key("inflight"), url)
+        res = pipe.execute()
+        return int(res[0]) if next_urls else 0
+
+    def requeue_expired(self) -> int:
+        """Devolve à fronteira páginas cujo lease expirou (worker morto)."""
+        return int(self._requeue(keys=[self.key("inflight"), self.key("frontier")], args=[time.time()]))
+
+    def pending(self) -> tuple[int, int]:
+        """(URLs na fronteira, páginas em processamento)."""
+        pipe = self.conn.pipeline()
+        pipe.llen(self.key("frontier"))
+        pipe.zcard(self.key("inflight"))
+        frontier, inflight = pipe.execute()
+        return int(frontier), int(inflight)
+
+    def is_complete(self) -> bool:
+        """Semeado pelo coordenador e sem URLs pendentes ou em processamento."""
+        return self.is_seeded() and self.pending() == (0, 0)
+
+    # ---------- Sessão ----------
+
+    def save_session(self, cookie_header: str):
+        self.conn.set(self.key("session"), cookie_header, ex=self.ttl_seconds)
+
+    def load_session(self) -> str | None:
+        raw = self.conn.get(self.key("session"))
+        return raw.decode() if isinstance(raw, bytes) else raw
+
+    def mark_seeded(self):
+        self.conn.set(self.key("seeded"), "1", ex=self.ttl_seconds)
+
+    def is_seeded(self) -> bool:
+        return bool(self.conn.exists(self.key("seeded")))
+
+    # ---------- Finalização ----------
+
+    def try_finalize(self) -> bool:
+        """Apenas um worker vence e fica responsável pelo upload do crawl."""
+        return bool(self.conn.set(self.key("final"), "1", nx=True, ex=self.ttl_seconds))
+
+    def items(self) -> list[dict]:
+        return [json.loads(r) for r in self.conn.lrange(self.key("items"), 0, -1)]
+
+    def cleanup(self):
+        """Expira as chaves do crawl (mantém por pouco tempo para inspeção)."""
+        pipe = self.conn.pipeline()
+        for nome in ("frontier", "seen", "inflight", "items", "session", "seeded", "final"):
+            pipe.expire(self.key(nome), 3600)
+        pipe.execute()
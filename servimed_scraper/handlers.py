@@ -0,0 +1,95 @@
+"""
+Download handlers do projeto (perfil de conexão "fast", ver servimed_scraper.profiles).
+
+Exigem a API de download handlers assíncronos do Scrapy (BaseDownloadHandler);
+em versões sem ela o perfil não configura este módulo (profiles._async_handler_api).
+"""
+from scrapy.core.downloader.handlers.base import BaseDownloadHandler
+from scrapy.core.downloader.handlers.http11 import HTTP11DownloadHandler
+from scrapy.utils.httpobj import urlparse_cached
+
+
+def _h2_negotiation_errors() -> tuple:
+    """Exceções do cliente HTTP/2 do Scrapy que indicam h2 não negociado com o servidor."""
+    from h2.exceptions import ProtocolError
+
+    try:
+        from scrapy.core._http2.protocol import InvalidNegotiatedProtocol
+    except ImportError:
+        from scrapy.core.http2.protocol import InvalidNegotiatedProtocol
+    return InvalidNegotiatedProtocol, ProtocolError
+
+
+def _causes(exc):
+    """exc e as exceções encadeadas (__cause__, __context__ e reasons de ResponseFailed)."""
+    vistos, pilha = set(), [exc]
+    while pilha:
+        e = pilha.pop()
+        if e is None or id(e) in vistos:
+            continue
+        vistos.add(id(e))
+        yield e
+        pilha += [e.__cause__, e.__context__]
+        pilha += [getattr(r, "value", r) for r in getattr(e, "reasons", None) or []]
+
+
+def _h2_unsupported(exc) -> bool:
+    """
+    Falha de uma primeira conexão HTTP/2 que indica servidor sem h2: ALPN com outro
+    protocolo (InvalidNegotiatedProtocol), alerta TLS no_application_protocol ou
+    resposta que não é HTTP/2 (ProtocolError do h2). Demais erros (timeout, conexão
+    perdida, DNS) seguem para o RetryMiddleware sem mudar o host para HTTP/1.1.
+    """
+    negociacao = _h2_negotiation_errors()
+    for e in _causes(exc):
+        if isinstance(e, negociacao) or "no application protocol" in str(e).lower():
+            return True
+    return False
+
+
+class H2FallbackDownloadHandler(BaseDownloadHandler):
+    """
+    HTTPS via HTTP/2 (uma conexão multiplexada por host) com volta automática
+    para HTTP/1.1 nos hosts que não negociam h2 e nas requisições com proxy
+    (não suportado pelo handler HTTP/2 do Scrapy). Um host só volta para HTTP/1.1
+    se falhar antes de alguma resposta em HTTP/2; depois disso os erros seguem
+    normalmente para o RetryMiddleware.
+
+    Métricas: stats http2/requests, http2/fallback_hosts, http2/fallback_requests.
+    """
+    lazy = True
+
+    def __init__(self, crawler):
+        from scrapy.core.downloader.handlers.http2 import H2DownloadHandler
+
+        super().__init__(crawler)
+        self.stats = crawler.stats
+        self._h2 = H2DownloadHandler.from_crawler(crawler)
+        self._http11 = HTTP11DownloadHandler.from_crawler(crawler)
+        self._http1_hosts: set[str] = set()
+        self._h2_hosts: set[str] = set()
+
+    async def download_request(self, request):
+        host = urlparse_cached(request).netloc
+        if host in self._http1_hosts or request.meta.get("proxy"):
+            return await self._download_http11(request)
+        try:
+            response = await self._h2.download_request(request)
+        except Exception as e:
+            if host in self._h2_hosts or not _h2_unsupported(e):
+                raise
+            self._http1_hosts.add(host)
+            self.stats.inc_value("http2/fallback_hosts")
+            self.crawler.spider.logger.info("%s não negociou HTTP/2; usando HTTP/1.1", host)
+            return await self._download_http11(request)
+        self._h2_hosts.add(host)
+        self.stats.inc_value("http2/requests")
+        return response
+
+    async def _download_http11(self, request):
+        self.stats.inc_value("http2/fallback_requests")
+        return await self._http11.download_request(request)
+
+    async def close(self):
+        await self._h2.close()
+        await self._http11.close()
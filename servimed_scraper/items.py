@@ -13,5 +13,6 @@ class ProductItem(scrapy.Item):
 
 class OrderResultItem(scrapy.Item):
     """Resultado do pedido no site (Nível 3): código Servimed e status."""
+    id_pedido = scrapy.Field()  # ID do pedido na API (identifica o resultado em lotes)
     codigo_confirmacao = scrapy.Field()
     status = scrapy.Field()
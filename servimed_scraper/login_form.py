@@ -0,0 +1,201 @@
+"""
+Formulário de login com schema em cache por login_url (spiders de produtos e de pedido).
+
+Na primeira vez, a página de login é analisada (DOM): URL de ação, campo de
+usuário, campo de senha, campos hidden estáticos e nomes dos tokens dinâmicos
+(ex.: __RequestVerificationToken). O schema é gravado em
+LOGIN_SCHEMA_CACHE_DIR (padrão: .scrapy/login_schema) e os jobs seguintes só
+extraem os tokens por regex, sem montar o DOM da página.
+
+Se o login falhar (formulário de senha ainda presente na resposta), o schema é
+invalidado; se o POST tinha usado o cache, o spider refaz o login com análise
+completa da página.
+"""
+import hashlib
+import html
+import json
+import os
+import re
+
+from scrapy.http import FormRequest
+
+# Campos hidden cujo valor muda a cada carregamento da página
+TOKEN_NAME_RE = re.compile(r"token|csrf|xsrf|__viewstate|__eventvalidation", re.I)
+USER_NAME_HINTS = ("email", "user", "login", "usuario")
+PASSWORD_NAME_HINTS = ("senha", "password")
+
+
+def discover(response, login_url: str) -> tuple[dict, dict] | None:
+    """
+    Analisa o formulário de login da página.
+    Retorna (schema, tokens) ou None se não houver formulário.
+    """
+    form = response.xpath("//form[.//input[@type='password']]")
+    if not form:
+        form = response.xpath("//form")
+    if not form:
+        return None
+
+    form = form[0]
+    action = form.xpath("@action").get()
+    if action and not action.startswith("http"):
+        action = response.urljoin(action)
+
+    schema = {
+        "login_url": login_url,
+        "action": action or login_url,
+        "user_field": None,
+        "password_field": None,
+        "hidden": {},
+        "tokens": [],
+    }
+    tokens = {}
+    for inp in form.xpath(".//input[@name]"):
+        name = inp.xpath("@name").get()
+        if not name:
+            continue
+        name_lower = name.lower()
+        if inp.xpath("@type").get() == "password" or any(h in name_lower for h in PASSWORD_NAME_HINTS):
+            schema["password_field"] = name
+        elif any(h in name_lower for h in USER_NAME_HINTS):
+            schema["user_field"] = name
+        else:
+            val = inp.xpath("@value").get()
+            if val is None:
+                continue
+            if TOKEN_NAME_RE.search(name):
+                schema["tokens"].append(name)
+                tokens[name] = val
+            else:
+                schema["hidden"][name] = val
+    return schema, tokens
+
+
+def extract_tokens(text: str, names) -> dict | None:
+    """Valores dos tokens por regex no HTML; None se algum não for encontrado."""
+    tokens = {}
+    for name in names:
+        tag = re.search(r"<input\b[^>]*\bname\s*=\s*[\"']" + re.escape(name) + r"[\"'][^>]*>", text, re.I)
+        value = tag and re.search(r"\bvalue\s*=\s*(?:\"([^\"]*)\"|'([^']*)')", tag.group(0), re.I)
+        if not value:
+            return None
+        tokens[name] = html.unescape(value.group(1) if value.group(1) is not None else value.group(2))
+    return tokens
+
+
+def build_formdata(schema: dict, tokens: dict, user: str, password: str) -> dict:
+    """Dados do POST de login; sem campo identificado, usa nomes comuns."""
+    formdata = dict(schema["hidden"])
+    formdata.update(tokens)
+    if schema["user_field"]:
+        formdata[schema["user_field"]] = user
+    elif user:
+        formdata["Email"] = user
+        formdata["UserName"] = user
+    if schema["password_field"]:
+        formdata[schema["password_field"]] = password
+    elif password:
+        formdata["Senha"] = password
+        formdata["Password"] = password
+    return formdata
+
+
+class LoginSchemaCache:
+    """Schemas de formulário de login em disco, um arquivo JSON por login_url."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Cache configurado em settings; None com LOGIN_SCHEMA_CACHE_ENABLED desligado."""
+        if not crawler.settings.getbool("LOGIN_SCHEMA_CACHE_ENABLED", True):
+            return None
+        directory = crawler.settings.get("LOGIN_SCHEMA_CACHE_DIR")
+        if not directory:
+            from scrapy.utils.project import data_path
+
+            directory = data_path("login_schema")
+        return cls(directory)
+
+    def _path(self, login_url: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(login_url.encode()).hexdigest() + ".json")
+
+    def get(self, login_url: str) -> dict | None:
+        try:
+            with open(self._path(login_url), encoding="utf-8") as f:
+                schema = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return schema if schema.get("login_url") == login_url else None
+
+    def save(self, schema: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(schema["login_url"])
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(schema, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def invalidate(self, login_url: str):
+        try:
+            os.remove(self._path(login_url))
+        except FileNotFoundError:
+            pass
+
+
+def login_request(spider, response, callback) -> FormRequest | None:
+    """
+    POST de login a partir da página de login. Usa o schema em cache (tokens por
+    regex) salvo com meta login_schema_cache=False; None se não houver formulário.
+    """
+    cache = getattr(spider, "login_schema_cache", None)
+    stats = spider.crawler.stats
+    schema = None
+    if cache is not None and response.meta.get("login_schema_cache", True):
+        schema = cache.get(spider.login_url)
+        if schema is not None:
+            tokens = extract_tokens(response.text, schema["tokens"])
+            if tokens is None:
+                # Página mudou (token sumiu): descarta o schema e analisa de novo
+                cache.invalidate(spider.login_url)
+                stats.inc_value("login_schema/invalidated")
+                schema = None
+    cached = schema is not None
+    if cached:
+        stats.inc_value("login_schema/cache_hit")
+    else:
+        discovered = discover(response, spider.login_url)
+        if discovered is None:
+            return None
+        schema, tokens = discovered
+        stats.inc_value("login_schema/cache_miss")
+        if cache is not None:
+            cache.save(schema)
+
+    spider.logger.info("Enviando login para %s", schema["action"])
+    return FormRequest(
+        url=schema["action"],
+        formdata=build_formdata(schema, tokens, spider.user, spider.password),
+        callback=callback,
+        dont_filter=True,
+        meta={"login_schema_cached": cached},
+    )
+
+
+def login_failed(response, user: str) -> bool:
+    """Heurística de falha: o formulário de senha continua na resposta do login."""
+    return bool(user) and bool(response.xpath("//form[.//input[@type='password']]"))
+
+
+def handle_login_failure(spider, response) -> bool:
+    """
+    Invalida o schema após falha de login. Retorna True se o POST tinha usado o
+    cache (vale refazer o login com análise completa da página).
+    """
+    cache = getattr(spider, "login_schema_cache", None)
+    if cache is None:
+        return False
+    cache.invalidate(spider.login_url)
+    spider.crawler.stats.inc_value("login_schema/invalidated")
+    return bool(response.meta.get("login_schema_cached"))
@@ -1,2 +1,333 @@
 # Define here the models for your spider middleware
-# Scrapy built-in middlewares are sufficient for this project
+# Scrapy built-in middlewares cover o restante; aqui ficam os middlewares do projeto.
+import os
+
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.utils.defer import maybe_deferred_to_future
+from scrapy.utils.httpobj import urlparse_cached
+from twisted.internet.task import deferLater
+
+
+# Token bucket com reserva: cada chamada consome um token; sem token disponível,
+# o saldo fica negativo e o chamador recebe o tempo de espera até "seu" token.
+# Usa o relógio do Redis (TIME) para que hosts diferentes compartilhem a mesma base.
+# KEYS[1] = bucket, KEYS[2] = hash de métricas; ARGV = rate (tokens/s), burst.
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+  tokens = burst
+  ts = now
+end
+tokens = math.min(burst, tokens + (now - ts) * rate)
+tokens = tokens - 1
+local wait = 0
+if tokens < 0 then
+  wait = -tokens / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst / rate + wait) * 2000) + 1000)
+redis.call('HINCRBY', KEYS[2], 'requests', 1)
+if wait > 0 then
+  redis.call('HINCRBY', KEYS[2], 'delayed', 1)
+  redis.call('HINCRBYFLOAT', KEYS[2], 'wait_seconds', tostring(wait))
+end
+return tostring(wait)
+"""
+
+
+class RedisTokenBucket:
+    """
+    Token bucket distribuído no Redis (script Lua atômico).
+    acquire(key) reserva um token e retorna quantos segundos esperar antes de usá-lo.
+    """
+    def __init__(self, conn, rate: float, burst: float):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate deve ser > 0 e burst >= 1")
+        self.rate = rate
+        self.burst = burst
+        self._script = conn.register_script(TOKEN_BUCKET_LUA)
+
+    def acquire(self, key: str) -> float:
+        wait = self._script(keys=[key, f"{key}:metricas"], args=[self.rate, self.burst])
+        return float(wait)
+
+
+class RedisRateLimitMiddleware:
+    """
+    Limita a taxa global de requisições por domínio (e opcionalmente por conta do
+    fornecedor) compartilhada por todos os crawlers/workers via Redis.
+
+    Settings:
+      RATE_LIMIT_ENABLED: ativa o middleware.
+      RATE_LIMIT_REDIS_URL: Redis do bucket (padrão: REDIS_URL).
+      RATE_LIMIT_RATE / RATE_LIMIT_BURST: tokens por segundo e tamanho do bucket.
+      RATE_LIMIT_PER_ACCOUNT: bucket separado por conta (spider.user).
+
+    Métricas: stats ratelimit/requests, ratelimit/delayed, ratelimit/wait_time,
+    ratelimit/wait_time_max; acumulados globais no hash Redis ratelimit:<chave>:metricas.
+    """
+    key_prefix = "ratelimit"
+
+    def __init__(self, crawler, bucket: RedisTokenBucket, per_account: bool = False):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.bucket = bucket
+        self.per_account = per_account
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("RATE_LIMIT_ENABLED"):
+            raise NotConfigured
+        from redis import Redis
+
+        redis_url = settings.get("RATE_LIMIT_REDIS_URL") or os.environ.get(
+            "REDIS_URL", "redis://localhost:6379/0"
+        )
+        bucket = RedisTokenBucket(
+            Redis.from_url(redis_url),
+            rate=settings.getfloat("RATE_LIMIT_RATE", 2.0),
+            burst=settings.getfloat("RATE_LIMIT_BURST", 5),
+        )
+        return cls(crawler, bucket, per_account=settings.getbool("RATE_LIMIT_PER_ACCOUNT"))
+
+    def bucket_key(self, request, spider=None) -> str:
+        key = f"{self.key_prefix}:{urlparse_cached(request).hostname}"
+        conta = getattr(spider or self.crawler.spider, "user", "") if self.per_account else ""
+        if conta:
+            key += f":{conta}"
+        return key
+
+    async def process_request(self, request, spider=None):
+        wait = self.bucket.acquire(self.bucket_key(request, spider))
+        self.stats.inc_value("ratelimit/requests")
+        if wait > 0:
+            self.stats.inc_value("ratelimit/delayed")
+            self.stats.inc_value("ratelimit/wait_time", wait, start=0.0)
+            self.stats.max_value("ratelimit/wait_time_max", wait)
+            from twisted.internet import reactor
+
+            await maybe_deferred_to_future(deferLater(reactor, wait, lambda: None))
+        return None
+
+
+class CircuitBreakerMiddleware:
+    """
+    Circuit breaker por domínio do fornecedor (circuit_breaker.py), compartilhado
+    entre workers via Redis.
+
+    Cada resposta/erro alimenta o breaker do host (erros de rede, 5xx e 429 contam
+    como falha; download_latency acima de CB_SLOW_SECONDS conta como lenta). Com o
+    breaker aberto, o crawl é encerrado na hora (finish_reason "circuit_open") e o
+    runner levanta CircuitOpenError para o worker adiar o job.
+
+    Spiders com circuit_breaker_abort = False (ex.: pedido, que não pode parar no
+    meio de um lote) só alimentam o breaker; a checagem fica antes do crawl.
+
+    Settings: CIRCUIT_BREAKER_ENABLED (padrão: env CIRCUIT_BREAKER=1).
+    """
+    close_reason = "circuit_open"
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.stats = crawler.stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("CIRCUIT_BREAKER_ENABLED"):
+            raise NotConfigured
+        return cls(crawler)
+
+    def _breaker(self, request):
+        from circuit_breaker import breaker_for, supplier_upstream
+
+        return breaker_for(supplier_upstream(urlparse_cached(request).hostname))
+
+    def _abort(self, spider) -> bool:
+        return getattr(spider or self.crawler.spider, "circuit_breaker_abort", True)
+
+    def _trip(self, error, spider=None):
+        self.stats.set_value("circuit_breaker/upstream", error.upstream)
+        self.stats.set_value("circuit_breaker/retry_after", error.retry_after)
+        if self._abort(spider):
+            self.crawler.engine.close_spider(spider or self.crawler.spider, self.close_reason)
+
+    def process_request(self, request, spider=None):
+        from circuit_breaker import CircuitOpenError
+
+        breaker = self._breaker(request)
+        if breaker is None or not self._abort(spider):
+            return None
+        try:
+            breaker.before_call()
+        except CircuitOpenError as e:
+            self.stats.inc_value("circuit_breaker/rejected")
+            self._trip(e, spider)
+            raise IgnoreRequest(str(e))
+        return None
+
+    def process_response(self, request, response, spider=None):
+        breaker = self._breaker(request)
+        if breaker is not None:
+            ok = response.status < 500 and response.status != 429
+            self._record(breaker, ok, request.meta.get("download_latency"), spider)
+        return response
+
+    def process_exception(self, request, exception, spider=None):
+        breaker = self._breaker(request)
+        if breaker is not None and not isinstance(exception, IgnoreRequest):
+            self._record(breaker, False, request.meta.get("download_latency"), spider)
+        return None
+
+    def _record(self, breaker, ok, latency, spider):
+        from circuit_breaker import ABERTO, CircuitOpenError
+
+        if breaker.record(ok, latency) == ABERTO:
+            self.stats.inc_value("circuit_breaker/opened")
+            self._trip(CircuitOpenError(breaker.name, breaker.cooldown), spider)
+
+
+class PageCacheMiddleware:
+    """
+    GET condicional e detecção de mudança das páginas da listagem de produtos
+    (servimed_scraper.pagecache). Atua só em requisições com meta page_cache=True
+    de spiders com atributo page_cache (PageCache).
+
+    - Com ETag/Last-Modified gravados, envia If-None-Match/If-Modified-Since e
+      aceita 304 (status "not_modified").
+    - Em 200, compara o hash da região de produtos com o gravado: igual vira
+      "unchanged" (validadores atualizados); diferente, "changed", e o spider grava
+      os itens novos com PageCache.record.
+
+    Fica depois do HttpCompressionMiddleware (corpo já descomprimido).
+    Settings: PAGE_CACHE_ENABLED (env PAGE_CACHE=1), PAGE_CACHE_PATH.
+    Métricas: stats page_cache/not_modified, page_cache/unchanged, page_cache/changed.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.stats = crawler.stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("PAGE_CACHE_ENABLED"):
+            raise NotConfigured
+        return cls(crawler)
+
+    def _cache(self, spider):
+        return getattr(spider or self.crawler.spider, "page_cache", None)
+
+    def process_request(self, request, spider=None):
+        cache = self._cache(spider)
+        if cache is None or not request.meta.get("page_cache") or request.method != "GET":
+            return None
+        entry = cache.get(request.meta.setdefault("page_cache_url", request.url))
+        if entry is None:
+            return None
+        if entry["etag"]:
+            request.headers.setdefault("If-None-Match", entry["etag"])
+        if entry["last_modified"]:
+            request.headers.setdefault("If-Modified-Since", entry["last_modified"])
+        if entry["etag"] or entry["last_modified"]:
+            request.meta["handle_httpstatus_list"] = [*request.meta.get("handle_httpstatus_list", []), 304]
+        return None
+
+    def process_response(self, request, response, spider=None):
+        from servimed_scraper.pagecache import CHANGED, NOT_MODIFIED, UNCHANGED, region_hash
+
+        cache = self._cache(spider)
+        url = request.meta.get("page_cache_url")
+        if cache is None or url is None:
+            return response
+        if response.status == 304:
+            if cache.get(url) is None:
+                # Página sumiu do cache entre a requisição e a resposta: baixa de novo
+                retry = request.replace(dont_filter=True)
+                retry.headers.pop("If-None-Match", None)
+                retry.headers.pop("If-Modified-Since", None)
+                retry.meta["page_cache"] = False
+                retry.meta.pop("page_cache_url", None)
+                return retry
+            request.meta["page_cache_status"] = NOT_MODIFIED
+            self.stats.inc_value("page_cache/not_modified")
+            return response
+        if response.status != 200 or not hasattr(response, "text"):
+            return response
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        etag = etag.decode("latin-1") if etag else None
+        last_modified = last_modified.decode("latin-1") if last_modified else None
+        content_hash = region_hash(response.text)
+        entry = cache.get(url)
+        if entry is not None and entry["content_hash"] == content_hash:
+            request.meta["page_cache_status"] = UNCHANGED
+            cache.update_validators(url, etag, last_modified)
+            self.stats.inc_value("page_cache/unchanged")
+        else:
+            request.meta.update({
+                "page_cache_status": CHANGED,
+                "page_cache_hash": content_hash,
+                "page_cache_etag": etag,
+                "page_cache_last_modified": last_modified,
+            })
+            self.stats.inc_value("page_cache/changed")
+        return response
+
+
+class LatencyStatsMiddleware:
+    """
+    Percentis do tempo de download por requisição (download_latency, em ms) nas
+    stats do crawl: latency/p50, latency/p90, latency/p99, latency/max e
+    latency/count. Fica junto ao downloader: cada resposta da rede conta, inclusive
+    as que serão retentadas. Guarda no máximo LATENCY_STATS_SAMPLE latências
+    (amostragem por reservatório acima disso).
+
+    Settings: LATENCY_STATS_ENABLED (padrão: ligado).
+    """
+
+    def __init__(self, crawler, sample: int):
+        import random
+
+        self.stats = crawler.stats
+        self.sample = sample
+        self.latencias: list[float] = []
+        self.vistas = 0
+        self.random = random.Random(0)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        from scrapy import signals
+
+        if not crawler.settings.getbool("LATENCY_STATS_ENABLED", True):
+            raise NotConfigured
+        mw = cls(crawler, crawler.settings.getint("LATENCY_STATS_SAMPLE", 10000))
+        crawler.signals.connect(mw.spider_closed, signal=signals.spider_closed)
+        return mw
+
+    def process_response(self, request, response, spider=None):
+        latencia = request.meta.get("download_latency")
+        if latencia is not None:
+            self.vistas += 1
+            if len(self.latencias) < self.sample:
+                self.latencias.append(latencia)
+            else:
+                i = self.random.randrange(self.vistas)
+                if i < self.sample:
+                    self.latencias[i] = latencia
+        return response
+
+    def spider_closed(self, spider, reason):
+        if not self.latencias:
+            return
+        ordenadas = sorted(self.latencias)
+        for nome, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+            self.stats.set_value(f"latency/{nome}", round(ordenadas[int(q * (len(ordenadas) - 1))] * 1000, 1))
+        self.stats.set_value("latency/max", round(ordenadas[-1] * 1000, 1))
+        self.stats.set_value("latency/count", self.vistas)
@@ -0,0 +1,139 @@
+"""
+Cache persistente das páginas da listagem de produtos (GET condicional + detecção de mudança).
+
+Por URL (e conta do fornecedor, pois o catálogo pode variar por cliente) ficam
+gravados em SQLite: ETag, Last-Modified, hash da região de produtos e os itens e
+próximas URLs extraídos na última vez em que a página foi analisada.
+
+O PageCacheMiddleware envia If-None-Match/If-Modified-Since quando há validadores.
+Resposta 304, ou 200 com o mesmo hash da região (tabela de produtos + paginação),
+marca a página como inalterada e o spider reaproveita os itens gravados sem
+analisar o HTML.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+
+# Região que define o conteúdo da página: tabelas de produtos e links de paginação.
+# Fora dela (tokens, banners, relógio) a página pode mudar sem alterar os itens.
+REGION_RE = re.compile(
+    r"<table\b.*?</table>"
+    r"|<ul\b[^>]*pagination.*?</ul>"
+    r"|<a\b[^>]*>[^<]*(?:Próxim|Next|»)[^<]*</a>",
+    re.S | re.I,
+)
+
+# Estado da página em request.meta["page_cache_status"]
+NOT_MODIFIED = "not_modified"
+UNCHANGED = "unchanged"
+CHANGED = "changed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS paginas (
+  conta TEXT NOT NULL,
+  url TEXT NOT NULL,
+  etag TEXT,
+  last_modified TEXT,
+  content_hash TEXT NOT NULL,
+  items TEXT NOT NULL,
+  next_urls TEXT NOT NULL,
+  atualizado_em REAL NOT NULL,
+  PRIMARY KEY (conta, url)
+)
+"""
+
+
+def region_hash(text: str) -> str:
+    """sha1 da região de produtos (página inteira se não houver tabela/paginação)."""
+    partes = REGION_RE.findall(text) or [text]
+    h = hashlib.sha1()
+    for parte in partes:
+        h.update(re.sub(r"\s+", " ", parte).encode())
+    return h.hexdigest()
+
+
+class PageCache:
+    """Páginas da listagem por (conta, url) em um arquivo SQLite."""
+
+    def __init__(self, path: str, conta: str = ""):
+        self.path = path
+        self.conta = conta or ""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Vários workers no mesmo host podem usar o mesmo arquivo
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(SCHEMA)
+
+    @classmethod
+    def from_crawler(cls, crawler, conta: str = ""):
+        """Cache configurado em settings; None com PAGE_CACHE_ENABLED desligado."""
+        if not crawler.settings.getbool("PAGE_CACHE_ENABLED"):
+            return None
+        path = crawler.settings.get("PAGE_CACHE_PATH")
+        if not path:
+            from scrapy.utils.project import data_path
+
+            path = data_path("page_cache.sqlite3")
+        return cls(path, conta)
+
+    def get(self, url: str) -> dict | None:
+        row = self.db.execute(
+            "SELECT etag, last_modified, content_hash, items, next_urls FROM paginas WHERE conta = ? AND url = ?",
+            (self.conta, url),
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "etag": row[0],
+            "last_modified": row[1],
+            "content_hash": row[2],
+            "items": json.loads(row[3]),
+            "next_urls": json.loads(row[4]),
+        }
+
+    def save(self, url: str, content_hash: str, items: list[dict], next_urls: list[str],
+             etag: str | None = None, last_modified: str | None = None):
+        self.db.execute(
+            "INSERT OR REPLACE INTO paginas VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                self.conta, url, etag, last_modified, content_hash,
+                json.dumps(items, ensure_ascii=False), json.dumps(next_urls), time.time(),
+            ),
+        )
+
+    def update_validators(self, url: str, etag: str | None, last_modified: str | None):
+        self.db.execute(
+            "UPDATE paginas SET etag = ?, last_modified = ?, atualizado_em = ? WHERE conta = ? AND url = ?",
+            (etag, last_modified, time.time(), self.conta, url),
+        )
+
+    def replay(self, response) -> tuple[list[dict], list[str]] | None:
+        """(itens, próximas URLs) gravados se a página não mudou; None para analisar."""
+        if response.meta.get("page_cache_status") not in (NOT_MODIFIED, UNCHANGED):
+            return None
+        entry = self.get(response.meta["page_cache_url"])
+        if entry is None:
+            return None
+        return entry["items"], entry["next_urls"]
+
+    def record(self, response, items: list[dict], next_urls: list[str]):
+        """Grava a página analisada com os validadores e o hash vistos pelo middleware."""
+        meta = response.meta
+        if meta.get("page_cache_status") != CHANGED:
+            return
+        self.save(
+            meta["page_cache_url"],
+            meta["page_cache_hash"],
+            items,
+            next_urls,
+            etag=meta.get("page_cache_etag"),
+            last_modified=meta.get("page_cache_last_modified"),
+        )
+
+    def close(self):
+        self.db.close()
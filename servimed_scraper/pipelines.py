@@ -1,3 +1,19 @@
+class SharedList(list):
+    """
+    Lista de resultados passada via settings que sobrevive à cópia dos settings.
+    O Scrapy faz deepcopy dos settings para cada crawler; uma lista comum seria
+    copiada e o runner nunca veria o que os pipelines gravaram.
+    """
+    def __deepcopy__(self, memo):
+        return self
+
+
+class SharedDict(dict):
+    """Como SharedList, para resultados agrupados (ex.: itens por conta)."""
+    def __deepcopy__(self, memo):
+        return self
+
+
 class CollectOrderResultPipeline:
     """
     Pipeline que armazena o resultado do pedido (codigo_confirmacao, status)
@@ -22,15 +38,24 @@ class CollectOrderResultPipeline:
 class CollectItemsPipeline:
     """
     Pipeline que armazena os itens em uma lista (para uso pelo worker).
-    A lista é passada via settings['COLLECT_ITEMS_LIST'].
+    A lista é passada via settings['COLLECT_ITEMS_LIST']. Com vários crawlers
+    (uma conta do fornecedor cada) no mesmo processo, settings['COLLECT_ITEMS_BY_ACCOUNT']
+    (dict conta -> lista) separa os itens pela conta do spider.
     """
-    def __init__(self, items_list):
+    def __init__(self, items_list, by_account=None):
         self.items_list = items_list
+        self.by_account = by_account
 
     @classmethod
     def from_crawler(cls, crawler):
-        return cls(items_list=crawler.settings.get("COLLECT_ITEMS_LIST", []))
+        return cls(
+            items_list=crawler.settings.get("COLLECT_ITEMS_LIST", []),
+            by_account=crawler.settings.get("COLLECT_ITEMS_BY_ACCOUNT"),
+        )
 
     def process_item(self, item, spider):
-        self.items_list.append(dict(item))
+        if self.by_account is not None:
+            self.by_account.setdefault(getattr(spider, "user", ""), []).append(dict(item))
+        else:
+            self.items_list.append(dict(item))
         return item
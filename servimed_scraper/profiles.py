@@ -0,0 +1,88 @@
+"""
+Perfis de conexão do crawler (HTTP_PROFILE; env SERVIMED_HTTP_PROFILE).
+
+  default  configuração atual de settings.py (HTTP/1.1, autothrottle conservador)
+  fast     alto throughput contra o fornecedor:
+           - HTTPS via HTTP/2 com multiplexação (H2FallbackDownloadHandler: volta
+             para HTTP/1.1 no host que não negociar h2 por ALPN; exige h2 e um
+             Scrapy com BaseDownloadHandler, senão HTTPS fica em HTTP/1.1)
+           - descompressão gzip/deflate/br garantida (COMPRESSION_ENABLED; br
+             exige o pacote brotli)
+           - mais requisições por domínio; no HTTP/1.1 o pool de conexões
+             persistentes por host acompanha CONCURRENT_REQUESTS_PER_DOMAIN
+           - cache de DNS maior e threadpool do reactor para resoluções paralelas
+
+Aplicado pelo add-on HttpProfileAddon (ADDONS em settings.py): sobrescreve os
+valores de settings.py, mas não custom_settings do spider nem -s na linha de comando.
+Comparação com o perfil default: benchmarks/http_profile.py.
+"""
+import importlib.util
+import logging
+
+logger = logging.getLogger(__name__)
+
+PROFILES = {
+    "default": {},
+    "fast": {
+        "DOWNLOAD_HANDLERS": {
+            "https": "servimed_scraper.handlers.H2FallbackDownloadHandler",
+        },
+        "COMPRESSION_ENABLED": True,
+        "CONCURRENT_REQUESTS": 32,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": 16,
+        "AUTOTHROTTLE_START_DELAY": 0.25,
+        "AUTOTHROTTLE_TARGET_CONCURRENCY": 8.0,
+        "DNSCACHE_ENABLED": True,
+        "DNSCACHE_SIZE": 10000,
+        "DNS_TIMEOUT": 10,
+        "REACTOR_THREADPOOL_MAXSIZE": 20,
+    },
+}
+
+
+def _async_handler_api() -> bool:
+    """
+    Scrapy com a API de download handlers usada por H2FallbackDownloadHandler
+    (BaseDownloadHandler com download_request assíncrono).
+    """
+    try:
+        from scrapy.core.downloader.handlers.base import BaseDownloadHandler  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def profile_settings(name: str) -> dict:
+    """Settings do perfil; ValueError para nome desconhecido."""
+    if name not in PROFILES:
+        raise ValueError(f"Perfil HTTP desconhecido: {name!r} (use {', '.join(PROFILES)})")
+    values = dict(PROFILES[name])
+    if "DOWNLOAD_HANDLERS" in values and importlib.util.find_spec("h2") is None:
+        # Sem h2 instalado o handler HTTP/2 não carrega: mantém HTTP/1.1
+        logger.warning("Perfil %s: pacote h2 ausente, HTTPS continua em HTTP/1.1 (pip install h2)", name)
+        del values["DOWNLOAD_HANDLERS"]
+    elif "DOWNLOAD_HANDLERS" in values and not _async_handler_api():
+        # Scrapy antigo: o handler do projeto não carrega; mantém o handler padrão
+        logger.warning("Perfil %s: Scrapy sem BaseDownloadHandler, HTTPS continua em HTTP/1.1 (atualize o Scrapy)", name)
+        del values["DOWNLOAD_HANDLERS"]
+    if name != "default" and importlib.util.find_spec("brotli") is None and importlib.util.find_spec("brotlicffi") is None:
+        logger.warning("Perfil %s: pacote brotli ausente, respostas br não serão pedidas", name)
+    return values
+
+
+class HttpProfileAddon:
+    """Add-on Scrapy que aplica o perfil HTTP_PROFILE."""
+
+    def update_settings(self, settings):
+        from scrapy.settings import SETTINGS_PRIORITIES
+
+        name = settings.get("HTTP_PROFILE") or "default"
+        for key, value in profile_settings(name).items():
+            prioridade = settings.getpriority(key) or 0
+            if prioridade > SETTINGS_PRIORITIES["project"]:
+                continue  # custom_settings do spider e -s prevalecem sobre o perfil
+            if key == "DOWNLOAD_HANDLERS":
+                handlers = dict(settings.getdict("DOWNLOAD_HANDLERS"))
+                handlers.update(value)
+                value = handlers
+            settings.set(key, value, max(prioridade, SETTINGS_PRIORITIES["addon"]))
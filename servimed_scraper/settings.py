@@ -1,4 +1,5 @@
 # Scrapy settings for servimed_scraper project
+import os
 
 BOT_NAME = "servimed_scraper"
 SPIDER_MODULES = ["servimed_scraper.spiders"]
@@ -23,6 +24,66 @@ AUTOTHROTTLE_ENABLED = True
 AUTOTHROTTLE_START_DELAY = 1
 AUTOTHROTTLE_MAX_DELAY = 5
 
+# Limite global de requisições compartilhado entre workers (token bucket no Redis).
+# AUTOTHROTTLE só enxerga um crawler; com vários workers o total fica sem limite.
+RATE_LIMIT_ENABLED = os.environ.get("SERVIMED_RATE_LIMIT", "0") == "1"
+RATE_LIMIT_REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_RATE = float(os.environ.get("SERVIMED_RATE_LIMIT_RATE", "2"))    # req/s por domínio
+RATE_LIMIT_BURST = float(os.environ.get("SERVIMED_RATE_LIMIT_BURST", "5"))
+RATE_LIMIT_PER_ACCOUNT = os.environ.get("SERVIMED_RATE_LIMIT_PER_ACCOUNT", "0") == "1"
+
+# Crawl distribuído de produtos (fronteira compartilhada no Redis)
+DISTRIBUTED_REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+DISTRIBUTED_SEED_TIMEOUT = 300  # s que um worker espera o coordenador semear
+
+# Schema do formulário de login em cache por login_url (ver servimed_scraper/login_form.py)
+LOGIN_SCHEMA_CACHE_ENABLED = os.environ.get("LOGIN_SCHEMA_CACHE", "1") == "1"
+LOGIN_SCHEMA_CACHE_DIR = os.environ.get("LOGIN_SCHEMA_CACHE_DIR", "")  # vazio: .scrapy/login_schema
+
+# Circuit breaker por domínio do fornecedor (ver circuit_breaker.py)
+CIRCUIT_BREAKER_ENABLED = os.environ.get("CIRCUIT_BREAKER", "0") == "1"
+
+# Cache das páginas da listagem: GET condicional e hash da tabela de produtos
+# (ver servimed_scraper/pagecache.py)
+PAGE_CACHE_ENABLED = os.environ.get("PAGE_CACHE", "0") == "1"
+PAGE_CACHE_PATH = os.environ.get("PAGE_CACHE_PATH", "")  # vazio: .scrapy/page_cache.sqlite3
+
+DOWNLOADER_MIDDLEWARES = {
+    # Depois do HttpCompressionMiddleware (590) nas respostas
+    "servimed_scraper.middlewares.PageCacheMiddleware": 580,
+    "servimed_scraper.middlewares.RedisRateLimitMiddleware": 900,
+    "servimed_scraper.middlewares.CircuitBreakerMiddleware": 950,
+    "servimed_scraper.middlewares.LatencyStatsMiddleware": 960,
+}
+
+# Percentis de latência por requisição nas stats do crawl (ver crawl_stats.py)
+LATENCY_STATS_ENABLED = True
+LATENCY_STATS_SAMPLE = 10000
+
+# Tracing (spans Zipkin v2 em TRACE_FILE; ver tracing.py). Desativado sem TRACE_FILE.
+TRACING_ENABLED = bool(os.environ.get("TRACE_FILE"))
+EXTENSIONS = {
+    "servimed_scraper.extensions.TracingExtension": 500,
+    "servimed_scraper.extensions.JobBudgetExtension": 510,
+    "servimed_scraper.extensions.JobCancelExtension": 520,
+}
+
+# Cancelamento/desligamento gracioso do job (job_cancel.py): chave definida pelo runner
+JOB_CANCEL_KEY = ""
+JOB_CANCEL_REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+JOB_CANCEL_CHECK_INTERVAL = 1.0
+
+# Orçamento do job (job_budget.py): preenchido pelo runner a partir do payload/fila
+JOB_BUDGET = {}
+JOB_BUDGET_CHECK_INTERVAL = 1.0  # s entre verificações de prazo e memória
+
+# Perfil de conexão: "default" (acima) ou "fast" (HTTP/2, compressão, mais
+# concorrência e cache de DNS). Ver servimed_scraper/profiles.py
+HTTP_PROFILE = os.environ.get("SERVIMED_HTTP_PROFILE", "default")
+ADDONS = {
+    "servimed_scraper.profiles.HttpProfileAddon": 0,
+}
+
 # Log level (INFO para execução normal)
 LOG_LEVEL = "INFO"
 
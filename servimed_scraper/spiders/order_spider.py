@@ -6,6 +6,7 @@ Retorna o código de confirmação do pedido (Servimed) para callback na API do
 import re
 import scrapy
 from scrapy.http import FormRequest
+from servimed_scraper import login_form
 from servimed_scraper.items import OrderResultItem
 
 
@@ -14,10 +15,17 @@ class OrderSpider(scrapy.Spider):
     Spider que simula a realização de um pedido no site do fornecedor.
     Recebe: usuario, senha, id_pedido (ref. API), lista de produtos (gtin, codigo, quantidade).
     Retorna: codigo_confirmacao (código do pedido na Servimed), status.
+
+    Modo lote: com `pedidos` ([{"id_pedido": ..., "produtos": [...]}, ...]) faz um
+    único login e submete cada pedido na mesma sessão, em sequência ou com até
+    `concorrencia` pedidos em andamento. Gera um OrderResultItem por pedido.
     """
     name = "order"
     allowed_domains = ["pedidoeletronico.servimed.com.br"]
     base_url = "https://pedidoeletronico.servimed.com.br"
+    # Um lote de pedidos não é interrompido pelo circuit breaker (evita pedidos
+    # feitos no site sem registro); a checagem do breaker é feita antes do crawl.
+    circuit_breaker_abort = False
 
     def __init__(
         self,
@@ -26,6 +34,8 @@ class OrderSpider(scrapy.Spider):
         id_pedido=None,
         produtos=None,
         login_url=None,
+        pedidos=None,
+        concorrencia=1,
         **kwargs,
     ):
         super().__init__(**kwargs)
@@ -35,21 +45,47 @@ class OrderSpider(scrapy.Spider):
         # produtos: [{"gtin": "...", "codigo": "...", "quantidade": 1}, ...]
         self.produtos = produtos if isinstance(produtos, list) else []
         self.login_url = login_url or f"{self.base_url}/"
-        self._order_result = None
-
-    def start_requests(self):
-        yield scrapy.Request(
+        # Lote de pedidos; sem lote, o pedido único vira um lote de um elemento
+        if isinstance(pedidos, list) and pedidos:
+            self.pedidos = [
+                {
+                    "id_pedido": str(p.get("id_pedido") or ""),
+                    "produtos": p.get("produtos") if isinstance(p.get("produtos"), list) else [],
+                }
+                for p in pedidos
+            ]
+        else:
+            self.pedidos = [{"id_pedido": str(self.id_pedido), "produtos": self.produtos}]
+        self.concorrencia = max(1, int(concorrencia or 1))
+        self._pendentes = list(self.pedidos)
+        self.login_schema_cache = None
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.login_schema_cache = login_form.LoginSchemaCache.from_crawler(crawler)
+        return spider
+
+    def _login_page_request(self, use_cache=True):
+        return scrapy.Request(
             self.login_url,
             callback=self.parse_login_page,
             dont_filter=True,
+            meta={"login_schema_cache": use_cache},
         )
 
+    def start_requests(self):
+        """Primeira requisição: página de login (fallback para Scrapy < 2.13)."""
+        yield self._login_page_request()
+
+    async def start(self, *args, **kwargs):
+        """Scrapy 2.13+: inicia com requisição à página de login."""
+        yield self._login_page_request()
+
     def parse_login_page(self, response):
-        """Localiza formulário de login e envia credenciais."""
-        form = response.xpath("//form[.//input[@type='password']]")
-        if not form:
-            form = response.xpath("//form")
-        if not form:
+        """Envia as credenciais (schema do formulário em cache, ver servimed_scraper.login_form)."""
+        request = login_form.login_request(self, response, callback=self.parse_after_login_or_order_page)
+        if request is None:
             self.logger.warning("Formulário de login não encontrado.")
             yield scrapy.Request(
                 self.base_url + "/",
@@ -57,58 +93,57 @@ class OrderSpider(scrapy.Spider):
                 dont_filter=True,
             )
             return
+        yield request
 
-        form = form[0]
-        action = form.xpath("@action").get()
-        if action and not action.startswith("http"):
-            action = response.urljoin(action)
-        form_action = action or self.login_url
-
-        inputs = form.xpath(".//input[@name]")
-        formdata = {}
-        user_key = None
-        password_key = None
-
-        for inp in inputs:
-            name = inp.xpath("@name").get()
-            if not name:
-                continue
-            name_lower = name.lower()
-            if inp.xpath("@type").get() == "password":
-                password_key = name
-            elif "senha" in name_lower or "password" in name_lower:
-                password_key = name
-            elif "email" in name_lower or "user" in name_lower or "usuario" in name_lower:
-                user_key = name
-            else:
-                val = inp.xpath("@value").get()
-                if val is not None:
-                    formdata[name] = val
-
-        if user_key:
-            formdata[user_key] = self.user
-        if password_key:
-            formdata[password_key] = self.password
-        if not formdata.get(user_key or "") and self.user:
-            formdata["Email"] = self.user
-            formdata["UserName"] = self.user
-        if not formdata.get(password_key or "") and self.password:
-            formdata["Senha"] = self.password
-            formdata["Password"] = self.password
-
-        yield FormRequest(
-            url=form_action,
-            formdata=formdata,
-            callback=self.parse_after_login_or_order_page,
+    def parse_after_login_or_order_page(self, response):
+        """
+        Após login, inicia a submissão dos pedidos na mesma sessão.
+        O primeiro pedido usa a própria página pós-login; os demais (até
+        `concorrencia` em paralelo) recarregam a página de pedido.
+        """
+        if response.meta.get("login_schema_cached") is not None and login_form.login_failed(response, self.user):
+            self.logger.warning("Possível falha no login: formulário de senha ainda presente.")
+            if login_form.handle_login_failure(self, response):
+                # Schema em cache desatualizado: refaz o login analisando a página
+                yield self._login_page_request(use_cache=False)
+                return
+        self.order_page_url = response.url
+        first = self._next_pedido()
+        if first is None:
+            return
+        yield from self._submit_order(response, first)
+        for _ in range(self.concorrencia - 1):
+            request = self._order_page_request()
+            if request is None:
+                break
+            yield request
+
+    def parse_order_page(self, response):
+        """Página de pedido recarregada para o próximo pedido do lote."""
+        yield from self._submit_order(response, response.meta["pedido"])
+
+    def _next_pedido(self):
+        return self._pendentes.pop(0) if self._pendentes else None
+
+    def _order_page_request(self):
+        """Requisição da página de pedido para o próximo pedido pendente (ou None)."""
+        pedido = self._next_pedido()
+        if pedido is None:
+            return None
+        return scrapy.Request(
+            self.order_page_url,
+            callback=self.parse_order_page,
             dont_filter=True,
+            meta={"pedido": pedido},
         )
 
-    def parse_after_login_or_order_page(self, response):
+    def _submit_order(self, response, pedido):
         """
-        Após login, procura página/formulário de pedido.
+        Procura página/formulário de pedido.
         Se existir form de pedido (carrinho, finalizar pedido), preenche e envia.
         Caso contrário, simula sucesso com código baseado em id_pedido (ambiente de teste).
         """
+        produtos = pedido["produtos"]
         # Tenta encontrar formulário de pedido/carrinho (nomes comuns)
         order_form = response.xpath(
             "//form[contains(@action, 'pedido') or contains(@action, 'carrinho') "
@@ -117,7 +152,7 @@ class OrderSpider(scrapy.Spider):
         if not order_form:
             order_form = response.xpath("//form[.//input[contains(@name, 'quantidade')]]")
 
-        if order_form and self.produtos:
+        if order_form and produtos:
             # Preencher e enviar formulário de pedido (estrutura depende do site)
             form = order_form[0]
             action = form.xpath("@action").get()
@@ -130,7 +165,7 @@ class OrderSpider(scrapy.Spider):
                 formdata[inp.xpath("@name").get()] = inp.xpath("@value").get()
 
             # Inserir itens do pedido (campos podem ser quantidade_123, item_gtin[], etc.)
-            for i, item in enumerate(self.produtos):
+            for i, item in enumerate(produtos):
                 gtin = str(item.get("gtin", ""))
                 codigo = str(item.get("codigo", ""))
                 qty = int(item.get("quantidade", 1))
@@ -143,6 +178,7 @@ class OrderSpider(scrapy.Spider):
                 formdata=formdata,
                 callback=self.parse_order_confirmation,
                 dont_filter=True,
+                meta={"pedido": pedido},
             )
         else:
             # Sem formulário de pedido visível: simulação (site real pode não expor form igual)
@@ -151,15 +187,17 @@ class OrderSpider(scrapy.Spider):
                 response.url,
                 callback=self.parse_order_confirmation,
                 dont_filter=True,
-                meta={"simulated": True},
+                meta={"simulated": True, "pedido": pedido},
             )
 
     def parse_order_confirmation(self, response):
         """
         Extrai código de confirmação do pedido da página de sucesso.
         Se meta['simulated'] ou não encontrar, retorna código simulado (SERV-{id_pedido}).
+        Em seguida, encadeia o próximo pedido pendente do lote.
         """
         simulated = response.meta.get("simulated", False)
+        id_pedido = response.meta["pedido"]["id_pedido"]
         codigo_confirmacao = None
         # Seletores comuns para código do pedido na página de confirmação
         for sel in [
@@ -180,9 +218,14 @@ class OrderSpider(scrapy.Spider):
 
         if not codigo_confirmacao:
             # Fallback: código simulado para integração com API (e ambiente de teste)
-            codigo_confirmacao = f"SERV-{self.id_pedido}" if self.id_pedido else "SERV-CONF"
+            codigo_confirmacao = f"SERV-{id_pedido}" if id_pedido else "SERV-CONF"
 
         yield OrderResultItem(
+            id_pedido=id_pedido,
             codigo_confirmacao=codigo_confirmacao,
             status="pedido_realizado",
         )
+
+        request = self._order_page_request()
+        if request is not None:
+            yield request
@@ -1,11 +1,30 @@
 """
 Spider para login no site Servimed e extração da listagem de produtos.
 Nível 1 - Desafio Cotefácil: Scrapy sem Selenium/Playwright.
+
+Modo distribuído (crawl_id + distributed_role): as páginas da listagem vêm de uma
+fronteira compartilhada no Redis (servimed_scraper.frontier). O coordenador faz o
+login, publica a sessão e semeia a fronteira; os workers, em qualquer host, usam a
+mesma sessão, retiram páginas, publicam novas URLs e gravam os itens no sink comum.
+
+Checkpoint (argumento checkpoint, ver servimed_scraper.checkpoint): cada página
+da listagem é registrada; numa retentativa, após o login, o spider segue direto para
+as URLs pendentes em vez de recomeçar pela primeira página.
+
+Cache de páginas (PAGE_CACHE_ENABLED, ver servimed_scraper.pagecache): páginas da
+listagem inalteradas desde o último crawl (304 ou mesmo hash da tabela) não são
+analisadas; itens e próxima página vêm do cache.
 """
+import os
 import re
+import time
+
 import scrapy
-from scrapy.http import FormRequest
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
+from servimed_scraper import login_form
 from servimed_scraper.items import ProductItem
+from servimed_scraper.pagecache import PageCache
 
 
 class ProductsSpider(scrapy.Spider):
@@ -15,107 +34,115 @@ class ProductsSpider(scrapy.Spider):
     base_url = "https://pedidoeletronico.servimed.com.br"
 
     # Parâmetros configuráveis via -a user= e -a password=
-    def __init__(self, user=None, password=None, login_url=None, products_url=None, **kwargs):
+    def __init__(
+        self,
+        user=None,
+        password=None,
+        login_url=None,
+        products_url=None,
+        crawl_id=None,
+        distributed_role=None,
+        checkpoint=None,
+        **kwargs,
+    ):
         super().__init__(**kwargs)
         self.user = user or ""
         self.password = password or ""
         self.login_url = login_url or f"{self.base_url}/"
         self.products_url = products_url or f"{self.base_url}/"
+        # Modo distribuído: "coordinator" (login + semeadura) ou "worker"
+        self.crawl_id = crawl_id
+        self.distributed_role = distributed_role if crawl_id else None
+        self.frontier = None
+        self._session_cookie = None
+        self._idle_since = None
+        self.login_schema_cache = None
+        self.page_cache = None
+        # CrawlCheckpoint (só no modo não distribuído); passado por scraper_runner
+        self.checkpoint = None if self.distributed_role else checkpoint
 
-    def start_requests(self):
-        """Primeira requisição: página de login (fallback para Scrapy < 2.13)."""
-        yield scrapy.Request(
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.login_schema_cache = login_form.LoginSchemaCache.from_crawler(crawler)
+        if not spider.distributed_role:
+            # Modo distribuído grava os itens na fronteira; o cache de páginas é por processo
+            spider.page_cache = PageCache.from_crawler(crawler, conta=spider.user)
+        if spider.distributed_role:
+            from redis import Redis
+            from servimed_scraper.frontier import RedisFrontier
+
+            redis_url = crawler.settings.get("DISTRIBUTED_REDIS_URL") or os.environ.get(
+                "REDIS_URL", "redis://localhost:6379/0"
+            )
+            spider.frontier = RedisFrontier(Redis.from_url(redis_url), spider.crawl_id)
+            crawler.signals.connect(spider.spider_idle, signal=signals.spider_idle)
+        return spider
+
+    def _initial_requests(self):
+        if self.distributed_role == "worker":
+            # Workers não fazem login: usam a sessão publicada pelo coordenador
+            return self._requests_from_frontier()
+        return [self._login_page_request()]
+
+    def _login_page_request(self, use_cache=True):
+        return scrapy.Request(
             self.login_url,
             callback=self.parse_login_page,
             dont_filter=True,
+            meta={"login_schema_cache": use_cache},
         )
 
+    def start_requests(self):
+        """Primeira requisição: página de login (fallback para Scrapy < 2.13)."""
+        yield from self._initial_requests()
+
     async def start(self, *args, **kwargs):
         """Scrapy 2.13+: inicia com requisição à página de login."""
-        yield scrapy.Request(
-            self.login_url,
-            callback=self.parse_login_page,
-            dont_filter=True,
-        )
+        for request in self._initial_requests():
+            yield request
 
     def parse_login_page(self, response):
         """
-        Localiza o formulário de login, descobre os nomes dos campos e envia o POST.
-        Compatível com formulários que usam Email/Usuario/UserName e Senha/Password.
+        Envia o POST de login (schema do formulário em cache por login_url, ver
+        servimed_scraper.login_form). Compatível com Email/Usuario/UserName e Senha/Password.
         """
-        # Tenta encontrar a URL de ação do formulário (login)
-        form = response.xpath("//form[.//input[@type='password']]")
-        if not form:
-            form = response.xpath("//form")
-        if not form:
+        request = login_form.login_request(self, response, callback=self.after_login)
+        if request is None:
             self.logger.warning("Nenhum formulário encontrado na página de login. Verifique login_url e a estrutura do site.")
             # Mesmo assim tenta ir para a listagem (site pode não ter login separado)
-            yield scrapy.Request(
-                self.products_url,
-                callback=self.parse_products_list,
-                dont_filter=True,
-            )
+            yield from self._listing_requests()
             return
-
-        form = form[0]
-        action = form.xpath("@action").get()
-        if action and not action.startswith("http"):
-            action = response.urljoin(action)
-        form_action = action or self.login_url
-
-        # Descobre nomes dos campos: usuário (email/login) e senha
-        inputs = form.xpath(".//input[@name]")
-        formdata = {}
-        user_key = None
-        password_key = None
-
-        for inp in inputs:
-            name = inp.xpath("@name").get()
-            if not name:
-                continue
-            name_lower = name.lower()
-            if inp.xpath("@type").get() == "password":
-                password_key = name
-            elif "senha" in name_lower or "password" in name_lower:
-                password_key = name
-            elif "email" in name_lower or "user" in name_lower or "login" in name_lower or "usuario" in name_lower:
-                user_key = name
-            else:
-                # Inclui campos hidden (ex.: __RequestVerificationToken) para o POST
-                val = inp.xpath("@value").get()
-                if val is not None:
-                    formdata[name] = val
-
-        if user_key:
-            formdata[user_key] = self.user
-        if password_key:
-            formdata[password_key] = self.password
-
-        if not formdata.get(user_key or "") and self.user:
-            # Fallback: nomes comuns
-            formdata["Email"] = self.user
-            formdata["UserName"] = self.user
-        if not formdata.get(password_key or "") and self.password:
-            formdata["Senha"] = self.password
-            formdata["Password"] = self.password
-
-        self.logger.info("Enviando login para %s", form_action)
-        yield FormRequest(
-            url=form_action,
-            formdata=formdata,
-            callback=self.after_login,
-            dont_filter=True,
-        )
+        yield request
 
     def after_login(self, response):
         """Após o login, acessa a listagem de produtos."""
         # Verificação simples: se ainda houver formulário de senha, login pode ter falhado
-        if response.xpath("//form[.//input[@type='password']]") and self.user:
+        if login_form.login_failed(response, self.user):
             self.logger.warning("Possível falha no login: formulário de senha ainda presente.")
-        yield scrapy.Request(
-            self.products_url,
+            if login_form.handle_login_failure(self, response):
+                # Schema em cache desatualizado: refaz o login analisando a página
+                yield self._login_page_request(use_cache=False)
+                return
+        yield from self._listing_requests()
+
+    def _listing_requests(self):
+        """Primeira página da listagem ou, com checkpoint, as páginas pendentes."""
+        if self.checkpoint is not None and self.checkpoint.has_progress():
+            pendentes = self.checkpoint.pending_urls()
+            self.logger.info("Retomando crawl do checkpoint: %d páginas pendentes", len(pendentes))
+            self.crawler.stats.set_value("checkpoint/resumed", True)
+            for url in pendentes:
+                yield self._listing_request(url)
+            return
+        yield self._listing_request(self.products_url)
+
+    def _listing_request(self, url):
+        return scrapy.Request(
+            url,
             callback=self.parse_products_list,
             dont_filter=True,
+            meta={"checkpoint_url": url, "page_cache": True},
         )
 
     def parse_products_list(self, response):
@@ -123,7 +150,44 @@ class ProductsSpider(scrapy.Spider):
         Extrai a listagem de produtos.
         Tenta múltiplas estratégias: tabela (tr), listas (.item, .produto, [data-*]).
         """
-        # Estratégia 1: linhas de tabela (thead + tbody tr)
+        if self.distributed_role:
+            yield from self._parse_products_distributed(response)
+            return
+
+        cached = self.page_cache.replay(response) if self.page_cache is not None else None
+        if cached is not None:
+            # Página inalterada (304 ou mesmo hash): itens e paginação do cache
+            items = [ProductItem(**i) for i in cached[0]]
+            proximas = cached[1]
+            self.crawler.stats.inc_value("page_cache/items_replayed", len(items))
+        else:
+            # Paginação: links "Próxima", "Next", número da página
+            next_page = (
+                response.xpath("//a[contains(.,'Próxim') or contains(.,'Next') or contains(.,'»')]/@href").get()
+                or response.xpath("//ul[contains(@class,'pagination')]//a[@rel='next']/@href").get()
+            )
+            items = list(self._extract_products(response))
+            proximas = [response.urljoin(next_page)] if next_page else []
+            if self.page_cache is not None:
+                self.page_cache.record(response, [dict(i) for i in items], proximas)
+
+        if self.checkpoint is None:
+            yield from items
+            for next_url in proximas:
+                yield scrapy.Request(next_url, callback=self.parse_products_list, meta={"page_cache": True})
+            return
+
+        url = response.meta.get("checkpoint_url", response.url)
+        for next_url in self.checkpoint.record_page(url, [dict(i) for i in items], proximas):
+            yield self._listing_request(next_url)
+        self.crawler.stats.inc_value("checkpoint/pages")
+        yield from items
+
+    def closed(self, reason):
+        if self.page_cache is not None:
+            self.page_cache.close()
+
+    def _extract_products(self, response):
         rows = response.xpath("//table[@class='table']//tbody/tr | //table//tbody/tr")
         if not rows:
             rows = response.xpath("//table//tr[position()>1]")
@@ -137,13 +201,80 @@ class ProductsSpider(scrapy.Spider):
             if item and (item.get("gtin") or item.get("codigo") or item.get("descricao")):
                 yield item
 
-        # Paginação: links "Próxima", "Next", número da página
-        next_page = (
-            response.xpath("//a[contains(.,'Próxim') or contains(.,'Next') or contains(.,'»')]/@href").get()
-            or response.xpath("//ul[contains(@class,'pagination')]//a[@rel='next']/@href").get()
-        )
-        if next_page:
-            yield response.follow(next_page, callback=self.parse_products_list)
+    # ---------- Modo distribuído ----------
+
+    def _page_links(self, response):
+        """Todos os links de paginação da página (fan-out máximo entre workers)."""
+        hrefs = response.xpath(
+            "//ul[contains(@class,'pagination')]//a/@href"
+            " | //a[contains(.,'Próxim') or contains(.,'Next') or contains(.,'»')]/@href"
+        ).getall()
+        return [response.urljoin(h) for h in hrefs if h and not h.startswith(("#", "javascript:"))]
+
+    def _parse_products_distributed(self, response):
+        seeding = self.distributed_role == "coordinator" and not self.frontier.is_seeded()
+        if seeding:
+            # Primeira página autenticada: publica a sessão para os workers
+            cookie = response.request.headers.get("Cookie")
+            self._session_cookie = cookie.decode() if cookie else ""
+            self.frontier.save_session(self._session_cookie)
+            self.frontier.mark_seen({response.url, response.request.url, self.products_url})
+            url = None
+        else:
+            url = response.meta.get("frontier_url", response.url)
+
+        items = list(self._extract_products(response))
+        novos = self.frontier.complete_page(url, [dict(i) for i in items], self._page_links(response))
+        if seeding:
+            # Só depois de publicar as URLs: antes disso os workers não podem concluir
+            self.frontier.mark_seeded()
+        self.crawler.stats.inc_value("distributed/pages")
+        self.crawler.stats.inc_value("distributed/urls_published", novos)
+        yield from items
+        yield from self._requests_from_frontier()
+
+    def _requests_from_frontier(self):
+        """Requisições para as próximas URLs da fronteira (com a sessão compartilhada)."""
+        if self._session_cookie is None:
+            self._session_cookie = self.frontier.load_session()
+            if self._session_cookie is None:
+                return []
+        n = max(1, self.crawler.settings.getint("CONCURRENT_REQUESTS_PER_DOMAIN", 8))
+        requests = []
+        for url in self.frontier.pop(n):
+            headers = {"Cookie": self._session_cookie} if self._session_cookie else {}
+            requests.append(scrapy.Request(
+                url,
+                callback=self.parse_products_list,
+                headers=headers,
+                dont_filter=True,
+                meta={"frontier_url": url, "dont_merge_cookies": True},
+            ))
+        return requests
+
+    def spider_idle(self, spider=None):
+        """Sem requisições locais: busca mais URLs; só encerra quando a fronteira esvaziar."""
+        self.frontier.requeue_expired()
+        requests = self._requests_from_frontier()
+        for request in requests:
+            self.crawler.engine.crawl(request)
+        if requests or self.frontier.is_complete():
+            self._idle_since = None
+            if requests:
+                raise DontCloseSpider
+            return
+        if not self.frontier.is_seeded():
+            if self.distributed_role == "coordinator":
+                # Login ou primeira página falhou: não há o que distribuir
+                self.logger.error("Crawl %s não foi semeado (falha no login?)", self.crawl_id)
+                return
+            # Worker aguarda o coordenador semear, até DISTRIBUTED_SEED_TIMEOUT
+            self._idle_since = self._idle_since or time.monotonic()
+            timeout = self.crawler.settings.getfloat("DISTRIBUTED_SEED_TIMEOUT", 300)
+            if time.monotonic() - self._idle_since > timeout:
+                self.logger.error("Crawl %s não foi semeado em %ss", self.crawl_id, timeout)
+                return
+        raise DontCloseSpider
 
     def _extract_product_from_row(self, row, response):
         """Extrai um ProductItem a partir de uma linha (tr ou div)."""
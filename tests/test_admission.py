@@ -0,0 +1,66 @@
+"""Testes para admission (profundidade máxima, deduplicação por conta e ttl na fila)."""
+import fakeredis
+import pytest
+from rq import Queue
+
+import admission
+from admission import ADIADO, ADMITIDO, REJEITADO, QueueAdmission
+from scheduling import fair_queue
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    monkeypatch.setenv("QUEUE_ADMISSION", '{"scraping": {"max_depth": 3, "ttl": 120, "retry_after": 15}}')
+    return Queue("scraping", connection=fakeredis.FakeRedis())
+
+
+def test_politica_padrao_e_env(monkeypatch):
+    monkeypatch.delenv("QUEUE_ADMISSION", raising=False)
+    assert admission.policy("pedido") == {"max_depth": 0, "ttl": None, "retry_after": 60}
+    assert admission.policy("scraping.abc123") == {"max_depth": 0, "ttl": None, "retry_after": 60}
+    monkeypatch.setenv("QUEUE_ADMISSION", '{"scraping": {"ttl": 3600}}')
+    assert admission.policy("scraping.abc123")["ttl"] == 3600
+    monkeypatch.setenv("QUEUE_ADMISSION", '{"*": {"max_depth": 7}, "pedido": {"ttl": 30}}')
+    assert admission.policy("pedido") == {"max_depth": 7, "ttl": 30, "retry_after": 60}
+    monkeypatch.setenv("QUEUE_ADMISSION", '{"*": {"max_jobs": 7}}')
+    with pytest.raises(ValueError, match="max_jobs"):
+        admission.policy("pedido")
+
+
+def test_conta_com_job_na_fila_e_rejeitada(queue):
+    primeiro = admission.enqueue(queue, "worker.process_scraping_task", {"usuario": "a", "senha": "s"}, dedup=True)
+    assert primeiro["resultado"] == ADMITIDO
+    assert queue.fetch_job(primeiro["job_id"]).ttl == 120
+
+    segundo = admission.enqueue(queue, "worker.process_scraping_task", {"usuario": "a", "senha": "s"}, dedup=True)
+    assert segundo == {"resultado": REJEITADO, "motivo": "duplicado", "job_id": primeiro["job_id"]}
+
+    queue.fetch_job(primeiro["job_id"]).set_status("started")  # já rodando: novo job é aceito
+    assert admission.enqueue(queue, "worker.process_scraping_task", {"usuario": "a", "senha": "s"}, dedup=True)[
+        "resultado"] == ADMITIDO
+
+
+def test_fila_cheia_adia_e_conta_subfilas(queue):
+    fair_queue(queue.connection, "scraping", "x").enqueue("worker.process_scraping_task", {})
+    res = admission.enqueue_bulk(
+        queue, "worker.process_scraping_task",
+        [{"usuario": u, "senha": "s"} for u in ("a", "b", "a", "c")], dedup=True,
+    )
+    assert len(res["jobs"]) == 2 and len(queue) == 2
+    motivos = [r["motivo"] for _, r in res["recusados"]]
+    assert motivos == ["duplicado", "fila_cheia"]
+    adiado = res["recusados"][1][1]
+    assert adiado["resultado"] == ADIADO and adiado["profundidade"] == 3 and adiado["retry_after"] == 15
+    assert QueueAdmission(queue).capacity() == 0
+
+
+def test_pedido_adiado_com_fila_cheia(monkeypatch):
+    from pedido_ledger import PedidoLedger, enqueue_pedido_idempotente
+
+    monkeypatch.setenv("QUEUE_ADMISSION", '{"pedido": {"max_depth": 1}}')
+    queue = Queue("pedido", connection=fakeredis.FakeRedis())
+    payload = {"usuario": "a", "senha": "s", "produtos": []}
+    assert enqueue_pedido_idempotente(queue, {**payload, "id_pedido": "1"})["resultado"] == "ok"
+    res = enqueue_pedido_idempotente(queue, {**payload, "id_pedido": "2"})
+    assert res["resultado"] == ADIADO
+    assert PedidoLedger(queue.connection).get("2") == {}  # nada reservado no ledger
@@ -14,6 +14,7 @@ from api_client import (
     patch_pedido,
     post_pedido,
     post_produtos,
+    post_produtos_stream,
     signup,
 )
 
@@ -74,6 +75,66 @@ def test_post_produtos(api_base):
     assert "Bearer abc" in req.headers.get("Authorization", "")
 
 
+def _produtos(n):
+    for i in range(n):
+        yield {"gtin": str(i), "codigo": f"A{i}", "descricao": "Dipirona ção", "preco_fabrica": "1,50", "estoque": "3"}
+
+
+@pytest.mark.parametrize("gzip", [False, True])
+@responses.activate
+def test_post_produtos_stream_corpo_chunked(api_base, gzip):
+    import json
+    import zlib
+
+    recebido = {}
+
+    def callback(request):
+        corpo = b"".join(request.body)  # gerador: Transfer-Encoding chunked
+        recebido["headers"] = request.headers
+        recebido["itens"] = json.loads(zlib.decompress(corpo, 31) if gzip else corpo)
+        return 201, {}, json.dumps({"recebidos": len(recebido["itens"])})
+
+    responses.add_callback(responses.POST, f"{api_base}/produto", callback=callback)
+    result = post_produtos_stream(_produtos(3000), token="abc", base_url=api_base, gzip=gzip)
+
+    assert result == {"recebidos": 3000}
+    assert recebido["headers"]["Transfer-Encoding"] == "chunked"
+    assert recebido["headers"].get("Content-Encoding") == ("gzip" if gzip else None)
+    assert recebido["itens"][1] == {
+        "gtin": "1", "codigo": "A1", "descricao": "Dipirona ção", "preco_fabrica": 1.5, "estoque": 3,
+    }
+
+
+def test_post_produtos_stream_mock_api():
+    """Upload em stream (chunked + gzip) contra a API mock (tests_mock_server) rodando em uvicorn."""
+    pytest.importorskip("fastapi")
+    uvicorn = pytest.importorskip("uvicorn")
+    import socket
+    import threading
+    import time
+
+    from tests_mock_server import app as mock
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        porta = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(mock.app, host="127.0.0.1", port=porta, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    try:
+        while not server.started:
+            time.sleep(0.01)
+        base = f"http://127.0.0.1:{porta}"
+        signup("stream_user", "stream_pass", base_url=base)
+        token = get_token("stream_user", "stream_pass", base_url=base)
+        assert post_produtos_stream(_produtos(20000), token=token, base_url=base, gzip=True) == {"recebidos": 20000}
+        assert post_produtos_stream(_produtos(10), token=token, base_url=base) == {"recebidos": 10}
+        assert mock.produtos["A19999"]["preco_fabrica"] == 1.5
+    finally:
+        server.should_exit = True
+        thread.join(5)
+
+
 @responses.activate
 def test_post_pedido(api_base):
     responses.add(
@@ -122,3 +183,15 @@ def test_patch_pedido(api_base):
     body = json.loads(req.body)
     assert body["codigo_confirmacao"] == "ABC987"
     assert body["status"] == "pedido_realizado"
+
+
+@responses.activate
+def test_list_pedidos_envia_filtros(api_base):
+    from api_client import list_pedidos
+
+    responses.add(responses.GET, f"{api_base}/pedido", json=[{"id": 8}], status=200)
+    result = list_pedidos(token="tok", base_url=api_base, after_id=7, pendente=True, limit=50)
+    assert result == [{"id": 8}]
+    req = responses.calls[0].request
+    assert "after_id=7" in req.url and "pendente=true" in req.url and "limit=50" in req.url
+    assert req.headers["Authorization"] == "Bearer tok"
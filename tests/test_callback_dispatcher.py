@@ -0,0 +1,119 @@
+"""Testes para callback_dispatcher (PATCH /pedido/:id em lote fora dos jobs)."""
+import json
+import time
+from unittest.mock import patch
+
+import fakeredis
+import pytest
+import requests
+
+import callback_dispatcher
+from callback_dispatcher import DEAD_KEY, PENDING_KEY, QUEUE_KEY, CallbackDispatcher
+from pedido_ledger import PedidoLedger
+
+
+@pytest.fixture
+def conn():
+    return fakeredis.FakeRedis()
+
+
+def _http_error(codigo):
+    resposta = requests.Response()
+    resposta.status_code = codigo
+    return requests.HTTPError(f"{codigo}", response=resposta)
+
+
+def _dispatcher(conn, **kwargs):
+    return CallbackDispatcher(conn, "api_user", "api_pass", concurrency=4, **kwargs)
+
+
+def test_atualizacoes_do_mesmo_pedido_sao_mescladas(conn):
+    callback_dispatcher.push_callback(conn, 1, "C1", "pendente")
+    callback_dispatcher.push_callback(conn, 1, "C1", "pedido_realizado")
+    callback_dispatcher.push_callback(conn, 2, "C2", "pedido_realizado")
+    assert callback_dispatcher.pending(conn) == 2
+
+    with patch("api_client.get_token", return_value="t") as mock_token, \
+            patch("api_client.patch_pedido", return_value={}) as mock_patch:
+        contagem = _dispatcher(conn).dispatch_once()
+
+    assert contagem == {"enviado": 2, "reagendado": 0, "falha": 0}
+    mock_token.assert_called_once()
+    enviados = {c.kwargs["id_pedido"]: c.kwargs["status"] for c in mock_patch.call_args_list}
+    assert enviados == {1: "pedido_realizado", 2: "pedido_realizado"}
+    assert callback_dispatcher.pending(conn) == 0 and conn.zcard(QUEUE_KEY) == 0
+    assert PedidoLedger(conn).get("1")["etapa"] == "concluido"
+
+
+def test_falha_reagenda_so_o_pedido_com_backoff(conn):
+    callback_dispatcher.push_callback(conn, 1, "C1", "ok")
+    callback_dispatcher.push_callback(conn, 2, "C2", "ok")
+
+    def patch_pedido(**kwargs):
+        if kwargs["id_pedido"] == 2:
+            raise _http_error(503)
+        return {}
+
+    with patch("api_client.get_token", return_value="t"), \
+            patch("api_client.patch_pedido", side_effect=patch_pedido):
+        dispatcher = _dispatcher(conn, backoff_base=30)
+        assert dispatcher.dispatch_once() == {"enviado": 1, "reagendado": 1, "falha": 0}
+        # Retentativa só depois do backoff
+        assert dispatcher.dispatch_once() == {"enviado": 0, "reagendado": 0, "falha": 0}
+
+    assert json.loads(conn.hget(PENDING_KEY, "2"))["tentativas"] == 1
+    assert conn.zscore(QUEUE_KEY, "2") > time.time() + 20
+    assert conn.hget(PENDING_KEY, "1") is None
+
+
+def test_erro_4xx_e_tentativas_esgotadas_vao_para_falhas(conn):
+    callback_dispatcher.push_callback(conn, 1, "C1", "ok")
+    callback_dispatcher.push_callback(conn, 2, "C2", "ok")
+
+    def patch_pedido(**kwargs):
+        raise _http_error(404) if kwargs["id_pedido"] == 1 else ConnectionError("reset")
+
+    with patch("api_client.get_token", return_value="t"), \
+            patch("api_client.patch_pedido", side_effect=patch_pedido):
+        contagem = _dispatcher(conn, max_attempts=1).dispatch_once()
+
+    assert contagem == {"enviado": 0, "reagendado": 0, "falha": 2}
+    assert callback_dispatcher.pending(conn) == 0
+    assert json.loads(conn.hget(DEAD_KEY, "1"))["erro"] == "404"
+
+
+def test_callback_substituido_durante_o_envio_nao_e_perdido(conn):
+    callback_dispatcher.push_callback(conn, 1, "C1", "pendente")
+
+    def patch_pedido(**kwargs):
+        # Novo status chega enquanto o anterior está sendo enviado
+        callback_dispatcher.push_callback(conn, 1, "C1", "pedido_realizado")
+        return {}
+
+    with patch("api_client.get_token", return_value="t"), \
+            patch("api_client.patch_pedido", side_effect=patch_pedido):
+        _dispatcher(conn).dispatch_once()
+
+    assert json.loads(conn.hget(PENDING_KEY, "1"))["status"] == "pedido_realizado"
+    assert PedidoLedger(conn).get("1").get("etapa") != "concluido"
+
+
+def test_claim_retoma_callbacks_de_dispatcher_que_morreu(conn):
+    callback_dispatcher.push_callback(conn, 1, "C1", "ok")
+    assert len(_dispatcher(conn, lease=60).claim()) == 1
+    assert _dispatcher(conn).claim() == []  # em envio por outro dispatcher
+
+    conn.zadd(QUEUE_KEY, {"1": 0})  # lease vencido
+    assert [id_ for id_, _ in _dispatcher(conn).claim()] == ["1"]
+
+
+def test_id_pedido_nao_numerico_vai_direto_para_falhas(conn):
+    callback_dispatcher.push_callback(conn, "PED-1", "C1", "ok")
+
+    with patch("api_client.get_token", return_value="t"), \
+            patch("api_client.patch_pedido") as mock_patch:
+        contagem = _dispatcher(conn, max_attempts=5).dispatch_once()
+
+    assert contagem == {"enviado": 0, "reagendado": 0, "falha": 1}
+    mock_patch.assert_not_called()
+    assert "não numérico" in json.loads(conn.hget(DEAD_KEY, "PED-1"))["erro"]
@@ -0,0 +1,88 @@
+"""Testes para catalog_index (índice em memória do catálogo e troca de snapshots)."""
+import json
+
+import pytest
+
+import catalog_index
+from catalog_index import CatalogIndex, CatalogStore, fold
+
+PRODUTOS = [
+    {"gtin": "7891", "codigo": "A1", "descricao": "DIPIRONA SÓDICA 500MG CX 20 COMPRIMIDOS"},
+    {"gtin": "7892", "codigo": "A2", "descricao": "DIPIRONA GOTAS 500MG/ML CX 1 FRASCO"},
+    {"gtin": "7893", "codigo": "A3", "descricao": "SOLUÇÃO FISIOLÓGICA 0,9% CX 1"},
+    {"gtin": "7894", "codigo": "A4", "descricao": "ÁCIDO ACETILSALICÍLICO 100MG CX 30 COMPRIMIDOS"},
+]
+
+
+def _gtins(produtos):
+    return [p["gtin"] for p in produtos]
+
+
+@pytest.fixture(params=["bitmap", "array"])
+def index(request, monkeypatch):
+    # "array": só termos presentes em todos os produtos viram bitmap
+    monkeypatch.setattr(catalog_index, "BITMAP_DENSITY", 64 if request.param == "bitmap" else 1)
+    return CatalogIndex(PRODUTOS)
+
+
+def test_fold_remove_acentos():
+    assert fold("SOLUÇÃO Fisiológica") == "solucao fisiologica"
+
+
+def test_busca_por_palavras_sem_acento_e_prefixo(index):
+    assert _gtins(index.search("dipirona")) == ["7891", "7892"]
+    assert _gtins(index.search("DIPIRONA compr")) == ["7891"]
+    assert _gtins(index.search("solucao fisio")) == ["7893"]
+    assert _gtins(index.search("acido 100mg")) == ["7894"]
+    assert _gtins(index.search("cx", limit=2)) == ["7891", "7892"]
+    assert index.search("dipirona xarope") == []
+
+
+def test_busca_e_mapas_exatos(index):
+    assert index.get_gtin("7893")["codigo"] == "A3"
+    assert index.get_codigo("A4")["gtin"] == "7894"
+    assert index.get_gtin("0") is None
+    assert _gtins(index.search("7892")) == ["7892"]
+
+
+def test_prefixo_com_mais_termos_que_prefix_max_terms():
+    # 5000 produtos, termos w0..w4999: "w1" casa 1111 termos distintos
+    produtos = [
+        {"gtin": str(i), "codigo": f"C{i}", "descricao": f"W{i} {'CX' if i % 2 else 'FR'}"}
+        for i in range(5000)
+    ]
+    idx = CatalogIndex(produtos)
+    for consulta in ("w1", "cx w1", "fr w15", "w4999"):
+        *exatas, prefixo = catalog_index.tokens(consulta)
+        esperado = [
+            p["gtin"] for p in produtos
+            if all(t in catalog_index.tokens(p["descricao"]) for t in exatas)
+            and any(t.startswith(prefixo) for t in catalog_index.tokens(p["descricao"]))
+        ]
+        assert _gtins(idx.search(consulta, limit=len(produtos))) == esperado
+
+
+def test_store_troca_snapshot_e_mantem_indice_com_json_invalido(tmp_path):
+    path = tmp_path / "produtos.json"
+    path.write_text(json.dumps(PRODUTOS[:1]), encoding="utf-8")
+    store = CatalogStore(str(path))
+    assert store.refresh() and len(store.index) == 1
+    antigo = store.index
+    assert not store.refresh()  # snapshot não mudou
+
+    path.write_text("[{", encoding="utf-8")  # gravação pela metade
+    assert not store.refresh(force=True)
+    assert store.index is antigo
+
+    path.write_text(json.dumps(PRODUTOS), encoding="utf-8")
+    assert store.refresh(force=True)
+    assert _gtins(store.index.search("dipirona")) == ["7891", "7892"]
+    assert _gtins(antigo.search("dipirona")) == ["7891"]  # consultas em andamento seguem no antigo
+
+
+def test_store_diretorio_com_um_snapshot_por_conta(tmp_path):
+    (tmp_path / "a.json").write_text(json.dumps(PRODUTOS[:2]), encoding="utf-8")
+    (tmp_path / "b.json").write_text(json.dumps(PRODUTOS[2:]), encoding="utf-8")
+    store = CatalogStore(str(tmp_path))
+    assert store.refresh()
+    assert len(store.index) == 4
@@ -0,0 +1,116 @@
+"""Testes para catalog_store (snapshots comprimidos, deduplicação de chunks e diff)."""
+import random
+from unittest.mock import patch
+
+import pytest
+
+from catalog_store import CatalogStore
+from change_events import ALTERADO, NOVO, REMOVIDO
+
+
+def _catalogo(n, preco=lambda i: f"{i % 97},00"):
+    return [{"codigo": f"{i:06d}", "descricao": f"PRODUTO {i}", "preco_fabrica": preco(i), "estoque": str(i % 13)}
+            for i in range(n)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CatalogStore(str(tmp_path), chunk_records=16)
+
+
+def test_snapshot_ordenado_e_chunks_reaproveitados(store):
+    catalogo = _catalogo(2000)
+    random.Random(1).shuffle(catalogo)
+    primeiro = store.put("conta@x", catalogo, agora=1000)
+    assert primeiro["produtos"] == 2000 and len(primeiro["chunks"]) > 10
+    assert [p["codigo"] for p in store.records("conta@x", primeiro["id"])] == [f"{i:06d}" for i in range(2000)]
+
+    # Um preço alterado e um produto novo: só a coluna preco_fabrica de um bloco e
+    # as colunas do bloco onde o produto novo cai são gravadas
+    catalogo = _catalogo(2000, preco=lambda i: "1,00" if i == 500 else f"{i % 97},00") + _catalogo(2001)[-1:]
+    segundo = store.put("conta@x", catalogo, agora=2000)
+    assert segundo["blobs_novos"] <= 1 + 5
+    assert segundo["bytes_gravados"] < primeiro["bytes_gravados"] / 5
+    assert store.put("conta@x", catalogo, agora=3000)["blobs_novos"] == 0
+
+
+def test_mudanca_de_estoque_grava_so_a_coluna(store):
+    catalogo = _catalogo(3000)
+    primeiro = store.put("c", catalogo, agora=1000)
+    for p in catalogo:
+        p["estoque"] = "0"
+    segundo = store.put("c", catalogo, agora=2000)
+    # Só colunas estoque novas; SKUs, códigos, descrições e preços reaproveitados
+    assert segundo["blobs_novos"] <= len({c["colunas"]["estoque"] for c in segundo["chunks"]})
+    for antes, depois in zip(primeiro["chunks"], segundo["chunks"]):
+        assert {k: v for k, v in antes["colunas"].items() if k != "estoque"} == \
+            {k: v for k, v in depois["colunas"].items() if k != "estoque"}
+
+
+def test_diff_igual_ao_de_forca_bruta(store):
+    rng = random.Random(7)
+    antes = _catalogo(1500)
+    depois = [dict(p) for p in antes if rng.random() > 0.02]
+    for p in rng.sample(depois, 30):
+        p["estoque"] = "0"
+    depois += [{"codigo": f"9{i:05d}", "preco_fabrica": "2,00"} for i in range(20)]
+    a = store.put("c", antes, agora=1000)["id"]
+    b = store.put("c", depois, agora=2000)["id"]
+
+    mudancas = list(store.diff("c", a, b))
+    por_sku_antes = {p["codigo"]: p for p in antes}
+    por_sku_depois = {p["codigo"]: p for p in depois}
+    esperado = {s: REMOVIDO for s in por_sku_antes.keys() - por_sku_depois.keys()}
+    esperado.update({s: NOVO for s in por_sku_depois.keys() - por_sku_antes.keys()})
+    esperado.update({s: ALTERADO for s in por_sku_antes.keys() & por_sku_depois.keys()
+                     if por_sku_antes[s] != por_sku_depois[s]})
+    assert {m["sku"]: m["tipo"] for m in mudancas} == esperado
+    assert [m["sku"] for m in mudancas] == sorted(esperado)
+    assert list(store.diff("c", b, "-1")) == []
+
+
+def test_diff_le_so_o_que_mudou(store):
+    catalogo = _catalogo(3000)
+    a = store.put("c", catalogo, agora=1000)
+    catalogo[1234]["estoque"] = "999"
+    b = store.put("c", catalogo, agora=2000)
+
+    with patch.object(store, "read_column", wraps=store.read_column) as lidas:
+        mudancas = list(store.diff("c", a["id"], b["id"]))
+    assert mudancas == [{
+        "tipo": ALTERADO,
+        "sku": "001234",
+        "anterior": {**catalogo[1234], "estoque": str(1234 % 13)},
+        "atual": catalogo[1234],
+    }]
+    # Só o bloco alterado: estoque dos dois lados, depois as outras colunas uma vez
+    assert lidas.call_count == 2 + len(b["chunks"][0]["colunas"]) - 1
+
+
+def test_retencao_e_compactacao(store):
+    dia = 86400
+    for d in range(10):
+        for h in (1, 2):  # dois snapshots por dia
+            store.put("c", _catalogo(200, preco=lambda i, d=d, h=h: f"{d}{h},{i}"), agora=d * dia + h * 3600)
+    agora = 10 * dia
+    apagados = store.retain("c", keep_last=3, keep_daily=5, agora=agora)
+    ids = store.snapshot_ids("c")
+    # 3 mais recentes + o último de cada um dos dias 5..9
+    assert len(ids) == 6 and len(apagados) == 14
+    assert store.compact(grace=3600)["blobs_removidos"] == 0  # gravados há pouco
+
+    resultado = store.compact(grace=0)
+    assert resultado["blobs_removidos"] > 0
+    for snapshot_id in ids:
+        assert len(list(store.records("c", snapshot_id))) == 200
+    uso = store.usage()
+    assert uso["snapshots"] == 6 and uso["blobs"] == resultado["blobs_mantidos"]
+
+
+def test_snapshot_inexistente(store):
+    store.put("c", [], agora=1000)
+    assert list(store.records("c", "-1")) == []
+    with pytest.raises(KeyError):
+        store.manifest("c", "-2")
+    with pytest.raises(KeyError):
+        store.manifest("outra", "20260101T000000000000Z")
@@ -0,0 +1,90 @@
+"""Testes para change_events (diff do catálogo e stream de mudanças)."""
+import fakeredis
+import pytest
+
+import change_events
+from change_events import ALTERADO, NOVO, REMOVIDO, ChangeFeed
+
+
+@pytest.fixture
+def conn():
+    return fakeredis.FakeRedis()
+
+
+def _p(codigo, preco, estoque):
+    return {"gtin": f"789{codigo}", "codigo": codigo, "descricao": "X", "preco_fabrica": preco, "estoque": estoque}
+
+
+def test_primeiro_crawl_so_grava_base(conn):
+    feed = ChangeFeed(conn)
+    assert feed.publish("conta", [_p("1", "10,00", "5")]) == {ALTERADO: 0, NOVO: 0, REMOVIDO: 0}
+    assert conn.xlen(change_events.STREAM_KEY) == 0
+    assert conn.hlen("produtos:estado:conta") == 1
+
+
+def test_eventos_por_sku_alterado(conn):
+    feed = ChangeFeed(conn)
+    feed.publish("conta", [_p("1", "10,00", "5"), _p("2", "3,00", "1"), _p("3", "1,00", "0")])
+    contagem = feed.publish("conta", [_p("1", "9,50", "5"), _p("2", "3,00", "1"), _p("4", "2,00", "7")], crawl="job-2")
+    assert contagem == {ALTERADO: 1, NOVO: 1, REMOVIDO: 1}
+
+    eventos = {e["sku"]: e for _, e in change_events._eventos(conn.xrange(change_events.STREAM_KEY))}
+    assert eventos["1"]["preco_fabrica_anterior"] == "10,00" and eventos["1"]["preco_fabrica"] == "9,50"
+    assert eventos["1"]["crawl"] == "job-2"
+    assert eventos["4"]["tipo"] == NOVO and eventos["4"]["estoque"] == "7"
+    assert eventos["3"]["tipo"] == REMOVIDO and eventos["3"]["estoque_anterior"] == "0"
+
+    # Mesmo catálogo de novo (ex.: retentativa do job): nenhum evento
+    assert feed.publish("conta", [_p("1", "9,50", "5"), _p("2", "3,00", "1"), _p("4", "2,00", "7")])[ALTERADO] == 0
+    assert conn.xlen(change_events.STREAM_KEY) == 3
+
+
+def test_crawl_parcial_nao_remove(conn):
+    feed = ChangeFeed(conn)
+    feed.publish("conta", [_p("1", "1", "1"), _p("2", "2", "2")])
+    assert feed.publish("conta", [_p("1", "1", "0")], completo=False) == {ALTERADO: 1, NOVO: 0, REMOVIDO: 0}
+    assert conn.hlen("produtos:estado:conta") == 2
+
+
+def test_stream_limitado(conn):
+    feed = ChangeFeed(conn, maxlen=10)
+    feed.publish("conta", [_p(str(i), "1", "1") for i in range(100)])
+    feed.publish("conta", [_p(str(i), "2", "1") for i in range(100)])
+    assert conn.xlen(change_events.STREAM_KEY) < 100
+
+
+def test_grupo_de_consumidores(conn):
+    feed = ChangeFeed(conn)
+    change_events.ensure_group(conn, "precos")
+    change_events.ensure_group(conn, "precos")  # idempotente
+    feed.publish("conta", [_p("1", "1", "1"), _p("2", "1", "1")])
+    feed.publish("conta", [_p("1", "2", "1"), _p("2", "2", "1")])
+
+    primeiro = change_events.read(conn, "precos", "c1", count=1)
+    segundo = change_events.read(conn, "precos", "c2", count=10)
+    assert [e["sku"] for _, e in primeiro + segundo] == ["1", "2"]
+    assert change_events.ack(conn, "precos", [id_ for id_, _ in segundo]) == 1
+
+    # c1 morreu sem ack: c2 reassume o evento pendente
+    reassumidos = change_events.claim_stale(conn, "precos", "c2", min_idle_ms=0)
+    assert [e["sku"] for _, e in reassumidos] == ["1"]
+
+
+def test_crawls_concorrentes_nao_duplicam_eventos(conn):
+    feed = ChangeFeed(conn)
+    feed.publish("conta", [_p("1", "10,00", "5")])
+    diff_original = feed.diff
+    concorrentes = [ChangeFeed(conn)]
+
+    def diff_com_crawl_concorrente(*args, **kwargs):
+        # Outro worker publica o mesmo catálogo entre o diff e o EXEC deste
+        resultado = diff_original(*args, **kwargs)
+        if concorrentes:
+            concorrentes.pop().publish("conta", [_p("1", "9,00", "5")])
+        return resultado
+
+    feed.diff = diff_com_crawl_concorrente
+    contagem = feed.publish("conta", [_p("1", "9,00", "5")])
+
+    assert contagem == {ALTERADO: 0, NOVO: 0, REMOVIDO: 0}
+    assert conn.xlen(change_events.STREAM_KEY) == 1
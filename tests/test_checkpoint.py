@@ -0,0 +1,33 @@
+"""Testes para servimed_scraper.checkpoint (retomada de crawls)."""
+import fakeredis
+import pytest
+
+from servimed_scraper.checkpoint import CrawlCheckpoint
+
+
+@pytest.fixture
+def checkpoint():
+    return CrawlCheckpoint(fakeredis.FakeRedis(), "job-1")
+
+
+def test_record_page_move_url_de_pendente_para_visitada(checkpoint):
+    assert not checkpoint.has_progress()
+    assert checkpoint.record_page("/p1", [{"gtin": "1"}], ["/p2"]) == ["/p2"]
+    assert checkpoint.pending_urls() == ["/p2"]
+
+    checkpoint.record_page("/p2", [{"gtin": "2"}], ["/p1", "/p3"])
+    assert checkpoint.has_progress()
+    assert checkpoint.pending_urls() == ["/p3"]
+    assert checkpoint.items() == [{"gtin": "1"}, {"gtin": "2"}]
+
+
+def test_progresso_de_upload_e_clear(checkpoint):
+    checkpoint.record_page("/p1", [{"gtin": "1"}], [])
+    assert checkpoint.uploaded() == 0
+    checkpoint.mark_uploaded(1)
+    assert checkpoint.uploaded() == 1
+
+    checkpoint.clear()
+    assert not checkpoint.has_progress()
+    assert checkpoint.items() == []
+    assert checkpoint.uploaded() == 0
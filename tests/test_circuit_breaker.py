@@ -0,0 +1,57 @@
+"""Testes para circuit_breaker (breaker por upstream e orçamento de retentativas)."""
+import os
+import sys
+
+import fakeredis
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError, RetryBudget
+
+
+@pytest.fixture
+def conn():
+    return fakeredis.FakeRedis()
+
+
+def test_abre_por_taxa_de_erro_e_rejeita(conn):
+    breaker = CircuitBreaker(conn, "api:x", error_rate=0.5, min_calls=4, cooldown=30)
+    for ok in (True, False, True):
+        assert breaker.record(ok, 0.1) == "fechado"
+    assert breaker.record(False, 0.1) == "aberto"
+
+    with pytest.raises(CircuitOpenError) as exc:
+        breaker.before_call()
+    assert exc.value.upstream == "api:x" and exc.value.retry_after > 0
+    with pytest.raises(CircuitOpenError):
+        breaker.ensure_closed()
+    estado = breaker.state()
+    assert estado["gauge"] == 2 and estado["aberturas"] == 1 and estado["rejeitadas"] == 1
+
+
+def test_abre_por_latencia(conn):
+    breaker = CircuitBreaker(conn, "fornecedor:y", slow_seconds=2, slow_rate=0.5, min_calls=2)
+    breaker.record(True, 5.0)
+    assert breaker.record(True, 3.0) == "aberto"
+
+
+def test_meio_aberto_libera_uma_sonda(conn):
+    breaker = CircuitBreaker(conn, "api:z", min_calls=1, cooldown=30)
+    breaker.record(False)
+    conn.hset("breaker:api:z:estado", "aberto_ate", 0)  # cooldown expirado
+
+    breaker.before_call()  # sonda
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.state()["estado"] == "meio_aberto"
+    assert breaker.record(True) == "fechado"
+    breaker.before_call()
+
+
+def test_orcamento_de_retentativas(conn):
+    budget = RetryBudget(conn, ratio=0.5, min_retries=1)
+    for _ in range(4):
+        budget.record_attempt()
+    assert [budget.try_acquire() for _ in range(3)] == [True, True, False]
+    assert budget.usage() == {"tentativas": 4, "retentativas": 2, "negadas": 1}
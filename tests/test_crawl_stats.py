@@ -0,0 +1,60 @@
+"""Testes para crawl_stats (resumo das stats do Scrapy e série por fornecedor)."""
+from types import SimpleNamespace
+
+import fakeredis
+
+import crawl_stats
+
+STATS = {
+    "finish_reason": "finished",
+    "elapsed_time_seconds": 12.3456,
+    "downloader/request_count": 12,
+    "downloader/response_count": 11,
+    "downloader/response_bytes": 40960,
+    "downloader/response_status_count/200": 10,
+    "downloader/response_status_count/503": 1,
+    "retry/count": 1,
+    "downloader/exception_count": 1,
+    "item_scraped_count": 250,
+    "item_dropped_count": 2,
+    "latency/p50": 180.0,
+    "latency/p99": 950.5,
+    "latency/count": 11,
+}
+
+
+def _crawler(stats):
+    spider = SimpleNamespace(name="products", base_url="https://pedidoeletronico.servimed.com.br", user="conta")
+    return SimpleNamespace(spider=spider, stats=SimpleNamespace(get_stats=lambda: stats))
+
+
+def test_summarize():
+    resumo = crawl_stats.summarize(STATS)
+    assert resumo["segundos"] == 12.346
+    assert resumo["status"] == {"200": 10, "503": 1}
+    assert resumo["retentativas"] == 1 and resumo["itens_descartados"] == 2
+    assert resumo["latencia_ms"] == {"p50": 180.0, "p99": 950.5, "count": 11}
+
+
+def test_record_crawl_so_com_coleta_ativa():
+    crawl_stats.record_crawl(_crawler(STATS))  # sem coleta: ignorado
+    with crawl_stats.collect() as resumos:
+        crawl_stats.record_crawl(_crawler(STATS))
+    assert len(resumos) == 1
+    assert resumos[0]["fornecedor"] == "pedidoeletronico.servimed.com.br"
+    assert resumos[0]["conta"] == "conta" and resumos[0]["itens"] == 250
+
+
+def test_serie_por_fornecedor():
+    conn = fakeredis.FakeRedis()
+    with crawl_stats.collect() as resumos:
+        crawl_stats.record_crawl(_crawler(STATS))
+        crawl_stats.record_crawl(_crawler({**STATS, "latency/p50": 400.0}))
+    for resumo in resumos:
+        crawl_stats.append(conn, resumo, job_id="job-1")
+
+    serie = crawl_stats.series(conn, "pedidoeletronico.servimed.com.br")
+    assert [e["latencia_p50"] for e in serie] == [180.0, 400.0]
+    assert serie[0]["itens"] == 250 and serie[0]["status"] == {"200": 10, "503": 1}
+    assert serie[0]["job"] == "job-1" and serie[0]["ts"] > 0
+    assert crawl_stats.append(conn, resumos[0], maxlen=0) is None
@@ -0,0 +1,56 @@
+"""Testes para servimed_scraper.frontier (fronteira compartilhada do crawl distribuído)."""
+import fakeredis
+import pytest
+
+from servimed_scraper.frontier import RedisFrontier
+
+
+@pytest.fixture
+def frontier():
+    return RedisFrontier(fakeredis.FakeRedis(), "t1", lease_seconds=60)
+
+
+def test_push_ignora_urls_ja_vistas(frontier):
+    assert frontier.push(["/p1", "/p2"]) == 2
+    assert frontier.push(["/p2", "/p3"]) == 1
+    frontier.mark_seen(["/p4"])
+    assert frontier.push(["/p4"]) == 0
+    assert frontier.pending() == (3, 0)
+
+
+def test_pop_e_complete_page_controlam_lease(frontier):
+    frontier.push(["/p1", "/p2"])
+    assert frontier.pop(1) == ["/p1"]
+    assert frontier.pending() == (1, 1)
+
+    novos = frontier.complete_page("/p1", [{"gtin": "1"}], ["/p2", "/p3"])
+    assert novos == 1
+    assert frontier.pending() == (2, 0)
+    assert frontier.items() == [{"gtin": "1"}]
+
+
+def test_requeue_expired_devolve_paginas_de_worker_morto(frontier):
+    frontier.push(["/p1"])
+    frontier.lease_seconds = -1
+    frontier.pop(1)
+    assert frontier.requeue_expired() == 1
+    assert frontier.pending() == (1, 0)
+
+
+def test_is_complete_exige_semeadura(frontier):
+    assert not frontier.is_complete()
+    frontier.mark_seeded()
+    assert frontier.is_complete()
+    frontier.push(["/p1"])
+    assert not frontier.is_complete()
+
+
+def test_try_finalize_apenas_um_vence(frontier):
+    assert frontier.try_finalize()
+    assert not frontier.try_finalize()
+
+
+def test_sessao_compartilhada(frontier):
+    assert frontier.load_session() is None
+    frontier.save_session("ASP.NET_SessionId=abc")
+    assert frontier.load_session() == "ASP.NET_SessionId=abc"
@@ -0,0 +1,63 @@
+"""Testes para job_budget e JobBudgetExtension (orçamento de recursos por job)."""
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+import job_budget
+from servimed_scraper.extensions import JobBudgetExtension
+
+
+def test_resolve_combina_padrao_da_fila_e_payload(monkeypatch):
+    monkeypatch.setenv("JOB_BUDGET_DEFAULTS", '{"*": {"max_rss_mb": 512}, "scraping": {"max_pages": 2000}}')
+    # Subfila por conta (scheduling.account_queue_name) usa os padrões da fila base
+    limites = job_budget.resolve({"budget": {"max_pages": 50}}, "scraping.abc123")
+    assert limites == {"max_rss_mb": 512, "max_pages": 50}
+    assert job_budget.resolve({}, "pedido") == {"max_rss_mb": 512}
+
+
+def test_resolve_rejeita_limite_desconhecido_ou_invalido(monkeypatch):
+    monkeypatch.delenv("JOB_BUDGET_DEFAULTS", raising=False)
+    with pytest.raises(ValueError):
+        job_budget.resolve({"budget": {"max_paginas": 1}})
+    with pytest.raises(ValueError):
+        job_budget.resolve({"budget": {"max_items": 0}})
+
+
+def test_crawl_settings_converte_max_seconds_em_prazo():
+    budget = job_budget.JobBudget({"max_seconds": 60, "max_items": 10}, inicio=1000.0)
+    assert budget.crawl_settings() == {"max_items": 10, "deadline": 1060.0}
+
+
+def _extension(limites, stats=None):
+    crawler = MagicMock()
+    valores = dict(stats or {})
+    crawler.stats.get_value.side_effect = lambda k, default=None: valores.get(k, default)
+    return JobBudgetExtension(crawler, limites, intervalo=1.0), crawler
+
+
+def test_extensao_encerra_no_primeiro_limite():
+    ext, crawler = _extension({"max_pages": 3, "max_bytes": 100}, {"response_received_count": 3, "downloader/response_bytes": 500})
+    ext.response_received(None, None, None)
+    ext.response_received(None, None, None)
+    assert ext.exceeded == "max_pages"
+    crawler.engine.close_spider.assert_called_once_with(crawler.spider, "budget_exceeded")
+    crawler.stats.set_value.assert_any_call("job_budget/limit", "max_pages")
+
+
+def test_extensao_prazo_e_memoria():
+    ext, crawler = _extension({"deadline": time.time() + 60, "max_rss_mb": 1e9})
+    ext.check_periodic()
+    assert ext.exceeded is None
+    ext.limites["deadline"] = time.time() - 1
+    ext.check_periodic()
+    assert ext.exceeded == "max_seconds"
+
+
+def test_record_crawl_guarda_limite_das_stats():
+    crawler = MagicMock()
+    crawler.stats.get_value.return_value = "max_items"
+    with job_budget.activate({"max_items": 5}) as budget:
+        assert job_budget.current() is budget
+        budget.record_crawl(crawler)
+    assert budget.exceeded == "max_items" and job_budget.current() is None
@@ -0,0 +1,104 @@
+"""Testes para job_cancel (cancelamento cooperativo e desligamento gracioso)."""
+import signal
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+import pytest
+from rq import Queue
+
+import job_cancel
+from job_cancel import CANCELADO, SHUTDOWN, JobInterrupted
+from servimed_scraper.extensions import JobCancelExtension
+
+
+@pytest.fixture
+def conn():
+    return fakeredis.FakeRedis()
+
+
+def test_extensao_fecha_o_spider_com_o_motivo(conn):
+    crawler = MagicMock()
+    ext = JobCancelExtension(crawler, conn, job_cancel.cancel_key("job-1"), 1.0)
+    ext.check()
+    crawler.engine.close_spider.assert_not_called()
+
+    job_cancel.request_cancel(conn, "job-1", SHUTDOWN)
+    ext.check()
+    ext.check()  # uma única vez
+    crawler.engine.close_spider.assert_called_once_with(crawler.spider, "shutdown")
+
+    crawler = MagicMock()
+    job_cancel.request_cancel(conn, "job-1")
+    JobCancelExtension(crawler, conn, job_cancel.cancel_key("job-1"), 1.0).check()
+    crawler.engine.close_spider.assert_called_once_with(crawler.spider, "cancelled")
+
+
+def test_raise_if_interrupted():
+    def crawler(reason):
+        return SimpleNamespace(stats=SimpleNamespace(get_value=lambda k: reason))
+
+    job_cancel.raise_if_interrupted(crawler("finished"))
+    with pytest.raises(JobInterrupted) as e:
+        job_cancel.raise_if_interrupted(crawler("shutdown"))
+    assert e.value.motivo == SHUTDOWN
+    with pytest.raises(JobInterrupted):
+        job_cancel.raise_if_interrupted(crawler("cancelled"))
+
+
+def test_warm_shutdown_marca_o_job_atual(conn):
+    class Base:
+        name, log, connection = "w1", MagicMock(), conn
+
+        def handle_warm_shutdown_request(self):
+            self.avisado = True
+
+        def get_current_job_id(self):
+            return "job-7"
+
+    class Worker(job_cancel.GracefulShutdownMixin, Base):
+        pass
+
+    w = Worker()
+    w.handle_warm_shutdown_request()
+    assert w.avisado and job_cancel.requested(conn, "job-7") == SHUTDOWN
+
+
+def test_resume_reenfileira_com_o_mesmo_checkpoint(conn):
+    queue = Queue("scraping", connection=conn)
+    job = queue.enqueue("worker.process_scraping_task", {"usuario": "u", "senha": "s"}, job_timeout=900)
+    job_cancel.request_cancel(conn, job.id)
+
+    novo = job_cancel.resume(conn, job.id)
+    assert novo.meta == {"checkpoint_key": job.id}
+    assert novo.args == ({"usuario": "u", "senha": "s"},) and novo.timeout == 900
+    assert job_cancel.requested(conn, job.id) is None
+
+
+def test_dreno_nao_interrompe_o_job(conn):
+    class Base:
+        name, log, connection = "w1", MagicMock(), conn
+
+        def request_stop(self, signum, frame):
+            self.handle_warm_shutdown_request()
+
+        def handle_warm_shutdown_request(self):
+            pass
+
+        def request_force_stop(self, signum, frame):
+            pass
+
+        def get_current_job_id(self):
+            return "job-8"
+
+    class Worker(job_cancel.GracefulShutdownMixin, Base):
+        pass
+
+    worker = Worker()
+    with patch("job_cancel.signal.signal") as mock_signal:
+        worker.request_drain(job_cancel.DRAIN_SIGNAL, None)
+        assert job_cancel.requested(conn, "job-8") is None
+        # SIGTERM durante o dreno interrompe o job (reenfileirado pelo checkpoint)
+        mock_signal.assert_called_with(signal.SIGTERM, worker.interrupt_drain)
+        worker.interrupt_drain(signal.SIGTERM, None)
+    assert job_cancel.requested(conn, "job-8") == SHUTDOWN
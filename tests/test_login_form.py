@@ -0,0 +1,92 @@
+"""Testes para servimed_scraper.login_form (schema do formulário de login em cache)."""
+from unittest.mock import MagicMock
+
+import pytest
+from scrapy.http import HtmlResponse, Request
+
+from servimed_scraper.login_form import (
+    LoginSchemaCache,
+    build_formdata,
+    discover,
+    extract_tokens,
+    handle_login_failure,
+    login_request,
+)
+
+LOGIN_URL = "https://pedidoeletronico.servimed.com.br/"
+
+PAGE = """
+<html><body>
+<form action="/Account/Login" method="post">
+  <input name="__RequestVerificationToken" type="hidden" value="{token}" />
+  <input type="hidden" name="ReturnUrl" value="/Pedido" />
+  <input name="Usuario" type="text" />
+  <input name="Senha" type="password" />
+</form>
+</body></html>
+"""
+
+
+def _response(token="tok-1", meta=None):
+    request = Request(LOGIN_URL, meta=meta or {})
+    return HtmlResponse(LOGIN_URL, body=PAGE.format(token=token).encode(), encoding="utf-8", request=request)
+
+
+@pytest.fixture
+def spider(tmp_path):
+    s = MagicMock()
+    s.login_url = LOGIN_URL
+    s.user = "conta@farmacia"
+    s.password = "segredo"
+    s.login_schema_cache = LoginSchemaCache(str(tmp_path))
+    return s
+
+
+def test_discover_separa_campos_estaticos_e_tokens():
+    schema, tokens = discover(_response(), LOGIN_URL)
+    assert schema["action"] == "https://pedidoeletronico.servimed.com.br/Account/Login"
+    assert schema["user_field"] == "Usuario" and schema["password_field"] == "Senha"
+    assert schema["hidden"] == {"ReturnUrl": "/Pedido"}
+    assert schema["tokens"] == ["__RequestVerificationToken"]
+    assert tokens == {"__RequestVerificationToken": "tok-1"}
+
+
+def test_extract_tokens_por_regex_em_qualquer_ordem_de_atributos():
+    html = "<input value='a&amp;b' type=hidden name='csrf'><input name=\"__RequestVerificationToken\" value=\"x\">"
+    assert extract_tokens(html, ["csrf", "__RequestVerificationToken"]) == {
+        "csrf": "a&b",
+        "__RequestVerificationToken": "x",
+    }
+    assert extract_tokens(html, ["outro_token"]) is None
+
+
+def test_build_formdata_usa_nomes_comuns_sem_campo_identificado():
+    schema = {"hidden": {}, "tokens": [], "user_field": None, "password_field": None}
+    assert build_formdata(schema, {}, "u", "p") == {"Email": "u", "UserName": "u", "Senha": "p", "Password": "p"}
+
+
+def test_login_request_reutiliza_schema_e_renova_token(spider):
+    primeiro = login_request(spider, _response("tok-1"), callback=None)
+    assert primeiro.meta["login_schema_cached"] is False
+    assert spider.login_schema_cache.get(LOGIN_URL)["user_field"] == "Usuario"
+
+    segundo = login_request(spider, _response("tok-2"), callback=None)
+    assert segundo.meta["login_schema_cached"] is True
+    assert segundo.url == "https://pedidoeletronico.servimed.com.br/Account/Login"
+    body = segundo.body.decode()
+    assert "__RequestVerificationToken=tok-2" in body
+    assert "ReturnUrl=%2FPedido" in body and "Senha=segredo" in body
+
+
+def test_falha_de_login_invalida_schema_e_pede_nova_analise(spider):
+    post = login_request(spider, _response(), callback=None)
+    assert handle_login_failure(spider, _response(meta=post.meta)) is False
+
+    login_request(spider, _response(), callback=None)
+    cached = login_request(spider, _response(), callback=None)
+    assert handle_login_failure(spider, _response(meta=cached.meta)) is True
+    assert spider.login_schema_cache.get(LOGIN_URL) is None
+
+    # Com login_schema_cache=False a página é analisada de novo
+    novo = login_request(spider, _response(meta={"login_schema_cache": False}), callback=None)
+    assert novo.meta["login_schema_cached"] is False
@@ -0,0 +1,63 @@
+"""Testes para os middlewares do Scrapy (limite de taxa distribuído)."""
+import os
+import sys
+from unittest.mock import MagicMock
+
+import fakeredis
+import pytest
+from scrapy import Request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from servimed_scraper.middlewares import LatencyStatsMiddleware, RedisRateLimitMiddleware, RedisTokenBucket
+
+
+def test_token_bucket_compartilhado_entre_instancias():
+    conn = fakeredis.FakeRedis()
+    # Duas instâncias (dois workers) no mesmo bucket: burst 2, 1 token/s
+    a = RedisTokenBucket(conn, rate=1.0, burst=2)
+    b = RedisTokenBucket(conn, rate=1.0, burst=2)
+    assert a.acquire("ratelimit:x") == 0
+    assert b.acquire("ratelimit:x") == 0
+    espera = a.acquire("ratelimit:x")
+    assert 0.9 < espera <= 1.0
+    # Reservas seguintes ficam na fila atrás da anterior
+    assert 1.9 < b.acquire("ratelimit:x") <= 2.0
+    metricas = conn.hgetall("ratelimit:x:metricas")
+    assert metricas[b"requests"] == b"4" and metricas[b"delayed"] == b"2"
+
+
+def test_token_bucket_valida_parametros():
+    with pytest.raises(ValueError):
+        RedisTokenBucket(fakeredis.FakeRedis(), rate=0, burst=1)
+
+
+def test_bucket_key_por_dominio_e_conta():
+    crawler = MagicMock()
+    crawler.spider.user = "conta@farmacia"
+    bucket = MagicMock()
+    req = Request("https://pedidoeletronico.servimed.com.br/produtos")
+
+    mw = RedisRateLimitMiddleware(crawler, bucket)
+    assert mw.bucket_key(req) == "ratelimit:pedidoeletronico.servimed.com.br"
+    mw = RedisRateLimitMiddleware(crawler, bucket, per_account=True)
+    assert mw.bucket_key(req) == "ratelimit:pedidoeletronico.servimed.com.br:conta@farmacia"
+
+
+def test_latency_stats_percentis():
+    from scrapy.http import Response
+    from scrapy.statscollectors import MemoryStatsCollector
+
+    crawler = MagicMock()
+    crawler.stats = MemoryStatsCollector(crawler)
+    mw = LatencyStatsMiddleware(crawler, sample=50)
+    for i in range(1, 101):
+        req = Request("https://pedidoeletronico.servimed.com.br/produtos", meta={"download_latency": i / 1000})
+        mw.process_response(req, Response(req.url, request=req))
+    mw.process_response(Request("https://x/sem-latencia"), Response("https://x/sem-latencia"))
+    mw.spider_closed(None, "finished")
+
+    stats = crawler.stats.get_stats()
+    assert stats["latency/count"] == 100
+    assert len(mw.latencias) == 50  # amostra limitada
+    assert 0 < stats["latency/p50"] <= stats["latency/p90"] <= stats["latency/p99"] <= stats["latency/max"] <= 100
@@ -55,3 +55,39 @@ def test_run_order_returns_dict_with_codigo_and_status():
         assert result["status"] == "pedido_realizado"
         # Fallback quando container vazio: SERV-1234 ou SERV-UNKNOWN
         assert "SERV-" in result["codigo_confirmacao"] or result["codigo_confirmacao"] == "SERV-UNKNOWN"
+
+
+def test_run_orders_um_resultado_por_pedido_sem_confirmacao_inventada():
+    """run_orders devolve um resultado por pedido, na ordem; sem resultado do spider, nao_confirmado."""
+    from unittest.mock import MagicMock, patch
+
+    with patch("order_runner.CrawlerProcess") as MockProcess, \
+            patch("order_runner.get_project_settings") as mock_settings:
+        settings = {}
+        mock_settings.return_value = MagicMock(set=settings.__setitem__)
+        mock_process = MagicMock()
+        MockProcess.return_value = mock_process
+
+        def side_effect_start():
+            # Pipeline preenche apenas o pedido 2
+            settings["ORDER_RESULT_CONTAINER"].append({
+                "id_pedido": "2",
+                "codigo_confirmacao": "ABC987",
+                "status": "pedido_realizado",
+            })
+
+        mock_process.start.side_effect = side_effect_start
+
+        from order_runner import run_orders
+
+        result = run_orders(
+            usuario="u",
+            senha="s",
+            pedidos=[{"id_pedido": "1", "produtos": []}, {"id_pedido": "2", "produtos": []}],
+        )
+
+    mock_process.crawl.assert_called_once()
+    assert mock_process.crawl.call_args[1]["pedidos"][1]["id_pedido"] == "2"
+    assert [r["id_pedido"] for r in result] == ["1", "2"]
+    assert result[0] == {"id_pedido": "1", "codigo_confirmacao": None, "status": "nao_confirmado"}
+    assert result[1]["codigo_confirmacao"] == "ABC987"
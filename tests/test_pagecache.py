@@ -0,0 +1,92 @@
+"""Testes para servimed_scraper.pagecache e PageCacheMiddleware (GET condicional)."""
+from unittest.mock import MagicMock
+
+import pytest
+from scrapy.http import HtmlResponse, Request, Response
+
+from servimed_scraper.middlewares import PageCacheMiddleware
+from servimed_scraper.pagecache import CHANGED, NOT_MODIFIED, UNCHANGED, PageCache, region_hash
+
+URL = "https://pedidoeletronico.servimed.com.br/produtos?page=2"
+PAGE = "<html><input name='__RequestVerificationToken' value='{token}'><table><tr><td>{gtin}</td></tr></table></html>"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = PageCache(str(tmp_path / "pages.sqlite3"), conta="conta@farmacia")
+    yield c
+    c.close()
+
+
+@pytest.fixture
+def middleware(cache):
+    crawler = MagicMock()
+    crawler.spider.page_cache = cache
+    return PageCacheMiddleware(crawler)
+
+
+def _html(request, token="a", gtin="789", headers=None):
+    body = PAGE.format(token=token, gtin=gtin).encode()
+    return HtmlResponse(URL, body=body, encoding="utf-8", request=request, headers=headers)
+
+
+def test_region_hash_ignora_conteudo_fora_da_tabela():
+    assert region_hash(PAGE.format(token="a", gtin="1")) == region_hash(PAGE.format(token="b", gtin="1"))
+    assert region_hash(PAGE.format(token="a", gtin="1")) != region_hash(PAGE.format(token="a", gtin="2"))
+
+
+def test_cache_separado_por_conta(tmp_path, cache):
+    cache.save(URL, "h", [{"gtin": "1"}], [URL + "3"], etag='"v1"')
+    outra = PageCache(str(tmp_path / "pages.sqlite3"), conta="outra")
+    assert outra.get(URL) is None
+    assert cache.get(URL)["items"] == [{"gtin": "1"}]
+    outra.close()
+
+
+def test_primeira_visita_grava_itens_e_validadores(middleware, cache):
+    request = Request(URL, meta={"page_cache": True})
+    assert middleware.process_request(request) is None
+    assert "If-None-Match" not in request.headers
+
+    response = _html(request, headers={"ETag": '"v1"'})
+    middleware.process_response(request, response)
+    assert response.meta["page_cache_status"] == CHANGED
+    assert cache.replay(response) is None
+
+    cache.record(response, [{"gtin": "789"}], [URL + "3"])
+    assert cache.get(URL)["etag"] == '"v1"'
+
+
+def test_304_reaproveita_itens(middleware, cache):
+    cache.save(URL, "h", [{"gtin": "789"}], [URL + "3"], etag='"v1"')
+    request = Request(URL, meta={"page_cache": True})
+    middleware.process_request(request)
+    assert request.headers["If-None-Match"] == b'"v1"'
+    assert 304 in request.meta["handle_httpstatus_list"]
+
+    response = Response(URL, status=304, request=request)
+    assert middleware.process_response(request, response) is response
+    assert response.meta["page_cache_status"] == NOT_MODIFIED
+    assert cache.replay(response) == ([{"gtin": "789"}], [URL + "3"])
+
+
+def test_200_com_mesmo_hash_nao_reanalisa(middleware, cache):
+    cache.save(URL, region_hash(PAGE.format(token="x", gtin="789")), [{"gtin": "789"}], [])
+    request = Request(URL, meta={"page_cache": True})
+    middleware.process_request(request)
+    response = _html(request, token="outro-token", headers={"Last-Modified": "Mon, 19 Oct 2026 10:00:00 GMT"})
+    middleware.process_response(request, response)
+    assert response.meta["page_cache_status"] == UNCHANGED
+    assert cache.replay(response) == ([{"gtin": "789"}], [])
+    assert cache.get(URL)["last_modified"] == "Mon, 19 Oct 2026 10:00:00 GMT"
+
+
+def test_304_sem_entrada_refaz_requisicao_sem_validadores(middleware, cache):
+    cache.save(URL, "h", [], [], etag='"v1"')
+    request = Request(URL, meta={"page_cache": True})
+    middleware.process_request(request)
+    cache.db.execute("DELETE FROM paginas")
+
+    retry = middleware.process_response(request, Response(URL, status=304, request=request))
+    assert isinstance(retry, Request)
+    assert "If-None-Match" not in retry.headers and retry.meta["page_cache"] is False
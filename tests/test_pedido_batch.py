@@ -0,0 +1,68 @@
+"""Testes para pedido_batch (coalescência de pedidos por conta)."""
+import os
+import sys
+
+import fakeredis
+import pytest
+from rq import Queue
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pedido_batch import ack_batch, batch_key, enqueue_pedido_coalescido, processing_key, take_batch
+
+
+@pytest.fixture
+def queue():
+    return Queue("pedido", connection=fakeredis.FakeRedis())
+
+
+def _payload(id_pedido, usuario="conta@fornecedor"):
+    return {
+        "usuario": usuario,
+        "senha": "s",
+        "id_pedido": str(id_pedido),
+        "produtos": [{"gtin": "1", "codigo": "A", "quantidade": 1}],
+    }
+
+
+def test_enqueue_coalescido_agenda_um_flush_por_janela(queue):
+    r1 = enqueue_pedido_coalescido(queue, _payload(1), janela=5)
+    r2 = enqueue_pedido_coalescido(queue, _payload(2), janela=5)
+    r3 = enqueue_pedido_coalescido(queue, _payload(3, usuario="outra"), janela=5)
+
+    assert r1["agendado"] and r1["job_id"]
+    assert not r2["agendado"] and r2["job_id"] is None
+    assert r3["agendado"]
+    assert queue.scheduled_job_registry.count == 2
+    assert queue.connection.llen(batch_key("conta@fornecedor")) == 2
+
+
+def test_take_batch_esvazia_e_reabre_janela(queue):
+    enqueue_pedido_coalescido(queue, _payload(1), janela=5)
+    enqueue_pedido_coalescido(queue, _payload(2), janela=5)
+
+    lote = take_batch(queue.connection, "conta@fornecedor", "flush-1")
+    assert [p["id_pedido"] for p in lote] == ["1", "2"]
+    assert take_batch(queue.connection, "conta@fornecedor", "flush-2") == []
+
+    # Após o flush, um novo pedido abre nova janela
+    assert enqueue_pedido_coalescido(queue, _payload(3), janela=5)["agendado"]
+
+
+def test_retentativa_do_flush_reprocessa_o_mesmo_lote(queue):
+    conn = queue.connection
+    enqueue_pedido_coalescido(queue, _payload(1), janela=5)
+    assert len(take_batch(conn, "conta@fornecedor", "flush-1")) == 1
+
+    # Flush falhou; um pedido novo abre outra janela sem misturar com o lote em retentativa
+    assert enqueue_pedido_coalescido(queue, _payload(2), janela=5)["agendado"]
+    assert [p["id_pedido"] for p in take_batch(conn, "conta@fornecedor", "flush-1")] == ["1"]
+    assert conn.llen(batch_key("conta@fornecedor")) == 1
+
+    ack_batch(conn, "conta@fornecedor", "flush-1")
+    assert not conn.exists(processing_key("conta@fornecedor", "flush-1"))
+
+
+def test_enqueue_coalescido_exige_usuario(queue):
+    with pytest.raises(ValueError, match="usuario"):
+        enqueue_pedido_coalescido(queue, {"id_pedido": "1"}, janela=5)
@@ -0,0 +1,56 @@
+"""Testes para pedido_ledger (idempotência de pedidos)."""
+import os
+import sys
+
+import fakeredis
+import pytest
+from rq import Queue
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pedido_ledger import PedidoLedger, enqueue_pedido_idempotente
+
+
+@pytest.fixture
+def queue():
+    return Queue("pedido", connection=fakeredis.FakeRedis())
+
+
+def _payload(id_pedido):
+    return {"usuario": "u", "senha": "s", "id_pedido": str(id_pedido), "produtos": []}
+
+
+def test_enqueue_duplicado_e_concluido_nao_criam_job(queue):
+    assert enqueue_pedido_idempotente(queue, _payload(7))["resultado"] == "ok"
+    assert enqueue_pedido_idempotente(queue, _payload(7))["resultado"] == "duplicado"
+    assert queue.count == 1
+
+    PedidoLedger(queue.connection).record_patched("7")
+    queue.empty()
+    assert enqueue_pedido_idempotente(queue, _payload(7))["resultado"] == "concluido"
+    assert queue.count == 0
+
+
+def test_reenfileira_quando_job_anterior_falhou(queue):
+    enqueue_pedido_idempotente(queue, _payload(8))
+    queue.connection.hset("rq:job:pedido-8", "status", "failed")
+    assert enqueue_pedido_idempotente(queue, _payload(8))["resultado"] == "ok"
+
+
+def test_trava_por_pedido(queue):
+    ledger = PedidoLedger(queue.connection)
+    assert ledger.lock("9", "job-a", 60)
+    assert not ledger.lock("9", "job-b", 60)
+    ledger.unlock("9", "job-b")  # não é o dono: não libera
+    assert not ledger.lock("9", "job-b", 60)
+    ledger.unlock("9", "job-a")
+    assert ledger.lock("9", "job-b", 60)
+
+
+def test_trava_reentrante_para_o_mesmo_dono(queue):
+    ledger = PedidoLedger(queue.connection)
+    assert ledger.lock("10", "job-a", 60)
+    queue.connection.expire("pedido:ledger:10:trava", 5)
+    assert ledger.lock("10", "job-a", 60)  # retentativa do mesmo job renova a trava
+    assert queue.connection.ttl("pedido:ledger:10:trava") > 5
+    assert not ledger.lock("10", "job-b", 60)
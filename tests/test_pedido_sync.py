@@ -0,0 +1,90 @@
+"""Testes para pedido_sync (sincronização incremental de pedidos pendentes)."""
+import os
+import sys
+from unittest.mock import patch
+
+import fakeredis
+import pytest
+from rq import Queue
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pedido_sync import CURSOR_KEY, PedidoSync
+
+
+def _pedido(id_pedido, status=None):
+    return {
+        "id": id_pedido,
+        "codigo_fornecedor": "X" if status else None,
+        "status": status,
+        "itens": [{"gtin": "1", "codigo": "A1", "quantidade": 2}],
+    }
+
+
+@pytest.fixture
+def sync():
+    queue = Queue("pedido", connection=fakeredis.FakeRedis())
+    return PedidoSync(queue, "forn", "senha", "api", "api_pass", page_size=2)
+
+
+def test_sync_once_pagina_e_enfileira_pendentes_uma_vez(sync):
+    base = [_pedido(1), _pedido(2, status="pedido_realizado"), _pedido(3)]
+
+    def fake_list(token, base_url=None, after_id=None, pendente=None, limit=None):
+        return [p for p in base if p["id"] > after_id][:limit]
+
+    with patch("pedido_sync.get_token", return_value="tok"), \
+            patch("pedido_sync.list_pedidos", side_effect=fake_list) as mock_list:
+        assert sync.sync_once() == 2
+        assert sync.get_cursor() == 3
+        assert mock_list.call_count == 2
+        # Novo ciclo sem pedidos novos: nada é reenfileirado
+        assert sync.sync_once() == 0
+
+    jobs = sync.queue.get_jobs()
+    assert [j.args[0]["id_pedido"] for j in jobs] == ["1", "3"]
+    assert jobs[0].args[0]["produtos"] == [{"gtin": "1", "codigo": "A1", "quantidade": 2}]
+
+
+def test_sync_once_ignora_ids_abaixo_do_cursor(sync):
+    sync.conn.set(CURSOR_KEY, 5)
+    # API que ignora filtros devolve a lista completa
+    with patch("pedido_sync.get_token", return_value="tok"), \
+            patch("pedido_sync.list_pedidos", return_value=[_pedido(4), _pedido(6)]):
+        assert sync.sync_once() == 1
+    assert sync.get_cursor() == 6
+
+
+def test_next_interval_adaptativo(sync):
+    sync.min_interval, sync.max_interval = 1.0, 4.0
+    sync.interval = 1.0
+    assert [sync.next_interval(0) for _ in range(3)] == [2.0, 4.0, 4.0]
+    assert sync.next_interval(3) == 1.0
+
+
+def test_sync_once_respeita_o_ledger_do_enqueue_pedido(sync):
+    from pedido_ledger import enqueue_pedido_idempotente
+
+    enqueue_pedido_idempotente(sync.queue, {"usuario": "forn", "senha": "senha", "id_pedido": "1", "produtos": []})
+    with patch("pedido_sync.get_token", return_value="tok"), \
+            patch("pedido_sync.list_pedidos", return_value=[_pedido(1), _pedido(2)]):
+        assert sync.sync_once() == 1
+    assert sorted(sync.queue.job_ids) == ["pedido-1", "pedido-2"]
+
+
+def test_rescan_reenfileira_pedido_cujo_job_falhou(sync):
+    from rq.job import JobStatus
+
+    with patch("pedido_sync.get_token", return_value="tok"), \
+            patch("pedido_sync.list_pedidos", return_value=[_pedido(1)]):
+        assert sync.sync_once() == 1
+        # Job ativo: o rescan não duplica
+        assert sync.sync_once(desde=0) == 0
+        job = sync.queue.fetch_job("pedido-1")
+        job.set_status(JobStatus.FAILED)
+        sync.queue.remove(job)
+        # Sem rescan o cursor já passou do pedido; com rescan ele volta para a fila
+        assert sync.sync_once() == 0
+        assert sync.sync_once(desde=0) == 1
+    assert sync.get_cursor() == 1
+    assert sync.queue.job_ids == ["pedido-1"]
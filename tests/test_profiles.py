@@ -0,0 +1,68 @@
+"""Testes para servimed_scraper.profiles (perfis de conexão)."""
+import pytest
+from scrapy.exceptions import DownloadFailedError
+from scrapy.settings import Settings
+
+from servimed_scraper.handlers import _h2_unsupported
+from servimed_scraper.profiles import HttpProfileAddon, profile_settings
+
+
+def test_perfil_default_nao_altera_settings():
+    assert profile_settings("default") == {}
+
+
+def test_perfil_desconhecido():
+    with pytest.raises(ValueError):
+        profile_settings("turbo")
+
+
+def test_addon_aplica_perfil_sem_sobrescrever_linha_de_comando():
+    settings = Settings({"DOWNLOAD_HANDLERS": {"s3": None}})
+    settings.set("HTTP_PROFILE", "fast")
+    settings.set("CONCURRENT_REQUESTS", 4, "cmdline")
+    HttpProfileAddon().update_settings(settings)
+
+    assert settings.getint("CONCURRENT_REQUESTS_PER_DOMAIN") == 16
+    assert settings.getbool("DNSCACHE_ENABLED") and settings.getbool("COMPRESSION_ENABLED")
+    assert settings.getint("CONCURRENT_REQUESTS") == 4
+    handlers = settings.getdict("DOWNLOAD_HANDLERS")
+    assert handlers["s3"] is None
+    assert handlers["https"] == "servimed_scraper.handlers.H2FallbackDownloadHandler"
+
+
+def _falha_h2(*erros):
+    """DownloadFailedError como o handler HTTP/2 do Scrapy levanta (ResponseFailed encadeado)."""
+    from twisted.python.failure import Failure
+    from twisted.web._newclient import ResponseFailed
+
+    try:
+        try:
+            raise ResponseFailed([Failure(e) for e in erros])
+        except ResponseFailed as e:
+            raise DownloadFailedError(str(e)) from e
+    except DownloadFailedError as e:
+        return e
+
+
+def test_fallback_http11_so_para_falhas_de_negociacao():
+    from h2.exceptions import ProtocolError
+    from OpenSSL import SSL
+    from twisted.internet.error import ConnectionLost, TCPTimedOutError
+    from scrapy.core._http2.protocol import InvalidNegotiatedProtocol
+
+    assert _h2_unsupported(_falha_h2(InvalidNegotiatedProtocol(b"http/1.1")))
+    assert _h2_unsupported(_falha_h2(ProtocolError("Invalid HTTP/2 preamble")))
+    assert _h2_unsupported(SSL.Error([("SSL routines", "", "tlsv1 alert no application protocol")]))
+    # Falhas transitórias ficam com o RetryMiddleware, sem trocar o host de protocolo
+    assert not _h2_unsupported(_falha_h2(ConnectionLost()))
+    assert not _h2_unsupported(TCPTimedOutError())
+    assert not _h2_unsupported(DownloadFailedError("tlsv1 alert"))
+
+
+def test_scrapy_sem_api_de_handlers_mantem_http11(monkeypatch):
+    from servimed_scraper import profiles
+
+    monkeypatch.setattr(profiles, "_async_handler_api", lambda: False)
+    values = profile_settings("fast")
+    assert "DOWNLOAD_HANDLERS" not in values
+    assert values["CONCURRENT_REQUESTS_PER_DOMAIN"] == 16
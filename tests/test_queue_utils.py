@@ -0,0 +1,42 @@
+"""Testes para queue_utils (payloads e enfileiramento em massa)."""
+import io
+import os
+import sys
+
+import fakeredis
+import pytest
+from rq import Queue
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from queue_utils import enqueue_bulk, pedido_payload, read_jsonl
+
+
+def test_pedido_payload_formato_do_desafio():
+    pedido = {"id": 7, "itens": [{"gtin": 123, "codigo": "A1", "quantidade": 2}]}
+    assert pedido_payload(pedido, "u", "s") == {
+        "usuario": "u",
+        "senha": "s",
+        "id_pedido": "7",
+        "produtos": [{"gtin": "123", "codigo": "A1", "quantidade": 2}],
+    }
+
+
+def test_read_jsonl_ignora_linhas_vazias_e_aponta_linha_invalida():
+    assert list(read_jsonl(io.StringIO('{"usuario": "a"}\n\n{"usuario": "b"}\n'))) == [
+        {"usuario": "a"},
+        {"usuario": "b"},
+    ]
+    with pytest.raises(ValueError, match="Linha 2"):
+        list(read_jsonl(io.StringIO('{"a": 1}\n{quebrado\n')))
+
+
+def test_enqueue_bulk_um_pipeline():
+    queue = Queue("scraping", connection=fakeredis.FakeRedis())
+    payloads = [{"usuario": f"u{i}", "senha": "s"} for i in range(50)]
+    jobs, segundos = enqueue_bulk(queue, "worker.process_scraping_task", payloads)
+    assert len(jobs) == 50 and segundos >= 0
+    assert len(queue) == 50
+    payload = queue.get_jobs()[0].args[0]
+    assert payload["usuario"] == "u0" and payload["senha"] == "s"
+    assert payload["traceparent"].startswith("00-")
@@ -0,0 +1,61 @@
+"""Testes para scheduling (faixas de prioridade, justiça por conta e métricas de espera)."""
+import os
+import sys
+
+import fakeredis
+from rq import Queue, SimpleWorker, get_current_job
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduling import (
+    FairSchedulingMixin,
+    account_queue_name,
+    fair_queue,
+    lane_wait_metrics,
+    record_queue_wait,
+)
+
+
+def registrar(tag):
+    """Job de teste: registra a ordem de execução."""
+    get_current_job().connection.rpush("ordem", tag)
+
+
+class _InProcessFairWorker(FairSchedulingMixin, SimpleWorker):
+    """FairWorker sem fork (o estado do fakeredis não sobrevive ao fork)."""
+
+
+def test_account_queue_name_estavel_e_sem_login():
+    nome = account_queue_name("scraping", "conta@farmacia.com")
+    assert nome == account_queue_name("scraping", "conta@farmacia.com")
+    assert nome.startswith("scraping.") and "farmacia" not in nome
+
+
+def test_pedido_primeiro_e_round_robin_entre_contas():
+    conn = fakeredis.FakeRedis()
+    for _ in range(3):
+        fair_queue(conn, "scraping", "grande").enqueue(registrar, "grande")
+    fair_queue(conn, "scraping", "pequena").enqueue(registrar, "pequena")
+    Queue("pedido", connection=conn).enqueue(registrar, "pedido")
+
+    worker = _InProcessFairWorker(["pedido"], ["scraping"], connection=conn)
+    worker.work(burst=True)
+
+    ordem = [t.decode() for t in conn.lrange("ordem", 0, -1)]
+    assert len(ordem) == 5
+    assert ordem[0] == "pedido"
+    # A conta pequena não espera todos os jobs da conta grande
+    assert ordem.index("pequena") <= 2
+    metricas = lane_wait_metrics(conn)
+    assert metricas["pedido"]["count"] == 1
+    assert metricas["scraping"]["count"] == 4
+
+
+def test_record_queue_wait_histograma_e_maximo():
+    conn = fakeredis.FakeRedis()
+    for espera in (0.5, 12.0, 2000.0):
+        record_queue_wait(conn, "scraping", espera)
+    m = lane_wait_metrics(conn, lanes=("scraping",))["scraping"]
+    assert m["count"] == 3
+    assert m["max"] == 2000.0
+    assert m["histograma"] == {"le_1": 1, "le_30": 1, "le_inf": 1}
@@ -0,0 +1,65 @@
+"""Testes para scrape_scheduler (agendamento de scraping por desatualização)."""
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+import pytest
+from rq import Queue
+
+from scrape_scheduler import DUE_KEY, IN_FLIGHT_KEY, ScrapeScheduler, change_fraction
+
+CONTAS = [{"usuario": "a", "senha": "1"}, {"usuario": "b", "senha": "2", "budget": {"max_pages": 10}}]
+
+
+@pytest.fixture
+def scheduler():
+    queue = Queue("scraping", connection=fakeredis.FakeRedis())
+    return ScrapeScheduler(queue, CONTAS, min_interval=100, max_interval=1000)
+
+
+def test_change_fraction():
+    assert change_fraction({"produtos_enviados": 10, "mudancas": {"alterado": 2, "novo": 1, "removido": 0}}) == 0.3
+    assert change_fraction({"produtos_enviados": 10}) is None
+    assert change_fraction(None) is None
+
+
+def test_enfileira_vencidas_e_pula_contas_com_job_ativo(scheduler):
+    agora = 10**10  # todas as contas vencidas
+    assert sorted(scheduler.enqueue_due(agora)) == ["a", "b"]
+    jobs = {j.args[0]["usuario"]: j for j in scheduler.queue.jobs}
+    assert jobs["b"].args[0]["budget"] == {"max_pages": 10}
+    assert scheduler.state("a")["job_id"] == jobs["a"].id
+
+    # Jobs ainda na fila: nenhuma conta é enfileirada de novo, mesmo vencida
+    assert scheduler.enqueue_due(agora + 10**6) == []
+    assert len(scheduler.queue) == 2
+    assert scheduler.conn.zscore(DUE_KEY, "a") > agora + 10**6
+
+
+def test_intervalo_encurta_com_mudanca_e_aumenta_estavel(scheduler):
+    assert scheduler.observe("a", 0.2) == 100  # já no mínimo
+    assert scheduler.observe("a", 0.0) == 150
+    assert scheduler.observe("a", 0.0) == 225
+    assert scheduler.observe("a", 0.5) == 112.5
+    assert scheduler.observe("a", None) == 112.5  # sem informação: mantém
+    for _ in range(20):
+        intervalo = scheduler.observe("a", 0.0)
+    assert intervalo == 1000
+    assert 0 < float(scheduler.state("a")["taxa"]) < 0.5
+
+
+def test_collect_le_resultado_do_job_terminado(scheduler):
+    scheduler.enqueue_due(10**10)
+    job = MagicMock()
+    job.get_status.return_value = "finished"
+    job.return_value.return_value = {"produtos_enviados": 100, "mudancas": {"alterado": 0}}
+    with patch("scrape_scheduler.Job.fetch", return_value=job):
+        assert scheduler.collect() == 2
+    assert not scheduler.conn.smembers(IN_FLIGHT_KEY)
+    assert float(scheduler.state("a")["intervalo"]) == 150
+
+
+def test_contas_removidas_saem_da_agenda(scheduler):
+    scheduler.set_contas(CONTAS[:1])
+    assert [m.decode() for m in scheduler.conn.zrange(DUE_KEY, 0, -1)] == ["a"]
+    with pytest.raises(ValueError):
+        scheduler.set_contas([{"usuario": "x"}])
@@ -0,0 +1,42 @@
+"""Testes para tracing (spans Zipkin v2 em arquivo)."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tracing
+
+
+def test_spans_aninhados_e_traceparent_do_payload(monkeypatch, tmp_path):
+    arquivo = tmp_path / "traces.jsonl"
+    monkeypatch.setenv("TRACE_FILE", str(arquivo))
+
+    payload = {}
+    tracing.inject(payload, "enqueue").finish()
+    with tracing.span("job", parent=payload["traceparent"], kind="CONSUMER") as job:
+        with tracing.span("upload", produtos=3):
+            assert tracing.current_traceparent().split("-")[1] == job.trace_id
+    assert tracing.current_traceparent() is None
+
+    spans = {s["name"]: s for s in tracing.load_spans(str(arquivo))}
+    assert len({s["traceId"] for s in spans.values()}) == 1
+    assert spans["job"]["parentId"] == spans["enqueue"]["id"]
+    assert spans["upload"]["parentId"] == spans["job"]["id"]
+    assert spans["upload"]["tags"] == {"produtos": "3"}
+    assert spans["enqueue"]["kind"] == "PRODUCER"
+
+
+def test_erro_fica_no_span_e_sem_trace_file_nada_e_gravado(monkeypatch, tmp_path):
+    arquivo = tmp_path / "traces.jsonl"
+    monkeypatch.setenv("TRACE_FILE", str(arquivo))
+    try:
+        with tracing.span("falha"):
+            raise RuntimeError("x")
+    except RuntimeError:
+        pass
+    assert tracing.load_spans(str(arquivo))[0]["tags"]["error"] == "RuntimeError: x"
+
+    monkeypatch.delenv("TRACE_FILE")
+    with tracing.span("ignorado"):
+        pass
+    assert len(tracing.load_spans(str(arquivo))) == 1
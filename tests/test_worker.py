@@ -77,3 +77,497 @@ def test_process_pedido_task_full_flow_mocked(monkeypatch):
     assert call_kw["id_pedido"] == 1
     assert call_kw["codigo_confirmacao"] == "ABC987"
     assert call_kw["status"] == "pedido_realizado"
+
+
+def test_process_pedido_batch_task_um_token_e_patch_por_pedido(monkeypatch):
+    monkeypatch.setenv("DESAFIO_API_USER", "api_user")
+    monkeypatch.setenv("DESAFIO_API_PASSWORD", "api_pass")
+    from unittest.mock import patch
+    from worker import process_pedido_batch_task
+
+    with patch("worker.run_orders") as mock_orders, \
+            patch("worker.get_token", return_value="token123") as mock_token, \
+            patch("worker.patch_pedido") as mock_patch:
+        mock_orders.return_value = [
+            {"id_pedido": "1", "codigo_confirmacao": "C1", "status": "pedido_realizado"},
+            {"id_pedido": "2", "codigo_confirmacao": "C2", "status": "pedido_realizado"},
+        ]
+        mock_patch.side_effect = [{"id": 1}, RuntimeError("API indisponível")]
+
+        result = process_pedido_batch_task({
+            "usuario": "u",
+            "senha": "s",
+            "pedidos": [
+                {"id_pedido": "1", "produtos": [{"gtin": "1", "codigo": "A"}]},
+                {"id_pedido": "2", "produtos": []},
+                {"id_pedido": "1", "produtos": [{"gtin": "1", "codigo": "A", "quantidade": 3}]},
+            ],
+        })
+
+    # Um único login no site e um único token para o lote (id repetido submetido uma vez)
+    mock_orders.assert_called_once()
+    pedidos = mock_orders.call_args[1]["pedidos"]
+    assert [p["id_pedido"] for p in pedidos] == ["1", "2"]
+    assert pedidos[0]["produtos"][0]["quantidade"] == 3
+    mock_token.assert_called_once()
+    assert mock_patch.call_count == 2
+    assert result["falhas"] == 1
+    assert result["pedidos"][0]["resposta_api"] == {"id": 1}
+    assert "API indisponível" in result["pedidos"][1]["erro"]
+
+
+def test_process_scraping_task_retomada_envia_so_o_que_falta(monkeypatch):
+    import fakeredis
+    from unittest.mock import patch
+    from servimed_scraper.checkpoint import CrawlCheckpoint
+    from worker import process_scraping_task
+
+    monkeypatch.setenv("DESAFIO_API_USER", "api_user")
+    monkeypatch.setenv("DESAFIO_API_PASSWORD", "api_pass")
+    monkeypatch.setenv("PRODUTO_UPLOAD_CHUNK", "2")
+    checkpoint = CrawlCheckpoint(fakeredis.FakeRedis(), "job-1")
+    checkpoint.record_page("/p1", [{"gtin": str(i)} for i in range(5)], [])
+    checkpoint.mark_uploaded(2)  # execução anterior caiu após o primeiro bloco
+
+    with patch("worker._job_checkpoint", return_value=checkpoint), \
+            patch("worker.run_scraper", side_effect=lambda **kw: kw["checkpoint"].items()), \
+            patch("worker.get_token", return_value="t") as mock_token, \
+            patch("worker.post_produtos", return_value={"ok": True}) as mock_post:
+        result = process_scraping_task({"usuario": "u", "senha": "s"})
+
+    assert result["produtos_enviados"] == 5
+    enviados = [p["gtin"] for c in mock_post.call_args_list for p in c.kwargs["produtos"]]
+    assert enviados == ["2", "3", "4"]
+    assert result["resposta_api"] == [{"ok": True}, {"ok": True}]
+    mock_token.assert_called_once()
+    assert not checkpoint.has_progress()
+
+
+def test_process_pedido_task_retentativa_nao_refaz_pedido_no_site(monkeypatch):
+    import fakeredis
+    from unittest.mock import patch
+    from pedido_ledger import PedidoLedger
+    from worker import process_pedido_task
+
+    monkeypatch.setenv("DESAFIO_API_USER", "api_user")
+    monkeypatch.setenv("DESAFIO_API_PASSWORD", "api_pass")
+    ledger = PedidoLedger(fakeredis.FakeRedis())
+    payload = {"usuario": "u", "senha": "s", "id_pedido": "5", "produtos": []}
+
+    with patch("worker._job_ledger", return_value=(ledger, "job-1", 60)), \
+            patch("worker.run_order", return_value={"codigo_confirmacao": "C5", "status": "pedido_realizado"}) as mock_order, \
+            patch("worker.get_token", return_value="t"), \
+            patch("worker.patch_pedido", side_effect=[RuntimeError("timeout"), {"id": 5}, {"id": 5}]) as mock_patch:
+        with pytest.raises(RuntimeError):
+            process_pedido_task(payload)
+        assert ledger.get("5")["etapa"] == "submetido"
+
+        result = process_pedido_task(payload)  # retentativa
+        assert result["codigo_confirmacao"] == "C5"
+        assert ledger.get("5")["etapa"] == "concluido"
+
+        again = process_pedido_task(payload)  # enfileirado em duplicidade
+        assert again["ledger"] == "ja_concluido"
+
+    assert mock_order.call_count == 1
+    assert mock_patch.call_count == 2
+
+
+def test_breaker_aberto_reagenda_job_com_backoff(monkeypatch):
+    import fakeredis
+    from unittest.mock import patch
+    from rq import Queue
+    from circuit_breaker import CircuitOpenError, RetryBudget
+    from worker import _defer_job
+
+    monkeypatch.setenv("RETRY_MAX_ATTEMPTS", "2")
+    queue = Queue("scraping", connection=fakeredis.FakeRedis())
+    job = queue.enqueue("worker.process_scraping_task", {"usuario": "u", "senha": "s"})
+    budget = RetryBudget(queue.connection, ratio=0, min_retries=1)
+    erro = CircuitOpenError("api:x", 20)
+
+    with patch("worker.random.uniform", return_value=0):
+        res = _defer_job(job, "process_scraping_task", job.args[0], 1, erro, budget)
+    assert res["adiado"] and res["atraso"] == 20  # nunca antes do fim do cooldown
+    novo = queue.fetch_job(res["job_id"])
+    assert novo.meta == {"tentativa": 1, "checkpoint_key": job.id}
+    assert queue.scheduled_job_registry.count == 1
+
+    with pytest.raises(CircuitOpenError):  # orçamento esgotado: falha na hora
+        _defer_job(job, "process_scraping_task", job.args[0], 2, erro, budget)
+    with pytest.raises(CircuitOpenError):  # acima de RETRY_MAX_ATTEMPTS
+        _defer_job(job, "process_scraping_task", job.args[0], 3, erro, budget)
+
+
+def test_process_scraping_task_orcamento_atingido_envia_parcial(monkeypatch):
+    from unittest.mock import patch
+    import job_budget
+    from worker import process_scraping_task
+
+    monkeypatch.setenv("DESAFIO_API_USER", "api_user")
+    monkeypatch.setenv("DESAFIO_API_PASSWORD", "api_pass")
+    monkeypatch.setenv("JOB_BUDGET_DEFAULTS", '{"scraping": {"max_seconds": 540}}')
+
+    def crawl_parcial(**kw):
+        budget = job_budget.current()
+        assert budget.limites == {"max_seconds": 540, "max_pages": 3}
+        budget.exceeded = "max_pages"
+        return [{"gtin": "1"}, {"gtin": "2"}]
+
+    with patch("worker.run_scraper", side_effect=crawl_parcial), \
+            patch("worker.get_token", return_value="t"), \
+            patch("worker.post_produtos", return_value={"ok": True}) as mock_post:
+        result = process_scraping_task({"usuario": "u", "senha": "s", "budget": {"max_pages": 3}})
+
+    assert result["produtos_enviados"] == 2
+    assert result["limite_atingido"] == "max_pages"
+    mock_post.assert_called_once()
+
+
+def test_process_scraping_task_varias_contas_um_upload(monkeypatch):
+    from unittest.mock import patch
+    from worker import process_scraping_task
+
+    monkeypatch.setenv("DESAFIO_API_USER", "api_user")
+    monkeypatch.setenv("DESAFIO_API_PASSWORD", "api_pass")
+    monkeypatch.setenv("PRODUTO_UPLOAD_CHUNK", "2")
+    contas = [{"usuario": "a", "senha": "1"}, {"usuario": "b", "senha": "2"}, {"usuario": "a", "senha": "1"}]
+
+    with patch("worker.run_scrapers", return_value={"b": [{"gtin": "3"}], "a": [{"gtin": "1"}, {"gtin": "2"}]}) as mock_run, \
+            patch("worker.get_token", return_value="t") as mock_token, \
+            patch("worker.post_produtos", return_value={"ok": True}) as mock_post:
+        result = process_scraping_task({"contas": contas})
+
+    assert [c["usuario"] for c in mock_run.call_args.args[0]] == ["a", "b"]
+    assert result["produtos_enviados"] == 3
+    assert result["por_conta"] == {"a": 2, "b": 1}
+    enviados = [p["gtin"] for c in mock_post.call_args_list for p in c.kwargs["produtos"]]
+    assert enviados == ["1", "2", "3"]
+    mock_token.assert_called_once()
+    with pytest.raises(ValueError, match="'usuario' e 'senha'"):
+        process_scraping_task({"contas": [{"usuario": "a"}]})
+
+
+def test_process_scraping_task_publica_mudancas(monkeypatch):
+    import fakeredis
+    from unittest.mock import patch
+    from worker import process_scraping_task
+
+    monkeypatch.setenv("DESAFIO_API_USER", "api_user")
+    monkeypatch.setenv("DESAFIO_API_PASSWORD", "api_pass")
+    monkeypatch.setenv("CHANGE_EVENTS", "1")
+    conn = fakeredis.FakeRedis()
+    catalogos = [
+        [{"codigo": "1", "preco_fabrica": "10,00", "estoque": "5"}],
+        [{"codigo": "1", "preco_fabrica": "8,00", "estoque": "5"}],
+    ]
+
+    with patch("worker._redis_conn", return_value=conn), \
+            patch("worker.run_scraper", side_effect=lambda **kw: catalogos.pop(0)), \
+            patch("worker.get_token", return_value="t"), \
+            patch("worker.post_produtos", return_value={"ok": True}):
+        process_scraping_task({"usuario": "u", "senha": "s"})
+        result = process_scraping_task({"usuario": "u", "senha": "s"})
+
+    assert result["mudancas"]["alterado"] == 1
+    assert conn.xlen("produtos:mudancas") == 1
+
+
+def test_process_pedido_batch_task_nao_confirmado_sem_patch(monkeypatch):
+    monkeypatch.setenv("DESAFIO_API_USER", "api_user")
+    monkeypatch.setenv("DESAFIO_API_PASSWORD", "api_pass")
+    from unittest.mock import patch
+    from worker import process_pedido_batch_task
+
+    with patch("worker.run_orders", return_value=[
+                {"id_pedido": "1", "codigo_confirmacao": "C1", "status": "pedido_realizado"},
+                {"id_pedido": "2", "codigo_confirmacao": None, "status": "nao_confirmado"},
+            ]), \
+            patch("worker.get_token", return_value="t"), \
+            patch("worker.patch_pedido", return_value={}) as mock_patch:
+        result = process_pedido_batch_task({
+            "usuario": "u", "senha": "s", "pedidos": [{"id_pedido": "1"}, {"id_pedido": "2"}],
+        })
+
+    mock_patch.assert_called_once()
+    assert mock_patch.call_args[1]["id_pedido"] == 1
+    assert result["falhas"] == 1
+    assert [r for r in result["pedidos"] if "erro" in r][0]["status"] == "nao_confirmado"
+
+
+def test_flush_pedido_batch_mantem_o_lote_se_falhar(monkeypatch):
+    import fakeredis
+    from unittest.mock import patch
+    from rq import Queue
+    from pedido_batch import enqueue_pedido_coalescido, processing_key
+    from worker import flush_pedido_batch
+
+    queue = Queue("pedido", connection=fakeredis.FakeRedis())
+    job = enqueue_pedido_coalescido(queue, {"usuario": "u", "senha": "s", "id_pedido": "1"})
+    job = queue.fetch_job(job["job_id"])
+
+    with patch("rq.get_current_job", return_value=job), \
+            patch("worker._process_pedido_batch", side_effect=RuntimeError("login")):
+        with pytest.raises(RuntimeError):
+            flush_pedido_batch("u")
+    assert queue.connection.llen(processing_key("u", job.id)) == 1
+
+    with patch("rq.get_current_job", return_value=job), \
+            patch("worker._process_pedido_batch", return_value={"pedidos": [], "falhas": 0}) as mock_lote:
+        flush_pedido_batch("u")
+    assert mock_lote.call_args[0][0]["pedidos"][0]["id_pedido"] == "1"
+    assert not queue.connection.exists(processing_key("u", job.id))
+
+
+def test_flush_pedido_batch_um_lote_por_senha():
+    import fakeredis
+    from unittest.mock import patch
+    from rq import Queue
+    from pedido_batch import enqueue_pedido_coalescido
+    from worker import flush_pedido_batch
+
+    queue = Queue("pedido", connection=fakeredis.FakeRedis())
+    r = enqueue_pedido_coalescido(queue, {"usuario": "u", "senha": "s1", "id_pedido": "1"})
+    enqueue_pedido_coalescido(queue, {"usuario": "u", "senha": "s2", "id_pedido": "2"})
+    enqueue_pedido_coalescido(queue, {"usuario": "u", "senha": "s1", "id_pedido": "3"})
+
+    def lote(payload):
+        return {"pedidos": [{"id_pedido": p["id_pedido"]} for p in payload["pedidos"]], "falhas": 1, "adiado": {"job_id": "x"}}
+
+    with patch("rq.get_current_job", return_value=queue.fetch_job(r["job_id"])), \
+            patch("worker._process_pedido_batch", side_effect=lote) as mock_lote, \
+            patch("worker.run_orders") as mock_orders:
+        result = flush_pedido_batch("u")
+
+    # Só um lote roda no processo do flush (um run_orders por processo); o da
+    # outra senha vira um job próprio
+    mock_lote.assert_called_once()
+    mock_orders.assert_not_called()
+    assert mock_lote.call_args.args[0]["senha"] == "s1"
+    assert [p["id_pedido"] for p in mock_lote.call_args.args[0]["pedidos"]] == ["1", "3"]
+    assert result["falhas"] == 1 and result["adiado"] == {"job_id": "x"}
+    (job_id,) = result["lotes_enfileirados"]
+    outro = queue.fetch_job(job_id)
+    assert outro.func_name == "worker.process_pedido_batch_task"
+    assert outro.args[0]["senha"] == "s2"
+    assert [p["id_pedido"] for p in outro.args[0]["pedidos"]] == ["2"]
+
+
+def test_process_pedido_batch_task_com_dispatcher_enfileira_callbacks(monkeypatch):
+    import fakeredis
+    from unittest.mock import patch
+    import callback_dispatcher
+    from worker import process_pedido_batch_task
+
+    monkeypatch.setenv("CALLBACK_DISPATCHER", "1")
+    monkeypatch.delenv("DESAFIO_API_USER", raising=False)
+    conn = fakeredis.FakeRedis()
+
+    with patch("worker._redis_conn", return_value=conn), \
+            patch("worker.run_orders", return_value=[
+                {"id_pedido": "1", "codigo_confirmacao": "C1", "status": "pedido_realizado"},
+            ]), \
+            patch("worker.patch_pedido") as mock_patch:
+        result = process_pedido_batch_task({"usuario": "u", "senha": "s", "pedidos": [{"id_pedido": "1"}]})
+
+    mock_patch.assert_not_called()
+    assert result["pedidos"][0]["callback"] == "enfileirado"
+    assert callback_dispatcher.pending(conn) == 1
+
+
+def test_process_scraping_task_retorna_stats_do_crawl(monkeypatch):
+    from unittest.mock import patch
+    import crawl_stats
+    from worker import process_scraping_task
+
+    def run_scraper(**kwargs):
+        crawl_stats._current.get().append({"spider": "products", "itens": 1})
+        return [{"gtin": "1"}]
+
+    with patch("worker._job_checkpoint", return_value=None), \
+            patch("worker.run_scraper", side_effect=run_scraper), \
+            patch("worker._send_produtos", return_value={"ok": True}):
+        result = process_scraping_task({"usuario": "u", "senha": "s"})
+
+    assert result["crawl_stats"] == [{"spider": "products", "itens": 1}]
+
+
+def test_send_produtos_em_stream(monkeypatch):
+    from unittest.mock import patch
+    from worker import _send_produtos
+
+    monkeypatch.setenv("PRODUTO_UPLOAD_STREAM", "1")
+    monkeypatch.setenv("PRODUTO_UPLOAD_GZIP", "1")
+    with patch("worker.post_produtos_stream", return_value={"ok": True}) as mock_stream, \
+            patch("worker.post_produtos") as mock_post:
+        assert _send_produtos([{"gtin": "1"}], token="t") == {"ok": True}
+    mock_post.assert_not_called()
+    assert mock_stream.call_args.kwargs["gzip"] is True
+
+
+@pytest.mark.parametrize("motivo", ["shutdown", "cancelado"])
+def test_process_scraping_task_interrompido(monkeypatch, motivo):
+    import fakeredis
+    from unittest.mock import patch
+    from rq import Queue
+    import job_cancel
+    from worker import process_scraping_task
+
+    queue = Queue("scraping", connection=fakeredis.FakeRedis())
+    job = queue.enqueue("worker.process_scraping_task", {"usuario": "u", "senha": "s"})
+    queue.empty()
+
+    def crawl_interrompido(**kw):
+        assert job_cancel.current() == job_cancel.cancel_key(job.id)
+        raise job_cancel.JobInterrupted(motivo)
+
+    with patch("rq.get_current_job", return_value=job), \
+            patch("worker.run_scraper", side_effect=crawl_interrompido), \
+            patch("worker.post_produtos") as mock_post:
+        result = process_scraping_task({"usuario": "u", "senha": "s"})
+
+    mock_post.assert_not_called()
+    assert result["interrompido"] == motivo and result["checkpoint_key"] == job.id
+    if motivo == "shutdown":
+        novo = queue.fetch_job(result["job_id"])
+        assert novo.meta["checkpoint_key"] == job.id and queue.job_ids == [novo.id]
+    else:
+        assert result["retomavel"] and queue.count == 0
+
+
+def test_process_scraping_task_grava_historico_do_catalogo(monkeypatch, tmp_path):
+    from unittest.mock import patch
+    from catalog_store import CatalogStore
+    from worker import process_scraping_task
+
+    monkeypatch.setenv("DESAFIO_API_USER", "api_user")
+    monkeypatch.setenv("DESAFIO_API_PASSWORD", "api_pass")
+    monkeypatch.setenv("CATALOG_STORE_DIR", str(tmp_path))
+    monkeypatch.setenv("CATALOG_STORE_KEEP_LAST", "2")
+    catalogos = [
+        [{"codigo": "1", "preco_fabrica": "10,00"}],
+        [{"codigo": "1", "preco_fabrica": "8,00"}],
+        [{"codigo": "1", "preco_fabrica": "8,00"}, {"codigo": "2", "preco_fabrica": "1,00"}],
+    ]
+
+    with patch("worker.run_scraper", side_effect=lambda **kw: catalogos.pop(0)), \
+            patch("worker.get_token", return_value="t"), \
+            patch("worker.post_produtos", return_value={"ok": True}):
+        for _ in range(3):
+            process_scraping_task({"usuario": "u", "senha": "s"})
+
+    store = CatalogStore(str(tmp_path))
+    assert len(store.snapshot_ids("u")) == 2
+    assert [m["tipo"] for m in store.diff("u", "-2", "-1")] == ["novo"]
+
+
+def test_process_scraping_task_um_bloco_devolve_a_resposta_do_post(monkeypatch):
+    import fakeredis
+    from unittest.mock import patch
+    from servimed_scraper.checkpoint import CrawlCheckpoint
+    from worker import process_scraping_task
+
+    monkeypatch.setenv("DESAFIO_API_USER", "api_user")
+    monkeypatch.setenv("DESAFIO_API_PASSWORD", "api_pass")
+    checkpoint = CrawlCheckpoint(fakeredis.FakeRedis(), "job-1")
+
+    with patch("worker._job_checkpoint", return_value=checkpoint), \
+            patch("worker.run_scraper", return_value=[{"gtin": "1"}, {"gtin": "2"}]), \
+            patch("worker.get_token", return_value="t"), \
+            patch("worker.post_produtos", return_value={"inseridos": 2}) as mock_post:
+        result = process_scraping_task({"usuario": "u", "senha": "s"})
+
+    mock_post.assert_called_once()
+    assert result["resposta_api"] == {"inseridos": 2}
+
+
+def test_process_pedido_task_travado_por_outro_job_reagenda(monkeypatch):
+    import fakeredis
+    from unittest.mock import patch
+    from rq import Queue
+    from pedido_ledger import PedidoEmProcessamento, PedidoLedger
+    from worker import process_pedido_task
+
+    monkeypatch.setenv("DESAFIO_API_USER", "api_user")
+    monkeypatch.setenv("DESAFIO_API_PASSWORD", "api_pass")
+    monkeypatch.setenv("RETRY_MAX_ATTEMPTS", "1")
+    queue = Queue("pedido", connection=fakeredis.FakeRedis())
+    payload = {"usuario": "u", "senha": "s", "id_pedido": "5", "produtos": []}
+    job = queue.enqueue("worker.process_pedido_task", payload, job_id="pedido-5")
+    PedidoLedger(queue.connection).lock("5", "outro-job", 60)
+
+    with patch("rq.get_current_job", return_value=job), \
+            patch("worker.run_order") as mock_order:
+        result = process_pedido_task(payload)
+        assert result["adiado"]
+        assert queue.fetch_job(result["job_id"]).args[0] == payload
+        assert queue.scheduled_job_registry.count == 1
+
+        job.meta["tentativa"] = 1  # tentativas esgotadas: falha em vez de sucesso vazio
+        with pytest.raises(PedidoEmProcessamento):
+            process_pedido_task(payload)
+    mock_order.assert_not_called()
+
+
+def test_process_pedido_batch_task_reagenda_so_os_travados(monkeypatch):
+    import fakeredis
+    from unittest.mock import patch
+    from rq import Queue
+    from pedido_ledger import PedidoLedger
+    from worker import process_pedido_batch_task
+
+    monkeypatch.setenv("DESAFIO_API_USER", "api_user")
+    monkeypatch.setenv("DESAFIO_API_PASSWORD", "api_pass")
+    queue = Queue("pedido", connection=fakeredis.FakeRedis())
+    payload = {
+        "usuario": "u",
+        "senha": "s",
+        "pedidos": [{"id_pedido": "1", "produtos": []}, {"id_pedido": "2", "produtos": []}],
+    }
+    job = queue.enqueue("worker.process_pedido_batch_task", payload)
+    ledger = PedidoLedger(queue.connection)
+    ledger.lock("2", "outro-job", 60)
+    ledger.lock("1", job.id, 60)  # trava de uma execução anterior do mesmo job
+
+    with patch("rq.get_current_job", return_value=job), \
+            patch("worker.run_orders", return_value=[
+                {"id_pedido": "1", "codigo_confirmacao": "C1", "status": "pedido_realizado"},
+            ]) as mock_orders, \
+            patch("worker.get_token", return_value="t"), \
+            patch("worker.patch_pedido", return_value={"id": 1}):
+        result = process_pedido_batch_task(payload)
+
+    assert [p["id_pedido"] for p in mock_orders.call_args.kwargs["pedidos"]] == ["1"]
+    assert [r["id_pedido"] for r in result["pedidos"]] == ["1"]
+    novo = queue.fetch_job(result["adiado"]["job_id"])
+    assert [p["id_pedido"] for p in novo.args[0]["pedidos"]] == ["2"]
+
+
+def test_crawl_distribuido_aplica_e_repassa_o_orcamento(monkeypatch):
+    import fakeredis
+    from unittest.mock import patch
+    from rq import Queue
+    import job_budget
+    from worker import process_crawl_worker_task, process_distributed_scraping_task
+
+    monkeypatch.setenv("JOB_BUDGET_DEFAULTS", '{"scraping": {"max_seconds": 540}}')
+    queue = Queue("scraping", connection=fakeredis.FakeRedis())
+    payload = {"usuario": "u", "senha": "s", "workers": 2, "budget": {"max_pages": 10}}
+    job = queue.enqueue("worker.process_distributed_scraping_task", payload)
+
+    def crawl(crawl_id, role, **kw):
+        budget = job_budget.current()
+        assert budget.limites == {"max_seconds": 540, "max_pages": 10}
+        budget.exceeded = "max_pages"
+        return {"paginas": 10, "urls_publicadas": 3}
+
+    with patch("rq.get_current_job", return_value=job), \
+            patch("worker.run_scraper_distributed", side_effect=crawl), \
+            patch("worker._finalize_distributed_crawl", side_effect=lambda c, local, conta=None: dict(local)):
+        result = process_distributed_scraping_task(payload)
+        assert result["limite_atingido"] == "max_pages"
+
+        (worker_job,) = [j for j in queue.get_jobs() if j.func_name == "worker.process_crawl_worker_task"]
+        assert worker_job.args[0]["budget"] == {"max_pages": 10}
+        result = process_crawl_worker_task(worker_job.args[0])
+    assert result["limite_atingido"] == "max_pages"
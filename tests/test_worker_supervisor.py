@@ -0,0 +1,128 @@
+"""Testes para worker_supervisor (escala automática dos pools de workers)."""
+import json
+import signal
+from unittest.mock import patch
+
+import fakeredis
+import pytest
+from rq import Queue
+
+import job_cancel
+import worker_supervisor
+from scheduling import fair_queue
+from worker_supervisor import WorkerSupervisor, desired_size, parse_pools, queue_metrics
+
+FOLGA = {"cpu": 0.2, "memoria_livre": 0.5}
+
+
+@pytest.fixture
+def conn():
+    return fakeredis.FakeRedis()
+
+
+class FakeProcess:
+    pids = iter(range(1000, 2000))
+
+    def __init__(self):
+        self.pid = next(self.pids)
+        self.alive = True
+        self.exitcode = None
+
+    def is_alive(self):
+        return self.alive
+
+    def join(self, timeout=None):
+        pass
+
+
+def _politica(**kwargs):
+    return parse_pools({"p": {"queues": ["scraping"], **kwargs}})["p"]
+
+
+def test_parse_pools_valida_e_completa():
+    pools = parse_pools({"scraping": {"queues": "scraping, pedido", "max": 8}})
+    assert pools["scraping"]["queues"] == ["scraping", "pedido"]
+    assert pools["scraping"]["min"] == 1 and pools["scraping"]["max"] == 8
+    with pytest.raises(ValueError):
+        parse_pools({"x": {"queues": ["a"], "min": 3, "max": 2}})
+    with pytest.raises(ValueError):
+        parse_pools({"x": {"queues": ["a"], "maximo": 2}})
+
+
+def test_desired_size():
+    politica = _politica(min=1, max=6, jobs_per_worker=10, step=2, up_cooldown=30, down_cooldown=300)
+    fila = {"profundidade": 45, "idade_max": 0}
+    assert desired_size(politica, 1, fila, FOLGA, 0, 0, 1000) == (3, "fila")  # no máximo step por vez
+    assert desired_size(politica, 3, fila, FOLGA, 990, 0, 1000) == (3, "cooldown")
+    assert desired_size(politica, 3, fila, {"cpu": 0.95, "memoria_livre": 0.5}, 0, 0, 1000) == (3, "host_sem_folga")
+    assert desired_size(politica, 3, fila, {"cpu": 0.2, "memoria_livre": 0.05}, 0, 0, 1000) == (3, "host_sem_folga")
+    # Fila curta mas job antigo esperando (crawls longos)
+    assert desired_size(politica, 2, {"profundidade": 3, "idade_max": 500}, FOLGA, 0, 0, 1000) == (3, "fila")
+    # Redução: um por vez, depois do down_cooldown
+    vazia = {"profundidade": 0, "idade_max": 0}
+    assert desired_size(politica, 4, vazia, FOLGA, 900, 0, 1000) == (4, "cooldown")
+    assert desired_size(politica, 4, vazia, FOLGA, 0, 0, 1000) == (3, "ociosa")
+    assert desired_size(politica, 1, vazia, FOLGA, 0, 0, 1000) == (1, "estavel")
+    assert desired_size(_politica(min=2), 0, vazia, {"cpu": 5, "memoria_livre": 0}, 0, 0, 1000) == (2, "minimo")
+
+
+def test_queue_metrics_conta_subfilas_e_idade(conn):
+    fair_queue(conn, "scraping", "conta-a").enqueue("worker.process_scraping_task")
+    q = Queue("scraping", connection=conn)
+    job = q.enqueue("worker.process_scraping_task")
+    q.enqueue("worker.process_scraping_task")
+
+    metricas = queue_metrics(conn, ["scraping"], agora=job.enqueued_at.timestamp() + 60)
+    assert metricas["profundidade"] == 3
+    assert metricas["idade_max"] == pytest.approx(60, abs=1)
+    assert queue_metrics(conn, ["vazia"]) == {"profundidade": 0, "idade_max": 0.0}
+
+
+def test_supervisor_escala_drena_e_repoe(conn, tmp_path):
+    pools = parse_pools({"scraping": {"queues": ["scraping"], "min": 1, "max": 3, "jobs_per_worker": 2,
+                                      "up_cooldown": 0, "down_cooldown": 0}})
+    iniciados = []
+
+    def start_worker(queues):
+        iniciados.append(FakeProcess())
+        return iniciados[-1]
+
+    log = tmp_path / "pools.jsonl"
+    supervisor = WorkerSupervisor(conn, pools, start_worker=start_worker, event_log=str(log),
+                                  drain_timeout=60, host=lambda: FOLGA)
+    assert supervisor.step(agora=100) == {"scraping": 1}
+
+    q = Queue("scraping", connection=conn)
+    for _ in range(6):
+        q.enqueue("worker.process_scraping_task")
+    assert supervisor.step(agora=200) == {"scraping": 3}
+
+    q.empty()
+    with patch("worker_supervisor.os.kill") as kill:
+        assert supervisor.step(agora=300) == {"scraping": 2}
+    drenado = iniciados[-1]
+    kill.assert_called_once_with(drenado.pid, job_cancel.DRAIN_SIGNAL)
+
+    # Dreno acima do timeout: SIGTERM interrompe o job do worker (uma vez)
+    supervisor.pools["scraping"]["down_cooldown"] = 10**6
+    with patch("worker_supervisor.os.kill") as kill:
+        supervisor.step(agora=400)
+        supervisor.step(agora=450)
+    kill.assert_called_once_with(drenado.pid, signal.SIGTERM)
+
+    # Worker que morreu sai do pool; o drenado que terminou também
+    drenado.alive = False
+    iniciados[0].alive, iniciados[0].exitcode = False, 1
+    supervisor.pools["scraping"]["min"] = 2
+    assert supervisor.step(agora=500) == {"scraping": 2}
+    assert supervisor.drenando["scraping"] == []
+
+    eventos = [json.loads(linha)["evento"] for linha in log.read_text().splitlines()]
+    assert eventos == ["aumento", "aumento", "reducao", "interrupcao", "saida", "drenado", "aumento"]
+
+
+def test_host_metrics_sem_proc(monkeypatch):
+    monkeypatch.setattr(worker_supervisor.os, "getloadavg", lambda: (2.0, 0, 0))
+    monkeypatch.setattr(worker_supervisor.os, "cpu_count", lambda: 4)
+    with patch("builtins.open", side_effect=OSError):
+        assert worker_supervisor.host_metrics() == {"cpu": 0.5, "memoria_livre": 1.0}
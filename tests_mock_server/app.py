@@ -10,11 +10,13 @@ Depois:
   export DESAFIO_API_URL=http://127.0.0.1:8799
   python enqueue_pedido.py
 """
+import json
 import random
 import string
+import zlib
 from typing import Any
 
-from fastapi import FastAPI, Form, HTTPException, Depends
+from fastapi import FastAPI, Form, HTTPException, Depends, Request
 from fastapi.responses import Response
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
@@ -25,6 +27,7 @@ app = FastAPI(title="Mock API Desafio Cotefácil", version="0.1.0")
 users: dict[str, str] = {}  # username -> password
 tokens: dict[str, str] = {}  # token -> username
 pedidos: dict[int, dict] = {}
+produtos: dict[str, dict] = {}  # codigo -> produto
 _next_id = 1
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/oauth/token", auto_error=False)
@@ -96,8 +99,24 @@ def login(
 
 
 @app.get("/pedido")
-def listar_pedidos(_: str = Depends(get_current_user)):
-    return list(pedidos.values())
+def listar_pedidos(
+    after_id: int = 0,
+    pendente: bool | None = None,
+    limit: int | None = None,
+    _: str = Depends(get_current_user),
+):
+    """Lista pedidos por id crescente; after_id/limit paginam, pendente filtra sem status."""
+    out = []
+    for id_pedido in sorted(pedidos):
+        if id_pedido <= after_id:
+            continue
+        p = pedidos[id_pedido]
+        if pendente is not None and (p["status"] is None and p["codigo_fornecedor"] is None) != pendente:
+            continue
+        out.append(p)
+        if limit is not None and len(out) >= limit:
+            break
+    return out
 
 
 @app.post("/pedido")
@@ -135,6 +154,29 @@ def atualizar_pedido(id_pedido: int, body: UpdatePedido, _: str = Depends(get_cu
     return pedidos[id_pedido]
 
 
+@app.post("/produto")
+async def receber_produtos(request: Request, _: str = Depends(get_current_user)):
+    """Aceita corpo com Content-Length ou chunked, opcionalmente gzip (upload em stream)."""
+    gzip = request.headers.get("content-encoding", "").lower() == "gzip"
+    descompressor = zlib.decompressobj(31) if gzip else None
+    corpo = bytearray()
+    async for bloco in request.stream():
+        corpo += descompressor.decompress(bloco) if descompressor else bloco
+    if descompressor:
+        corpo += descompressor.flush()
+    try:
+        itens = json.loads(corpo)
+    except ValueError:
+        raise HTTPException(422, "invalid JSON")
+    if not isinstance(itens, list):
+        raise HTTPException(422, "expected a list of produtos")
+    for item in itens:
+        if not isinstance(item, dict) or not {"gtin", "codigo", "descricao", "preco_fabrica", "estoque"} <= item.keys():
+            raise HTTPException(422, "invalid produto")
+        produtos[str(item["codigo"])] = item
+    return {"recebidos": len(itens)}
+
+
 @app.get("/healthcheck")
 def healthcheck():
     return Response(status_code=204)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Tracing leve entre processos: enfileiramento -> worker -> crawl -> callback na API.
+
+- Contexto: traceparent W3C ("00-<trace_id>-<span_id>-01"), criado pelos scripts
+  enqueue_* e levado no payload do job (chave "traceparent").
+- Spans: formato Zipkin v2 (JSON), um por linha no arquivo TRACE_FILE (append;
+  vários workers podem gravar no mesmo arquivo). Sem TRACE_FILE nada é gravado.
+- Visualização sem serviço externo:
+    python tracing.py export traces.jsonl > trace.json    # array JSON Zipkin v2
+  e "Upload JSON" no Zipkin UI (ou no Jaeger UI, que aceita JSON Zipkin);
+    python tracing.py summary traces.jsonl                # duração por span, no terminal
+"""
+import argparse
+import contextvars
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+SERVICE_NAME = os.environ.get("TRACE_SERVICE_NAME", "desafio-cotefacil")
+
+_current = contextvars.ContextVar("tracing_span", default=None)
+_write_lock = threading.Lock()
+
+
+def format_traceparent(trace_id: str, span_id: str) -> str:
+    return f"00-{trace_id}-{span_id}-01"
+
+
+def parse_traceparent(value: str | None) -> tuple[str, str] | None:
+    """(trace_id, span_id) de um traceparent W3C; None se ausente ou inválido."""
+    if not value:
+        return None
+    parts = value.split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+class Span:
+    """Span em andamento; finish() grava no exportador (TRACE_FILE)."""
+
+    __slots__ = ("trace_id", "id", "parent_id", "name", "kind", "start", "tags")
+
+    def __init__(self, name: str, parent=None, kind: str | None = None, start: float | None = None, tags=None):
+        if parent is None:
+            parent = _current.get()
+        if isinstance(parent, Span):
+            ctx = (parent.trace_id, parent.id)
+        else:
+            ctx = parse_traceparent(parent)
+        self.trace_id, self.parent_id = ctx if ctx else (secrets.token_hex(16), None)
+        self.id = secrets.token_hex(8)
+        self.name = name
+        self.kind = kind
+        self.start = time.time() if start is None else start
+        self.tags = {}
+        for k, v in (tags or {}).items():
+            self.set_tag(k, v)
+
+    @property
+    def traceparent(self) -> str:
+        return format_traceparent(self.trace_id, self.id)
+
+    def set_tag(self, key: str, value):
+        if value is not None:
+            self.tags[key] = str(value)
+
+    def finish(self, end: float | None = None):
+        end = time.time() if end is None else end
+        record = {
+            "traceId": self.trace_id,
+            "id": self.id,
+            "name": self.name,
+            "timestamp": int(self.start * 1_000_000),
+            "duration": max(int((end - self.start) * 1_000_000), 1),
+            "localEndpoint": {"serviceName": SERVICE_NAME},
+        }
+        if self.parent_id:
+            record["parentId"] = self.parent_id
+        if self.kind:
+            record["kind"] = self.kind
+        if self.tags:
+            record["tags"] = self.tags
+        _export(record)
+
+
+@contextmanager
+def span(name: str, parent=None, kind: str | None = None, **tags):
+    """
+    Span do bloco; vira o span atual (filhos herdam o contexto).
+    parent: Span, traceparent (ex.: do payload) ou None (span atual / nova trace).
+    """
+    s = Span(name, parent=parent, kind=kind, tags=tags)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.set_tag("error", f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current.reset(token)
+        s.finish()
+
+
+def record_span(name: str, start: float, end: float, parent=None, kind: str | None = None, **tags):
+    """Grava um span já medido (ex.: espera em fila, requisição do Scrapy)."""
+    Span(name, parent=parent, kind=kind, start=start, tags=tags).finish(end)
+
+
+def inject(payload: dict, name: str = "enqueue") -> Span:
+    """
+    Cria o span de enfileiramento (PRODUCER; nova trace se não houver span atual)
+    e grava seu traceparent no payload do job. O chamador chama finish() após enfileirar.
+    """
+    s = Span(name, parent=payload.get("traceparent") or None, kind="PRODUCER")
+    payload["traceparent"] = s.traceparent
+    return s
+
+
+def current_traceparent() -> str | None:
+    s = _current.get()
+    return s.traceparent if s is not None else None
+
+
+def _export(record: dict):
+    path = os.environ.get("TRACE_FILE")
+    if not path:
+        return
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with _write_lock, open(path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+def load_spans(path: str, trace_id: str | None = None) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        spans = [json.loads(line) for line in f if line.strip()]
+    if trace_id:
+        spans = [s for s in spans if s["traceId"] == trace_id]
+    return spans
+
+
+def _summary(spans: list[dict]):
+    por_trace: dict[str, list] = {}
+    for s in spans:
+        por_trace.setdefault(s["traceId"], []).append(s)
+    for trace_id, lista in por_trace.items():
+        lista.sort(key=lambda s: s["timestamp"])
+        inicio = lista[0]["timestamp"]
+        print(f"trace {trace_id} ({len(lista)} spans)")
+        for s in lista:
+            offset = (s["timestamp"] - inicio) / 1000
+            print(f"  +{offset:10.1f}ms {s['duration'] / 1000:10.1f}ms  {s['name']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta/resume spans gravados em TRACE_FILE")
+    parser.add_argument("comando", choices=["export", "summary"])
+    parser.add_argument("arquivo", nargs="?", default=os.environ.get("TRACE_FILE", "traces.jsonl"))
+    parser.add_argument("--trace-id", default=None, help="Apenas uma trace")
+    args = parser.parse_args()
+
+    spans = load_spans(args.arquivo, args.trace_id)
+    if args.comando == "export":
+        json.dump(spans, sys.stdout, ensure_ascii=False)
+        sys.stdout.write("\n")
+    else:
+        _summary(spans)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,27 @@
 Worker Nível 2 e 3: processa tarefas de scraping e de pedido (RQ + Redis).
 - Nível 2: scraping + POST /produto.
 - Nível 3: pedido no site + PATCH /pedido/:id com código de confirmação.
+- Lotes de pedido: vários pedidos da mesma conta com um único login.
 """
+import functools
 import os
 import logging
+import random
+from datetime import timedelta, timezone
+from urllib.parse import urlsplit
 
-from api_client import get_token, patch_pedido, post_pedido, post_produtos
-from order_runner import run_order
-from scraper_runner import run_scraper
+import callback_dispatcher
+import change_events
+import circuit_breaker
+import crawl_stats
+import job_budget
+import job_cancel
+import tracing
+from api_client import get_base_url, get_token, patch_pedido, post_pedido, post_produtos, post_produtos_stream
+from circuit_breaker import CircuitOpenError
+from order_runner import NAO_CONFIRMADO, run_order, run_orders
+from pedido_ledger import CONCLUIDO, SUBMETIDO, PedidoEmProcessamento
+from scraper_runner import run_scraper, run_scraper_distributed, run_scrapers
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,11 +32,212 @@ QUEUE_NAME = os.environ.get("RQ_QUEUE_NAME", "scraping")
 QUEUE_PEDIDO_NAME = os.environ.get("RQ_QUEUE_PEDIDO_NAME", "pedido")
 
 
+def _traced_job(func):
+    """
+    Span do job (filho do traceparent do payload, criado no enfileiramento) e
+    span "fila" com o tempo entre o enfileiramento e o início da execução.
+    """
+    @functools.wraps(func)
+    def wrapper(payload, *args, **kwargs):
+        from rq import get_current_job
+
+        parent = payload.get("traceparent") if isinstance(payload, dict) else None
+        job = get_current_job()
+        with tracing.span(func.__name__, parent=parent, kind="CONSUMER", job_id=job.id if job else None) as s:
+            if job is not None and job.enqueued_at is not None:
+                enqueued_at = job.enqueued_at
+                if enqueued_at.tzinfo is None:
+                    enqueued_at = enqueued_at.replace(tzinfo=timezone.utc)
+                tracing.record_span("fila", enqueued_at.timestamp(), s.start, parent=parent or s, queue=job.origin)
+            return func(payload, *args, **kwargs)
+    return wrapper
+
+
+def _deferrable_job(func):
+    """
+    Com CIRCUIT_BREAKER=1, dentro de um job RQ: verifica os breakers da API e do
+    fornecedor antes de começar e, se algum estiver aberto (antes ou durante o
+    job), reagenda o job com backoff exponencial com jitter. O reagendamento
+    respeita RETRY_MAX_ATTEMPTS e o orçamento global de retentativas; fora deles
+    o job falha na hora com CircuitOpenError.
+    """
+    @functools.wraps(func)
+    def wrapper(payload, *args, **kwargs):
+        from rq import get_current_job
+
+        job = get_current_job()
+        if job is None or not circuit_breaker.enabled():
+            return func(payload, *args, **kwargs)
+        tentativa = int(job.meta.get("tentativa", 0))
+        budget = circuit_breaker.retry_budget(job.connection)
+        if tentativa == 0:
+            budget.record_attempt()
+        try:
+            _ensure_upstreams_closed()
+            return func(payload, *args, **kwargs)
+        except CircuitOpenError as e:
+            return _defer_job(job, func.__name__, payload, tentativa + 1, e, budget)
+    return wrapper
+
+
+def _budgeted_job(func):
+    """
+    Orçamento de recursos do job (job_budget.py): limites padrão da fila
+    (JOB_BUDGET_DEFAULTS) + payload["budget"]. O crawl é encerrado no primeiro
+    limite atingido, o job segue com os resultados parciais e o limite fica no
+    resultado ("limite_atingido") e em job.meta.
+    """
+    @functools.wraps(func)
+    def wrapper(payload, *args, **kwargs):
+        from rq import get_current_job
+
+        job = get_current_job()
+        limites = job_budget.resolve(payload, job.origin if job else QUEUE_NAME)
+        if not limites:
+            return func(payload, *args, **kwargs)
+        with job_budget.activate(limites) as budget:
+            result = func(payload, *args, **kwargs)
+        if budget.exceeded:
+            logger.warning("Job %s encerrado pelo orçamento: %s", job.id if job else "-", budget.exceeded)
+            result["limite_atingido"] = budget.exceeded
+            if job is not None:
+                job.meta["limite_atingido"] = budget.exceeded
+                job.save_meta()
+        return result
+    return wrapper
+
+
+def _interruptible_job(func):
+    """
+    Cancelamento e desligamento gracioso (job_cancel.py), dentro de um job RQ: o
+    crawl lê a flag do job e fecha o spider. Motivo "shutdown" (SIGTERM no worker):
+    o job é reenfileirado na frente da fila com o mesmo checkpoint e continua de
+    onde parou. Motivo "cancelado": o job termina sem enviar e fica retomável
+    (python job_cancel.py resume <job_id>) enquanto o checkpoint existir.
+    """
+    @functools.wraps(func)
+    def wrapper(payload, *args, **kwargs):
+        from rq import Queue, get_current_job
+
+        job = get_current_job()
+        if job is None:
+            return func(payload, *args, **kwargs)
+        checkpoint_key = job.meta.get("checkpoint_key", job.id)
+        try:
+            if job_cancel.requested(job.connection, job.id) == job_cancel.CANCELADO:
+                raise job_cancel.JobInterrupted(job_cancel.CANCELADO)
+            with job_cancel.activate(job.id):
+                return func(payload, *args, **kwargs)
+        except job_cancel.JobInterrupted as e:
+            if e.motivo != job_cancel.SHUTDOWN:
+                logger.warning("Job %s cancelado; checkpoint %s mantido para retomada", job.id, checkpoint_key)
+                return {"interrompido": e.motivo, "retomavel": True, "checkpoint_key": checkpoint_key}
+            novo = Queue(job.origin, connection=job.connection).enqueue(
+                f"worker.{func.__name__}",
+                payload,
+                job_timeout=job.timeout,
+                at_front=True,
+                meta={"tentativa": job.meta.get("tentativa", 0), "checkpoint_key": checkpoint_key},
+            )
+            logger.warning("Job %s interrompido pelo desligamento do worker; continua no job %s", job.id, novo.id)
+            return {"interrompido": e.motivo, "job_id": novo.id, "checkpoint_key": checkpoint_key}
+        finally:
+            job_cancel.clear(job.connection, job.id)
+    return wrapper
+
+
+def _crawl_stats_job(func):
+    """
+    Stats dos crawls do job (crawl_stats.py): resumo de cada crawl no resultado
+    ("crawl_stats") e, dentro de um job RQ, na série temporal do fornecedor.
+    """
+    @functools.wraps(func)
+    def wrapper(payload, *args, **kwargs):
+        from rq import get_current_job
+
+        with crawl_stats.collect() as resumos:
+            result = func(payload, *args, **kwargs)
+        if not resumos or not isinstance(result, dict):
+            return result
+        result["crawl_stats"] = resumos
+        job = get_current_job()
+        if job is not None:
+            try:
+                for resumo in resumos:
+                    crawl_stats.append(job.connection, resumo, job_id=job.id)
+            except Exception:
+                logger.exception("Falha ao gravar a série de stats do crawl")
+        return result
+    return wrapper
+
+
+def _ensure_upstreams_closed():
+    """Falha na hora (CircuitOpenError) se o breaker da API ou do fornecedor estiver aberto."""
+    from servimed_scraper.spiders.products_spider import ProductsSpider
+
+    upstreams = (
+        circuit_breaker.api_upstream(get_base_url()),
+        circuit_breaker.supplier_upstream(urlsplit(ProductsSpider.base_url).hostname),
+    )
+    for upstream in upstreams:
+        breaker = circuit_breaker.breaker_for(upstream)
+        if breaker is not None:
+            breaker.ensure_closed()
+
+
+def _backoff(tentativa: int, minimo: float) -> float:
+    """Backoff exponencial com jitter (metade fixa + metade aleatória), nunca abaixo de minimo."""
+    base = float(os.environ.get("RETRY_BACKOFF_BASE", "10"))
+    teto = float(os.environ.get("RETRY_BACKOFF_MAX", "600"))
+    limite = min(teto, base * 2 ** (tentativa - 1))
+    return max(minimo, limite / 2 + random.uniform(0, limite / 2))
+
+
+def _defer_job(job, func_name: str, payload: dict, tentativa: int, error, budget=None) -> dict:
+    """
+    Reagenda o job (enqueue_in) ou, sem orçamento/tentativas, falha com o erro
+    original (CircuitOpenError ou PedidoEmProcessamento; error.retry_after é o
+    atraso mínimo). Sem budget, só RETRY_MAX_ATTEMPTS limita os reagendamentos.
+    """
+    from rq import Queue
+
+    max_tentativas = int(os.environ.get("RETRY_MAX_ATTEMPTS", "5"))
+    if tentativa > max_tentativas or (budget is not None and not budget.try_acquire()):
+        logger.error("Job %s sem retentativa (tentativa %d): %s", job.id, tentativa, error)
+        raise error
+    atraso = _backoff(tentativa, error.retry_after)
+    novo = Queue(job.origin, connection=job.connection).enqueue_in(
+        timedelta(seconds=atraso),
+        f"worker.{func_name}",
+        payload,
+        job_timeout=job.timeout,
+        # O checkpoint do crawl continua sendo o do job original
+        meta={"tentativa": tentativa, "checkpoint_key": job.meta.get("checkpoint_key", job.id)},
+    )
+    logger.warning("%s; job reagendado em %.0fs (tentativa %d, job %s)", error, atraso, tentativa, novo.id)
+    return {
+        "adiado": True,
+        "motivo": str(error),
+        "tentativa": tentativa,
+        "atraso": atraso,
+        "job_id": novo.id,
+    }
+
+
+@_traced_job
+@_deferrable_job
+@_interruptible_job
+@_budgeted_job
+@_crawl_stats_job
 def process_scraping_task(payload: dict) -> dict:
     """
     Job executado pelo worker RQ.
 
     payload: {"usuario": "fornecedor_user", "senha": "fornecedor_pass"}
+    ou, para várias contas do fornecedor em um job (um crawler por conta no mesmo
+    processo): {"contas": [{"usuario": ..., "senha": ...}, ...]}.
+    Opcional: "budget": {"max_pages": ..., "max_items": ..., "max_rss_mb": ...,
+    "max_seconds": ..., "max_bytes": ...} (ver job_budget.py).
 
     Fluxo:
     1. Executa o scraping com as credenciais do payload.
@@ -31,35 +246,329 @@ def process_scraping_task(payload: dict) -> dict:
 
     Retorna dict com quantidade de produtos enviados e resposta da API.
     """
-    usuario = payload.get("usuario") or payload.get("user")
-    senha = payload.get("senha") or payload.get("password")
-    if not usuario or not senha:
-        raise ValueError("Payload deve conter 'usuario' e 'senha'")
+    contas = _payload_contas(payload)
+    checkpoint = _job_checkpoint()
+    if len(contas) > 1:
+        return _process_scraping_contas(contas, checkpoint)
 
+    usuario, senha = contas[0]["usuario"], contas[0]["senha"]
     logger.info("Iniciando scraping para usuario=%s", usuario)
-    produtos = run_scraper(usuario=usuario, senha=senha)
+    with tracing.span("scraping"):
+        produtos = run_scraper(usuario=usuario, senha=senha, checkpoint=checkpoint)
     logger.info("Scraping concluído: %d produtos", len(produtos))
 
     if not produtos:
+        if checkpoint is not None:
+            checkpoint.clear()
         return {"produtos_enviados": 0, "mensagem": "Nenhum produto extraído"}
 
+    mudancas = _publish_changes(usuario, produtos)
+    _write_catalog_snapshot(usuario, produtos)
+    with tracing.span("upload", produtos=len(produtos)):
+        if checkpoint is None:
+            response = _send_produtos(produtos)
+        else:
+            response = _send_produtos_em_blocos(produtos, checkpoint)
+            checkpoint.clear()
+    result = {
+        "produtos_enviados": len(produtos),
+        "resposta_api": response,
+    }
+    if mudancas is not None:
+        result["mudancas"] = mudancas
+    return result
+
+
+def _payload_contas(payload: dict) -> list[dict]:
+    """Contas do fornecedor do payload: "contas" (lista) ou "usuario"/"senha"."""
+    contas = []
+    for c in payload.get("contas") or [payload]:
+        usuario = c.get("usuario") or c.get("user")
+        senha = c.get("senha") or c.get("password")
+        if not usuario or not senha:
+            raise ValueError("Payload deve conter 'usuario' e 'senha'")
+        contas.append({"usuario": usuario, "senha": senha})
+    # A mesma conta duas vezes no lote é raspada uma só vez
+    return list({c["usuario"]: c for c in contas}.values())
+
+
+def _process_scraping_contas(contas: list[dict], checkpoint) -> dict:
+    """
+    Várias contas em um job: um crawler por conta no mesmo processo (run_scrapers)
+    e um único upload em blocos com um token para os produtos de todas as contas.
+    Com checkpoint, cada conta tem o seu (retomada independente) e o progresso do
+    upload fica no checkpoint do job.
+    """
+    from servimed_scraper.checkpoint import CrawlCheckpoint
+
+    checkpoints = None
+    if checkpoint is not None:
+        checkpoints = {
+            c["usuario"]: CrawlCheckpoint(checkpoint.conn, f"{checkpoint.checkpoint_key}:{c['usuario']}")
+            for c in contas
+        }
+    logger.info("Iniciando scraping de %d contas", len(contas))
+    with tracing.span("scraping", contas=len(contas)):
+        por_conta = run_scrapers(contas, checkpoints=checkpoints)
+    # Ordem fixa (contas do payload, páginas de cada conta): o progresso do upload
+    # no checkpoint continua válido numa retentativa
+    produtos = [p for c in contas for p in por_conta[c["usuario"]]]
+    logger.info("Scraping concluído: %d produtos de %d contas", len(produtos), len(contas))
+    mudancas = {u: _publish_changes(u, p) for u, p in por_conta.items() if p}
+    for u, p in por_conta.items():
+        if p:
+            _write_catalog_snapshot(u, p)
+
+    response = None
+    if produtos:
+        with tracing.span("upload", produtos=len(produtos)):
+            response = _send_produtos_em_blocos(produtos, checkpoint)
+    if checkpoint is not None:
+        checkpoint.clear()
+        for c in checkpoints.values():
+            c.clear()
+    result = {
+        "produtos_enviados": len(produtos),
+        "por_conta": {u: len(p) for u, p in por_conta.items()},
+        "resposta_api": response,
+    }
+    if change_events.enabled():
+        result["mudancas"] = mudancas
+    return result
+
+
+def _publish_changes(conta: str, produtos: list[dict]) -> dict | None:
+    """
+    Com CHANGE_EVENTS=1, publica no stream as mudanças de preço/estoque da conta em
+    relação ao crawl anterior (change_events.py). Crawl encerrado pelo orçamento
+    do job é parcial: não gera eventos de remoção.
+    """
+    if not change_events.enabled():
+        return None
+    from rq import get_current_job
+
+    budget = job_budget.current()
+    job = get_current_job()
+    with tracing.span("change_events", produtos=len(produtos)):
+        contagem = change_events.ChangeFeed(_redis_conn()).publish(
+            conta,
+            produtos,
+            completo=budget is None or budget.exceeded is None,
+            crawl=job.id if job else "",
+        )
+    logger.info("Mudanças de %s: %s", conta, contagem)
+    return contagem
+
+
+def _write_catalog_snapshot(conta: str, produtos: list[dict]):
+    """
+    Com CATALOG_SNAPSHOT_DIR, grava o catálogo da conta em <dir>/<conta>.json
+    (arquivo temporário + os.replace: o serviço de consulta, catalog_app.py, nunca
+    lê um snapshot pela metade). Com CATALOG_STORE_DIR, acrescenta o catálogo ao
+    histórico da conta (catalog_store.py) e aplica a retenção. Crawl parcial
+    (orçamento) mantém o snapshot anterior.
+    """
+    import json
+    import re
+
+    import catalog_store
+
+    budget = job_budget.current()
+    if budget is not None and budget.exceeded:
+        return
+    store = catalog_store.from_env()
+    if store is not None:
+        from rq import get_current_job
+
+        job = get_current_job()
+        with tracing.span("catalog_store", produtos=len(produtos)):
+            manifesto = store.put(conta, produtos, crawl=job.id if job else "")
+            store.retain(
+                conta,
+                keep_last=int(os.environ.get("CATALOG_STORE_KEEP_LAST", "30")),
+                keep_daily=int(os.environ.get("CATALOG_STORE_KEEP_DAILY", "0")),
+            )
+        logger.info(
+            "Snapshot %s de %s: %d blocos, %d blobs novos (%d bytes)",
+            manifesto["id"], conta, len(manifesto["chunks"]), manifesto["blobs_novos"], manifesto["bytes_gravados"],
+        )
+    directory = os.environ.get("CATALOG_SNAPSHOT_DIR", "")
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, re.sub(r"[^\w.@-]", "_", conta) + ".json")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(produtos, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _job_checkpoint():
+    """Checkpoint do crawl do job RQ atual (mesmo id nas retentativas; reagendamentos herdam a chave)."""
+    from rq import get_current_job
+
+    job = get_current_job()
+    if job is None:
+        return None
+    from servimed_scraper.checkpoint import CrawlCheckpoint
+
+    return CrawlCheckpoint(job.connection, job.meta.get("checkpoint_key", job.id))
+
+
+def _send_produtos_em_blocos(produtos: list[dict], checkpoint=None):
+    """
+    Envia em blocos (PRODUTO_UPLOAD_CHUNK) com um único token. Com checkpoint, só
+    os produtos ainda não enviados, registrando o progresso após cada bloco.
+
+    Retorna a resposta da API quando tudo coube em um POST, ou a lista das respostas
+    de cada bloco enviado nesta execução (None se nada faltava enviar).
+    """
+    chunk = max(1, int(os.environ.get("PRODUTO_UPLOAD_CHUNK", "500")))
+    enviados = checkpoint.uploaded() if checkpoint is not None else 0
+    if enviados:
+        logger.info("Checkpoint: %d de %d produtos já enviados", enviados, len(produtos))
+    respostas = []
+    token = _api_token() if enviados < len(produtos) else None
+    while enviados < len(produtos):
+        bloco = produtos[enviados:enviados + chunk]
+        respostas.append(_send_produtos(bloco, token=token))
+        enviados += len(bloco)
+        if checkpoint is not None:
+            checkpoint.mark_uploaded(enviados)
+    if len(respostas) <= 1:
+        return respostas[0] if respostas else None
+    return respostas
+
+
+def _api_token() -> str:
+    """Token da API com as credenciais de env."""
     api_user = os.environ.get("DESAFIO_API_USER")
     api_password = os.environ.get("DESAFIO_API_PASSWORD")
     if not api_user or not api_password:
         raise ValueError(
             "Configure DESAFIO_API_USER e DESAFIO_API_PASSWORD para enviar à API"
         )
+    return get_token(username=api_user, password=api_password)
+
 
-    token = get_token(username=api_user, password=api_password)
-    response = post_produtos(produtos=produtos, token=token)
+def _send_produtos(produtos: list[dict], token: str | None = None):
+    """
+    Autentica na API (credenciais de env) e envia os produtos para POST /produto.
+    Com PRODUTO_UPLOAD_STREAM=1 o corpo é gerado em stream (chunked; gzip com
+    PRODUTO_UPLOAD_GZIP=1), sem montar a lista normalizada nem o JSON inteiro.
+    """
+    token = token or _api_token()
+    if os.environ.get("PRODUTO_UPLOAD_STREAM", "0") == "1":
+        response = post_produtos_stream(
+            produtos=produtos, token=token, gzip=os.environ.get("PRODUTO_UPLOAD_GZIP", "0") == "1"
+        )
+    else:
+        response = post_produtos(produtos=produtos, token=token)
     logger.info("Produtos enviados à API: %d", len(produtos))
+    return response
 
-    return {
-        "produtos_enviados": len(produtos),
-        "resposta_api": response,
-    }
 
+def _redis_conn():
+    """Conexão Redis do job RQ atual (ou de REDIS_URL fora de um job)."""
+    from rq import get_current_job
+
+    job = get_current_job()
+    if job is not None:
+        return job.connection
+    from redis import Redis
+
+    return Redis.from_url(os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
 
+
+@_traced_job
+@_budgeted_job
+@_crawl_stats_job
+def process_distributed_scraping_task(payload: dict) -> dict:
+    """
+    Job coordenador de um crawl distribuído do catálogo.
+
+    payload: {"usuario": "...", "senha": "...", "workers": 4}
+    Opcional: "budget" (ver job_budget.py), repassado aos jobs worker do crawl.
+
+    Enfileira (workers - 1) jobs process_crawl_worker_task na mesma fila (atendidos
+    por qualquer host com run_worker.py), faz o login, semeia a fronteira
+    compartilhada e processa páginas como os demais. O último processo a terminar
+    com a fronteira vazia envia todos os itens do sink para POST /produto.
+
+    O orçamento (JOB_BUDGET_DEFAULTS + "budget") vale por processo do crawl: quem o
+    atinge para de pegar páginas e os demais seguem com a fronteira. Se todos
+    atingirem o limite, o crawl fica incompleto e nada é enviado.
+    """
+    import uuid
+
+    from rq import Queue, get_current_job
+
+    usuario = payload.get("usuario") or payload.get("user")
+    senha = payload.get("senha") or payload.get("password")
+    if not usuario or not senha:
+        raise ValueError("Payload deve conter 'usuario' e 'senha'")
+    workers = max(1, int(payload.get("workers") or 1))
+
+    job = get_current_job()
+    crawl_id = payload.get("crawl_id") or (job.id if job else uuid.uuid4().hex)
+    if job is not None:
+        queue = Queue(job.origin, connection=job.connection)
+        worker_payload = {"crawl_id": crawl_id, "conta": usuario}
+        if payload.get("budget"):
+            worker_payload["budget"] = payload["budget"]
+        for _ in range(workers - 1):
+            queue.enqueue(
+                "worker.process_crawl_worker_task",
+                worker_payload,
+                job_timeout=job.timeout,
+            )
+
+    logger.info("Crawl distribuído %s: coordenador + %d workers", crawl_id, workers - 1)
+    with tracing.span("scraping", crawl_id=crawl_id, role="coordinator"):
+        local = run_scraper_distributed(crawl_id, "coordinator", usuario=usuario, senha=senha)
+    return _finalize_distributed_crawl(crawl_id, local, usuario)
+
+
+@_traced_job
+@_budgeted_job
+@_crawl_stats_job
+def process_crawl_worker_task(payload: dict) -> dict:
+    """Job worker de um crawl distribuído: payload {"crawl_id": "...", "conta": "...", "budget": ...}."""
+    crawl_id = payload.get("crawl_id")
+    if not crawl_id:
+        raise ValueError("Payload deve conter 'crawl_id'")
+    with tracing.span("scraping", crawl_id=crawl_id, role="worker"):
+        local = run_scraper_distributed(crawl_id, "worker")
+    return _finalize_distributed_crawl(crawl_id, local, payload.get("conta"))
+
+
+def _finalize_distributed_crawl(crawl_id: str, local: dict, conta: str | None = None) -> dict:
+    """Apenas um processo (fronteira vazia + marca atômica) faz o upload do sink."""
+    from servimed_scraper.frontier import RedisFrontier
+
+    frontier = RedisFrontier(_redis_conn(), crawl_id)
+    result = {"crawl_id": crawl_id, **local}
+    if not frontier.is_complete() or not frontier.try_finalize():
+        return result
+
+    produtos = frontier.items()
+    logger.info("Crawl distribuído %s concluído: %d produtos", crawl_id, len(produtos))
+    if produtos:
+        mudancas = _publish_changes(conta, produtos) if conta else None
+        if conta:
+            _write_catalog_snapshot(conta, produtos)
+        if mudancas is not None:
+            result["mudancas"] = mudancas
+        with tracing.span("upload", produtos=len(produtos)):
+            result["resposta_api"] = _send_produtos(produtos)
+    result["produtos_enviados"] = len(produtos)
+    frontier.cleanup()
+    return result
+
+
+@_traced_job
+@_deferrable_job
+@_crawl_stats_job
 def process_pedido_task(payload: dict) -> dict:
     """
     Job Nível 3: processa uma tarefa de pedido.
@@ -75,7 +584,14 @@ def process_pedido_task(payload: dict) -> dict:
     1. Executa o pedido no site (formulário Servimed) via order_runner.
     2. Obtém codigo_confirmacao e status.
     3. Autentica na API do desafio (DESAFIO_API_USER / DESAFIO_API_PASSWORD).
-    4. Envia PATCH /pedido/:id com codigo_confirmacao e status.
+    4. Envia PATCH /pedido/:id com codigo_confirmacao e status (com
+       CALLBACK_DISPATCHER=1, 3 e 4 ficam com o dispatcher: callback_dispatcher.py).
+
+    Dentro de um job RQ, cada etapa é registrada no ledger (pedido_ledger): uma
+    retentativa não refaz o pedido no site se ele já foi submetido e um pedido já
+    concluído não é processado de novo. Com o pedido travado por outro job, este é
+    reagendado com backoff (RETRY_MAX_ATTEMPTS; esgotadas, falha com
+    PedidoEmProcessamento).
 
     Retorna dict com resultado do pedido e resposta do PATCH.
     """
@@ -97,28 +613,89 @@ def process_pedido_task(payload: dict) -> dict:
 
     logger.info("Processando pedido id_pedido=%s, %d itens", id_pedido_str, len(produtos))
 
-    # Normalizar produtos para lista de dicts com gtin, codigo, quantidade
-    itens = []
-    for p in produtos:
-        itens.append({
-            "gtin": str(p.get("gtin", "")),
-            "codigo": str(p.get("codigo", "")),
-            "quantidade": int(p.get("quantidade", 1)) or 1,
-        })
+    ledger, owner, lock_ttl = _job_ledger()
+    if ledger is None:
+        return _process_pedido(usuario, senha, id_pedido_str, id_pedido_int, produtos, None)
 
-    # 1. Realizar pedido no site (simulação de formulário)
-    order_result = run_order(
-        usuario=usuario,
-        senha=senha,
-        id_pedido=id_pedido_str,
-        produtos=itens,
-    )
-    codigo_confirmacao = order_result.get("codigo_confirmacao", f"SERV-{id_pedido_str}")
-    status = order_result.get("status", "pedido_realizado")
+    etapas = ledger.get(id_pedido_str)
+    if etapas.get("etapa") == CONCLUIDO:
+        logger.info("Pedido %s já concluído (ledger); nada a fazer", id_pedido_str)
+        return _ledger_result(id_pedido_str, etapas, "ja_concluido")
+    if not ledger.lock(id_pedido_str, owner, lock_ttl):
+        # Outro job com o pedido: reagenda este (ou falha sem tentativas) em vez
+        # de terminar com sucesso sem ter processado o pedido
+        return _defer_locked(payload, [id_pedido_str], "process_pedido_task")
+    try:
+        return _process_pedido(usuario, senha, id_pedido_str, id_pedido_int, produtos, ledger)
+    finally:
+        ledger.unlock(id_pedido_str, owner)
+
+
+def _job_ledger():
+    """(PedidoLedger, dono da trava, ttl da trava) do job RQ atual; (None, None, None) fora do RQ."""
+    from rq import get_current_job
+
+    job = get_current_job()
+    if job is None:
+        return None, None, None
+    from pedido_ledger import PedidoLedger
+
+    return PedidoLedger(job.connection), job.id, int(job.timeout or 600) + 60
+
+
+def _defer_locked(payload: dict, ids: list[str], func_name: str) -> dict:
+    """Reagenda o job do payload com backoff: os pedidos ids estão travados por outro job."""
+    from rq import get_current_job
+
+    job = get_current_job()
+    tentativa = int(job.meta.get("tentativa", 0)) + 1
+    return _defer_job(job, func_name, payload, tentativa, PedidoEmProcessamento(", ".join(ids)))
+
+
+def _ledger_result(id_pedido: str, etapas: dict, ledger_status: str) -> dict:
+    return {
+        "id_pedido": id_pedido,
+        "codigo_confirmacao": etapas.get("codigo_confirmacao"),
+        "status": etapas.get("status"),
+        "ledger": ledger_status,
+    }
+
+
+def _process_pedido(usuario, senha, id_pedido_str, id_pedido_int, produtos, ledger) -> dict:
+    """Pedido no site + PATCH; com ledger, pula as etapas já registradas."""
+    etapas = ledger.get(id_pedido_str) if ledger is not None else {}
+    if etapas.get("etapa") == SUBMETIDO:
+        # Retentativa: o pedido já foi feito no site, só falta o callback
+        codigo_confirmacao = etapas["codigo_confirmacao"]
+        status = etapas["status"]
+        logger.info("Pedido %s já submetido (ledger): %s", id_pedido_str, codigo_confirmacao)
+    else:
+        # 1. Realizar pedido no site (simulação de formulário)
+        with tracing.span("pedido.site", id_pedido=id_pedido_str):
+            order_result = run_order(
+                usuario=usuario,
+                senha=senha,
+                id_pedido=id_pedido_str,
+                produtos=_normalize_itens(produtos),
+            )
+        codigo_confirmacao = order_result.get("codigo_confirmacao", f"SERV-{id_pedido_str}")
+        status = order_result.get("status", "pedido_realizado")
+        if ledger is not None:
+            ledger.record_submitted(id_pedido_str, codigo_confirmacao, status)
 
     logger.info("Pedido no site: codigo_confirmacao=%s, status=%s", codigo_confirmacao, status)
 
     # 2. Callback na API do desafio (PATCH /pedido/:id)
+    if callback_dispatcher.enabled():
+        # O PATCH fica com o dispatcher (run_callback_dispatcher.py), que marca o ledger
+        callback_dispatcher.push_callback(_redis_conn(), id_pedido_str, codigo_confirmacao, status)
+        logger.info("Callback do pedido %s enfileirado para o dispatcher", id_pedido_str)
+        return {
+            "id_pedido": id_pedido_str,
+            "codigo_confirmacao": codigo_confirmacao,
+            "status": status,
+            "callback": "enfileirado",
+        }
     api_user = os.environ.get("DESAFIO_API_USER")
     api_password = os.environ.get("DESAFIO_API_PASSWORD")
     if not api_user or not api_password:
@@ -128,14 +705,17 @@ def process_pedido_task(payload: dict) -> dict:
     if id_pedido_int is None:
         logger.warning("id_pedido não é inteiro; PATCH pode falhar. Payload: %s", id_pedido_str)
 
-    token = get_token(username=api_user, password=api_password)
-    response = patch_pedido(
-        id_pedido=id_pedido_int if id_pedido_int is not None else int(id_pedido_str),
-        codigo_confirmacao=codigo_confirmacao,
-        status=status,
-        token=token,
-    )
+    with tracing.span("pedido.callback", id_pedido=id_pedido_str):
+        token = get_token(username=api_user, password=api_password)
+        response = patch_pedido(
+            id_pedido=id_pedido_int if id_pedido_int is not None else int(id_pedido_str),
+            codigo_confirmacao=codigo_confirmacao,
+            status=status,
+            token=token,
+        )
     logger.info("Callback PATCH /pedido/%s concluído", id_pedido_str)
+    if ledger is not None:
+        ledger.record_patched(id_pedido_str)
 
     return {
         "id_pedido": id_pedido_str,
@@ -143,3 +723,208 @@ def process_pedido_task(payload: dict) -> dict:
         "status": status,
         "resposta_api": response,
     }
+
+
+def _normalize_itens(produtos: list[dict]) -> list[dict]:
+    """Normaliza produtos para lista de dicts com gtin, codigo, quantidade."""
+    itens = []
+    for p in produtos:
+        itens.append({
+            "gtin": str(p.get("gtin", "")),
+            "codigo": str(p.get("codigo", "")),
+            "quantidade": int(p.get("quantidade", 1)) or 1,
+        })
+    return itens
+
+
+@_traced_job
+@_deferrable_job
+@_crawl_stats_job
+def process_pedido_batch_task(payload: dict) -> dict:
+    """
+    Job de lote de pedidos da mesma conta do fornecedor.
+
+    payload: {
+        "usuario": "fornecedor_user",
+        "senha": "fornecedor_pass",
+        "pedidos": [{"id_pedido": "1234", "produtos": [...]}, ...],
+        "concorrencia": 1  # opcional
+    }
+
+    Fluxo:
+    1. Um login no site e submissão de todos os pedidos na mesma sessão.
+    2. Um token na API do desafio e PATCH /pedido/:id para cada pedido (com
+       CALLBACK_DISPATCHER=1, os callbacks vão para o dispatcher).
+
+    Falhas de PATCH de um pedido não interrompem os demais; ficam em "erro", assim
+    como pedidos sem confirmação do spider (status "nao_confirmado", sem PATCH).
+    Com ledger (job RQ), pedidos concluídos são pulados e os já submetidos só
+    recebem o PATCH, como em process_pedido_task; os travados por outro job vão
+    para um novo lote reagendado com backoff ("adiado" no resultado).
+    Retorna dict com a lista de resultados por pedido.
+    """
+    return _process_pedido_batch(payload)
+
+
+def _process_pedido_batch(payload: dict) -> dict:
+    """Corpo de process_pedido_batch_task, sem os decoradores de job (usado pelo flush)."""
+    usuario = payload.get("usuario") or payload.get("user")
+    senha = payload.get("senha") or payload.get("password")
+    pedidos_raw = payload.get("pedidos") or []
+
+    if not usuario or not senha:
+        raise ValueError("Payload deve conter 'usuario' e 'senha'")
+    if not pedidos_raw:
+        raise ValueError("Payload deve conter 'pedidos'")
+
+    # Um mesmo id_pedido enfileirado mais de uma vez é submetido uma só vez (último vence)
+    pedidos_por_id: dict[str, dict] = {}
+    for p in pedidos_raw:
+        id_pedido = p.get("id_pedido")
+        if id_pedido is None or id_pedido == "":
+            raise ValueError("Cada pedido do lote deve conter 'id_pedido'")
+        pedidos_por_id[str(id_pedido)] = {
+            "id_pedido": str(id_pedido),
+            "produtos": _normalize_itens(p.get("produtos") or []),
+        }
+    pedidos = list(pedidos_por_id.values())
+
+    dispatcher = callback_dispatcher.enabled()
+    api_user = os.environ.get("DESAFIO_API_USER")
+    api_password = os.environ.get("DESAFIO_API_PASSWORD")
+    if not dispatcher and (not api_user or not api_password):
+        raise ValueError(
+            "Configure DESAFIO_API_USER e DESAFIO_API_PASSWORD para enviar callback à API"
+        )
+
+    ledger, owner, lock_ttl = _job_ledger()
+    resultados = []
+    ja_submetidos = []
+    travados = []
+    de_outro_job = []
+    if ledger is not None:
+        # Pula pedidos concluídos; os travados por outro job vão para um novo lote
+        # reagendado; reaproveita os já submetidos
+        a_submeter = []
+        for p in pedidos:
+            etapas = ledger.get(p["id_pedido"])
+            if etapas.get("etapa") == CONCLUIDO:
+                resultados.append(_ledger_result(p["id_pedido"], etapas, "ja_concluido"))
+            elif not ledger.lock(p["id_pedido"], owner, lock_ttl):
+                de_outro_job.append(p)
+            else:
+                travados.append(p["id_pedido"])
+                if etapas.get("etapa") == SUBMETIDO:
+                    ja_submetidos.append({
+                        "id_pedido": p["id_pedido"],
+                        "codigo_confirmacao": etapas["codigo_confirmacao"],
+                        "status": etapas["status"],
+                    })
+                else:
+                    a_submeter.append(p)
+        pedidos = a_submeter
+
+    try:
+        logger.info("Processando lote de %d pedidos para usuario=%s", len(pedidos), usuario)
+        with tracing.span("pedido.site", pedidos=len(pedidos)):
+            order_results = run_orders(
+                usuario=usuario,
+                senha=senha,
+                pedidos=pedidos,
+                concorrencia=int(payload.get("concorrencia") or 1),
+            ) if pedidos else []
+        # Sem confirmação do spider (ex.: login falhou) o pedido não foi feito:
+        # não entra no ledger nem recebe PATCH
+        confirmados = []
+        for r in order_results:
+            if r["status"] == NAO_CONFIRMADO:
+                logger.warning("Pedido %s sem confirmação no site", r["id_pedido"])
+                resultados.append({**r, "erro": "Pedido não confirmado no site"})
+            else:
+                confirmados.append(r)
+        if ledger is not None:
+            for r in confirmados:
+                ledger.record_submitted(r["id_pedido"], r["codigo_confirmacao"], r["status"])
+
+        a_notificar = ja_submetidos + confirmados
+        if dispatcher:
+            conn = _redis_conn()
+            for r in a_notificar:
+                callback_dispatcher.push_callback(conn, r["id_pedido"], r["codigo_confirmacao"], r["status"])
+                resultados.append({**r, "callback": "enfileirado"})
+            a_notificar = []
+        token = get_token(username=api_user, password=api_password) if a_notificar else None
+        for r in a_notificar:
+            resultado = dict(r)
+            try:
+                resultado["resposta_api"] = patch_pedido(
+                    id_pedido=int(r["id_pedido"]),
+                    codigo_confirmacao=r["codigo_confirmacao"],
+                    status=r["status"],
+                    token=token,
+                )
+                if ledger is not None:
+                    ledger.record_patched(r["id_pedido"])
+            except Exception as e:
+                logger.exception("Falha no PATCH /pedido/%s", r["id_pedido"])
+                resultado["erro"] = str(e)
+            resultados.append(resultado)
+    finally:
+        for id_pedido in travados:
+            ledger.unlock(id_pedido, owner)
+
+    falhas = sum(1 for r in resultados if "erro" in r)
+    logger.info("Lote concluído: %d pedidos, %d falhas", len(resultados), falhas)
+    result = {"pedidos": resultados, "falhas": falhas}
+    if de_outro_job:
+        result["adiado"] = _defer_locked(
+            {**payload, "pedidos": de_outro_job},
+            [p["id_pedido"] for p in de_outro_job],
+            "process_pedido_batch_task",
+        )
+    return result
+
+
+def flush_pedido_batch(conta: str) -> dict:
+    """
+    Job agendado por pedido_batch.enqueue_pedido_coalescido: retira os pedidos
+    acumulados da conta na janela e os processa em um único lote. Se a mesma conta
+    foi enfileirada com senhas diferentes, o primeiro lote é processado aqui e os
+    demais viram jobs process_pedido_batch_task (o reactor do Scrapy não reinicia no
+    mesmo processo). A lista só é apagada depois do lote processado (retentativa do
+    job reprocessa a mesma lista).
+    """
+    from rq import Queue, get_current_job
+    from pedido_batch import ack_batch, take_batch
+
+    job = get_current_job()
+    payloads = take_batch(job.connection, conta, job.id)
+    if not payloads:
+        return {"pedidos": [], "falhas": 0}
+
+    # Pedidos da mesma conta enfileirados com senhas diferentes: um lote por senha
+    por_senha: dict[str, list[dict]] = {}
+    for p in payloads:
+        por_senha.setdefault(p.get("senha") or p.get("password"), []).append(p)
+    lotes = [
+        {
+            "usuario": conta,
+            "senha": senha,
+            "pedidos": [
+                {"id_pedido": p.get("id_pedido"), "produtos": p.get("produtos") or []}
+                for p in grupo
+            ],
+        }
+        for senha, grupo in por_senha.items()
+    ]
+
+    logger.info("Flush do lote da conta %s: %d pedidos, %d lote(s)", conta, len(payloads), len(lotes))
+    result = _process_pedido_batch(lotes[0])
+    if len(lotes) > 1:
+        queue = Queue(job.origin, connection=job.connection)
+        result["lotes_enfileirados"] = [
+            queue.enqueue("worker.process_pedido_batch_task", lote, job_timeout=job.timeout).id
+            for lote in lotes[1:]
+        ]
+    ack_batch(job.connection, conta, job.id)
+    return result
@@ -0,0 +1,271 @@
+"""
+Supervisor de pools de workers RQ com escala automática (por host).
+
+Cada pool tem as filas que seus workers consomem (processos run_worker.run_worker,
+um FairWorker por processo) e uma política:
+  queues           filas do pool (base; subfilas por conta entram na profundidade)
+  min, max         tamanho do pool
+  jobs_per_worker  jobs na fila por worker desejado (alvo = profundidade / jobs_per_worker)
+  max_wait         idade (s) do job mais antigo na fila acima da qual o pool cresce
+                   mesmo com a fila curta (jobs longos, ex.: crawls)
+  up_cooldown      intervalo mínimo (s) entre aumentos
+  down_cooldown    intervalo mínimo (s) entre reduções (e desde o último aumento)
+  step             workers adicionados por aumento no máximo
+
+A cada ciclo o supervisor lê a profundidade e a idade do job mais antigo das filas
+de cada pool, a carga de CPU (load average de 1 min / CPUs) e a memória disponível
+do host. O pool cresce até o alvo (respeitando max, step e up_cooldown) só se o
+host tem folga (cpu < cpu_max, memória disponível > mem_min); diminui um worker
+por vez quando a fila está abaixo do alvo. A redução é um dreno: o worker recebe
+job_cancel.DRAIN_SIGNAL, termina o job atual e sai; passado drain_timeout recebe
+SIGTERM e o job é interrompido com o motivo "shutdown" (reenfileirado a partir do
+checkpoint, job_cancel.py). Processos que morrem são removidos e o pool volta ao mínimo.
+
+Eventos do pool (aumento, reducao, interrupcao, drenado, saida, fim) vão para o log e,
+com event_log, para um arquivo JSONL.
+"""
+import json
+import logging
+import math
+import os
+import signal
+import time
+
+from rq.utils import utcparse
+
+from job_cancel import DRAIN_SIGNAL
+from scheduling import SUBQUEUES_KEY
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY_PREFIX = "rq:queue:"
+JOB_KEY_PREFIX = "rq:job:"
+
+POLICY_DEFAULTS = {
+    "min": 1,
+    "max": 4,
+    "jobs_per_worker": 10,
+    "max_wait": 120,
+    "up_cooldown": 30,
+    "down_cooldown": 300,
+    "step": 2,
+}
+CAMPOS = ("queues",) + tuple(POLICY_DEFAULTS)
+
+
+def parse_pools(config: dict) -> dict[str, dict]:
+    """Valida {nome: {"queues": [...], "min": ..., ...}} e completa com POLICY_DEFAULTS."""
+    pools = {}
+    for nome, politica in config.items():
+        desconhecidos = set(politica) - set(CAMPOS)
+        if desconhecidos:
+            raise ValueError(f"Pool {nome}: campos desconhecidos {sorted(desconhecidos)} (use {', '.join(CAMPOS)})")
+        queues = politica.get("queues")
+        if isinstance(queues, str):
+            queues = [q.strip() for q in queues.split(",") if q.strip()]
+        if not queues:
+            raise ValueError(f"Pool {nome}: informe as filas (queues)")
+        p = {**POLICY_DEFAULTS, **politica, "queues": queues}
+        if not 0 <= p["min"] <= p["max"] or p["max"] < 1:
+            raise ValueError(f"Pool {nome}: requer 0 <= min <= max e max >= 1")
+        pools[nome] = p
+    return pools
+
+
+def _parse_enqueued_at(valor) -> float | None:
+    if not valor:
+        return None
+    try:
+        return utcparse(valor.decode() if isinstance(valor, bytes) else valor).timestamp()
+    except ValueError:
+        return None
+
+
+def queue_metrics(conn, queues: list[str], agora: float | None = None) -> dict:
+    """Profundidade (filas + subfilas por conta) e idade (s) do job mais antigo."""
+    agora = time.time() if agora is None else agora
+    nomes = []
+    for base in queues:
+        nomes.append(base)
+        nomes.extend(sorted(m.decode() for m in conn.smembers(SUBQUEUES_KEY.format(base=base))))
+    pipe = conn.pipeline(transaction=False)
+    for nome in nomes:
+        pipe.llen(QUEUE_KEY_PREFIX + nome)
+        pipe.lindex(QUEUE_KEY_PREFIX + nome, 0)  # RQ consome pela esquerda: o mais antigo
+    valores = pipe.execute()
+    profundidade = sum(valores[0::2])
+    primeiros = [v.decode() for v in valores[1::2] if v]
+    idade = 0.0
+    if primeiros:
+        pipe = conn.pipeline(transaction=False)
+        for job_id in primeiros:
+            pipe.hget(JOB_KEY_PREFIX + job_id, "enqueued_at")
+        for enfileirado in pipe.execute():
+            ts = _parse_enqueued_at(enfileirado)
+            if ts is not None:
+                idade = max(idade, agora - ts)
+    return {"profundidade": profundidade, "idade_max": round(idade, 1)}
+
+
+def host_metrics() -> dict:
+    """Carga de CPU (load average 1 min / CPUs) e fração de memória disponível do host."""
+    try:
+        cpu = os.getloadavg()[0] / (os.cpu_count() or 1)
+    except OSError:
+        cpu = 0.0
+    memoria = 1.0
+    try:
+        with open("/proc/meminfo") as f:
+            info = {linha.split(":")[0]: int(linha.split()[1]) for linha in f if len(linha.split()) >= 2}
+        memoria = info["MemAvailable"] / info["MemTotal"]
+    except (OSError, KeyError, ValueError, ZeroDivisionError):
+        pass
+    return {"cpu": round(cpu, 2), "memoria_livre": round(memoria, 3)}
+
+
+def desired_size(politica: dict, atual: int, metricas: dict, host: dict, ultimo_aumento: float,
+                 ultima_reducao: float, agora: float, cpu_max: float = 0.9, mem_min: float = 0.1) -> tuple[int, str]:
+    """Tamanho desejado do pool e o motivo (pura: sem efeitos, testável)."""
+    minimo, maximo = politica["min"], politica["max"]
+    if atual < minimo:
+        return minimo, "minimo"
+    alvo = math.ceil(metricas["profundidade"] / max(1, politica["jobs_per_worker"]))
+    if metricas["idade_max"] > politica["max_wait"]:
+        alvo = max(alvo, atual + 1)
+    alvo = min(maximo, max(minimo, alvo))
+    if alvo > atual:
+        if host["cpu"] >= cpu_max or host["memoria_livre"] <= mem_min:
+            return atual, "host_sem_folga"
+        if agora - ultimo_aumento < politica["up_cooldown"]:
+            return atual, "cooldown"
+        return min(alvo, atual + politica["step"]), "fila"
+    if alvo < atual:
+        if agora - max(ultimo_aumento, ultima_reducao) < politica["down_cooldown"]:
+            return atual, "cooldown"
+        return atual - 1, "ociosa"
+    return atual, "estavel"
+
+
+def _start_worker_process(queues: list[str], redis_url: str, pedido_queue: str):
+    from multiprocessing import Process
+
+    from run_worker import run_worker
+
+    proc = Process(target=run_worker, args=(queues, redis_url, pedido_queue), daemon=False)
+    proc.start()
+    return proc
+
+
+class WorkerSupervisor:
+    """
+    Mantém um pool de processos worker por política de pools (parse_pools).
+
+    start_worker: callable(queues) -> processo (pid, is_alive(), exitcode); padrão:
+    multiprocessing.Process com run_worker.run_worker.
+    """
+
+    def __init__(
+        self,
+        conn,
+        pools: dict[str, dict],
+        start_worker=None,
+        redis_url: str = "redis://localhost:6379/0",
+        pedido_queue: str = "pedido",
+        event_log: str | None = None,
+        cpu_max: float = 0.9,
+        mem_min: float = 0.1,
+        drain_timeout: float = 900.0,
+        host=host_metrics,
+    ):
+        self.conn = conn
+        self.pools = pools
+        self.start_worker = start_worker or (lambda queues: _start_worker_process(queues, redis_url, pedido_queue))
+        self.event_log = event_log
+        self.cpu_max = cpu_max
+        self.mem_min = mem_min
+        self.drain_timeout = drain_timeout
+        self.host = host
+        self.ativos: dict[str, list] = {nome: [] for nome in pools}
+        self.drenando: dict[str, list] = {nome: [] for nome in pools}  # (processo, desde, interrompido)
+        self.ultimo_aumento = {nome: 0.0 for nome in pools}
+        self.ultima_reducao = {nome: 0.0 for nome in pools}
+
+    def event(self, evento: str, pool: str, **dados):
+        registro = {"ts": round(time.time(), 3), "evento": evento, "pool": pool, **dados}
+        logger.info("Pool %s: %s %s", pool, evento, dados)
+        if self.event_log:
+            with open(self.event_log, "a", encoding="utf-8") as f:
+                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+    def _reap(self, nome: str):
+        for proc in [p for p in self.ativos[nome] if not p.is_alive()]:
+            self.ativos[nome].remove(proc)
+            self.event("saida", nome, pid=proc.pid, exitcode=proc.exitcode)
+        for item in [d for d in self.drenando[nome] if not d[0].is_alive()]:
+            self.drenando[nome].remove(item)
+            self.event("drenado", nome, pid=item[0].pid, segundos=round(time.time() - item[1], 1))
+
+    def _escalate_drains(self, nome: str, agora: float):
+        """Dreno acima de drain_timeout: SIGTERM interrompe o job do worker (reenfileirado pelo checkpoint)."""
+        for i, (proc, desde, interrompido) in enumerate(self.drenando[nome]):
+            if interrompido or agora - desde < self.drain_timeout:
+                continue
+            self.drenando[nome][i] = (proc, desde, True)
+            self._signal(proc, signal.SIGTERM)
+            self.event("interrupcao", nome, pid=proc.pid, segundos=round(agora - desde, 1))
+
+    def _signal(self, proc, signum):
+        try:
+            os.kill(proc.pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def step(self, agora: float | None = None) -> dict[str, int]:
+        """Um ciclo de supervisão. Retorna o tamanho de cada pool (sem os drenando)."""
+        agora = time.time() if agora is None else agora
+        host = self.host()
+        tamanhos = {}
+        for nome, politica in self.pools.items():
+            self._reap(nome)
+            self._escalate_drains(nome, agora)
+            atual = len(self.ativos[nome])
+            metricas = queue_metrics(self.conn, politica["queues"], agora)
+            alvo, motivo = desired_size(
+                politica, atual, metricas, host, self.ultimo_aumento[nome], self.ultima_reducao[nome],
+                agora, self.cpu_max, self.mem_min,
+            )
+            if alvo > atual:
+                for _ in range(alvo - atual):
+                    self.ativos[nome].append(self.start_worker(politica["queues"]))
+                self.ultimo_aumento[nome] = agora
+                self.event("aumento", nome, de=atual, para=alvo, motivo=motivo, **metricas, **host)
+            elif alvo < atual:
+                proc = self.ativos[nome].pop()
+                self._signal(proc, DRAIN_SIGNAL)
+                self.drenando[nome].append((proc, agora, False))
+                self.ultima_reducao[nome] = agora
+                self.event("reducao", nome, de=atual, para=alvo, pid=proc.pid, motivo=motivo, **metricas, **host)
+            tamanhos[nome] = len(self.ativos[nome])
+        return tamanhos
+
+    def run(self, interval: float = 5.0, max_cycles: int | None = None):
+        """Laço do supervisor; max_cycles limita os ciclos (útil em testes)."""
+        ciclos = 0
+        while max_cycles is None or ciclos < max_cycles:
+            ciclos += 1
+            try:
+                self.step()
+            except Exception:
+                logger.exception("Falha no ciclo do supervisor de workers")
+            time.sleep(interval)
+
+    def shutdown(self, timeout: float = 60.0):
+        """SIGTERM em todos os workers (crawls interrompidos são reenfileirados) e espera a saída."""
+        for nome in self.pools:
+            for proc in self.ativos[nome] + [d[0] for d in self.drenando[nome]]:
+                self._signal(proc, signal.SIGTERM)
+        limite = time.time() + timeout
+        for nome in self.pools:
+            for proc in self.ativos[nome] + [d[0] for d in self.drenando[nome]]:
+                proc.join(max(0.0, limite - time.time()))
+            self.event("fim", nome, workers=len(self.ativos[nome]))